@@ -6,6 +6,7 @@ import os
 import PyQt5.QtWidgets as qwd
 from PyQt5 import QtCore
 
+from nvp.ai.stable_diffusion.sd_client import DEFAULT_PORT, SDClient
 from nvp.gui.app_base import AppBase
 from nvp.gui.utils import NVPGui as gui
 from nvp.nvp_context import NVPContext
@@ -13,6 +14,30 @@ from nvp.nvp_context import NVPContext
 logger = logging.getLogger(__name__)
 
 
+class GenerateWorker(QtCore.QThread):
+    """Worker thread sending a generation request to the model server,
+    so that the GUI thread is not blocked while the images are generated."""
+
+    done = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, client, prompt, params):
+        """Constructor"""
+        super().__init__()
+        self.client = client
+        self.prompt = prompt
+        self.params = params
+
+    def run(self):
+        """Send the request and post the response back with a signal"""
+        try:
+            resp = self.client.text_to_image(self.prompt, **self.params)
+            self.done.emit(resp)
+        except Exception as err:  # pylint: disable=broad-except
+            logger.exception("Error while generating image")
+            self.failed.emit(str(err))
+
+
 class SDLab(AppBase):
     """SDLab component class"""
 
@@ -42,6 +67,10 @@ class SDLab(AppBase):
         self.config = cfg
         logger.info("SDLab config: %s", self.config)
 
+        # Client used to send the generation requests to the resident model server:
+        self.sd_client = SDClient(self.config.get("sd_server_port", DEFAULT_PORT))
+        self.gen_worker = None
+
     def process_cmd_path(self, cmd):
         """Check if this component can process the given command"""
 
@@ -87,11 +116,56 @@ class SDLab(AppBase):
         # act.triggered.connect(self.open_folder)
         menu.addAction(act)
 
+        act = qwd.QAction(gui.create_icon("image"), "Generate image...", win)
+        act.triggered.connect(self.generate_image)
+        menu.addAction(act)
+
         act = qwd.QAction(gui.create_icon("control-power"), "Exit", win)
         act.setShortcut("Ctrl+Q")
         act.triggered.connect(win.close)
         menu.addAction(act)
 
+    def generate_image(self):
+        """Request the generation of an image from the model server"""
+        win = self.get_main_window()
+        prompt, accepted = qwd.QInputDialog.getText(win, "Generate image", "Prompt:")
+        if not accepted or prompt.strip() == "":
+            return
+
+        if self.gen_worker is not None:
+            qwd.QMessageBox.warning(win, "SDLab", "An image generation is already in progress.")
+            return
+
+        if not self.sd_client.is_available():
+            qwd.QMessageBox.warning(win, "SDLab", "StableDiffusion server not running (start it with 'nvp sd-server')")
+            return
+
+        params = {"n_samples": 1, "output_dir": self.config.get("output_dir", None)}
+        self.gen_worker = GenerateWorker(self.sd_client, prompt, params)
+        self.gen_worker.done.connect(self.on_image_generated)
+        self.gen_worker.failed.connect(self.on_generation_failed)
+        self.gen_worker.finished.connect(self.on_generation_finished)
+        self.gen_worker.start()
+        win.statusBar().showMessage("Generating image...")
+
+    def on_image_generated(self, resp):
+        """Display the generation results, called on the GUI thread"""
+        self.get_main_window().statusBar().showMessage(
+            f"Generated {len(resp['files'])} image(s) in {resp['roundtrip_time']:.2f} secs "
+            f"(model load: {resp['load_time']:.2f} secs)"
+        )
+
+    def on_generation_failed(self, error):
+        """Report a generation error, called on the GUI thread"""
+        win = self.get_main_window()
+        win.statusBar().clearMessage()
+        qwd.QMessageBox.warning(win, "SDLab", f"Image generation failed: {error}")
+
+    def on_generation_finished(self):
+        """Release the generation worker"""
+        self.gen_worker.deleteLater()
+        self.gen_worker = None
+
 
 if __name__ == "__main__":
     # Create the context:
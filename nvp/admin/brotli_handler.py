@@ -1,23 +1,150 @@
 """brotli handling component
 
-This component is used to compress/decompress with brotli"""
+This component is used to compress/decompress with brotli (or zstd) in a streaming way"""
 
 import logging
+import os
 import time
+from concurrent.futures import ProcessPoolExecutor
 
 import brotli
 
 from nvp.nvp_component import NVPComponent
 from nvp.nvp_context import NVPContext
 
+try:
+    import zstandard
+except ModuleNotFoundError:
+    # zstd support is optional:
+    zstandard = None
+
+try:
+    import resource
+except ModuleNotFoundError:
+    # Not available on windows:
+    resource = None
+
 logger = logging.getLogger(__name__)
 
+# Size of the chunks processed by the streaming compressors:
+CHUNK_SIZE = 1024 * 1024
+
+# Extension of the compressed files for each codec:
+CODEC_EXTS = {"br": ".br", "zstd": ".zst"}
+
+# Default compression level for each codec:
+DEFAULT_LEVELS = {"br": 11, "zstd": 19}
+
+# Assets precompressed by default in the directory mode:
+ASSET_EXTS = [".wasm", ".js", ".mjs", ".html", ".css", ".json", ".svg", ".data"]
+
 
 def create_component(ctx: NVPContext):
     """Create an instance of the component"""
     return BrotliHandler(ctx)
 
 
+def create_compressor(codec, level=None, lgwin=22):
+    """Create a streaming compressor returning the (process, finish) functions"""
+    level = DEFAULT_LEVELS[codec] if level is None else level
+    if codec == "br":
+        comp = brotli.Compressor(mode=brotli.MODE_GENERIC, quality=level, lgwin=lgwin, lgblock=0)
+        return comp.process, comp.finish
+
+    if codec == "zstd":
+        assert zstandard is not None, "zstandard module is not available."
+        comp = zstandard.ZstdCompressor(level=level).compressobj()
+        return comp.compress, comp.flush
+
+    raise ValueError(f"Unsupported compression codec: {codec}")
+
+
+def decompress_chunks(codec, chunks):
+    """Decompress an iterable of compressed chunks, yielding the decompressed data with bounded buffers"""
+    if codec == "br":
+        dec = brotli.Decompressor()
+        if not hasattr(dec, "can_accept_more_data"):
+            # Older brotli versions without output buffer limit:
+            for chunk in chunks:
+                yield dec.process(chunk)
+            return
+
+        for chunk in chunks:
+            yield dec.process(chunk, output_buffer_limit=CHUNK_SIZE)
+            while not dec.can_accept_more_data():
+                yield dec.process(b"", output_buffer_limit=CHUNK_SIZE)
+
+        # Flush the remaining buffered output:
+        while not dec.is_finished():
+            data = dec.process(b"", output_buffer_limit=CHUNK_SIZE)
+            if len(data) == 0:
+                raise brotli.error("Truncated brotli stream")
+            yield data
+        return
+
+    if codec == "zstd":
+        assert zstandard is not None, "zstandard module is not available."
+        dec = zstandard.ZstdDecompressor().decompressobj()
+        for chunk in chunks:
+            yield dec.decompress(chunk)
+        return
+
+    raise ValueError(f"Unsupported compression codec: {codec}")
+
+
+def get_codec(filename, default="br"):
+    """Retrieve the codec to use for a given compressed file name"""
+    for codec, ext in CODEC_EXTS.items():
+        if filename.endswith(ext):
+            return codec
+    return default
+
+
+def stream_file(input_file, output_file, process):
+    """Stream the chunks of an input file through a processing function into an output file.
+    The output is written to a temp file first, so that an interrupted run never leaves a truncated output.
+    Returns the (input_size, output_size) tuple."""
+    tmp_file = output_file + ".tmp"
+    with open(input_file, "rb") as src, open(tmp_file, "wb") as dst:
+        for data in process(iter(lambda: src.read(CHUNK_SIZE), b"")):
+            dst.write(data)
+    os.replace(tmp_file, output_file)
+    return os.path.getsize(input_file), os.path.getsize(output_file)
+
+
+def compress_file(input_file, output_file, codec="br", level=None):
+    """Compress a file with a streaming compressor, returning the compression stats"""
+    start_time = time.time()
+
+    def process(chunks):
+        compress, finish = create_compressor(codec, level)
+        for chunk in chunks:
+            yield compress(chunk)
+        yield finish()
+
+    in_size, out_size = stream_file(input_file, output_file, process)
+    return {"file": input_file, "input_size": in_size, "output_size": out_size, "elapsed": time.time() - start_time}
+
+
+def decompress_file(input_file, output_file, codec="br"):
+    """Decompress a file with a streaming decompressor, returning the decompression stats"""
+    start_time = time.time()
+    in_size, out_size = stream_file(input_file, output_file, lambda chunks: decompress_chunks(codec, chunks))
+    return {"file": input_file, "input_size": in_size, "output_size": out_size, "elapsed": time.time() - start_time}
+
+
+def get_peak_rss():
+    """Retrieve the peak RSS of the current process and of its terminated children in MB"""
+    if resource is None:
+        return 0.0
+
+    # Note: ru_maxrss is in kilobytes on linux:
+    usage = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    return usage / 1024.0
+
+
 class BrotliHandler(NVPComponent):
     """BrotliHandler component class"""
 
@@ -32,58 +159,125 @@ class BrotliHandler(NVPComponent):
             file = self.get_param("input_file")
             outfile = self.get_param("output_file")
             level = self.get_param("compression_level")
-            return self.compress_file(file, outfile, clevel=level)
+            codec = self.get_param("codec")
+            return self.compress_file(file, outfile, clevel=level, codec=codec)
 
         if cmd == "decompress":
             file = self.get_param("input_file")
             outfile = self.get_param("output_file")
             return self.decompress_file(file, outfile)
 
+        if cmd == "compress-dir":
+            root_dir = self.get_param("root_dir")
+            level = self.get_param("compression_level")
+            codecs = self.get_param("codecs").split(",")
+            exts = self.get_param("extensions")
+            exts = ASSET_EXTS if exts is None else exts.split(",")
+            self.compress_directory(root_dir, codecs, level, exts, max_workers=self.get_param("num_jobs"))
+            return True
+
+        if cmd == "bench":
+            files = self.get_param("input_files")
+            level = self.get_param("compression_level")
+            codecs = self.get_param("codecs").split(",")
+            self.bench_files(files, codecs, level)
+            return True
+
         return False
 
-    def compress_file(self, input_file, output_file=None, clevel=11):
+    def compress_file(self, input_file, output_file=None, clevel=None, codec="br"):
         """Compress a file"""
         if output_file is None:
-            output_file = input_file + ".br"
-
-        params = {
-            # 'mode': brotli.MODE_TEXT  # Set to brotli.MODE_TEXT for text-based files
-            "mode": brotli.MODE_GENERIC,
-            "quality": clevel,
-            "lgwin": 22,
-            "lgblock": 0,
-        }
+            output_file = input_file + CODEC_EXTS[codec]
 
-        start_time = time.time()
-        content = self.read_binary_file(input_file)
         logger.info("Compressing %s...", input_file)
-        compressed = brotli.compress(content, **params)
-
-        # write the compressed data:
-        self.write_binary_file(compressed, output_file)
-
-        elapsed = time.time() - start_time
-        logger.info("Compressed %s in %.2fsecs", input_file, elapsed)
+        stats = compress_file(input_file, output_file, codec, clevel)
+        logger.info("Compressed %s in %.2fsecs", input_file, stats["elapsed"])
 
         return True
 
     def decompress_file(self, input_file, output_file=None):
-        """Compress a file"""
+        """Decompress a file"""
         if output_file is None:
             output_file = self.set_path_extension(input_file, "")
 
-        start_time = time.time()
-        content = self.read_binary_file(input_file)
         logger.info("Decompressing %s...", input_file)
-        decompressed = brotli.decompress(content)
+        stats = decompress_file(input_file, output_file, get_codec(input_file))
+        logger.info("Decompressed %s in %.2fsecs", input_file, stats["elapsed"])
+
+        return True
+
+    def find_assets(self, root_dir, exts=None, recursive=True):
+        """Find the files that could be precompressed in a folder"""
+        exts = ASSET_EXTS if exts is None else exts
+        files = self.get_all_files(root_dir, recursive=recursive)
+        return [self.get_path(root_dir, fname) for fname in files if self.get_path_extension(fname).lower() in exts]
+
+    def compress_directory(self, root_dir, codecs=("br",), clevel=None, exts=None, recursive=True, max_workers=None):
+        """Precompress all the eligible assets in a folder in a process pool,
+        skipping the outputs that are more recent than their input"""
+        tasks = []
+        for in_file in self.find_assets(root_dir, exts, recursive):
+            for codec in codecs:
+                out_file = in_file + CODEC_EXTS[codec]
+                if self.file_exists(out_file) and os.path.getmtime(out_file) >= os.path.getmtime(in_file):
+                    logger.info("%s is OK", out_file)
+                    continue
+                tasks.append((in_file, out_file, codec, clevel))
 
-        # write the compressed data:
-        self.write_binary_file(decompressed, output_file)
+        if len(tasks) == 0:
+            return []
 
+        logger.info("Compressing %d file(s)...", len(tasks))
+        start_time = time.time()
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(compress_file, *zip(*tasks)))
+
+        for (_, out_file, _, _), res in zip(tasks, results):
+            logger.info("Generated %s (%.1f%% of input size)", out_file, 100.0 * res["output_size"] / res["input_size"])
+
+        total = sum(res["input_size"] for res in results) / (1024 * 1024)
         elapsed = time.time() - start_time
-        logger.info("Decompressed %s in %.2fsecs", input_file, elapsed)
+        rate = total / elapsed if elapsed > 0 else 0.0
+        logger.info("Compressed %.2f MB in %.2fsecs (%.2f MB/s)", total, elapsed, rate)
+        return results
 
-        return True
+    def bench_files(self, input_files, codecs=("br", "zstd"), clevel=None):
+        """Benchmark the streaming compressors on a list of files, reporting the throughput and peak RSS"""
+        results = []
+        for in_file in input_files:
+            for codec in codecs:
+                out_file = in_file + ".bench" + CODEC_EXTS[codec]
+                stats = compress_file(in_file, out_file, codec, clevel)
+                start_time = time.time()
+                decompress_file(out_file, out_file + ".out", codec)
+                dec_elapsed = time.time() - start_time
+                self.remove_file(out_file + ".out")
+                self.remove_file(out_file)
+
+                size = stats["input_size"] / (1024 * 1024)
+                res = {
+                    "file": in_file,
+                    "codec": codec,
+                    "size_mb": size,
+                    "ratio": stats["output_size"] / stats["input_size"] if stats["input_size"] > 0 else 0.0,
+                    "compress_mbps": size / stats["elapsed"] if stats["elapsed"] > 0 else 0.0,
+                    "decompress_mbps": size / dec_elapsed if dec_elapsed > 0 else 0.0,
+                    "peak_rss_mb": get_peak_rss(),
+                }
+                logger.info(
+                    "%s [%s]: %.2f MB, ratio=%.3f, compress=%.2f MB/s, decompress=%.2f MB/s, peak RSS=%.1f MB",
+                    in_file,
+                    codec,
+                    res["size_mb"],
+                    res["ratio"],
+                    res["compress_mbps"],
+                    res["decompress_mbps"],
+                    res["peak_rss_mb"],
+                )
+                results.append(res)
+
+        return results
 
 
 if __name__ == "__main__":
@@ -96,9 +290,20 @@ if __name__ == "__main__":
     psr = context.build_parser("compress")
     psr.add_str("input_file")("File to compress")
     psr.add_str("-o", "--output", dest="output_file")("Output destination for compress")
-    psr.add_int("-l", "--level", dest="compression_level", default=11)("Compression level")
+    psr.add_int("-l", "--level", dest="compression_level")("Compression level (default: 11 for br, 19 for zstd)")
+    psr.add_str("-c", "--codec", dest="codec", default="br")("Compression codec: br or zstd")
     psr = context.build_parser("decompress")
     psr.add_str("input_file")("File to decompress")
     psr.add_str("-o", "--output", dest="output_file")("Output destination for decompress")
+    psr = context.build_parser("compress-dir")
+    psr.add_str("root_dir")("Folder containing the assets to precompress")
+    psr.add_int("-l", "--level", dest="compression_level")("Compression level (default: 11 for br, 19 for zstd)")
+    psr.add_str("-c", "--codecs", dest="codecs", default="br")("Comma separated list of codecs: br,zstd")
+    psr.add_str("-e", "--exts", dest="extensions")("Comma separated list of file extensions to compress")
+    psr.add_int("-j", "--jobs", dest="num_jobs")("Number of worker processes")
+    psr = context.build_parser("bench")
+    psr.add_str("input_files", nargs="+")("Files to compress")
+    psr.add_int("-l", "--level", dest="compression_level")("Compression level (default: 11 for br, 19 for zstd)")
+    psr.add_str("-c", "--codecs", dest="codecs", default="br,zstd")("Comma separated list of codecs: br,zstd")
 
     comp.run()
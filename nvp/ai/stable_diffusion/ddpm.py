@@ -593,6 +593,7 @@ class UNet(DDPM):
                 conditioning,
                 unconditional_conditioning=unconditional_conditioning,
                 unconditional_guidance_scale=unconditional_guidance_scale,
+                callback=callback,
             )
         elif sampler == "euler_a":
             self.make_schedule(ddim_num_steps=S, ddim_eta=eta, verbose=False)
@@ -603,6 +604,7 @@ class UNet(DDPM):
                 conditioning,
                 unconditional_conditioning=unconditional_conditioning,
                 unconditional_guidance_scale=unconditional_guidance_scale,
+                callback=callback,
             )
 
         elif sampler == "dpm2":
@@ -613,6 +615,7 @@ class UNet(DDPM):
                 conditioning,
                 unconditional_conditioning=unconditional_conditioning,
                 unconditional_guidance_scale=unconditional_guidance_scale,
+                callback=callback,
             )
         elif sampler == "heun":
             samples = self.heun_sampling(
@@ -622,6 +625,7 @@ class UNet(DDPM):
                 conditioning,
                 unconditional_conditioning=unconditional_conditioning,
                 unconditional_guidance_scale=unconditional_guidance_scale,
+                callback=callback,
             )
 
         elif sampler == "dpm2_a":
@@ -632,6 +636,7 @@ class UNet(DDPM):
                 conditioning,
                 unconditional_conditioning=unconditional_conditioning,
                 unconditional_guidance_scale=unconditional_guidance_scale,
+                callback=callback,
             )
 
         elif sampler == "lms":
@@ -642,6 +647,7 @@ class UNet(DDPM):
                 conditioning,
                 unconditional_conditioning=unconditional_conditioning,
                 unconditional_guidance_scale=unconditional_guidance_scale,
+                callback=callback,
             )
 
         if self.turbo:
@@ -957,11 +963,11 @@ class UNet(DDPM):
         sigmas = cvd.get_sigmas(S)
         x = x * sigmas[0]
 
-        s_in = x.new_ones([x.shape[0]]).half()
+        s_in = x.new_ones([x.shape[0]])
         for i in trange(len(sigmas) - 1, disable=disable):
             gamma = min(s_churn / (len(sigmas) - 1), 2**0.5 - 1) if s_tmin <= sigmas[i] <= s_tmax else 0.0
             eps = torch.randn_like(x) * s_noise
-            sigma_hat = (sigmas[i] * (gamma + 1)).half()
+            sigma_hat = (sigmas[i] * (gamma + 1)).to(x.dtype)
             if gamma > 0:
                 x = x + eps * (sigma_hat**2 - sigmas[i] ** 2) ** 0.5
 
@@ -1002,7 +1008,7 @@ class UNet(DDPM):
         sigmas = cvd.get_sigmas(S)
         x = x * sigmas[0]
 
-        s_in = x.new_ones([x.shape[0]]).half()
+        s_in = x.new_ones([x.shape[0]])
         for i in trange(len(sigmas) - 1, disable=disable):
 
             s_i = sigmas[i] * s_in
@@ -1048,11 +1054,11 @@ class UNet(DDPM):
         sigmas = cvd.get_sigmas(S)
         x = x * sigmas[0]
 
-        s_in = x.new_ones([x.shape[0]]).half()
+        s_in = x.new_ones([x.shape[0]])
         for i in trange(len(sigmas) - 1, disable=disable):
             gamma = min(s_churn / (len(sigmas) - 1), 2**0.5 - 1) if s_tmin <= sigmas[i] <= s_tmax else 0.0
             eps = torch.randn_like(x) * s_noise
-            sigma_hat = (sigmas[i] * (gamma + 1)).half()
+            sigma_hat = (sigmas[i] * (gamma + 1)).to(x.dtype)
             if gamma > 0:
                 x = x + eps * (sigma_hat**2 - sigmas[i] ** 2) ** 0.5
 
@@ -1113,7 +1119,7 @@ class UNet(DDPM):
         sigmas = cvd.get_sigmas(S)
         x = x * sigmas[0]
 
-        s_in = x.new_ones([x.shape[0]]).half()
+        s_in = x.new_ones([x.shape[0]])
         for i in trange(len(sigmas) - 1, disable=disable):
             gamma = min(s_churn / (len(sigmas) - 1), 2**0.5 - 1) if s_tmin <= sigmas[i] <= s_tmax else 0.0
             eps = torch.randn_like(x) * s_noise
@@ -1170,7 +1176,7 @@ class UNet(DDPM):
         sigmas = cvd.get_sigmas(S)
         x = x * sigmas[0]
 
-        s_in = x.new_ones([x.shape[0]]).half()
+        s_in = x.new_ones([x.shape[0]])
         for i in trange(len(sigmas) - 1, disable=disable):
 
             s_i = sigmas[i] * s_in
@@ -0,0 +1,145 @@
+"""Client and connection loop for the resident StableDiffusion model server.
+
+This module doesn't depend on torch, so that it can be used from
+light processes like the SDLab application."""
+
+import logging
+import os
+import secrets
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from nvp.nvp_object import NVPObject
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 6789
+
+# File storing the random authentication key shared by the server and its clients:
+DEFAULT_AUTHKEY_FILE = os.path.join(os.path.expanduser("~"), ".nvp", "sd_server.key")
+
+# Request parameters containing paths, resolved on the client side:
+PATH_PARAMS = ["output_dir", "init_image", "ckpt_file"]
+
+
+def read_authkey(key_file=DEFAULT_AUTHKEY_FILE):
+    """Read the server authentication key, or return None if the key file doesn't exist"""
+    if not os.path.isfile(key_file):
+        return None
+    with open(key_file, "r", encoding="utf-8") as file:
+        return file.read().strip()
+
+
+def get_or_create_authkey(key_file=DEFAULT_AUTHKEY_FILE):
+    """Retrieve the server authentication key, generating a new random key on first use.
+    The key file is only readable by the current user, since the server unpickles the
+    requests received from any authenticated client."""
+    authkey = read_authkey(key_file)
+    if authkey is None:
+        os.makedirs(os.path.dirname(key_file), exist_ok=True)
+        authkey = secrets.token_hex(32)
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(authkey)
+        logger.info("Generated StableDiffusion server key file %s", key_file)
+
+    # Ensure the key file is not readable by other users:
+    os.chmod(key_file, 0o600)
+    return authkey
+
+
+def serve_requests(address, authkey, handle_request):
+    """Accept the connections on the given address until a handler requests to stop.
+    handle_request(req) should return a (response, stop) tuple. A failed connection
+    (invalid key, client disconnected) is logged and doesn't stop the loop."""
+    with Listener(address, authkey=authkey.encode("utf-8")) as listener:
+        running = True
+        while running:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, EOFError, OSError) as err:
+                logger.warning("Rejected StableDiffusion server connection: %s", err)
+                continue
+
+            try:
+                resp, stop = handle_request(conn.recv())
+                conn.send(resp)
+                running = not stop
+            except (EOFError, OSError) as err:
+                logger.warning("StableDiffusion server connection failed: %s", err)
+            finally:
+                conn.close()
+
+
+class SDClient(NVPObject):
+    """Helper class used to send requests to the StableDiffusion model server.
+    The authentication key is read from the server key file when not provided."""
+
+    def __init__(self, port=DEFAULT_PORT, authkey=None, host="localhost", key_file=DEFAULT_AUTHKEY_FILE):
+        """Constructor"""
+        self.address = (host, port)
+        self.authkey = authkey
+        self.key_file = key_file
+
+    def get_authkey(self):
+        """Retrieve the authentication key as bytes"""
+        authkey = self.authkey or read_authkey(self.key_file)
+        if authkey is None:
+            self.throw("StableDiffusion server key file %s not found (is the server started?)", self.key_file)
+        return authkey.encode("utf-8")
+
+    def send_request(self, cmd, params=None):
+        """Send a request to the server and wait for the response"""
+        start_time = time.time()
+        with Client(self.address, authkey=self.get_authkey()) as conn:
+            conn.send({"cmd": cmd, "params": params or {}})
+            resp = conn.recv()
+
+        resp["roundtrip_time"] = time.time() - start_time
+        if resp.get("status") != "ok":
+            self.throw("StableDiffusion server request '%s' failed: %s", cmd, resp.get("error", "unknown error"))
+
+        return resp
+
+    def is_available(self):
+        """Check if the server is running"""
+        if self.authkey is None and read_authkey(self.key_file) is None:
+            return False
+
+        try:
+            self.send_request("ping")
+            return True
+        except (ConnectionRefusedError, OSError):
+            return False
+
+    def prepare_params(self, params):
+        """Prepare the request parameters: the paths are made absolute against our own cwd
+        since the server may run in another folder, and the unset parameters are dropped
+        so that the server uses its defaults for them."""
+        params = {key: val for key, val in params.items() if val is not None}
+        params.setdefault("output_dir", self.get_cwd())
+        for key in PATH_PARAMS:
+            if key in params:
+                params[key] = os.path.abspath(params[key])
+        return params
+
+    def text_to_image(self, prompt, **params):
+        """Request the generation of images from a prompt.
+        Returns the server response with the list of generated files and the timings."""
+        params["prompt"] = prompt
+        resp = self.send_request("txt2img", self.prepare_params(params))
+
+        logger.info(
+            "Generated %d images (load: %.2f secs, generation: %.2f secs, roundtrip: %.2f secs, %.2f images/min)",
+            len(resp["files"]),
+            resp["load_time"],
+            resp["gen_time"],
+            resp["roundtrip_time"],
+            resp.get("throughput", 0.0),
+        )
+        return resp
+
+    def stop_server(self):
+        """Request the server to stop"""
+        return self.send_request("stop")
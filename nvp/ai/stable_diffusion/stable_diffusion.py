@@ -3,11 +3,13 @@
 import logging
 import os
 import time
+from collections import OrderedDict
 from contextlib import nullcontext
 from random import randint
 
 import numpy as np
 import torch
+import xxhash
 from einops import rearrange, repeat
 from omegaconf import OmegaConf
 from optimUtils import split_weighted_subprompts
@@ -22,12 +24,50 @@ from transformers import logging as tlog
 tlog.set_verbosity_error()
 # tlog.set_verbosity_warning()
 
+try:
+    from safetensors.torch import load_file, save_file
+except ModuleNotFoundError:
+    load_file = save_file = None
+
 from nvp.ai.stable_diffusion.ldm.util import instantiate_from_config
+from nvp.ai.stable_diffusion.sd_client import DEFAULT_PORT, SDClient, get_or_create_authkey, serve_requests
 from nvp.nvp_component import NVPComponent
 from nvp.nvp_context import NVPContext
 
 logger = logging.getLogger(__name__)
 
+# Parameters used for a text to image generation:
+TXT2IMG_PARAMS = [
+    "seed",
+    "unet_bs",
+    "ckpt_file",
+    "device",
+    "precision",
+    "output_dir",
+    "prompt",
+    "init_image",
+    "seed_mode",
+    "turbo",
+    "fixed_code",
+    "n_iter",
+    "height",
+    "width",
+    "latent_channels",
+    "down_factor",
+    "n_samples",
+    "n_rows",
+    "ddim_steps",
+    "scale",
+    "strength",
+    "ddim_eta",
+    "sampler",
+    "format",
+    "batch_seeds",
+    "max_batch_size",
+    "sample_mem",
+    "cond_cache_size",
+]
+
 
 class StableDiffusion(NVPComponent):
     """StableDiffusion component class"""
@@ -37,15 +77,40 @@ class StableDiffusion(NVPComponent):
         NVPComponent.__init__(self, ctx)
         self.device = None
 
+        # Resident models, keyed by checkpoint file, device and half precision flag:
+        self.models = {}
+
+        # LRU cache of conditioning tensors, keyed by model hash, device, half precision flag and prompt:
+        self.cond_cache = OrderedDict()
+        self.cond_cache_size = 32
+        self.cond_hits = 0
+        self.cond_misses = 0
+
+        # LRU cache of the VAE encoded init images, with the same size as the conditioning cache:
+        self.latent_cache = OrderedDict()
+
         # self.config = ctx.get_config()["stable_diffusion"]
 
     def process_cmd_path(self, cmd):
         """Re-implementation of process_cmd_path"""
 
         if cmd == "txt2img":
+            if self.get_param("use_server"):
+                client = SDClient(self.get_param("port"), self.get_param("authkey"))
+                params = {key: self.get_param(key) for key in TXT2IMG_PARAMS}
+                client.text_to_image(params.pop("prompt"), **params)
+                return True
+
             device = self.get_param("device")
             return self.handle_text_to_image(device)
 
+        if cmd == "serve":
+            return self.run_server(self.get_param("port"), self.get_param("authkey"))
+
+        if cmd == "stop-server":
+            SDClient(self.get_param("port"), self.get_param("authkey")).stop_server()
+            return True
+
         return False
 
     def gpu_release(self, tensor):
@@ -74,6 +139,207 @@ class StableDiffusion(NVPComponent):
         sdict = pl_sd["state_dict"]
         return sdict
 
+    def split_state_dict(self, sdict):
+        """Split the UNet weights of a state dict between model1 and model2"""
+        li, lo = [], []
+        for key, _ in sdict.items():
+            sp = key.split(".")
+            if (sp[0]) == "model":
+                if "input_blocks" in sp:
+                    li.append(key)
+                elif "middle_block" in sp:
+                    li.append(key)
+                elif "time_embed" in sp:
+                    li.append(key)
+                else:
+                    lo.append(key)
+        for key in li:
+            sdict["model1." + key[6:]] = sdict.pop(key)
+        for key in lo:
+            sdict["model2." + key[6:]] = sdict.pop(key)
+
+        return sdict
+
+    def load_state_dict(self, ckpt_file):
+        """Load the split state dict for a given checkpoint.
+
+        When safetensors is available, the split weights are converted once to a
+        .split.safetensors file next to the checkpoint, which is then memory mapped
+        on the next loads instead of unpickling the full checkpoint."""
+        cache_file = self.set_path_extension(ckpt_file, ".split.safetensors")
+        if load_file is not None and self.file_exists(cache_file):
+            if os.path.getmtime(cache_file) >= os.path.getmtime(ckpt_file):
+                logger.info("Loading cached weights from %s", cache_file)
+                return load_file(cache_file, device="cpu")
+
+        sdict = self.split_state_dict(self.load_model_from_config(ckpt_file))
+
+        if save_file is not None:
+            logger.info("Writing weights cache file %s", cache_file)
+            save_file({key: val.contiguous() for key, val in sdict.items() if torch.is_tensor(val)}, cache_file)
+
+        return sdict
+
+    def get_models(self, ckpt_file, device, use_half):
+        """Retrieve the UNet, CondStage and FirstStage models for a given checkpoint,
+        building them only once."""
+        key = (ckpt_file, device, use_half)
+        if key in self.models:
+            return self.models[key]
+
+        logger.info("Using checkpoint file: %s", ckpt_file)
+        sdict = self.load_state_dict(ckpt_file)
+
+        logger.info("Building config...")
+        config_file = self.get_path(self.ctx.get_root_dir(), "assets", "stable_diffusion", "v1-inference.yaml")
+
+        config = OmegaConf.load(config_file)
+
+        logger.info("Instanciating models...")
+
+        model = instantiate_from_config(config.modelUNet)
+        _, _ = model.load_state_dict(sdict, strict=False)
+        model.eval()
+
+        model_cs = instantiate_from_config(config.modelCondStage)
+        _, _ = model_cs.load_state_dict(sdict, strict=False)
+        model_cs.eval()
+        model_cs.cond_stage_model.device = device
+
+        model_fs = instantiate_from_config(config.modelFirstStage)
+        _, _ = model_fs.load_state_dict(sdict, strict=False)
+        model_fs.eval()
+
+        del sdict
+
+        if use_half:
+            model.half()
+            model_cs.half()
+            model_fs.half()
+
+        self.models[key] = (model, model_cs, model_fs)
+        return self.models[key]
+
+    def get_model_hash(self, ckpt_file):
+        """Compute an identity hash for a checkpoint from its path, size and mtime"""
+        stt = os.stat(ckpt_file)
+        return xxhash.xxh64_hexdigest(f"{ckpt_file}:{stt.st_size}:{stt.st_mtime_ns}".encode("utf-8"))
+
+    def get_conditioning(self, model_cs, model_hash, use_half, prompt, batch_size):
+        """Retrieve the conditioning tensor for a given prompt, expanded to the batch size.
+
+        The conditioning is computed only once per prompt and kept in an LRU cache, so the
+        CondStage model is not used again when only the seed or the step count change."""
+        key = (model_hash, self.device, use_half, prompt)
+        cond = self.cond_cache.get(key, None)
+
+        if cond is not None:
+            self.cond_cache.move_to_end(key)
+            self.cond_hits += 1
+        else:
+            self.cond_misses += 1
+
+            # Send the model on the device:
+            model_cs_dev = self.to_device(model_cs)
+
+            subprompts, weights = split_weighted_subprompts(prompt)
+            if len(subprompts) > 1:
+                total_weight = sum(weights)
+                # normalize each "sub prompt" and add it
+                for idx, subp in enumerate(subprompts):
+                    weight = weights[idx] / total_weight
+                    sub_cond = model_cs_dev.get_learned_conditioning(subp) * weight
+                    cond = sub_cond if cond is None else cond + sub_cond
+            else:
+                cond = model_cs_dev.get_learned_conditioning([prompt])
+
+            self.gpu_release(model_cs_dev)
+
+            self.cond_cache[key] = cond
+            while len(self.cond_cache) > self.cond_cache_size:
+                self.cond_cache.popitem(last=False)
+
+        logger.debug("Conditioning cache: %d hits, %d misses", self.cond_hits, self.cond_misses)
+        return cond.expand(batch_size, *cond.shape[1:])
+
+    def get_init_latent(self, model_fs_dev, model_hash, use_half, img_file, height, width):
+        """Retrieve the VAE encoding of an init image, kept in an LRU cache so that the image
+        is not encoded again when only the seed, the strength or the prompt change."""
+        stt = os.stat(img_file)
+        key = (model_hash, self.device, use_half, img_file, stt.st_size, stt.st_mtime_ns, height, width)
+        init_latent = self.latent_cache.get(key, None)
+        if init_latent is not None:
+            self.latent_cache.move_to_end(key)
+            logger.info("Reusing cached init image latent for %s", img_file)
+            return init_latent
+
+        # load the init image:
+        logger.info("Using init image: %s", img_file)
+        init_image = self.to_device(self.load_img(img_file, height, width))
+
+        # Note: the resident first stage model may already be on the target device,
+        # and it can only run in half precision there, since on the cpu "slow_conv2d_cpu"
+        # doesn't support half format:
+        if use_half:
+            init_image = init_image.half()
+
+        # move to latent space:
+        init_latent = model_fs_dev.get_first_stage_encoding(model_fs_dev.encode_first_stage(init_image))
+        self.check(
+            init_latent.device != "cpu" or self.device == "cpu", "Invalid init latent device: %s", init_latent.device
+        )
+
+        self.latent_cache[key] = init_latent
+        while len(self.latent_cache) > self.cond_cache_size:
+            self.latent_cache.popitem(last=False)
+
+        return init_latent
+
+    def decode_samples(self, model_fs_dev, samples):
+        """Decode a batch of latents with the VAE, yielding the images as uint8 arrays.
+        The latents are decoded one by one to limit the memory usage on the device."""
+        for i in range(samples.shape[0]):
+            x_sample = model_fs_dev.decode_first_stage(samples[i].unsqueeze(0))
+            x_sample = torch.clamp((x_sample + 1.0) / 2.0, min=0.0, max=1.0)
+            x_sample = 255.0 * rearrange(x_sample[0].cpu().numpy(), "c h w -> h w c")
+            yield x_sample.astype(np.uint8)
+
+    def get_seed_batch_size(self, num_images, latent_shape, device, params):
+        """Compute how many latents can be sampled in a single tensor batch,
+        given the available memory on the target device"""
+        max_batch = params.get("max_batch_size") or num_images
+
+        # Estimated memory needed per sample, scaled from the 512x512 reference size:
+        sample_bytes = params.get("sample_mem", 1024) * 1024 * 1024
+        sample_bytes *= (latent_shape[1] * latent_shape[2]) / (64 * 64)
+
+        if device != "cpu" and torch.cuda.is_available():
+            free_bytes, _ = torch.cuda.mem_get_info(device)
+        elif hasattr(os, "sysconf"):
+            free_bytes = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        else:
+            free_bytes = sample_bytes * max_batch
+
+        return max(1, min(num_images, max_batch, int(free_bytes // sample_bytes)))
+
+    def log_step_times(self, start_time, step_times, num_steps, batch_size):
+        """Report the per-step latency and the throughput of a sampling pass"""
+        elapsed = time.time() - start_time
+        if len(step_times) > 1:
+            deltas = [t1 - t0 for t0, t1 in zip(step_times[:-1], step_times[1:])]
+            step_latency = sum(deltas) / len(deltas)
+        else:
+            # This sampler doesn't report its steps:
+            step_latency = elapsed / max(num_steps, 1)
+
+        logger.info(
+            "Sampled %d latents in %.2f secs (%.3f secs/step, %.2f images/min)",
+            batch_size,
+            elapsed,
+            step_latency,
+            batch_size * 60.0 / elapsed if elapsed > 0.0 else 0.0,
+        )
+
     def load_img(self, path, h0, w0):
         """Load an image from the system and prepare a torch tensor from it"""
 
@@ -96,9 +362,57 @@ class StableDiffusion(NVPComponent):
 
     def handle_text_to_image(self, device):
         """Handle stable diffusion text to image."""
-        # logger.info("Should handle text to image here.")
+        params = {key: self.get_param(key) for key in TXT2IMG_PARAMS}
+        params["device"] = device
+        self.text_to_image(params)
+        return True
+
+    def run_server(self, port, authkey):
+        """Run a long-lived model server, keeping the models loaded between the
+        generation requests received on a local socket.
+        Without explicit authkey, a random key is generated and stored in the user key file."""
+        if authkey is None:
+            authkey = get_or_create_authkey()
+
+        address = ("localhost", port)
+        logger.info("StableDiffusion server listening on %s:%d", *address)
+        serve_requests(address, authkey, self.handle_server_request)
+
+        logger.info("StableDiffusion server stopped.")
+        return True
+
+    def handle_server_request(self, req):
+        """Process a request received by the model server, returns the (response, stop) tuple"""
+        cmd = req.get("cmd")
+
+        if cmd == "stop":
+            return {"status": "ok"}, True
+
+        if cmd == "ping":
+            return {"status": "ok", "models": len(self.models)}, False
+
+        if cmd != "txt2img":
+            return {"status": "error", "error": f"Unknown command {cmd}"}, False
+
+        # Use our own settings as defaults for the request parameters:
+        params = {key: self.get_param(key) for key in TXT2IMG_PARAMS}
+        params.update(req.get("params", {}))
+        try:
+            resp = self.text_to_image(params)
+            resp["status"] = "ok"
+        except Exception as err:  # pylint: disable=broad-except
+            logger.exception("Error while processing txt2img request")
+            resp = {"status": "error", "error": str(err)}
+
+        return resp, False
+
+    def text_to_image(self, params):
+        """Generate images from the given parameters, and return a dict with the generated
+        files and the model loading (cold start) and generation times."""
+        device = params["device"]
         self.device = device
-        seed = self.get_param("seed")
+        self.cond_cache_size = params.get("cond_cache_size", self.cond_cache_size)
+        seed = params["seed"]
 
         tic = time.time()
 
@@ -108,89 +422,46 @@ class StableDiffusion(NVPComponent):
         logger.info("Seeding everything with global seed: %d", seed)
         seed_everything(seed)
 
-        ckpt_file = self.get_param("ckpt_file")
+        ckpt_file = params["ckpt_file"]
         if ckpt_file is None:
             ckpt_file = self.get_path(self.ctx.get_root_dir(), "data", "stable_diffusion", "sd-v1-5.ckpt")
 
-        logger.info("Using checkpoint file: %s", ckpt_file)
-
-        sdict = self.load_model_from_config(ckpt_file)
-
-        li, lo = [], []
-        for key, _ in sdict.items():
-            sp = key.split(".")
-            if (sp[0]) == "model":
-                if "input_blocks" in sp:
-                    li.append(key)
-                elif "middle_block" in sp:
-                    li.append(key)
-                elif "time_embed" in sp:
-                    li.append(key)
-                else:
-                    lo.append(key)
-        for key in li:
-            sdict["model1." + key[6:]] = sdict.pop(key)
-        for key in lo:
-            sdict["model2." + key[6:]] = sdict.pop(key)
-
-        logger.info("Building config...")
-        config_file = self.get_path(self.ctx.get_root_dir(), "assets", "stable_diffusion", "v1-inference.yaml")
-
-        config = OmegaConf.load(config_file)
+        img_height = params["height"]
+        img_width = params["width"]
+        precision = params["precision"]
 
-        img_height = self.get_param("height")
-        img_width = self.get_param("width")
-        precision = self.get_param("precision")
-
-        img_file = self.get_param("init_image")
-        init_image = None
+        img_file = params["init_image"]
         init_latent = None
-        if img_file is not None:
-            # load the init image:
-            logger.info("Using init image: %s", img_file)
-            # we keep the init image on the cpu:
-            init_image = self.load_img(img_file, img_height, img_width)
 
-        logger.info("Instanciating models...")
+        use_half = device != "cpu" and precision == "autocast"
 
-        model = instantiate_from_config(config.modelUNet)
-        _, _ = model.load_state_dict(sdict, strict=False)
-        model.eval()
-        model.unet_bs = self.get_param("unet_bs")
+        load_start = time.time()
+        model, model_cs, model_fs = self.get_models(ckpt_file, device, use_half)
+        load_time = time.time() - load_start
 
+        model.unet_bs = params["unet_bs"]
         model.cdevice = device
-        model.turbo = self.get_param("turbo")
-
-        model_cs = instantiate_from_config(config.modelCondStage)
-        _, _ = model_cs.load_state_dict(sdict, strict=False)
-        model_cs.eval()
-        model_cs.cond_stage_model.device = device
-
-        model_fs = instantiate_from_config(config.modelFirstStage)
-        _, _ = model_fs.load_state_dict(sdict, strict=False)
-        model_fs.eval()
-
-        del sdict
+        model.turbo = params["turbo"]
 
         start_code = None
-        n_samples = self.get_param("n_samples")
-        latent_channels = self.get_param("latent_channels")
-        down_factor = self.get_param("down_factor")
-        n_rows = self.get_param("n_rows")
-        n_iter = self.get_param("n_iter")
-        scale = self.get_param("scale")
-        ddim_steps = self.get_param("ddim_steps")
-        ddim_eta = self.get_param("ddim_eta")
-        sampler = self.get_param("sampler")
-        img_format = self.get_param("format")
-        smode = self.get_param("seed_mode")
-        strength = self.get_param("strength")
+        n_samples = params["n_samples"]
+        latent_channels = params["latent_channels"]
+        down_factor = params["down_factor"]
+        n_rows = params["n_rows"]
+        n_iter = params["n_iter"]
+        scale = params["scale"]
+        ddim_steps = params["ddim_steps"]
+        ddim_eta = params["ddim_eta"]
+        sampler = params["sampler"]
+        img_format = params["format"]
+        smode = params["seed_mode"]
+        strength = params["strength"]
         self.check(0 <= strength <= 1.0, "Invalid strength value.")
 
         # Prepare the t_enc variable:
         t_enc = int(strength * ddim_steps)
 
-        output_dir = self.get_param("output_dir")
+        output_dir = params["output_dir"]
         if output_dir is None:
             output_dir = self.get_cwd()
 
@@ -203,83 +474,67 @@ class StableDiffusion(NVPComponent):
 
         logger.debug("Using output folder: %s", output_dir)
 
+        num_images = n_iter * n_samples
         batch_size = n_samples
-        n_rows = n_rows if n_rows > 0 else batch_size
+        if params.get("batch_seeds", False) and img_file is None:
+            # Generate as many seeds as possible in a single tensor batch:
+            latent_shape = [latent_channels, img_height // down_factor, img_width // down_factor]
+            batch_size = self.get_seed_batch_size(num_images, latent_shape, device, params)
+            n_iter = (num_images + batch_size - 1) // batch_size
+            logger.info("Generating %d images in %d batch(es) of %d seeds", num_images, n_iter, batch_size)
 
-        if init_image is not None:
-            init_image = repeat(init_image, "1 ... -> b ...", b=batch_size)
+        n_rows = n_rows if n_rows > 0 else batch_size
 
-            # Note: this is on the cpu side:
-            init_latent = model_fs.get_first_stage_encoding(
-                model_fs.encode_first_stage(init_image)
-            )  # move to latent space
+        model_hash = self.get_model_hash(ckpt_file)
 
-            # Move to target device:
-            init_latent = self.to_device(init_latent)
+        # The first stage (VAE) model is sent once on the device for the whole request:
+        model_fs_dev = self.to_device(model_fs)
 
-        if device != "cpu" and precision == "autocast":
-            # Note: we only convert to half *after* preparing the init_latent array,
-            # since on the cpu "slow_conv2d_cpu" doesn't support half format.
-            model.half()
-            model_cs.half()
-            model_fs.half()
-            if init_latent is not None:
-                init_latent = init_latent.half()
-                self.check(init_latent.device != "cpu", "Invalid init latent device: %s", init_latent.device)
+        if img_file is not None:
+            init_latent = self.get_init_latent(model_fs_dev, model_hash, use_half, img_file, img_height, img_width)
+            init_latent = repeat(init_latent, "1 ... -> b ...", b=batch_size)
 
-        if self.get_param("fixed_code"):
+        if params["fixed_code"]:
             start_code = torch.randn(
-                [n_samples, latent_channels, img_height // down_factor, img_width // down_factor], device=device
+                [batch_size, latent_channels, img_height // down_factor, img_width // down_factor], device=device
             )
 
-        prompt = self.get_param("prompt", None)
+        prompt = params.get("prompt", None)
         self.check(prompt is not None, "Invalid prompt.")
 
         logger.debug("Using prompt: %s", prompt)
-        prompts = batch_size * [prompt]
 
-        if precision == "autocast" and device != "cpu":
+        if use_half:
             precision_scope = autocast
         else:
             precision_scope = nullcontext
 
         seeds = ""
+        files = []
+        step_times = []
         sample_path = output_dir
         base_count = len(os.listdir(sample_path))
         if smode == "continue":
             seed += base_count
 
+        def step_callback(_data):
+            """Record the time of each sampling step"""
+            step_times.append(time.time())
+
         with torch.no_grad():
 
-            for _ in trange(n_iter, desc="Sampling"):
+            for it in trange(n_iter, desc="Sampling"):
+                cur_batch = min(batch_size, num_images - it * batch_size)
                 with precision_scope("cuda"):
 
-                    # Send the model on the device:
-                    model_cs_dev = self.to_device(model_cs)
-
+                    # Retrieve the conditioning tensors, only computed once per prompt:
                     uc = None
                     if scale != 1.0:
-                        uc = model_cs_dev.get_learned_conditioning(batch_size * [""])
-
-                    if isinstance(prompts, tuple):
-                        prompts = list(prompts)
-
-                    subprompts, weights = split_weighted_subprompts(prompts[0])
-                    if len(subprompts) > 1:
-                        c = torch.zeros_like(uc)
-                        total_weight = sum(weights)
-                        # normalize each "sub prompt" and add it
-                        for idx, subp in enumerate(subprompts):
-                            weight = weights[idx]
-                            # if not skip_normalize:
-                            weight = weight / total_weight
-                            c = torch.add(c, model_cs_dev.get_learned_conditioning(subp), alpha=weight)
-                    else:
-                        c = model_cs_dev.get_learned_conditioning(prompts)
+                        uc = self.get_conditioning(model_cs, model_hash, use_half, "", cur_batch)
 
-                    shape = [n_samples, latent_channels, img_height // down_factor, img_width // down_factor]
+                    c = self.get_conditioning(model_cs, model_hash, use_half, prompt, cur_batch)
 
-                    self.gpu_release(model_cs_dev)
+                    shape = [cur_batch, latent_channels, img_height // down_factor, img_width // down_factor]
 
                     # Starting point of the image in latent space:
                     # if none is specified then random noise will be used:
@@ -290,18 +545,19 @@ class StableDiffusion(NVPComponent):
                         # A source image was provided,
                         # So we encode the corresponding latents:
                         # encode (scaled latent)
-                        self.check(init_latent.device != "cpu", "Invalid init latent device: %s", init_latent.device)
                         # logger.info("init_latent shape: %s", init_latent.shape)
 
                         x0 = model.stochastic_encode(
-                            init_latent,
-                            torch.tensor([t_enc] * batch_size).to(device),
+                            init_latent[:cur_batch],
+                            torch.tensor([t_enc] * cur_batch).to(device),
                             seed,
                             ddim_eta,
                             ddim_steps,
                         )
                         num_steps = t_enc
 
+                    sample_start = time.time()
+                    step_times.clear()
                     samples_ddim = model.sample(
                         S=num_steps,
                         conditioning=c,
@@ -309,34 +565,30 @@ class StableDiffusion(NVPComponent):
                         seed=seed,
                         shape=shape,
                         verbose=False,
+                        callback=step_callback,
                         unconditional_guidance_scale=scale,
                         unconditional_conditioning=uc,
                         eta=ddim_eta,
-                        x_T=start_code,
+                        x_T=start_code[:cur_batch] if start_code is not None else None,
                         sampler=sampler,
                     )
-
-                    model_fs_dev = self.to_device(model_fs)
+                    self.log_step_times(sample_start, step_times, num_steps, cur_batch)
 
                     logger.info("Saving images (shape: %s)...", samples_ddim.shape)
 
-                    for i in range(batch_size):
-
-                        x_samples_ddim = model_fs_dev.decode_first_stage(samples_ddim[i].unsqueeze(0))
-                        x_sample = torch.clamp((x_samples_ddim + 1.0) / 2.0, min=0.0, max=1.0)
-                        x_sample = 255.0 * rearrange(x_sample[0].cpu().numpy(), "c h w -> h w c")
-                        Image.fromarray(x_sample.astype(np.uint8)).save(
-                            os.path.join(sample_path, f"{base_count:05}_seed_{seed}.{img_format}")
-                        )
+                    for img in self.decode_samples(model_fs_dev, samples_ddim):
+                        filename = os.path.join(sample_path, f"{base_count:05}_seed_{seed}.{img_format}")
+                        Image.fromarray(img).save(filename)
+                        files.append(filename)
                         seeds += str(seed) + ","
                         seed += 1
                         base_count += 1
 
-                    self.gpu_release(model_fs_dev)
-
                     del samples_ddim
-                    logger.info("memory_final = %s MiB", torch.cuda.memory_allocated() / 1e6)
+                    if device != "cpu":
+                        logger.info("memory_final = %s MiB", torch.cuda.memory_allocated() / 1e6)
 
+        self.gpu_release(model_fs_dev)
         toc = time.time()
 
         time_taken = (toc - tic) / 60.0
@@ -347,8 +599,13 @@ class StableDiffusion(NVPComponent):
             sample_path,
             str(seeds[:-1]),
         )
+        logger.info("Model loading: %.2f secs (%s start)", load_time, "cold" if load_time > 0.01 else "warm")
 
-        return True
+        gen_time = toc - tic - load_time
+        throughput = len(files) * 60.0 / gen_time if gen_time > 0.0 else 0.0
+        logger.info("Throughput: %.2f images/min", throughput)
+
+        return {"files": files, "load_time": load_time, "gen_time": gen_time, "throughput": throughput}
 
 
 if __name__ == "__main__":
@@ -358,52 +615,83 @@ if __name__ == "__main__":
     # Add our component:
     comp = context.register_component("StableDiffusion", StableDiffusion(context))
 
+    def add_server_args(psr):
+        """Add the arguments used to reach the model server"""
+        psr.add_int("--port", dest="port", default=DEFAULT_PORT)("Port of the model server")
+        psr.add_str("--authkey", dest="authkey", default=None)(
+            "Authentication key for the model server (default: random key stored in ~/.nvp/sd_server.key)"
+        )
+
+    def add_txt2img_args(psr):
+        """Add the arguments used for a text to image generation"""
+        psr.add_int("--seed", dest="seed", default=42)("Random seed for the whole process.")
+        psr.add_int("--unet_bs", dest="unet_bs", default=1)(
+            "Slightly reduces inference time at the expense of high VRAM (value > 1 not recommended )"
+        )
+        psr.add_str("--ckpt", dest="ckpt_file", default=None)("checkpoint file to use.")
+        psr.add_str("--device", dest="device", default="cuda")("specify GPU (cuda/cuda:0/cuda:1/...) or cpu")
+        psr.add_str("--precision", dest="precision", default="autocast", choices=["full", "autocast"])(
+            "evaluate at this precision, can be full or autocast"
+        )
+        psr.add_str("-o", "--output", dest="output_dir", default=None)("Output folder")
+        psr.add_str("--prompt", dest="prompt")("The prompt to render")
+        psr.add_str("-i", "--img", dest="init_image")("Init image to use for inference")
+        psr.add_str("--smode", dest="seed_mode", default="continue")(
+            "Define how the seed number should be changed depending on the existing content in dest folder."
+        )
+        psr.add_flag("--turbo", dest="turbo")("Reduces inference time on the expense of 1GB VRAM")
+        psr.add_flag("--fixed_code", dest="fixed_code")("if enabled, uses the same starting code across samples")
+        psr.add_int("--n_iter", dest="n_iter", default=1)("Sample this often")
+        psr.add_int("-H", "--height", dest="height", default=512)("Image height, in pixel space")
+        psr.add_int("-W", "--width", dest="width", default=512)("Image width, in pixel space")
+        psr.add_int("-C", "--channels", dest="latent_channels", default=4)("Latent channels")
+        psr.add_int("-f", "--down-factor", dest="down_factor", default=8)("Downsampling factor")
+        psr.add_int("-n", "--samples", dest="n_samples", default=5)(
+            "How many samples to produce for each given prompt. A.k.a. batch size"
+        )
+        psr.add_int("--n_rows", dest="n_rows", default=0)("rows in the grid (default: n_samples)")
+        psr.add_int("--ddim_steps", dest="ddim_steps", default=50)("number of ddim sampling steps")
+        psr.add_float("--scale", dest="scale", default=7.5)(
+            "unconditional guidance scale: eps = eps(x, empty) + scale * (eps(x, cond) - eps(x, empty))"
+        )
+        psr.add_float("--strength", dest="strength", default=0.5)(
+            "Strength for noising/unnoising. 1.0 corresponds to full destruction of information in init image"
+        )
+        psr.add_float("--ddim_eta", dest="ddim_eta", default=0.0)(
+            "ddim eta (eta=0.0 corresponds to deterministic sampling"
+        )
+        psr.add_str(
+            "--sampler",
+            dest="sampler",
+            default="plms",
+            choices=["ddim", "plms", "heun", "euler", "euler_a", "dpm2", "dpm2_a", "lms"],
+        )("Sampler to use.")
+        psr.add_str(
+            "--format",
+            dest="format",
+            default="png",
+            choices=["jpg", "png"],
+        )("Output format to write")
+        psr.add_flag("--batch_seeds", dest="batch_seeds")(
+            "Sample all the n_iter * n_samples seeds in as few tensor batches as the available memory allows"
+        )
+        psr.add_int("--max_batch_size", dest="max_batch_size", default=0)("Max number of seeds per batch (0: no limit)")
+        psr.add_int("--sample_mem", dest="sample_mem", default=1024)(
+            "Estimated memory needed per 512x512 sample in MB, used to size the seed batches"
+        )
+        psr.add_int("--cond_cache_size", dest="cond_cache_size", default=32)("Number of cached prompt conditionings")
+
     psr = context.build_parser("txt2img")
-    psr.add_int("--seed", dest="seed", default=42)("Random seed for the whole process.")
-    psr.add_int("--unet_bs", dest="unet_bs", default=1)(
-        "Slightly reduces inference time at the expense of high VRAM (value > 1 not recommended )"
-    )
-    psr.add_str("--ckpt", dest="ckpt_file", default=None)("checkpoint file to use.")
-    psr.add_str("--device", dest="device", default="cuda")("specify GPU (cuda/cuda:0/cuda:1/...)")
-    psr.add_str("--precision", dest="precision", default="autocast", choices=["full", "autocast"])(
-        "evaluate at this precision, can be full or autocast"
-    )
-    psr.add_str("-o", "--output", dest="output_dir", default=None)("Output folder")
-    psr.add_str("--prompt", dest="prompt")("The prompt to render")
-    psr.add_str("-i", "--img", dest="init_image")("Init image to use for inference")
-    psr.add_str("--smode", dest="seed_mode", default="continue")(
-        "Define how the seed number should be changed depending on the existing content in dest folder."
-    )
-    psr.add_flag("--turbo", dest="turbo")("Reduces inference time on the expense of 1GB VRAM")
-    psr.add_flag("--fixed_code", dest="fixed_code")("if enabled, uses the same starting code across samples")
-    psr.add_int("--n_iter", dest="n_iter", default=1)("Sample this often")
-    psr.add_int("-H", "--height", dest="height", default=512)("Image height, in pixel space")
-    psr.add_int("-W", "--width", dest="width", default=512)("Image width, in pixel space")
-    psr.add_int("-C", "--channels", dest="latent_channels", default=4)("Latent channels")
-    psr.add_int("-f", "--down-factor", dest="down_factor", default=8)("Downsampling factor")
-    psr.add_int("-n", "--samples", dest="n_samples", default=5)(
-        "How many samples to produce for each given prompt. A.k.a. batch size"
-    )
-    psr.add_int("--n_rows", dest="n_rows", default=0)("rows in the grid (default: n_samples)")
-    psr.add_int("--ddim_steps", dest="ddim_steps", default=50)("number of ddim sampling steps")
-    psr.add_float("--scale", dest="scale", default=7.5)(
-        "unconditional guidance scale: eps = eps(x, empty) + scale * (eps(x, cond) - eps(x, empty))"
-    )
-    psr.add_float("--strength", dest="strength", default=0.5)(
-        "Strength for noising/unnoising. 1.0 corresponds to full destruction of information in init image"
-    )
-    psr.add_float("--ddim_eta", dest="ddim_eta", default=0.0)("ddim eta (eta=0.0 corresponds to deterministic sampling")
-    psr.add_str(
-        "--sampler",
-        dest="sampler",
-        default="plms",
-        choices=["ddim", "plms", "heun", "euler", "euler_a", "dpm2", "dpm2_a", "lms"],
-    )("Sampler to use.")
-    psr.add_str(
-        "--format",
-        dest="format",
-        default="png",
-        choices=["jpg", "png"],
-    )("Output format to write")
+    add_txt2img_args(psr)
+    add_server_args(psr)
+    psr.add_flag("--server", dest="use_server")("Send the request to a running model server")
+
+    # The server uses the txt2img arguments as defaults for the requests:
+    psr = context.build_parser("serve")
+    add_txt2img_args(psr)
+    add_server_args(psr)
+
+    psr = context.build_parser("stop-server")
+    add_server_args(psr)
 
     comp.run()
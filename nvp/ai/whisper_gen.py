@@ -8,6 +8,8 @@ This version avoids pyannote.audio dependency issues by using alternative VAD.""
 import logging
 import os
 import time
+from queue import Queue
+from threading import Thread
 
 import torch
 import whisperx
@@ -27,6 +29,9 @@ class WhisperGen(NVPComponent):
         NVPComponent.__init__(self, ctx)
 
         self.config = ctx.get_config()["movie_handler"]
+        self.asr_models = {}
+        self.align_models = {}
+        self.stage_times = {}
 
     def process_cmd_path(self, cmd):
         """Re-implementation of process_cmd_path"""
@@ -48,22 +53,181 @@ class WhisperGen(NVPComponent):
 
         return False
 
+    def get_device_settings(self):
+        """Retrieve the device and compute type to use for the models"""
+        device = self.get_param("device")
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+
+        compute_type = self.get_param("compute_type")
+        if compute_type is None:
+            compute_type = "float16" if device == "cuda" else "int8"
+
+        return device, compute_type
+
+    def add_stage_time(self, stage, elapsed):
+        """Accumulate the time spent in a given processing stage"""
+        self.stage_times[stage] = self.stage_times.get(stage, 0.0) + elapsed
+        logger.debug("Stage '%s' done in %.3f secs", stage, elapsed)
+
+    def log_stage_times(self):
+        """Report the time spent in each processing stage"""
+        total = sum(self.stage_times.values())
+        for stage, elapsed in self.stage_times.items():
+            pct = (elapsed / total * 100.0) if total > 0.0 else 0.0
+            logger.info("  %-12s: %8.2f secs (%.1f%%)", stage, elapsed, pct)
+
+    def get_asr_model(self, model_size, language):
+        """Retrieve the ASR model for a given language, loading it only once"""
+        key = (model_size, language)
+        if key in self.asr_models:
+            return self.asr_models[key]
+
+        device, compute_type = self.get_device_settings()
+        logger.info("Loading WhisperX model '%s' on device '%s' (%s)...", model_size, device, compute_type)
+
+        start_time = time.time()
+        # Load model with vad_onset/vad_offset to avoid pyannote dependency
+        model = whisperx.load_model(
+            model_size,
+            device,
+            compute_type=compute_type,
+            language=language,  # None for auto-detection, or specify language code
+            vad_options={"vad_onset": 0.500, "vad_offset": 0.363},
+        )
+        self.add_stage_time("load_model", time.time() - start_time)
+
+        self.asr_models[key] = model
+        return model
+
+    def get_align_model(self, language):
+        """Retrieve the alignment model and metadata for a given language, loading them only once"""
+        if language in self.align_models:
+            return self.align_models[language]
+
+        device, _ = self.get_device_settings()
+        start_time = time.time()
+        model_a, metadata = whisperx.load_align_model(language_code=language, device=device)
+        self.add_stage_time("load_align", time.time() - start_time)
+
+        self.align_models[language] = (model_a, metadata)
+        return model_a, metadata
+
+    def release_models(self):
+        """Release all the resident models"""
+        device, _ = self.get_device_settings()
+        self.asr_models = {}
+        self.align_models = {}
+        if device == "cuda":
+            torch.cuda.empty_cache()
+
+    def get_manifest_file(self, folder):
+        """Retrieve the transcription manifest file for a given folder"""
+        return self.get_path(folder, ".whisper_manifest.json")
+
+    def is_transcript_up_to_date(self, manifest, folder, fname, model_size):
+        """Check if the transcript of a given file is up to date, updating the
+        manifest entry if the file was only touched"""
+        full_path = self.get_path(folder, fname)
+        if not self.file_exists(full_path + ".txt"):
+            return False
+
+        stt = os.stat(full_path)
+        entry = manifest.get(fname, None)
+        if entry is None:
+            # Transcript written before the manifest was introduced: adopt it.
+            manifest[fname] = {
+                "size": stt.st_size,
+                "mtime_ns": stt.st_mtime_ns,
+                "hash": self.compute_file_hash(full_path),
+                "model": model_size,
+            }
+            return True
+
+        if entry.get("model") != model_size:
+            return False
+
+        if entry["size"] == stt.st_size and entry["mtime_ns"] == stt.st_mtime_ns:
+            return True
+
+        # Only hash the file when the stat data changed:
+        if entry["size"] != stt.st_size or entry["hash"] != self.compute_file_hash(full_path):
+            return False
+
+        entry["mtime_ns"] = stt.st_mtime_ns
+        return True
+
     def process_all_files(self, model, nwords):
-        """Process all the video files not already processed in the current folder"""
+        """Process all the video files not already processed in the current folder.
+
+        The ASR and alignment models are loaded once and stay resident, while a
+        loader thread decodes the next audio files into a bounded queue."""
         cur_dir = self.get_cwd()
         all_files = self.get_all_files(cur_dir, recursive=False)
         exts = [".mkv", ".mp3", ".mp4"]
-        for fname in all_files:
+
+        manifest_file = self.get_manifest_file(cur_dir)
+        manifest = self.read_json(manifest_file) if self.file_exists(manifest_file) else {}
+
+        files = []
+        for fname in sorted(all_files):
             ext = self.get_path_extension(fname).lower()
             if ext not in exts:
                 continue
 
-            # Check if we already have the text file:
-            if self.file_exists(self.get_path(cur_dir, fname + ".txt")):
+            # Check if we already have an up to date transcript:
+            if self.is_transcript_up_to_date(manifest, cur_dir, fname, model):
                 continue
 
-            # Otherwise we process this file:
-            self.convert_audio_to_text_whisperx(fname, model)
+            files.append(fname)
+
+        if len(files) == 0:
+            logger.info("All transcripts are up to date.")
+            self.write_json(manifest, manifest_file)
+            return True
+
+        logger.info("Transcribing %d files...", len(files))
+        start_time = time.time()
+        work_queue = Queue(maxsize=2)
+
+        def loader():
+            """Decode the audio files in the background"""
+            for fname in files:
+                tic = time.time()
+                try:
+                    audio = whisperx.load_audio(self.get_path(cur_dir, fname))
+                except Exception as err:  # pylint: disable=broad-except
+                    logger.error("Cannot load audio from %s: %s", fname, str(err))
+                    audio = None
+                work_queue.put((fname, audio, time.time() - tic))
+            work_queue.put(None)
+
+        Thread(target=loader, daemon=True).start()
+
+        for fname, audio, load_time in iter(work_queue.get, None):
+            self.add_stage_time("load_audio", load_time)
+            if audio is None:
+                continue
+
+            full_path = self.get_path(cur_dir, fname)
+            self.transcribe_audio(full_path, audio, model)
+
+            # Update the manifest incrementally:
+            stt = os.stat(full_path)
+            tic = time.time()
+            manifest[fname] = {
+                "size": stt.st_size,
+                "mtime_ns": stt.st_mtime_ns,
+                "hash": self.compute_file_hash(full_path),
+                "model": model,
+            }
+            self.write_json(manifest, manifest_file)
+            self.add_stage_time("hash", time.time() - tic)
+
+        self.release_models()
+
+        logger.info("Transcribed %d files in %.2f secs:", len(files), time.time() - start_time)
+        self.log_stage_times()
 
         return True
 
@@ -73,28 +237,33 @@ class WhisperGen(NVPComponent):
 
         start_time = time.time()
 
-        # Detect device
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        compute_type = "float16" if device == "cuda" else "int8"
-
-        logger.info("Loading WhisperX model '%s' on device '%s'...", model_size, device)
-
-        # Load model with vad_onset/vad_offset to avoid pyannote dependency
-        model = whisperx.load_model(
-            model_size,
-            device,
-            compute_type=compute_type,
-            language="en",  # Set to None for auto-detection, or specify language code
-            vad_options={"vad_onset": 0.500, "vad_offset": 0.363},
-        )
-
         # Load audio
         logger.info("Loading audio file: %s", file)
         audio = whisperx.load_audio(file)
+        self.add_stage_time("load_audio", time.time() - start_time)
+
+        self.transcribe_audio(file, audio, model_size)
+        self.release_models()
+
+        logger.info("Done converting audio to text in %.2f secs:", time.time() - start_time)
+        self.log_stage_times()
+
+        return True
+
+    def transcribe_audio(self, file, audio, model_size):
+        """Transcribe already loaded audio data using the resident models,
+        and write the text and word list outputs for the given file."""
+        device, _ = self.get_device_settings()
+        language = self.get_param("language")
+        if language == "auto":
+            language = None
+        model = self.get_asr_model(model_size, language)
 
         # Transcribe with WhisperX
-        logger.info("Transcribing...")
-        result = model.transcribe(audio, batch_size=16)  # Adjust based on your GPU memory
+        logger.info("Transcribing %s...", file)
+        tic = time.time()
+        result = model.transcribe(audio, batch_size=self.get_param("batch_size", 16))
+        self.add_stage_time("transcribe", time.time() - tic)
 
         detected_language = result.get("language", "en")
         logger.info("Detected language: %s", detected_language)
@@ -102,26 +271,24 @@ class WhisperGen(NVPComponent):
         # Align whisper output for better word-level timestamps
         try:
             logger.info("Aligning timestamps...")
-            model_a, metadata = whisperx.load_align_model(language_code=detected_language, device=device)
+            model_a, metadata = self.get_align_model(detected_language)
 
+            tic = time.time()
             result = whisperx.align(result["segments"], model_a, metadata, audio, device, return_char_alignments=False)
-
-            # Clean up alignment model
-            del model_a
+            self.add_stage_time("align", time.time() - tic)
 
         except Exception as e:
             logger.warning("Alignment failed (will use base timestamps): %s", str(e))
             # Continue with unaligned results
 
+        tic = time.time()
+
         # Extract full text
         segments = result["segments"]
         txt = " ".join([segment["text"].strip() for segment in segments])
 
-        elapsed = time.time() - start_time
-
         # Write text file
         self.write_text_file(txt, file + ".txt")
-        logger.info("Done converting audio to text in %.2f secs", elapsed)
         logger.info("Generated output: %s", txt[:200] + "..." if len(txt) > 200 else txt)
 
         # Process word-level timestamps
@@ -179,13 +346,7 @@ class WhisperGen(NVPComponent):
         out_file = self.set_path_extension(file, ".json")
         self.write_json(word_list, out_file)
         logger.info("Wrote %d words with timestamps to: %s", len(word_list), out_file)
-
-        # Clean up
-        del model
-        if device == "cuda":
-            torch.cuda.empty_cache()
-
-        return True
+        self.add_stage_time("write", time.time() - tic)
 
     def split_text_chunks(self, filename, num_words):
         """Split a given text file into multiple chunk files"""
@@ -238,6 +399,10 @@ if __name__ == "__main__":
     psr.add_str("-i", "--input", dest="input_file", default="all")("Audio file to convert to text")
     psr.add_str("-m", "--model", dest="model", default="large-v3")("Model to use for the convertion")
     psr.add_int("-n", "--nwords", dest="num_words", default=3000)("Number of words to write per chunk.")
+    psr.add_str("-l", "--language", dest="language", default="en")("Language code, or 'auto' for auto-detection")
+    psr.add_str("-d", "--device", dest="device")("Device to use (cuda or cpu), auto-detected by default")
+    psr.add_str("-c", "--compute-type", dest="compute_type")("Compute type (float16, float32, int8)")
+    psr.add_int("-b", "--batch-size", dest="batch_size", default=16)("Transcription batch size")
 
     psr = context.build_parser("split_text")
     psr.add_str("-i", "--input", dest="input_file")("Text file to split")
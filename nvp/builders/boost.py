@@ -41,6 +41,7 @@ class BoostBuilder(NVPBuilder):
             py_path = self.tools.get_tool_path("python").replace("\\", "/")
             py_vers = self.tools.get_tool_desc("python")["version"].split(".")
 
+            self.break_hard_link(self.get_path(build_dir, "user-config.jam"))
             with open(self.get_path(build_dir, "user-config.jam"), "w", encoding="utf-8") as file:
                 # Add the entry for python:
                 file.write(f"using python : {py_vers[0]}.{py_vers[1]} : {py_path} ;\n")
@@ -118,6 +119,7 @@ class BoostBuilder(NVPBuilder):
         ver_major = self.compiler.get_major_version()
         ver_minor = self.compiler.get_minor_version()
 
+        self.break_hard_link(self.get_path(build_dir, "user-config.jam"))
         with open(self.get_path(build_dir, "user-config.jam"), "w", encoding="utf-8") as file:
             # Note: Should not add the -std=c++11 flag below as this will lead to an error with C files:
             file.write(f"using clang : {ver_major}.{ver_minor} : {comp_path} : ")
@@ -17,6 +17,84 @@ def create_component(ctx: NVPContext):
     return EmailHandler(ctx)
 
 
+class SmtpSender:
+    """SMTP sender keeping its connection open between messages"""
+
+    def __init__(self, smtp_server, username=None, password=None, use_tls=True):
+        """Constructor"""
+        self.smtp_server = smtp_server
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.server = None
+        self.num_connections = 0
+
+    def connect(self):
+        """Open the connection to the SMTP server"""
+        server = smtplib.SMTP(self.smtp_server, timeout=30.0)
+        server.ehlo()
+        if self.use_tls:
+            server.starttls()
+        if self.username is not None:
+            server.login(self.username, self.password)
+        self.server = server
+        self.num_connections += 1
+
+    def close(self):
+        """Close the connection to the SMTP server if any"""
+        if self.server is None:
+            return
+
+        try:
+            self.server.quit()
+        except smtplib.SMTPException:
+            pass
+        self.server = None
+
+    def build_message(self, title, message, to_addrs, from_addr):
+        """Build an html email message"""
+        msg = MIMEMultipart("alternative")
+
+        msg["Subject"] = Header(title, "utf-8")
+        msg["From"] = from_addr
+        msg["To"] = to_addrs
+        msg["Message-id"] = email.utils.make_msgid()
+        msg["Date"] = email.utils.formatdate(localtime=True)
+
+        msg.attach(MIMEText(message.encode("utf-8"), "html", "utf-8"))
+        return msg
+
+    def send(self, title, message, to_addrs, from_addr):
+        """Send a message, reconnecting once if the previous connection was closed by the server.
+        Returns True on success."""
+        msg = self.build_message(title, message, to_addrs, from_addr)
+
+        for _ in range(2):
+            try:
+                if self.server is None:
+                    self.connect()
+                self.server.send_message(msg)
+                return True
+            except smtplib.SMTPServerDisconnected as err:
+                logger.warning("SMTP server disconnected: %s", err)
+                self.server = None
+            except smtplib.SMTPHeloError as err:
+                logger.error("No helo greeting: %s", err)
+                break
+            except smtplib.SMTPAuthenticationError as err:
+                logger.error("SMTP authentification error: %s", err)
+                break
+            except smtplib.SMTPNotSupportedError as err:
+                logger.error("SMTP auth not supported: %s", err)
+                break
+            except (smtplib.SMTPException, OSError) as err:
+                logger.error("SMTP exception occured: %s", err)
+                break
+
+        self.close()
+        return False
+
+
 class EmailHandler(NVPComponent):
     """EmailHandler component used to send automatic messages ono rocketchat server"""
 
@@ -26,6 +104,7 @@ class EmailHandler(NVPComponent):
 
         # Get the config for this component:
         self.config = ctx.get_config().get("email", None)
+        self.sender = None
 
     def process_command(self, cmd):
         """Check if this component can process the given command"""
@@ -38,61 +117,51 @@ class EmailHandler(NVPComponent):
             from_addr = self.get_param("from_addr", None)
 
             self.send_message(title, msg, to_addrs, from_addr)
+            self.close_connection()
             return True
 
         return False
 
-    def send_message(self, title, message, to_addrs=None, from_addr=None, username=None, password=None):
-        """Method used to send an email with a given SMTP server"""
-        logger.debug("Should send the email message %s", message)
-
+    def get_sender(self, username=None, password=None):
+        """Retrieve the SMTP sender for the given credentials, or None if not configured"""
         if self.config is None:
-            logger.error("No configuration provided for email_handler: cannot send email:\n%s", message)
-            return
-
-        # assert self.config is not None, "No configuration provided for rocketchat."
+            return None
 
-        if to_addrs is None:
-            to_addrs = self.config["default_to_addrs"]
-        if from_addr is None:
-            from_addr = self.config["default_from_addr"]
         if username is None:
             username = self.config["default_username"]
         if password is None:
             password = self.config["default_password"]
 
-        smtp_server = self.config["smtp_server"]
+        if self.sender is None or self.sender.username != username or self.sender.password != password:
+            self.close_connection()
+            self.sender = SmtpSender(
+                self.config["smtp_server"], username, password, use_tls=self.config.get("use_tls", True)
+            )
 
-        # Build the message:
-        msg = MIMEMultipart("alternative")
+        return self.sender
 
-        msg["Subject"] = Header(title, "utf-8")
-        msg["From"] = from_addr
-        msg["To"] = to_addrs
-        msg["Message-id"] = email.utils.make_msgid()
-        msg["Date"] = email.utils.formatdate(localtime=True)
-        # logger.info("Using date: %s", msg['Date'])
+    def close_connection(self):
+        """Close the current SMTP connection if any"""
+        if self.sender is not None:
+            self.sender.close()
 
-        msg.attach(MIMEText(message.encode("utf-8"), "html", "utf-8"))
-        try:
-            server = smtplib.SMTP(smtp_server)
-            # server = smtplib.SMTP_SSL('smtp.gmail.com')
-            server.ehlo()
-            server.starttls()
-            server.login(username, password)
-            # msg = MIMEText(msg.encode('utf-8'), 'html','utf-8')
-            # server.sendmail(fromAddr, [toAddr], str(msg))
-
-            server.send_message(msg)
-            server.quit()
-        except smtplib.SMTPHeloError as err:
-            logger.error("No helo greeting: %s", err)
-        except smtplib.SMTPAuthenticationError as err:
-            logger.error("SMTP authentification error: %s", err)
-        except smtplib.SMTPNotSupportedError as err:
-            logger.error("SMTP auth not supported: %s", err)
-        except smtplib.SMTPException as err:
-            logger.error("SMTP exception occured: %s", err)
+    def send_message(self, title, message, to_addrs=None, from_addr=None, username=None, password=None):
+        """Method used to send an email with a given SMTP server.
+        Note: this call is blocking, use the notifier component to send an email asynchronously.
+        The SMTP connection is kept open until close_connection() is called."""
+        logger.debug("Should send the email message %s", message)
+
+        sender = self.get_sender(username, password)
+        if sender is None:
+            logger.error("No configuration provided for email_handler: cannot send email:\n%s", message)
+            return False
+
+        if to_addrs is None:
+            to_addrs = self.config["default_to_addrs"]
+        if from_addr is None:
+            from_addr = self.config["default_from_addr"]
+
+        return sender.send(title, message, to_addrs, from_addr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,316 @@
+"""Asynchronous notification dispatcher for rocketchat and email messages"""
+
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from nvp.nvp_component import NVPComponent
+from nvp.nvp_context import NVPContext
+from nvp.nvp_object import NVPObject
+
+logger = logging.getLogger(__name__)
+
+
+def create_component(ctx: NVPContext):
+    """Create an instance of the component"""
+    return Notifier(ctx)
+
+
+class NotificationSpool(NVPObject):
+    """Durable SQLite queue of pending notifications.
+    Identical pending notifications are coalesced into a single entry with a repeat count,
+    and the entries are leased before sending, so multiple processes can share the same spool."""
+
+    def __init__(self, db_file, lease_time=120.0):
+        """Constructor"""
+        self.db_file = db_file
+        self.lease_time = lease_time
+        self.make_folder(self.get_parent_folder(db_file))
+
+        with self.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS notifications ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, key TEXT, payload TEXT, "
+                "count INTEGER, created REAL, attempts INTEGER, next_try REAL, lease REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS notifications_next_try ON notifications (next_try)")
+
+    @contextmanager
+    def connect(self):
+        """Open a connection to the spool database"""
+        conn = sqlite3.connect(self.db_file, timeout=30.0, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def push(self, kind, key, payload):
+        """Add a notification to the spool"""
+        data = json.dumps(payload, sort_keys=True)
+        now = time.time()
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute(
+                "UPDATE notifications SET count = count + 1 "
+                "WHERE kind = ? AND key = ? AND payload = ? AND attempts = 0 AND lease = 0",
+                (kind, key, data),
+            )
+            if cur.rowcount == 0:
+                conn.execute(
+                    "INSERT INTO notifications (kind, key, payload, count, created, attempts, next_try, lease) "
+                    "VALUES (?, ?, ?, 1, ?, 0, ?, 0)",
+                    (kind, key, data, now, now),
+                )
+            conn.execute("COMMIT")
+
+    def acquire(self, max_entries=100):
+        """Lease the due entries, returning a list of (id, kind, key, payload, count, attempts)"""
+        now = time.time()
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, kind, key, payload, count, attempts FROM notifications "
+                "WHERE next_try <= ? AND lease < ? ORDER BY id LIMIT ?",
+                (now, now, max_entries),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE notifications SET lease = ? WHERE id = ?", [(now + self.lease_time, row[0]) for row in rows]
+            )
+            conn.execute("COMMIT")
+
+        return [(row[0], row[1], row[2], json.loads(row[3]), row[4], row[5]) for row in rows]
+
+    def remove(self, ids):
+        """Remove delivered entries"""
+        with self.connect() as conn:
+            conn.executemany("DELETE FROM notifications WHERE id = ?", [(eid,) for eid in ids])
+
+    def release(self, ids, delay):
+        """Release entries that could not be delivered, to retry them after the given delay"""
+        with self.connect() as conn:
+            conn.executemany(
+                "UPDATE notifications SET lease = 0, attempts = attempts + 1, next_try = ? WHERE id = ?",
+                [(time.time() + delay, eid) for eid in ids],
+            )
+
+    def get_num_pending(self):
+        """Retrieve the number of pending notifications"""
+        with self.connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM notifications").fetchone()[0]
+
+
+class NotificationDispatcher(NVPObject):
+    """Background sender delivering the spooled notifications in batches.
+    senders is a dict of kind -> function(key, payloads) returning True on success,
+    where payloads is a list of (payload, repeat count) tuples sharing the same key."""
+
+    def __init__(self, spool, senders, on_idle=None, batch_delay=1.0, max_attempts=10, retry_delay=30.0):
+        """Constructor"""
+        self.spool = spool
+        self.senders = senders
+        self.on_idle = on_idle
+        self.batch_delay = batch_delay
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.thread = None
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Start the background sender thread if needed"""
+        with self.lock:
+            if self.thread is None:
+                self.stopping = False
+                self.thread = threading.Thread(target=self.run, name="nvp_notifier", daemon=True)
+                self.thread.start()
+
+    def notify(self, kind, key, payload):
+        """Spool a notification and return immediately"""
+        self.spool.push(kind, key, payload)
+        self.start()
+        self.wakeup.set()
+
+    def run(self):
+        """Main loop of the sender thread"""
+        while True:
+            # Wait a bit to collect more notifications in the same batch:
+            self.wakeup.wait(self.retry_delay)
+            self.wakeup.clear()
+            if not self.stopping:
+                time.sleep(self.batch_delay)
+
+            try:
+                num_sent = self.process_pending()
+            except Exception as err:  # pylint: disable=broad-except
+                logger.error("Error while sending notifications: %s", err)
+                num_sent = 0
+
+            if (num_sent == 0 or self.stopping) and self.on_idle is not None:
+                self.on_idle()
+
+            if self.stopping:
+                return
+
+    def process_pending(self):
+        """Send all the due notifications, returning the number of delivered entries"""
+        total = 0
+        while True:
+            entries = self.spool.acquire()
+            if len(entries) == 0:
+                return total
+
+            # Group the entries per (kind, key), preserving the order:
+            groups = {}
+            for entry in entries:
+                groups.setdefault((entry[1], entry[2]), []).append(entry)
+
+            for (kind, key), group in groups.items():
+                ids = [entry[0] for entry in group]
+                sender = self.senders.get(kind, None)
+                if sender is None:
+                    logger.error("No sender available for %s notifications, discarding them.", kind)
+                    self.spool.remove(ids)
+                    continue
+
+                try:
+                    success = sender(key, [(entry[3], entry[4]) for entry in group])
+                except Exception as err:  # pylint: disable=broad-except
+                    logger.error("Exception while sending %s notifications: %s", kind, err)
+                    success = False
+
+                if success:
+                    self.spool.remove(ids)
+                    total += len(ids)
+                    continue
+
+                expired = [entry[0] for entry in group if entry[5] + 1 >= self.max_attempts]
+                if len(expired) > 0:
+                    logger.error(
+                        "Discarding %d %s notifications after %d attempts", len(expired), kind, self.max_attempts
+                    )
+                    self.spool.remove(expired)
+                delay = self.retry_delay * (2 ** min(group[0][5], 6))
+                self.spool.release([eid for eid in ids if eid not in expired], delay)
+
+            if self.stopping:
+                return total
+
+    def flush(self, timeout=10.0):
+        """Stop the sender thread after trying to deliver the pending notifications"""
+        with self.lock:
+            thread = self.thread
+            self.thread = None
+
+        if thread is None:
+            return
+
+        self.stopping = True
+        self.wakeup.set()
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning("Notifications still pending: they will be sent later.")
+
+
+class Notifier(NVPComponent):
+    """Notifier component used to send rocketchat messages and emails without blocking the caller"""
+
+    def __init__(self, ctx: NVPContext):
+        """Component constructor"""
+        NVPComponent.__init__(self, ctx)
+
+        desc = self.config.get("notifier", {})
+        db_file = desc.get("spool_file", self.get_path(ctx.get_root_dir(), "build", "notifications.db"))
+        self.spool = NotificationSpool(db_file)
+        senders = {"rchat": self.deliver_rocketchat, "email": self.deliver_email}
+        self.dispatcher = NotificationDispatcher(
+            self.spool,
+            senders,
+            on_idle=self.close_connections,
+            batch_delay=desc.get("batch_delay", 1.0),
+            max_attempts=desc.get("max_attempts", 10),
+            retry_delay=desc.get("retry_delay", 30.0),
+        )
+        self.flush_timeout = desc.get("flush_timeout", 10.0)
+        self.registered = False
+
+    def process_cmd_path(self, cmd):
+        """Check if this component can process the given command"""
+
+        if cmd == "flush":
+            self.dispatcher.process_pending()
+            self.close_connections()
+            self.info("%d notifications still pending.", self.spool.get_num_pending())
+            return True
+
+        return False
+
+    def notify(self, kind, key, payload):
+        """Spool a notification for the background sender"""
+        if not self.registered:
+            # Give the sender a chance to deliver the notifications before exiting:
+            atexit.register(self.dispatcher.flush, self.flush_timeout)
+            self.registered = True
+
+        self.dispatcher.notify(kind, key, payload)
+
+    def send_rocketchat(self, message, channel=None):
+        """Send a rocketchat message asynchronously"""
+        if channel is None:
+            channel = self.get_component("rchat").get_default_channel()
+        self.notify("rchat", channel or "", {"message": message})
+
+    def send_email(self, title, message, to_addrs=None, from_addr=None):
+        """Send an email asynchronously"""
+        key = json.dumps([to_addrs, from_addr])
+        self.notify("email", key, {"title": title, "message": message})
+
+    def format_message(self, message, count, sep):
+        """Add the repeat count to a coalesced message"""
+        return message if count == 1 else f"{message}{sep}(repeated {count} times)"
+
+    def deliver_rocketchat(self, channel, payloads):
+        """Send a batch of rocketchat messages on a given channel"""
+        client = self.get_component("rchat").get_client()
+        if client is None:
+            logger.error("No configuration provided for rocketchat: discarding %d messages", len(payloads))
+            return True
+
+        msg = "\n\n".join(self.format_message(payload["message"], count, "\n") for payload, count in payloads)
+        return client.send_message(msg, channel or self.get_component("rchat").get_default_channel(), max_retries=2)
+
+    def deliver_email(self, key, payloads):
+        """Send a batch of emails to the same destination as a single email"""
+        email = self.get_component("email")
+        if email.get_sender() is None:
+            logger.error("No configuration provided for email_handler: discarding %d emails", len(payloads))
+            return True
+
+        to_addrs, from_addr = json.loads(key)
+        title = payloads[0][0]["title"]
+        if len(payloads) > 1:
+            title += f" (+{len(payloads) - 1} more)"
+
+        msg = "<hr/>".join(self.format_message(payload["message"], count, "<br/>") for payload, count in payloads)
+        return email.send_message(title, msg, to_addrs, from_addr)
+
+    def close_connections(self):
+        """Close the persistent SMTP connection when there is nothing left to send"""
+        self.get_component("email").close_connection()
+
+
+if __name__ == "__main__":
+    # Create the context:
+    context = NVPContext()
+
+    # Add our component:
+    comp = context.get_component("notifier")
+
+    context.build_parser("flush")
+
+    comp.run()
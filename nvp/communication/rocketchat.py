@@ -2,10 +2,8 @@
 
 import json
 import logging
-import time
-
-import requests
 
+from nvp.core.http_client import get_http_client
 from nvp.nvp_component import NVPComponent
 from nvp.nvp_context import NVPContext
 
@@ -17,65 +15,16 @@ def create_component(ctx: NVPContext):
     return RocketChat(ctx)
 
 
-class RocketChat(NVPComponent):
-    """RocketChat component used to send automatic messages ono rocketchat server"""
-
-    def __init__(self, ctx: NVPContext):
-        """Script runner constructor"""
-        NVPComponent.__init__(self, ctx)
-
-        # Get the config for this component:
-        self.config = ctx.get_config().get("rocketchat", None)
-
-        self.user_id = None
-        self.token = None
-        self.base_url = None
-
-    def process_command(self, cmd):
-        """Check if this component can process the given command"""
-
-        if cmd == "send":
-            msg = self.get_param("message")
-            channel = self.get_param("channel")
-            self.send_message(msg, channel=channel)
-            return True
+class RocketChatClient:
+    """Minimal rocketchat REST client caching the room ids.
+    The requests go through the shared http client, so the connections are kept alive."""
 
-        return False
-
-    def send_message(self, message, channel=None, max_retries=5):
-        """Method used to send a message on the configured rocketchat server."""
-        # logger.info("Should send the rocketchat message: '%s'", message)
-
-        if self.config is None:
-            logger.error("No configuration provided for rocketchat: cannot send message:\n%s", message)
-            return False
-
-        # assert self.config is not None, "No configuration provided for rocketchat."
-
-        self.user_id = self.config["user_id"]
-        self.token = self.config["token"]
-        self.base_url = self.config["base_url"]
-
-        if channel is None:
-            channel = self.config["default_channel"]
-
-        infos = self.get_channel_infos(channel, max_retries=max_retries)
-        if infos is None:
-            infos = self.get_group_infos(channel, max_retries=max_retries)
-
-        if infos is None:
-            logger.error("Cannot find channel with name '%s'", channel)
-            return False
-
-        msg = {"rid": infos["_id"], "msg": message}
-
-        res = self.post("/api/v1/chat.sendMessage", {"message": msg}, max_retries=max_retries)
-
-        if res is None or "success" not in res or res["success"] is False:
-            logger.error("Cannot send rocketchat message: %s", res)
-            return False
-
-        return True
+    def __init__(self, base_url, user_id, token):
+        """Constructor"""
+        self.base_url = base_url
+        self.user_id = user_id
+        self.token = token
+        self.room_ids = {}
 
     def send_request(self, req_type, url, data, max_retries=5, auth=True):
         """Send a REST request to the rocketchat server"""
@@ -87,30 +36,25 @@ class RocketChat(NVPComponent):
             headers["X-Auth-Token"] = self.token
             headers["X-User-Id"] = self.user_id
 
-        try_count = 0
-        while max_retries <= 0 or try_count < max_retries:
-            try:
-                if req_type == "GET":
-                    response = requests.request(
-                        req_type, self.base_url + url, params=data, headers=headers, timeout=4.0
-                    )
-                else:
-                    payload = json.dumps(data)
-                    response = requests.request(
-                        req_type, self.base_url + url, data=payload, headers=headers, timeout=4.0
-                    )
-                res = json.loads(response.text)
-                return res
-            except requests.exceptions.RequestException as err:
-                logger.error("Request exception detected: %s", str(err))
-
-            # wait 1 seconds:
-            time.sleep(2)
-
-            # Increment the try count:
-            try_count += 1
+        http = get_http_client()
+        if req_type == "GET":
+            response = http.request(
+                req_type, self.base_url + url, max_retries=max_retries, params=data, headers=headers, timeout=4.0
+            )
+        else:
+            payload = json.dumps(data)
+            response = http.request(
+                req_type, self.base_url + url, max_retries=max_retries, data=payload, headers=headers, timeout=4.0
+            )
+
+        if response is None:
+            return None
 
-        return None
+        try:
+            return json.loads(response.text)
+        except json.JSONDecodeError:
+            logger.error("Invalid rocketchat response: %s", response.text)
+            return None
 
     def get(self, url, data, max_retries=5, auth=True):
         """Send a get request to the server"""
@@ -125,14 +69,7 @@ class RocketChat(NVPComponent):
         res = self.get("/api/v1/channels.info", {"roomName": chname}, max_retries=max_retries)
 
         # Res might be none in case of network failure:
-        if res is None:
-            return None
-
-        # logDEBUG("Result: %s" % res)
-        # CHECK(res['success']==True, "Cannot retrieve channel infos: %s" % res)
-        # return res['channel']
-        # Res might be none:
-        if "success" in res and res["success"]:
+        if res is not None and "success" in res and res["success"]:
             return res["channel"]
         return None
 
@@ -141,16 +78,92 @@ class RocketChat(NVPComponent):
         res = self.get("/api/v1/groups.info", {"roomName": chname}, max_retries=max_retries)
 
         # Res might be none in case of network failure:
-        if res is None:
-            return None
-
-        # logDEBUG("Result: %s" % res)
-        # CHECK(res['success']==True, "Cannot retrieve group infos: %s" % res)
-        # return res['group']
-        if "success" in res and res["success"]:
+        if res is not None and "success" in res and res["success"]:
             return res["group"]
         return None
 
+    def get_room_id(self, channel, max_retries=5):
+        """Retrieve the room id for a channel or private group"""
+        if channel not in self.room_ids:
+            infos = self.get_channel_infos(channel, max_retries=max_retries)
+            if infos is None:
+                infos = self.get_group_infos(channel, max_retries=max_retries)
+
+            if infos is None:
+                logger.error("Cannot find channel with name '%s'", channel)
+                return None
+
+            self.room_ids[channel] = infos["_id"]
+
+        return self.room_ids[channel]
+
+    def send_message(self, message, channel, max_retries=5):
+        """Send a message on a given channel"""
+        rid = self.get_room_id(channel, max_retries=max_retries)
+        if rid is None:
+            return False
+
+        msg = {"rid": rid, "msg": message}
+
+        res = self.post("/api/v1/chat.sendMessage", {"message": msg}, max_retries=max_retries)
+
+        if res is None or "success" not in res or res["success"] is False:
+            logger.error("Cannot send rocketchat message: %s", res)
+            return False
+
+        return True
+
+
+class RocketChat(NVPComponent):
+    """RocketChat component used to send automatic messages ono rocketchat server"""
+
+    def __init__(self, ctx: NVPContext):
+        """Script runner constructor"""
+        NVPComponent.__init__(self, ctx)
+
+        # Get the config for this component:
+        self.config = ctx.get_config().get("rocketchat", None)
+
+        self.client = None
+
+    def process_command(self, cmd):
+        """Check if this component can process the given command"""
+
+        if cmd == "send":
+            msg = self.get_param("message")
+            channel = self.get_param("channel")
+            self.send_message(msg, channel=channel)
+            return True
+
+        return False
+
+    def get_client(self):
+        """Retrieve the rocketchat client, or None if not configured"""
+        if self.config is None:
+            return None
+
+        if self.client is None:
+            self.client = RocketChatClient(self.config["base_url"], self.config["user_id"], self.config["token"])
+
+        return self.client
+
+    def get_default_channel(self):
+        """Retrieve the default channel"""
+        return self.config["default_channel"] if self.config is not None else None
+
+    def send_message(self, message, channel=None, max_retries=5):
+        """Method used to send a message on the configured rocketchat server.
+        Note: this call is blocking, use the notifier component to send a message asynchronously."""
+        client = self.get_client()
+        if client is None:
+            logger.error("No configuration provided for rocketchat: cannot send message:\n%s", message)
+            return False
+
+        if channel is None:
+            channel = self.get_default_channel()
+
+        return client.send_message(message, channel, max_retries=max_retries)
+
 
 if __name__ == "__main__":
     # Create the context:
@@ -1,6 +1,7 @@
 """Collection of admin utility functions"""
 
 import copy
+import json
 import logging
 import os
 import re
@@ -8,6 +9,8 @@ import sys
 import time
 from pathlib import Path
 
+from nvp.core.log_files import RotatingLogFile
+from nvp.core.templating import TemplateEngine
 from nvp.nvp_component import NVPComponent
 from nvp.nvp_context import NVPContext
 from nvp.nvp_project import NVPProject
@@ -30,6 +33,11 @@ class ScriptRunner(NVPComponent):
 
         self.scripts = ctx.get_config().get("scripts", {})
 
+        # Compiled scripts cache:
+        self.cache_version = 2
+        self.use_script_cache = self.config.get("use_script_cache", True)
+        self.script_cache = None
+
         # Also extend the parser:
         ctx.define_subparsers("main", {"run": None})
         psr = ctx.get_parser("main.run")
@@ -41,6 +49,11 @@ class ScriptRunner(NVPComponent):
             help="Display the help from the script command itself",
         )
 
+        ctx.define_subparsers("main", {"bench-run": None})
+        psr = ctx.get_parser("main.bench-run")
+        psr.add_argument("script_name", type=str, help="Name of the script to benchmark")
+        psr.add_argument("-n", "--count", dest="count", type=int, default=100, help="Number of resolutions")
+
     def process_command(self, cmd):
         """Check if this component can process the given command"""
 
@@ -52,11 +65,14 @@ class ScriptRunner(NVPComponent):
             # Exit with the underlying exit code:
             sys.exit(rcode)
 
+        if cmd == "bench-run":
+            self.bench_script(self.get_param("script_name"), self.get_param("count"))
+            return True
+
         return False
 
-    def list_scripts(self):
-        """List of all available scripts"""
-        # logger.info("Should list all the available scripts here.")
+    def collect_script_names(self):
+        """Collect the sorted list of all the available script names"""
         snames = []
 
         projs = self.ctx.get_projects()
@@ -67,6 +83,12 @@ class ScriptRunner(NVPComponent):
 
         snames = list(set(snames))
         snames.sort()
+        return snames
+
+    def list_scripts(self):
+        """List of all available scripts"""
+        # logger.info("Should list all the available scripts here.")
+        snames = self.collect_script_names()
 
         print("List of available NVP scripts:")
         for sname in snames:
@@ -74,14 +96,104 @@ class ScriptRunner(NVPComponent):
 
     def has_script(self, script_name):
         """Check if a given script name is available."""
-        projs = self.ctx.get_projects()
-        for proj in projs:
-            desc = proj.get_script(script_name)
-            if desc is not None:
-                return True
+        if self.use_script_cache:
+            return script_name in self.get_script_cache()["names"]
+
+        return script_name in self.collect_script_names()
+
+    def get_script_cache(self):
+        """Retrieve the compiled scripts cache, resetting it when the config sources changed"""
+        if self.script_cache is not None:
+            return self.script_cache
 
-        desc = self.scripts.get(script_name, None)
-        return desc is not None
+        config_hash = self.ctx.get_config_hash()
+        cache_file = self.get_script_cache_file()
+        cache = None
+        if self.file_exists(cache_file):
+            try:
+                # Note: using the plain json module here as it is much faster than read_json():
+                with open(cache_file, "r", encoding="utf-8") as file:
+                    cache = json.load(file)
+            except ValueError:
+                logger.warning("Ignoring invalid script cache file %s", cache_file)
+
+        if cache is None or cache.get("version") != self.cache_version or cache.get("config_hash") != config_hash:
+            cache = {
+                "version": self.cache_version,
+                "config_hash": config_hash,
+                "names": self.collect_script_names(),
+                "plans": {},
+            }
+            self.save_script_cache(cache)
+
+        self.script_cache = cache
+        return cache
+
+    def get_script_cache_file(self):
+        """Retrieve the path of the compiled scripts cache file"""
+        return self.get_path(self.ctx.get_root_dir(), "build", "script_cache.json")
+
+    def save_script_cache(self, cache):
+        """Write the compiled scripts cache atomically, as multiple scripts may be started concurrently"""
+        cache_file = self.get_script_cache_file()
+        self.make_folder(self.get_parent_folder(cache_file))
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as file:
+            json.dump(cache, file)
+        os.replace(tmp_file, cache_file)
+
+    def is_plan_valid(self, plan):
+        """Check if a cached plan can still be used in the current environment"""
+        if plan["base_dir"] is not None and plan["base_dir"] != self.ctx.get_base_dir():
+            return False
+
+        return all(self.dir_exists(folder) for folder in plan["required_dirs"])
+
+    def get_script_plan(self, script_name: str, proj: NVPProject | None):
+        """Retrieve the compiled plan for a given script, or None if not found"""
+        if not self.use_script_cache:
+            return self.compile_script_desc(self.get_script_desc(script_name, proj), script_name, proj)
+
+        cache = self.get_script_cache()
+        key = f"{proj.get_name() if proj is not None else ''}:{script_name}"
+        plan = cache["plans"].get(key, None)
+        if plan is not None and self.is_plan_valid(plan):
+            return plan
+
+        plan = self.compile_script_desc(self.get_script_desc(script_name, proj), script_name, proj)
+        if plan is not None:
+            cache["plans"][key] = plan
+            self.save_script_cache(cache)
+
+        return plan
+
+    def bench_script(self, script_name, count):
+        """Compare the time to resolve a script from its desc and from the cache"""
+        proj = self.ctx.get_current_project()
+
+        start_time = time.time()
+        for _ in range(count):
+            self.has_script(script_name)
+            self.compile_script_desc(self.get_script_desc(script_name, proj), script_name, proj)
+        compile_time = (time.time() - start_time) / count
+
+        self.script_cache = None
+        self.get_script_plan(script_name, proj)
+        start_time = time.time()
+        for _ in range(count):
+            # Force reloading the cache file, as in a new "nvp run" process:
+            self.script_cache = None
+            self.has_script(script_name)
+            self.get_script_plan(script_name, proj)
+        cached_time = (time.time() - start_time) / count
+
+        logger.info(
+            "Script %s resolution: %.3f ms uncached, %.3f ms cached (x%.1f speedup)",
+            script_name,
+            compile_time * 1000.0,
+            cached_time * 1000.0,
+            compile_time / cached_time if cached_time > 0 else 0.0,
+        )
 
     def get_script_parameters(self):
         """Retrieve all the script parameters"""
@@ -129,53 +241,61 @@ class ScriptRunner(NVPComponent):
 
     def run_script(self, script_name: str, proj: NVPProject | None, script_args):
         """Run a given script given by name on a given project"""
-        desc = self.get_script_desc(script_name, proj)
-        return self.run_script_desc(desc, script_name, proj, script_args)
+        plan = self.get_script_plan(script_name, proj)
+        if plan is None:
+            return 1
+
+        return self.execute_script_plan(plan, script_args)
 
     def fill_placeholders(self, content, hlocs):
         """Re-implementation of fill_placeholders to handle processing of tool paths"""
-        content = super().fill_placeholders(content, hlocs)
-
-        # Also find if we have any mention of a tool path or tool dir in there:
-        pat = re.compile(r"\$\[([^:]+):([a-z]+)\]")
-        tools = self.get_component("tools")
-        match = pat.search(content)
-        while match is not None:
-
-            # Get the source match:
-            match_str = match.group(0)
-
-            # get the request type:
-            req_type = match.group(1)
+        if content is None:
+            return None
 
-            # Get the tool name:
-            tool_name = match.group(2)
+        return TemplateEngine(hlocs, resolver=self.resolve_tool_reference).fill(content)
 
-            # Compute the replacement:
-            match req_type:
-                case "TOOL_PATH":
-                    replacement = tools.get_tool_path(tool_name)
-                case "TOOL_DIR":
-                    replacement = tools.get_tool_dir(tool_name)
-                case "TOOL_ROOT_DIR":
-                    replacement = tools.get_tool_root_dir(tool_name)
-                case _:
-                    self.throw("Invalid replacement request type: %s", req_type)
+    def resolve_tool_reference(self, token):
+        """Resolve a $[TOOL_PATH:name], $[TOOL_DIR:name] or $[TOOL_ROOT_DIR:name] placeholder"""
+        match = re.fullmatch(r"\$\[([^:]+):([a-z]+)\]", token)
+        if match is None:
+            return None
 
-            # Replace in the string:
-            logger.info("Replacing '%s' with '%s'", match_str, replacement)
-            content = content.replace(match_str, replacement)
+        # get the request type:
+        req_type = match.group(1)
 
-            match = pat.search(content)
+        # Get the tool name:
+        tool_name = match.group(2)
 
-        return content
+        # Compute the replacement:
+        tools = self.get_component("tools")
+        match req_type:
+            case "TOOL_PATH":
+                replacement = tools.get_tool_path(tool_name)
+            case "TOOL_DIR":
+                replacement = tools.get_tool_dir(tool_name)
+            case "TOOL_ROOT_DIR":
+                replacement = tools.get_tool_root_dir(tool_name)
+            case _:
+                self.throw("Invalid replacement request type: %s", req_type)
+
+        logger.info("Replacing '%s' with '%s'", token, replacement)
+        return replacement
 
     def run_script_desc(self, desc, script_name: str, proj: NVPProject | None, script_args=None):
         """Run a given script desc on a given project"""
+        plan = self.compile_script_desc(desc, script_name, proj)
+        if plan is None:
+            return 1
+
+        return self.execute_script_plan(plan, script_args)
+
+    def compile_script_desc(self, desc, script_name: str, proj: NVPProject | None):
+        """Resolve a script desc into an execution plan with the fully expanded
+        command, cwd, environment variables and paths. Returns None if the script is not found."""
 
         if desc is None:
             logger.warning("No script named %s found", script_name)
-            return 1
+            return None
 
         # If the desc contains a "script" entry, then we should retrive the corresponding script and
         # extend it with the settings we have in the current desc:
@@ -198,7 +318,7 @@ class ScriptRunner(NVPComponent):
 
             if desc2 is None:
                 logger.warning("No script named %s found", sname)
-                return 1
+                return None
 
             # We should adapt the subscript desc and then run it:
             desc2 = copy.deepcopy(desc2)
@@ -220,14 +340,14 @@ class ScriptRunner(NVPComponent):
                         if key in desc2:
                             desc2[key] += f" {args}"
 
-            # Finally we run that script and return:
-            return self.run_script_desc(desc2, sname, proj, script_args)
+            # Finally we compile that script:
+            return self.compile_script_desc(desc2, sname, proj)
 
         cmd = self.ctx.resolve_object(desc, "cmd")
 
         # Add all the known projects root dirs:
         hlocs = self.ctx.get_known_vars()
-        
+
         # Note the project root dir below might still be None:
         hlocs["${PROJECT_ROOT_DIR}"] = proj.get_root_dir() if proj is not None else self.ctx.get_root_dir()
         hlocs["${NVP_ROOT_DIR}"] = self.ctx.get_root_dir()
@@ -239,6 +359,9 @@ class ScriptRunner(NVPComponent):
             for k, v in desc["vars"].items():
                 hlocs["${" + k + "}"] = self.fill_placeholders(v, hlocs)
 
+        # Folders that must still exist for the plan to be valid:
+        required_dirs = []
+
         # check if we should use python in this command:
         tools = self.get_component("tools")
         env_name = desc.get("custom_python_env", None)
@@ -257,6 +380,7 @@ class ScriptRunner(NVPComponent):
                 logger.info("Creating python env %s...", env_name)
                 pyenv.setup_py_env(env_name)
 
+            required_dirs.append(pyenv_dir)
             py_path = self.get_path(pyenv_dir, pdesc["sub_path"])
 
             hlocs["${PYTHON_DIR}"] = self.get_parent_folder(py_path)
@@ -281,6 +405,7 @@ class ScriptRunner(NVPComponent):
             env_name = desc["nodejs_env"]
             env_dir = nodejs.get_env_dir(env_name)
             node_root_dir = self.get_path(env_dir, env_name)
+            required_dirs.append(node_root_dir)
             hlocs["${NODE_ENV_DIR}"] = node_root_dir
             node_path = nodejs.get_node_path(env_name)
             hlocs["${NODE}"] = node_path
@@ -304,18 +429,12 @@ class ScriptRunner(NVPComponent):
 
         cmd = [el for el in cmd if el != ""]
 
+        # If no CWD is provided we will use get_cwd() when running the script.
+        # Note: we really need to use get_cwd() or None here, otherwise
+        # some commands (like "nvp git commit") will not work.
         cwd = desc.get("cwd", None)
-        if cwd is None:
-            # If no CWD is provided we should use the current HOME folder as default:
-            # Update: actually we really need to use get_cwd() or None here.
-            # Otherwise some commands (like "nvp git commit") will not work.
-            cwd = self.get_cwd()
-
-            # cwd = self.ctx.get_home_dir()
-
-        cwd = self.fill_placeholders(cwd, hlocs)
-
-        env = os.environ.copy()
+        if cwd is not None:
+            cwd = self.fill_placeholders(cwd, hlocs)
 
         key = f"{self.platform}_env_vars"
         env_dict = desc[key] if key in desc else desc.get("env_vars", None)
@@ -326,41 +445,80 @@ class ScriptRunner(NVPComponent):
         if key in desc:
             env_dict = desc[key]
 
+        env_vars = {}
         if env_dict is not None:
             for key, val in env_dict.items():
-
-                env[key] = self.fill_placeholders(val, hlocs)
+                env_vars[key] = self.fill_placeholders(val, hlocs)
 
         sep = ";" if self.is_windows else ":"
 
+        # List of path prefixes, in the order they should be prepended to the PATH:
+        paths = []
         if len(additional_paths) > 0:
             # Add the additional paths:
-            val = sep.join(additional_paths)
-            os.environ["PATH"] = self.fill_placeholders(val, hlocs) + sep + os.environ["PATH"]
-            env["PATH"] = os.environ["PATH"]
+            paths.append(self.fill_placeholders(sep.join(additional_paths), hlocs))
 
-        def add_env_paths(key):
+        for key in ["env_paths", f"{self.platform}_env_paths", f"{pname}.env_paths"]:
             if key in desc:
-                val = desc[key].replace(";", sep)
-                os.environ["PATH"] = self.fill_placeholders(val, hlocs) + sep + os.environ["PATH"]
-                env["PATH"] = os.environ["PATH"]
-
-        add_env_paths("env_paths")
-        add_env_paths(f"{self.platform}_env_paths")
-        add_env_paths(f"{pname}.env_paths")
+                paths.append(self.fill_placeholders(desc[key].replace(";", sep), hlocs))
 
+        python_path = None
         if "python_path" in desc:
             elems = desc["python_path"]
             elems = [self.fill_placeholders(el, hlocs).replace("\\", "/") for el in elems]
-            sep = ";" if self.is_windows else ":"
-            pypath = sep.join(elems)
-            logger.debug("Using pythonpath: %s", pypath)
-            env = env or os.environ.copy()
-            env["PYTHONPATH"] = pypath
+            python_path = sep.join(elems)
+
+        notify = desc.get("notify", self.config.get("notify_script_errors", True))
+
+        log_file = desc.get("log_file", None)
+        if log_file is not None:
+            log_file = self.fill_placeholders(log_file, hlocs)
+
+        lock_file = desc.get("lock_file", None)
+        if lock_file is not None:
+            lock_file = self.fill_placeholders(lock_file, hlocs)
+
+        # The base dir is only part of the plan validity if it is used by the script:
+        uses_base_dir = "${BASE_DIR}" in json.dumps([desc, sparams])
+
+        return {
+            "script_name": script_name,
+            "cmd": cmd,
+            "cwd": cwd,
+            "env_vars": env_vars,
+            "paths": paths,
+            "python_path": python_path,
+            "log_file": log_file,
+            "log_rotation": dict(self.config.get("log_rotation", {}), **desc.get("log_rotation", {})),
+            "lock_file": lock_file,
+            "auto_restart": desc.get("auto_restart", False),
+            "restart_delay": desc.get("restart_delay", 60),
+            "notify": notify,
+            "output_encoding": desc.get("output_encoding", "utf-8"),
+            "base_dir": self.ctx.get_base_dir() if uses_base_dir else None,
+            "required_dirs": required_dirs,
+        }
+
+    def execute_script_plan(self, plan, script_args=None):
+        """Execute a compiled script plan"""
+        script_name = plan["script_name"]
+        cmd = list(plan["cmd"])
+        cwd = plan["cwd"] if plan["cwd"] is not None else self.get_cwd()
+
+        env = os.environ.copy()
+        env.update(plan["env_vars"])
+
+        sep = ";" if self.is_windows else ":"
+        for path in plan["paths"]:
+            os.environ["PATH"] = path + sep + os.environ["PATH"]
+            env["PATH"] = os.environ["PATH"]
+
+        if plan["python_path"] is not None:
+            logger.debug("Using pythonpath: %s", plan["python_path"])
+            env["PYTHONPATH"] = plan["python_path"]
 
         # If we have an environment created, we should ensure that we set the PWD correctly:
-        if env is not None and cwd is not None:
-            env["PWD"] = cwd
+        env["PWD"] = cwd
 
         # Check if we have additional args to pass to the command:
         # Manually collect the additional args: (same results as above)
@@ -373,13 +531,12 @@ class ScriptRunner(NVPComponent):
             cmd += ["--help"]
 
         logfile = None
-        if "log_file" in desc:
-            filename = self.fill_placeholders(desc["log_file"], hlocs)
-            logfile = open(filename, "w", encoding="utf-8")
+        if plan["log_file"] is not None:
+            # Start a new log file, keeping the previous one as a compressed backup:
+            logfile = RotatingLogFile(plan["log_file"], truncate=True, **plan["log_rotation"])
 
-        lockfile = None
-        if "lock_file" in desc:
-            lockfile = self.fill_placeholders(desc["lock_file"], hlocs)
+        lockfile = plan["lock_file"]
+        if lockfile is not None:
             folder = self.get_parent_folder(lockfile)
             self.make_folder(folder)
 
@@ -394,13 +551,9 @@ class ScriptRunner(NVPComponent):
         # Execute that command:
         logger.debug("Executing script command: %s (cwd=%s)", cmd, cwd)
 
-        auto_restart = desc.get("auto_restart", False)
-        notify = self.config.get("notify_script_errors", True)
-        encoding = desc.get("output_encoding", "utf-8")
-
-        # Override notify level if applicable for this script:
-        if "notify" in desc:
-            notify = desc["notify"]
+        auto_restart = plan["auto_restart"]
+        notify = plan["notify"]
+        encoding = plan["output_encoding"]
 
         while True:
             try:
@@ -426,16 +579,15 @@ class ScriptRunner(NVPComponent):
                 msg += f"cwd={cwd}\n\n"
                 msg += "=> Check the logs for details."
 
-                rchat = self.get_component("rchat")
-                rchat.send_message(msg, channel="problem-reports")
+                notifier = self.get_component("notifier")
+                notifier.send_rocketchat(msg, channel="problem-reports")
 
                 msg = '<p style="color: #fd0202;">**WARNING:** an exception occured in the following command:</p>'
                 msg += f"<p><em>{cmd}</em></p>"
                 msg += f"<p>cwd={cwd}</p>"
                 msg += "<p >=> Check the logs for details.</p>"
 
-                email = self.get_component("email")
-                email.send_message("[NervProj] Exception notification", msg)
+                notifier.send_email("[NervProj] Exception notification", msg)
 
             restart_requested = auto_restart
 
@@ -453,7 +605,7 @@ class ScriptRunner(NVPComponent):
                 break
 
             # Check if we have a restart delay:
-            delay = desc.get("restart_delay", 60)
+            delay = plan["restart_delay"]
             if delay is not None:
                 logger.info("Waiting %s seconds to restart process...", delay)
                 time.sleep(delay)
@@ -8,6 +8,8 @@ from datetime import datetime
 from importlib import import_module
 
 from nvp.nvp_compiler import NVPCompiler
+from nvp.core.source_mirror import SourceMirror
+from nvp.nvp_compiler_cache import NVPCompilerCache
 from nvp.nvp_component import NVPComponent
 from nvp.nvp_context import NVPContext
 
@@ -35,6 +37,10 @@ class BuildManager(NVPComponent):
         self.compiler = None
         self.compilers = None
         self.builders = None
+        self.compiler_caches = {}
+        self.compiler_lists = {}
+        self.source_mirror = None
+        self.compilers_by_type = {}
 
     def initialize(self):
         """Initialize this component as needed before usage."""
@@ -58,6 +64,13 @@ class BuildManager(NVPComponent):
             # Compiler already selected.
             return
 
+        if comp_type in self.compiler_lists:
+            # Reuse the compilers already collected for that type:
+            self.compilers = self.compiler_lists[comp_type]
+            self.compiler = self.compilers_by_type[comp_type]
+            self.setup_paths()
+            return
+
         self.compilers = []
 
         if self.is_windows:
@@ -127,6 +140,8 @@ class BuildManager(NVPComponent):
 
         assert self.compiler is not None, f"Cannot find compiler of type {comp_type}"
         logger.debug("Selecting compiler %s (in %s)", self.compiler.get_name(), self.compiler.get_root_dir())
+        self.compiler_lists[comp_type] = self.compilers
+        self.compilers_by_type[comp_type] = self.compiler
 
         self.setup_paths()
 
@@ -315,8 +330,12 @@ class BuildManager(NVPComponent):
             # Execute the builder function:
             start_time = time.time()
             builder = self.builders[lib_name]
+            cache = self.get_compiler_cache()
+            prev_stats = cache.get_stats() if cache is not None else None
             builder.build(build_dir, prefix, desc)
             elapsed = time.time() - start_time
+            if cache is not None:
+                logger.info("Compiler cache stats for %s: %s", dep_name, cache.get_stats_report(prev_stats))
 
             # Finally we should create the package from that installed dependency folder
             # so that we don't have to build it the next time:
@@ -382,10 +401,15 @@ class BuildManager(NVPComponent):
             self.remove_folder(build_dir)
 
         git = self.get_component("git")
+        mirror = self.get_source_mirror()
 
         if not self.dir_exists(build_dir):
-            # First check if this is a git repository:
-            if from_git:
+            # Use the local source mirror if available (mercurial repositories are not supported):
+            if mirror is not None and not url.startswith("hg@"):
+                self.setup_mirrored_sources(mirror, desc, url, from_git, build_dir)
+
+            # Otherwise check if this is a git repository:
+            elif from_git:
                 # Note that build_dir and src_pkg are the same here:
                 git.clone_repository(url, build_dir, recurse=True)
 
@@ -424,6 +448,48 @@ class BuildManager(NVPComponent):
 
         return (build_dir, prefix, dep_name)
 
+    def get_source_mirror(self):
+        """Retrieve the local source mirror, or None if disabled with 'use_source_mirror: false'"""
+        if not self.config.get("use_source_mirror", True):
+            return None
+
+        if self.source_mirror is None:
+            mirror_dir = self.config.get("source_mirror_dir", self.get_path(self.ctx.get_root_dir(), "build", "mirror"))
+            self.source_mirror = SourceMirror(
+                mirror_dir,
+                self.get_component("git"),
+                git_path=self.tools.get_git_path(),
+                tools=self.tools,
+                refresh_delay=self.config.get("source_mirror_refresh_delay", None),
+                hard_links=self.config.get("source_mirror_hard_links", False),
+            )
+        return self.source_mirror
+
+    def setup_mirrored_sources(self, mirror, desc, url, from_git, build_dir):
+        """Populate a build folder from the pristine source tree of the local mirror"""
+        tgt_dir = self.get_std_package_name(desc)
+        base_build_dir = self.get_parent_folder(build_dir)
+
+        if from_git:
+            # An optional git ref can be specified to pin the sources:
+            tree_dir, _ = mirror.get_git_pristine_tree(url, desc.get("git_ref", None))
+        else:
+            tree_dir = mirror.get_archive_pristine_tree(url, tgt_dir, desc.get("extracted_dir", None))
+
+        start_time = time.time()
+        mirror.copy_tree(tree_dir, build_dir)
+        logger.info("Prepared source folder %s in %.2f secs", build_dir, time.time() - start_time)
+
+        if from_git:
+            # Build the source package for this library from the build folder,
+            # so that the package top folder is still named after tgt_dir:
+            ext = ".7z" if self.is_windows else ".tar.xz"
+            pkgname = f"{tgt_dir}-{self.platform}{ext}"
+            if not self.file_exists(self.get_path(base_build_dir, pkgname)):
+                logger.info("Creating source package %s...", pkgname)
+                self.tools.create_package(build_dir, base_build_dir, pkgname)
+                logger.info("Done creating source package %s.", pkgname)
+
     def get_compiler(self, ctype=None):
         """Retrieve the current compiler to use"""
         assert self.compiler is not None, "Current compiler not configured yet."
@@ -436,6 +502,42 @@ class BuildManager(NVPComponent):
 
         assert False, f"No compiler found with type {ctype}"
 
+    def get_compiler_cache(self):
+        """Retrieve the compiler cache for the current compiler, or None if the cache is disabled.
+        The cache is enabled with the 'compiler_cache' config entry or the NVP_COMPILER_CACHE env var."""
+        desc = dict(self.config.get("compiler_cache", {}))
+        # Note: only the clang compiler is supported for now.
+        tool = os.getenv("NVP_COMPILER_CACHE", desc.get("tool", None))
+        if tool is None or tool in ["", "none"] or not self.compiler.is_clang():
+            return None
+
+        desc["tool"] = tool
+        key = f"{tool}_{self.compiler.get_name()}"
+        if key not in self.compiler_caches:
+            cache = NVPCompilerCache(self.ctx, self.compiler, desc)
+            if not cache.is_available():
+                logger.warning("Compiler cache tool %s not found, building without cache.", tool)
+                cache = None
+            self.compiler_caches[key] = cache
+
+        return self.compiler_caches[key]
+
+    def bench_compiler_cache(self, lib_name, num_runs):
+        """Rebuild a library multiple times to measure the effect of the compiler cache"""
+        cache = self.get_compiler_cache()
+        self.check(cache is not None, "Compiler cache is not enabled.")
+
+        times = []
+        for idx in range(num_runs):
+            prev_stats = cache.get_stats()
+            start_time = time.time()
+            self.check_libraries([lib_name], rebuild=True)
+            times.append(time.time() - start_time)
+            logger.info("Build %d of %s: %.2f secs, %s", idx + 1, lib_name, times[-1], cache.get_stats_report(prev_stats))
+
+        if len(times) > 1:
+            logger.info("Speedup of cached rebuild: %.2fx", times[0] / max(min(times[1:]), 1e-6))
+
     def get_flavor(self):
         """Retrieve the current flavor"""
         return f"{self.platform}_{self.compiler.get_type()}"
@@ -459,6 +561,14 @@ class BuildManager(NVPComponent):
             self.check_libraries(dlist, rebuild, preview, append, keep_build, use_existing_src)
             return True
 
+        if cmd == "bench-cache":
+            self.initialize()
+            ctype = self.get_param("compiler_type")
+            if ctype is not None:
+                self.select_compiler(ctype)
+            self.bench_compiler_cache(self.get_param("lib_name"), self.get_param("num_runs"))
+            return True
+
         if cmd == "project":
             proj_name = self.get_param("proj_name")
             proj = self.ctx.get_project(proj_name)
@@ -488,4 +598,9 @@ if __name__ == "__main__":
     psr.add_flag("-a", "--append", dest="append")("Keep the install folder if existing")
     psr.add_flag("-u", "--use-existing-src", dest="use_existing_src")("Use an existing source folder")
 
+    psr = context.build_parser("bench-cache")
+    psr.add_str("lib_name")("Library to rebuild")
+    psr.add_str("-c", "--compiler", dest="compiler_type")("Compiler for the build")
+    psr.add_int("-n", "--num-runs", dest="num_runs", default=2)("Number of rebuilds")
+
     bcomp.run()
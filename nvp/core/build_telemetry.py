@@ -0,0 +1,187 @@
+"""BuildTelemetry component used to record timings of the build phases"""
+
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from nvp.nvp_component import NVPComponent
+from nvp.nvp_context import NVPContext
+
+logger = logging.getLogger(__name__)
+
+
+def create_component(ctx: NVPContext):
+    """Create an instance of the component"""
+    return BuildTelemetry(ctx)
+
+
+class BuildTelemetry(NVPComponent):
+    """Record the wall time, CPU time, peak RSS and output size of each build phase"""
+
+    def __init__(self, ctx: NVPContext):
+        """Component constructor"""
+        NVPComponent.__init__(self, ctx)
+
+        self.enabled = self.config.get("build_telemetry", True)
+        self.stats_file = self.get_path(ctx.get_root_dir(), "build", "build_telemetry.jsonl")
+        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S") + f"_{os.getpid()}"
+        self.lock = threading.Lock()
+
+    def process_cmd_path(self, cmd):
+        """Check if this component can process the given command"""
+
+        if cmd == "stats":
+            self.show_stats(self.get_param("target"), self.get_param("threshold"), self.get_param("num_runs"))
+            return True
+
+        return False
+
+    def get_output_size(self, path):
+        """Compute the size of a file or of all the files in a folder"""
+        if path is None or not os.path.exists(path):
+            return 0
+
+        if os.path.isfile(path):
+            return os.path.getsize(path)
+
+        total = 0
+        for root, _, files in os.walk(path):
+            for fname in files:
+                try:
+                    total += os.lstat(os.path.join(root, fname)).st_size
+                except OSError:
+                    pass
+        return total
+
+    def add_usage(self, usage, rusage):
+        """Add the resource usage of a terminated child process to the usage of a phase"""
+        usage["cpu"] += rusage.ru_utime + rusage.ru_stime
+        usage["max_rss_kb"] = max(usage["max_rss_kb"] or 0, rusage.ru_maxrss)
+
+    @contextmanager
+    def record(self, target, phase, out_path=None):
+        """Record a build phase for a given target library/project.
+        Yields the usage dict of the phase, which should be updated with add_usage() with the
+        resource usage of each child process executed for that phase: this keeps the values
+        correct when multiple targets are built in parallel. The cpu time stays at 0 and the peak RSS
+        at None if no usage is provided (on windows for instance).
+        The output size is only computed when an output path is provided."""
+        if not self.enabled:
+            yield None
+            return
+
+        start_time = time.time()
+        usage = {"cpu": 0.0, "max_rss_kb": None}
+        success = False
+        try:
+            yield usage
+            success = True
+        finally:
+            wall_time = time.time() - start_time
+            entry = {
+                "run": self.run_id,
+                "date": datetime.now().isoformat(timespec="seconds"),
+                "target": target,
+                "phase": phase,
+                "wall": round(wall_time, 4),
+                "cpu": round(usage["cpu"], 4),
+                "max_rss_kb": usage["max_rss_kb"],
+                "output_size": self.get_output_size(out_path) if out_path is not None else None,
+                "success": success,
+            }
+            self.write_entry(entry)
+
+    def write_entry(self, entry):
+        """Append an entry to the telemetry file"""
+        with self.lock:
+            self.make_folder(self.get_parent_folder(self.stats_file))
+            with open(self.stats_file, "a", encoding="utf-8") as file:
+                file.write(json.dumps(entry) + "\n")
+
+    def read_entries(self, target=None):
+        """Read all the telemetry entries, optionally for a single target"""
+        entries = []
+        if not self.file_exists(self.stats_file):
+            return entries
+
+        with open(self.stats_file, "r", encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if target is None or entry["target"] == target:
+                    entries.append(entry)
+        return entries
+
+    def collect_runs(self, entries):
+        """Group the entries per (target, phase) then per run, summing the repeated phases"""
+        groups = {}
+        for entry in entries:
+            if not entry["success"]:
+                continue
+            runs = groups.setdefault((entry["target"], entry["phase"]), {})
+            data = runs.setdefault(entry["run"], {"wall": 0.0, "cpu": 0.0, "max_rss_kb": None, "output_size": None})
+            data["wall"] += entry["wall"]
+            data["cpu"] += entry["cpu"]
+            if entry["output_size"] is not None:
+                data["output_size"] = max(data["output_size"] or 0, entry["output_size"])
+            if entry["max_rss_kb"] is not None:
+                data["max_rss_kb"] = max(data["max_rss_kb"] or 0, entry["max_rss_kb"])
+
+        return groups
+
+    def show_stats(self, target, threshold, num_runs):
+        """Compare the last run of each target/phase with the median of the previous runs
+        and flag the regressions above the given threshold (in percent)"""
+        groups = self.collect_runs(self.read_entries(target))
+        if len(groups) == 0:
+            logger.info("No build telemetry data available.")
+            return []
+
+        regressions = []
+        for (tgt, phase), runs in sorted(groups.items()):
+            # Runs ids start with the date, so we can sort them:
+            run_ids = sorted(runs.keys())
+            last = runs[run_ids[-1]]
+            prev = [runs[rid]["wall"] for rid in run_ids[-num_runs - 1 : -1]]
+
+            msg = f"{tgt:24s} {phase:16s} wall: {last['wall']:9.2f}s cpu: {last['cpu']:9.2f}s"
+            if last["max_rss_kb"] is not None:
+                msg += f" rss: {last['max_rss_kb'] / 1024:8.1f}MB"
+            if last["output_size"] is not None:
+                msg += f" out: {last['output_size'] / (1024 * 1024):9.2f}MB"
+
+            if len(prev) > 0:
+                ref = statistics.median(prev)
+                delta = 100.0 * (last["wall"] - ref) / ref if ref > 0 else 0.0
+                msg += f" ({delta:+.1f}% vs median of {len(prev)} runs)"
+                # Ignore the very small phases where the noise dominates:
+                if delta > threshold and last["wall"] - ref > 1.0:
+                    msg += " <= REGRESSION"
+                    regressions.append((tgt, phase, delta))
+
+            logger.info(msg)
+
+        if len(regressions) > 0:
+            logger.warning("Detected %d regressions above %.1f%%", len(regressions), threshold)
+        return regressions
+
+
+if __name__ == "__main__":
+    # Create the context:
+    context = NVPContext()
+
+    # Add our component:
+    comp = context.get_component("build_telemetry")
+
+    psr = context.build_parser("stats")
+    psr.add_str("target", nargs="?", default=None)("Library or project name")
+    psr.add_float("-t", "--threshold", dest="threshold", default=20.0)("Regression threshold in percent")
+    psr.add_int("-n", "--num-runs", dest="num_runs", default=5)("Number of previous runs to compare with")
+
+    comp.run()
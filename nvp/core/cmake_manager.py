@@ -2,7 +2,11 @@
 
 import logging
 import math
+import os
+import shutil
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from nvp.nvp_builder import NVPBuilder
 from nvp.nvp_component import NVPComponent
@@ -17,6 +21,53 @@ def create_component(ctx: NVPContext):
     return CMakeManager(ctx)
 
 
+class BuildJobPool:
+    """Pool of build jobs shared between the concurrent ninja instances.
+    A build waits until its share of the jobs between the projects in flight is available, and
+    the jobs released by a completed build are granted again to the builds waiting for them.
+    Since the ninja versions in use have no jobserver support, the number of jobs of a running
+    ninja instance cannot change: so the last pending project takes all the available jobs."""
+
+    def __init__(self, num_jobs):
+        """Constructor"""
+        self.num_jobs = num_jobs
+        self.available = num_jobs
+        self.num_projects = 0
+        self.num_builds = 0
+        self.cond = threading.Condition()
+
+    def add_project(self):
+        """Register a project that will start building soon"""
+        with self.cond:
+            self.num_projects += 1
+
+    def get_share(self):
+        """Compute the fair share of the jobs for each project in flight"""
+        return max(1, self.num_jobs // max(1, self.num_projects))
+
+    def is_last(self):
+        """Check if the build requesting jobs is the last project in flight not building yet"""
+        return self.num_projects - self.num_builds <= 1
+
+    def acquire(self):
+        """Reserve a number of jobs for a new build, waiting for the jobs of the other builds if needed"""
+        with self.cond:
+            # When no other project will need jobs before a build completes, the remaining jobs are used:
+            self.cond.wait_for(lambda: self.available >= self.get_share() or (self.is_last() and self.available > 0))
+            count = self.available if self.is_last() else self.get_share()
+            self.available -= count
+            self.num_builds += 1
+            return count
+
+    def release(self, count):
+        """Release the jobs reserved by a build, which also completes the project"""
+        with self.cond:
+            self.available += count
+            self.num_builds -= 1
+            self.num_projects -= 1
+            self.cond.notify_all()
+
+
 class CMakeManager(NVPComponent):
     """Project command manager class"""
 
@@ -27,6 +78,10 @@ class CMakeManager(NVPComponent):
         self.cmake_projects = None
         self.builder = None
         self.build_dir = None
+        self.manifest_version = 1
+        self.timeline = None
+        self.timeline_start = None
+        self.timeline_lock = threading.Lock()
 
     def process_cmd_path(self, cmd):
         """Check if this component can process the given command"""
@@ -39,7 +94,8 @@ class CMakeManager(NVPComponent):
             bman = self.get_component("builder")
             bman.select_compiler(comp_type)
 
-            self.build_projects(bprints, dest_dir, rebuild=rebuild)
+            max_parallel = self.get_param("max_parallel")
+            self.build_projects(bprints, dest_dir, rebuild=rebuild, max_parallel=max_parallel)
             return True
 
         if cmd == "install":
@@ -90,6 +146,13 @@ class CMakeManager(NVPComponent):
 
             return True
 
+        if cmd == "bench-install":
+            pname = self.get_param("cproj_name")
+            dest_dir = self.get_param("mod_install_dir", None)
+            num_iters = self.get_param("num_iters")
+            self.bench_install_dep_modules(pname, dest_dir, num_iters)
+            return True
+
         if cmd == "add.nervbind":
 
             mname = self.get_param("mod_name")
@@ -557,23 +620,116 @@ class CMakeManager(NVPComponent):
 
         return platform
 
-    def build_projects(self, proj_names, install_dir, rebuild=False):
+    def build_projects(self, proj_names, install_dir, rebuild=False, max_parallel=1):
         """Build/install the list of projects"""
 
         self.initialize()
         cprojects = self.cmake_projects
 
-        # Iterate on all the module names:
         for proj_name in proj_names:
             assert proj_name in cprojects, f"Cannot find module {proj_name}"
+
+        if max_parallel > 1 and len(proj_names) > 1:
+            self.build_projects_parallel(proj_names, install_dir, rebuild, max_parallel)
+            return
+
+        # Iterate on all the module names:
+        for proj_name in proj_names:
             self.build_project(proj_name, install_dir, rebuild)
 
-    def install_dep_modules(self, proj_name, install_dir, platform):
-        """Install all the dependencies for a given project"""
+    def get_project_build_deps(self, proj_name):
+        """Retrieve the list of cmake projects that should be built before a given project.
+        Those are the cmake projects referenced in the dependencies of the project,
+        and the projects listed explicitly in its 'build_after' entry."""
         desc = self.cmake_projects[proj_name]
+        platform = self.get_platform()
 
-        if install_dir is None:
-            install_dir = desc["install_dir"]
+        deps = dict(desc.get("dependencies", {}))
+        deps.update(desc.get(f"{platform}_dependencies", {}))
+
+        names = [tgt.split(":")[0].lower() for tgt in deps.values()]
+        names += [name.lower() for name in desc.get("build_after", [])]
+
+        result = []
+        for name in names:
+            if name in self.cmake_projects and name != proj_name and name not in result:
+                result.append(name)
+        return result
+
+    def build_projects_parallel(self, proj_names, install_dir, rebuild, max_parallel):
+        """Build a list of projects concurrently, respecting the inter-project dependencies.
+        The configure steps of independent projects are overlapped and all the ninja
+        instances share a single pool of build jobs."""
+
+        # Collect the dependencies restricted to the projects we are building:
+        pending = {}
+        for pname in proj_names:
+            pending[pname] = [dep for dep in self.get_project_build_deps(pname) if dep in proj_names]
+
+        num_jobs = self.get_param("num_threads", None) or os.cpu_count() or 4
+        # Create the shared builder before starting the worker threads:
+        cache = self.get_builder().compiler_cache
+        prev_stats = cache.get_stats() if cache is not None else None
+        job_pool = BuildJobPool(num_jobs)
+        self.timeline = {}
+        self.timeline_start = time.time()
+        logger.info("Building %d projects with %d parallel builds and %d jobs", len(pending), max_parallel, num_jobs)
+
+        done = set()
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            while pending or running:
+                ready = [pname for pname, deps in pending.items() if all(dep in done for dep in deps)]
+                for pname in ready[: max_parallel - len(running)]:
+                    del pending[pname]
+                    job_pool.add_project()
+                    fut = executor.submit(self.build_project, pname, install_dir, rebuild, job_pool=job_pool)
+                    running[fut] = pname
+
+                self.check(len(running) > 0, "Circular dependencies detected between projects: %s", list(pending))
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    pname = running.pop(fut)
+                    # Propagate any build error:
+                    fut.result()
+                    done.add(pname)
+
+        self.log_build_timeline()
+        if cache is not None:
+            logger.info(
+                "Compiler cache stats for the parallel build of %d projects: %s",
+                len(done),
+                cache.get_stats_report(prev_stats),
+            )
+
+    def add_timeline_step(self, proj_name, step, start_tick, end_tick):
+        """Record the duration of a build step for a given project"""
+        if self.timeline is None:
+            return
+
+        with self.timeline_lock:
+            self.timeline.setdefault(proj_name, {})[step] = (start_tick, end_tick)
+
+    def log_build_timeline(self):
+        """Write a report of the configure/build/install steps of each project"""
+        logger.info("Build timeline (seconds from start):")
+        origin = self.timeline_start
+        for pname, steps in sorted(self.timeline.items(), key=lambda item: min(s[0] for s in item[1].values())):
+            parts = []
+            for step in ["configure", "build", "install"]:
+                if step in steps:
+                    start_tick, end_tick = steps[step]
+                    parts.append(
+                        f"{step}: {start_tick - origin:7.2f} -> {end_tick - origin:7.2f} ({end_tick - start_tick:.2f})"
+                    )
+            logger.info("  %-24s %s", pname, " | ".join(parts))
+        logger.info("Total build time: %.3f secs", time.time() - origin)
+        self.timeline = None
+
+    def collect_dep_module_files(self, proj_name, install_dir, platform):
+        """Collect the list of (src_path, dst_file, dst_path) entries to install for a given project"""
+        desc = self.cmake_projects[proj_name]
 
         bman = self.get_component("builder")
         tool = self.get_component("tools")
@@ -581,15 +737,14 @@ class CMakeManager(NVPComponent):
         key = f"{platform}_dep_modules"
         mods = desc.get(key, {})
 
+        entries = []
         for lib_name, file_map in mods.items():
-            # logger.info("Should install modules for %s: %s", lib_name, file_map)
             # get the root path of that dependency:
             if bman.has_library(lib_name):
                 root_dir = bman.get_library_root_dir(lib_name)
             else:
                 root_dir = tool.get_tool_root_dir(lib_name)
 
-            # Iterate on each file to check if it's already installed or not:
             for src_file, dst_locs in file_map.items():
                 # dst_locs could be a simple string or a list, we convert this to a list anyway:
                 if isinstance(dst_locs, str):
@@ -606,34 +761,164 @@ class CMakeManager(NVPComponent):
 
                     src_path = self.get_path(root_dir, src_file)
                     dst_path = self.get_path(install_dir, dst_file)
-                    copy_needed = False
-
-                    if self.file_exists(dst_path):
-                        # Check if the hash will match:
-                        hash1 = self.compute_file_hash(src_path)
-                        hash2 = self.compute_file_hash(dst_path)
-                        if hash1 != hash2:
-                            logger.info("Updating dep module %s...", dst_file)
-                            self.remove_file(dst_path)
-                            copy_needed = True
-                    else:
-                        # The destination file doesn't exist yet, we simply install it:
-                        logger.info("Installing dep module %s...", dst_file)
-                        copy_needed = True
-
-                    if copy_needed:
-                        # Check that the source file exists:
-                        self.check(
-                            self.file_exists(src_path),
-                            "Invalid source file: %s",
-                            src_path,
-                        )
-                        folder = self.get_parent_folder(dst_path)
-                        self.make_folder(folder)
-                        self.copy_file(src_path, dst_path)
-
-    def build_project(self, proj_name, install_dir, rebuild=False, gen_commands=False):
-        """Build/install a specific project"""
+                    entries.append((src_path, dst_file, dst_path))
+
+        return entries
+
+    def get_install_manifest_file(self, install_dir):
+        """Retrieve the path of the install manifest file for a given install folder"""
+        return self.get_path(install_dir, ".nvp_install_manifest.json")
+
+    def load_install_manifest(self, install_dir):
+        """Load the install manifest from a given install folder"""
+        mfile = self.get_install_manifest_file(install_dir)
+        if self.file_exists(mfile):
+            try:
+                data = self.read_json(mfile)
+                if data.get("version") == self.manifest_version:
+                    return data["files"]
+            except (ValueError, KeyError):
+                logger.warning("Discarding invalid install manifest %s", mfile)
+
+        return {}
+
+    def save_install_manifest(self, install_dir, files):
+        """Write the install manifest in a given install folder"""
+        self.make_folder(install_dir)
+        self.write_json({"version": self.manifest_version, "files": files}, self.get_install_manifest_file(install_dir))
+
+    def fast_copy_file(self, src_path, dst_path):
+        """Copy a file, using copy_file_range when available so that the kernel can
+        perform the copy in place (or with a reflink on filesystems supporting it)"""
+        folder = self.get_parent_folder(dst_path)
+        self.make_folder(folder)
+
+        # Remove the previous file first, since it could be a hard link or a read only file:
+        if self.file_exists(dst_path):
+            self.remove_file(dst_path)
+
+        if hasattr(os, "copy_file_range"):
+            try:
+                with open(src_path, "rb") as fsrc, open(dst_path, "wb") as fdst:
+                    remaining = os.fstat(fsrc.fileno()).st_size
+                    while remaining > 0:
+                        count = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                        if count == 0:
+                            break
+                        remaining -= count
+                shutil.copystat(src_path, dst_path)
+                return
+            except OSError as err:
+                logger.debug("copy_file_range failed for %s (%s), using regular copy.", src_path, err)
+
+        shutil.copy2(src_path, dst_path)
+
+    def install_dep_modules(self, proj_name, install_dir, platform, use_manifest=True):
+        """Install all the dependencies for a given project.
+        When use_manifest is True, the files recorded in the install manifest with unchanged
+        size/mtime are skipped without being read."""
+        desc = self.cmake_projects[proj_name]
+
+        if install_dir is None:
+            install_dir = desc["install_dir"]
+
+        entries = self.collect_dep_module_files(proj_name, install_dir, platform)
+        manifest = self.load_install_manifest(install_dir) if use_manifest else {}
+        if len(entries) == 0 and len(manifest) == 0:
+            return 0
+
+        new_manifest = {}
+        to_copy = []
+
+        for src_path, dst_file, dst_path in entries:
+            self.check(self.file_exists(src_path), "Invalid source file: %s", src_path)
+            src_st = os.stat(src_path)
+            dst_st = os.stat(dst_path) if self.file_exists(dst_path) else None
+
+            entry = manifest.get(dst_file)
+            if (
+                entry is not None
+                and dst_st is not None
+                and entry["src"] == src_path
+                and entry["src_size"] == src_st.st_size
+                and entry["src_mtime"] == src_st.st_mtime_ns
+                and entry["dst_size"] == dst_st.st_size
+                and entry["dst_mtime"] == dst_st.st_mtime_ns
+            ):
+                # Nothing changed since the last install:
+                new_manifest[dst_file] = entry
+                continue
+
+            src_hash = self.compute_file_hash(src_path)
+            if dst_st is not None:
+                # Check if the hash will match:
+                if src_hash == self.compute_file_hash(dst_path):
+                    new_manifest[dst_file] = self.make_install_entry(src_path, src_st, dst_st, src_hash)
+                    continue
+                logger.info("Updating dep module %s...", dst_file)
+            else:
+                # The destination file doesn't exist yet, we simply install it:
+                logger.info("Installing dep module %s...", dst_file)
+
+            to_copy.append((src_path, dst_file, dst_path, src_st, src_hash))
+
+        if len(to_copy) > 0:
+            nthreads = min(len(to_copy), os.cpu_count() or 4, 8)
+            with ThreadPoolExecutor(max_workers=nthreads) as executor:
+                # Consume the results to propagate any error:
+                list(executor.map(lambda item: self.fast_copy_file(item[0], item[2]), to_copy))
+
+            for src_path, dst_file, dst_path, src_st, src_hash in to_copy:
+                new_manifest[dst_file] = self.make_install_entry(src_path, src_st, os.stat(dst_path), src_hash)
+
+        # Remove the files we installed previously that are not dep modules anymore,
+        # unless they were modified since then:
+        for dst_file, entry in manifest.items():
+            dst_path = self.get_path(install_dir, dst_file)
+            if dst_file in new_manifest or not self.file_exists(dst_path):
+                continue
+            dst_st = os.stat(dst_path)
+            if entry["dst_size"] == dst_st.st_size and entry["dst_mtime"] == dst_st.st_mtime_ns:
+                logger.info("Removing dep module %s...", dst_file)
+                self.remove_file(dst_path)
+
+        if use_manifest and new_manifest != manifest:
+            self.save_install_manifest(install_dir, new_manifest)
+
+        return len(to_copy)
+
+    def make_install_entry(self, src_path, src_st, dst_st, file_hash):
+        """Build an install manifest entry"""
+        return {
+            "src": src_path,
+            "src_size": src_st.st_size,
+            "src_mtime": src_st.st_mtime_ns,
+            "dst_size": dst_st.st_size,
+            "dst_mtime": dst_st.st_mtime_ns,
+            "hash": file_hash,
+        }
+
+    def bench_install_dep_modules(self, proj_name, install_dir, num_iters):
+        """Benchmark the no-change path of install_dep_modules with and without manifest"""
+        self.initialize()
+        self.check(proj_name in self.cmake_projects, "Invalid Cmake project %s", proj_name)
+        platform = self.get_platform()
+
+        # Ensure everything is installed and the manifest is up to date first:
+        start_tick = time.time()
+        count = self.install_dep_modules(proj_name, install_dir, platform)
+        logger.info("Initial install: %d files copied in %.3f secs", count, time.time() - start_tick)
+
+        for use_manifest in [False, True]:
+            start_tick = time.time()
+            for _ in range(num_iters):
+                self.install_dep_modules(proj_name, install_dir, platform, use_manifest=use_manifest)
+            elapsed = (time.time() - start_tick) / num_iters
+            logger.info("No-change install (manifest=%s): %.3f ms per run", use_manifest, elapsed * 1000.0)
+
+    def build_project(self, proj_name, install_dir, rebuild=False, gen_commands=False, job_pool=None):
+        """Build/install a specific project.
+        When a job_pool is provided, the number of ninja jobs is taken from that shared pool."""
 
         desc = self.cmake_projects[proj_name]
 
@@ -725,31 +1010,55 @@ class CMakeManager(NVPComponent):
         outfile = None if gen_commands else open(build_file, "w", encoding="utf-8", newline="")
 
         builder = self.get_builder()
-        builder.run_cmake(build_dir, install_dir, src_dir, flags, outfile=outfile, build_type=build_type)
-
-        if bman.get_compiler().is_clang():
-            # Copy the compile_commands.json file:
-            comp_file = self.get_path(build_dir, "compile_commands.json")
-            self.check(self.file_exists(comp_file), "No file %s", comp_file)
-            dst_file = self.get_path(src_dir, "compile_commands.json")
-            self.rename_file(comp_file, dst_file)
-
-        if gen_commands:
-            # Don't actually run the build
-            return
+        builder.set_target_name(proj_name)
+        # The compiler cache statistics are global to the cache, so they cannot be attributed to
+        # a single project during a parallel build: they are reported once by build_projects_parallel() instead.
+        cache = builder.compiler_cache if job_pool is None else None
+        prev_stats = cache.get_stats() if cache is not None and not gen_commands else None
+        # Record the whole project build, so that the output size is computed once:
+        with builder.record_phase("build", build_dir):
+            start_tick = time.time()
+            builder.run_cmake(build_dir, install_dir, src_dir, flags, outfile=outfile, build_type=build_type)
+            self.add_timeline_step(proj_name, "configure", start_tick, time.time())
+
+            if bman.get_compiler().is_clang():
+                # Copy the compile_commands.json file:
+                comp_file = self.get_path(build_dir, "compile_commands.json")
+                self.check(self.file_exists(comp_file), "No file %s", comp_file)
+                dst_file = self.get_path(src_dir, "compile_commands.json")
+                self.rename_file(comp_file, dst_file)
+
+            if gen_commands:
+                # Don't actually run the build
+                return
 
-        nthreads = self.get_param("num_threads", None)
-        flags = None
-        if nthreads is not None:
-            logger.info("Building with %d threads.", nthreads)
-            flags = ["-j", str(nthreads)]
-        start_tick = time.time()
-        builder.run_ninja(build_dir, outfile=outfile, flags=flags)
+            nthreads = self.get_param("num_threads", None)
+            if job_pool is not None:
+                nthreads = job_pool.acquire()
+            flags = None
+            if nthreads is not None:
+                logger.info("Building %s with %d threads.", proj_name, nthreads)
+                flags = ["-j", str(nthreads)]
+            ninja_tick = time.time()
+            try:
+                builder.run_ninja(build_dir, outfile=outfile, flags=flags)
+            finally:
+                if job_pool is not None:
+                    job_pool.release(nthreads)
+
+        if cache is not None:
+            # Write the compiler cache statistics in the build log:
+            report = cache.get_stats_report(prev_stats)
+            logger.info("Compiler cache stats for %s: %s", proj_name, report)
+            outfile.write(f"Compiler cache stats: {report}\n")
         outfile.close()
+        build_tick = time.time()
+        self.add_timeline_step(proj_name, "build", ninja_tick, build_tick)
 
         # Install the dependency modules:
         platform = self.get_platform()
         self.install_dep_modules(proj_name, install_dir, platform)
+        self.add_timeline_step(proj_name, "install", build_tick, time.time())
 
         elapsed = time.time() - start_tick
         mins = math.floor(elapsed / 60)
@@ -793,6 +1102,7 @@ if __name__ == "__main__":
     psr.add_str("-t", "--build-type", dest="build_type", default="Release")("Specify the cmake build type")
     psr.add_str("-c", "--compiler", dest="compiler_type", default="clang")("Select the compiler")
     psr.add_int("-j", "--num-threads", dest="num_threads")("Specify the number of threads to use during build.")
+    psr.add_int("-p", "--parallel", dest="max_parallel", default=1)("Maximum number of projects built concurrently")
 
     psr = context.build_parser("install")
     psr.add_str("ctx_names", nargs="?", default="default")("List of module context to install")
@@ -815,6 +1125,11 @@ if __name__ == "__main__":
     psr.add_str("-t", dest="class_type")("Type of the class to create.")
     psr.add_flag("-f", dest="force_write")("Force rewriting the class files")
 
+    psr = context.build_parser("bench-install")
+    psr.add_str("cproj_name")("Cmake project")
+    psr.add_str("-d", "--dir", dest="mod_install_dir")("Install folder")
+    psr.add_int("-n", "--num-iters", dest="num_iters", default=10)("Number of no-change install runs")
+
     psr = context.build_parser("add.nervbind")
     psr.add_str("mod_name")("Module name")
 
@@ -0,0 +1,304 @@
+"""Indexed content pack builder used by the DevUtils component"""
+
+import fnmatch
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import xxhash
+
+from nvp.nvp_object import NVPObject
+
+logger = logging.getLogger(__name__)
+
+# Files that are never collected:
+ALWAYS_IGNORED = [".git/*", "*/.git/*", ".github/*", "*/.github/*", "*.private.h"]
+
+# Folders skipped during the scan (matching the ignored patterns above):
+IGNORED_DIRS = {".git", ".github"}
+
+# Chunk size used to stream the file contents:
+CHUNK_SIZE = 1024 * 1024
+
+
+def compile_glob(pattern, extended):
+    """Convert a glob pattern to a regex string.
+    In extended mode "**" matches zero or more path segments and "*" doesn't match "/",
+    otherwise the fnmatch rules are used."""
+    if not extended:
+        return fnmatch.translate(os.path.normcase(pattern))
+
+    regex = re.escape(pattern.replace("\\", "/"))
+    regex = regex.replace(r"\*\*", ".*").replace(r"\*", "[^/]*").replace(r"\?", "[^/]")
+    return f"(?s:{regex})\\Z"
+
+
+class PatternSet:
+    """Set of glob patterns precompiled into a single regex"""
+
+    def __init__(self, patterns, extended=True):
+        """Constructor"""
+        self.patterns = patterns
+
+        # The extended matching is only used for the patterns containing "**":
+        ext = [compile_glob(pat, True) for pat in patterns if extended and "**" in pat]
+        std = [compile_glob(pat, False) for pat in patterns if not (extended and "**" in pat)]
+        self.ext_regex = re.compile("|".join(ext)) if len(ext) > 0 else None
+        self.std_regex = re.compile("|".join(std)) if len(std) > 0 else None
+
+    @staticmethod
+    def from_string(patterns, extended=True):
+        """Build a pattern set from a semicolon-separated list of patterns"""
+        return PatternSet([pat.strip() for pat in patterns.split(";") if pat.strip()], extended)
+
+    def matches(self, path):
+        """Check if a path matches any of the patterns"""
+        if self.std_regex is not None and self.std_regex.match(os.path.normcase(path)) is not None:
+            return True
+        return self.ext_regex is not None and self.ext_regex.match(path.replace("\\", "/")) is not None
+
+
+class ContentPackBuilder(NVPObject):
+    """Collect the content of text files into content packs.
+    The selected files are written incrementally into the pack, and an index of the files
+    (size, mtime, hash, binary flag and offset in the pack) is kept per pack, so that a pack is only
+    rewritten when its configuration or one of its files changed."""
+
+    def __init__(self, index_file=None, max_workers=8):
+        """Constructor"""
+        self.index_file = index_file
+        self.max_workers = max_workers
+        self.index = {}
+        if index_file is not None and self.file_exists(index_file):
+            with open(index_file, "r", encoding="utf-8") as file:
+                self.index = json.load(file)
+
+        self.ignored = PatternSet(ALWAYS_IGNORED, extended=False)
+        self.api_txt = PatternSet(["*.api.txt"], extended=False)
+        self.scans = {}
+        self.prev_files = {}
+
+    def save_index(self):
+        """Write the index file"""
+        if self.index_file is None:
+            return
+
+        self.make_folder(self.get_parent_folder(self.index_file))
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as file:
+            json.dump(self.index, file)
+        os.replace(tmp_file, self.index_file)
+
+    def scan_dir(self, folder, prefix):
+        """Recursively list the files in a folder as (relpath, size, mtime_ns) tuples"""
+        res = []
+        stack = [(folder, prefix)]
+        while len(stack) > 0:
+            cur_dir, cur_prefix = stack.pop()
+            try:
+                with os.scandir(cur_dir) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            if entry.name not in IGNORED_DIRS and not entry.is_symlink():
+                                stack.append((entry.path, cur_prefix + entry.name + os.sep))
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            res.append((cur_prefix + entry.name, stat.st_size, stat.st_mtime_ns))
+            except OSError as err:
+                logger.warning("Cannot scan folder %s: %s", cur_dir, str(err))
+
+        return res
+
+    def scan_folder(self, folder):
+        """List all the files in a folder, scanning the top level sub folders in parallel"""
+        if folder in self.scans:
+            return self.scans[folder]
+
+        files = []
+        sub_dirs = []
+        if not self.dir_exists(folder):
+            logger.warning("Cannot scan missing folder %s", folder)
+            return files
+
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if entry.name not in IGNORED_DIRS and not entry.is_symlink():
+                        sub_dirs.append(entry)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(lambda entry: self.scan_dir(entry.path, entry.name + os.sep), sub_dirs)
+            for res in results:
+                files += res
+
+        # Sort the files to get a deterministic order:
+        files.sort()
+        self.scans[folder] = files
+        return files
+
+    def select_files(self, folder, patterns=None, ignore_patterns=None, include_api_txt=False):
+        """Select the files to collect in a folder as a list of (relpath, size, mtime_ns) tuples.
+        The include patterns support "**" and the exclude patterns use the fnmatch rules."""
+        if patterns is not None:
+            globs = [pat.strip() for pat in patterns.split(";") if pat.strip()]
+            if not any(c in pat for pat in globs for c in ("*", "?", "[")):
+                # Direct file paths: no need to scan the folder:
+                files = []
+                for pat in globs:
+                    fpath = self.get_path(folder, pat)
+                    if self.file_exists(fpath):
+                        stat = os.stat(fpath)
+                        files.append((pat, stat.st_size, stat.st_mtime_ns))
+                    else:
+                        logger.warning("Pattern '%s' does not match any file (resolved to: %s).", pat, fpath)
+            else:
+                pset = PatternSet(globs)
+                files = [elem for elem in self.scan_folder(folder) if pset.matches(elem[0])]
+        else:
+            files = self.scan_folder(folder)
+
+        ignored = PatternSet.from_string(ignore_patterns, extended=False) if ignore_patterns is not None else None
+        return [
+            elem
+            for elem in files
+            if elem[1] > 0
+            and (include_api_txt or not self.api_txt.matches(elem[0]))
+            and not self.ignored.matches(elem[0])
+            and (ignored is None or not ignored.matches(elem[0]))
+        ]
+
+    def is_binary_file(self, filepath):
+        """Return True if the file appears to be binary (null bytes in the first 8 KB)"""
+        try:
+            with open(filepath, "rb") as file:
+                return b"\x00" in file.read(8192)
+        except OSError:
+            return True
+
+    def get_file_infos(self, folder, relpath, size, mtime):
+        """Retrieve the infos on a file, reusing the indexed values if the size and mtime didn't change"""
+        fpath = self.get_path(folder, relpath)
+        prev = self.prev_files.get(fpath, None)
+        if prev is not None and prev["size"] == size and prev["mtime"] == mtime:
+            return dict(prev, path=relpath)
+
+        # The hash is only needed to check if the indexed packs are up to date:
+        binary = self.is_binary_file(fpath)
+        fhash = None if binary or self.index_file is None else self.compute_file_hash(fpath)
+        return {"file": fpath, "path": relpath, "size": size, "mtime": mtime, "binary": binary, "hash": fhash}
+
+    def collect_section(self, folder, patterns=None, ignore_patterns=None, include_api_txt=False):
+        """Collect the infos on all the files of a pack section"""
+        files = self.select_files(folder, patterns, ignore_patterns, include_api_txt)
+        return [self.get_file_infos(folder, *elem) for elem in files]
+
+    def write_text_content(self, out, fpath):
+        """Stream the content of a text file into the output, converting the newlines like text mode files"""
+        start = out.tell()
+        for encoding in ["utf-8", "cp1252", "latin-1"]:
+            try:
+                with open(fpath, "r", encoding=encoding) as file:
+                    for chunk in iter(lambda: file.read(CHUNK_SIZE), ""):
+                        out.write(chunk.replace("\n", os.linesep).encode("utf-8"))
+                return
+            except UnicodeDecodeError:
+                logger.warning("Could not read %s with encoding %s", fpath, encoding)
+                out.seek(start)
+                out.truncate()
+
+    def write_sections(self, out, sections):
+        """Write the pack sections into a binary output file, updating the file offsets.
+        The files of each section are written as binary file headers first, then text files, by ascending size."""
+        for infos in sections:
+            if len(infos) == 0:
+                continue
+
+            binary_files = sorted([elem for elem in infos if elem["binary"]], key=lambda elem: elem["size"])
+            text_files = sorted([elem for elem in infos if not elem["binary"]], key=lambda elem: elem["size"])
+            total_size = sum(elem["size"] for elem in text_files)
+
+            sep = b""
+            for elem in binary_files:
+                elem["offset"] = out.tell()
+                out.write(sep + f"// File: {elem['path']} ({elem['size']} bytes, binary)".encode("utf-8"))
+                sep = os.linesep.encode("utf-8")
+
+            for elem in text_files:
+                pct = (elem["size"] / total_size * 100.0) if total_size > 0 else 0.0
+                logger.debug("Writing file %s (%d bytes, %.1f%%)", elem["path"], elem["size"], pct)
+                out.write(sep)
+                elem["offset"] = out.tell()
+                header = f"// File: {elem['path']} ({elem['size']} bytes, {pct:.1f}% of total):\n\n"
+                out.write(header.replace("\n", os.linesep).encode("utf-8"))
+                self.write_text_content(out, elem["file"])
+                sep = os.linesep.encode("utf-8")
+
+            logger.info(
+                "Collected %d text files and %d binary files, total size: %d bytes.",
+                len(text_files),
+                len(binary_files),
+                total_size,
+            )
+
+    def collect(
+        self, folder, patterns=None, ignore_patterns=None, output_file=None, include_api_txt=False, append=False
+    ):
+        """Collect the content of a folder into a single output file, without using the index"""
+        infos = self.collect_section(folder, patterns, ignore_patterns, include_api_txt)
+        if len(infos) == 0:
+            logger.info("No files matched the selection criteria.")
+            return
+
+        dest = output_file or "content.api.txt"
+        with open(dest, "ab" if append else "wb") as out:
+            self.write_sections(out, [infos])
+        logger.info("%s content to %s.", "Appended" if append else "Written", dest)
+
+    def build_pack(self, name, output, steps, force=False):
+        """Build a content pack from a list of (folder, patterns, ignore_patterns, include_api_txt) steps.
+        Returns True if the pack was written, or False if it was already up to date."""
+        entry = self.index.get(name, {})
+        self.prev_files = {elem["file"]: elem for section in entry.get("sections", []) for elem in section}
+        self.scans = {}
+
+        sections = [self.collect_section(*step) for step in steps]
+        config_hash = xxhash.xxh64(json.dumps([output, steps]).encode("utf-8")).hexdigest()
+
+        def get_signature(secs):
+            return [[(elem["file"], elem["size"], elem["hash"]) for elem in sec] for sec in secs]
+
+        up_to_date = (
+            not force
+            and entry.get("config") == config_hash
+            and self.file_exists(output)
+            and os.stat(output).st_size == entry.get("output_size")
+            and os.stat(output).st_mtime_ns == entry.get("output_mtime")
+            and get_signature(sections) == get_signature(entry.get("sections", []))
+        )
+
+        if up_to_date:
+            # Keep the previous offsets, but store the updated mtimes:
+            for sec in sections:
+                for elem in sec:
+                    elem["offset"] = self.prev_files[elem["file"]].get("offset")
+        else:
+            self.make_folder(self.get_parent_folder(output))
+            tmp_file = output + ".tmp"
+            with open(tmp_file, "wb") as out:
+                self.write_sections(out, sections)
+            os.replace(tmp_file, output)
+
+        stat = os.stat(output)
+        self.index[name] = {
+            "config": config_hash,
+            "output_size": stat.st_size,
+            "output_mtime": stat.st_mtime_ns,
+            "sections": sections,
+        }
+        self.save_index()
+        return not up_to_date
@@ -1,13 +1,12 @@
 """Dev utils module."""
 
-import fnmatch
 import logging
 import os
 import re
 
-import numpy as np
-from PIL import Image
-
+from nvp.core.content_packs import ContentPackBuilder
+from nvp.core.folder_compare import FolderComparator, compare_image_files
+from nvp.core.log_files import filter_lines
 from nvp.nvp_component import NVPComponent
 from nvp.nvp_context import NVPContext
 
@@ -42,7 +41,9 @@ class DevUtils(NVPComponent):
             if ref_folder is None:
                 ref_folder = self.get_cwd()
 
-            self.compare_folders(input_folder, ref_folder)
+            self.compare_folders(
+                input_folder, ref_folder, self.get_param("pixel_tolerance", 0), self.get_param("report_file")
+            )
             return True
 
         if cmd == "collect-content":
@@ -57,7 +58,7 @@ class DevUtils(NVPComponent):
 
         if cmd == "build-content-packs":
             pack_name = self.get_param("pack_name")
-            self.build_content_packs(pack_name)
+            self.build_content_packs(pack_name, self.get_param("force", False))
             return True
 
         if cmd == "clean-log":
@@ -67,33 +68,22 @@ class DevUtils(NVPComponent):
 
         return False
 
-    @staticmethod
-    def is_binary_file(filepath):
-        """Return True if the file appears to be binary.
-
-        Reads the first 8 KB and checks for null bytes, which are a reliable
-        indicator of binary content in practice.
-        """
-        try:
-            with open(filepath, "rb") as fh:
-                chunk = fh.read(8192)
-            return b"\x00" in chunk
-        except OSError:
-            return True
-
-    def build_content_packs(self, pack_name=None):
+    def build_content_packs(self, pack_name=None, force=False):
         """Build one or all enabled content packs from the NervHome config.
 
         If pack_name is given, only that pack is processed (regardless of its
         'enabled' flag).  Otherwise every pack whose 'enabled' flag is True is
         processed in the order they appear in the config.
 
-        Each pack drives one or more collect_content calls (one per 'steps'
-        entry).  The first step of each pack always overwrites the output file;
-        subsequent steps append to it automatically.
+        Each pack is made of one section per 'patterns' entry of its 'steps',
+        collected like a collect_content call and written one after the other.
 
         Path placeholders (e.g. ${NVL_DIR}) in 'folder' and 'output' values
         are resolved via self.resolve_path() before use.
+
+        An index of the collected files is kept in build/content_packs_index.json,
+        and a pack is only rewritten if its config or one of its files changed,
+        unless force is True.
         """
         cfg = self.get_packs_config()
         default_output_dir = self.resolve_path(cfg.get("default_output_dir", os.getcwd()))
@@ -106,47 +96,30 @@ class DevUtils(NVPComponent):
         else:
             packs = [p for p in packs if p.get("enabled", True)]
 
+        index_file = cfg.get("index_file", self.get_path(self.ctx.get_root_dir(), "build", "content_packs_index.json"))
+        builder = ContentPackBuilder(self.resolve_path(index_file), cfg.get("max_workers", 8))
+
         for pack in packs:
             name = pack.get("name", "<unnamed>")
             output_dir = self.resolve_path(pack.get("output_dir", default_output_dir))
             output = self.get_path(output_dir, f"{name}.api.txt")
-            steps = pack.get("steps", [])
             include_api_txt = pack.get("include_api_txt", False)
 
-            logger.info("Building content pack '%s' => %s (%d step(s)).", name, output, len(steps))
-
-            first_call = True
-            for step in steps:
+            # patterns may be a single string or a list of strings.
+            # Each entry is collected as a separate section so that the files are
+            # sorted per pattern group.
+            sections = []
+            for step in pack.get("steps", []):
                 folder = self.resolve_path(step.get("folder", os.getcwd()))
-                ignore_patterns = step.get("ignore", None)
-
-                # patterns may be a single string or a list of strings.
-                # Each entry is passed as a separate collect_content call so
-                # that wildcard expansion is scoped to one pattern group at a time.
                 raw = step.get("patterns")
-                pattern_list = raw if isinstance(raw, list) else [raw]
-
-                for patterns in pattern_list:
-                    # First overall call writes fresh; every subsequent one appends.
-                    self.collect_content(folder, patterns, ignore_patterns, output, include_api_txt, not first_call)
-                    first_call = False
-
-            logger.info("Content pack '%s' done.", name)
-
-    @staticmethod
-    def _fnmatch_ex(path, pattern):
-        """fnmatch extended with ** support (matches zero or more path segments)."""
-        if "**" not in pattern:
-            return fnmatch.fnmatch(path, pattern)
-        # Normalise separators
-        path = path.replace("\\", "/")
-        pattern = pattern.replace("\\", "/")
-        # Split on ** and match each segment with fnmatch, allowing ** to span
-        # zero or more '/' separated components.
-        import re as _re
-
-        regex = _re.escape(pattern).replace(r"\*\*", ".*").replace(r"\*", "[^/]*").replace(r"\?", "[^/]")
-        return bool(_re.fullmatch(regex, path))
+                for patterns in raw if isinstance(raw, list) else [raw]:
+                    sections.append((folder, patterns, step.get("ignore", None), include_api_txt))
+
+            logger.info("Building content pack '%s' => %s (%d section(s)).", name, output, len(sections))
+            if builder.build_pack(name, output, sections, force):
+                logger.info("Content pack '%s' done.", name)
+            else:
+                logger.info("Content pack '%s' is up to date.", name)
 
     def collect_content(
         self, folder, patterns=None, ignore_patterns=None, output_file=None, include_api_txt=False, append=False
@@ -172,95 +145,15 @@ class DevUtils(NVPComponent):
         *.api.txt files are always excluded unless include_api_txt is True.
 
         Text files are written in ascending size order (smallest first, largest
-        last), preceded by binary-file header lines.  Each entry reports its
+        last, by path for identical sizes), preceded by binary-file header lines.
+        The file contents are streamed to the output instead of being loaded in memory.  Each entry reports its
         size in bytes and as a percentage of the combined total.
 
         output_file sets the destination file name (default: "content.api.txt").
         When append is True, content is appended instead of overwriting.
         """
-        # --- include filter ---
-        if patterns is not None:
-            glob_patterns = [p.strip() for p in patterns.split(";") if p.strip()]
-            # Optimisation: if none of the patterns contain a wildcard, treat them as
-            # direct file paths and skip the costly recursive directory scan entirely.
-            if not any(c in p for p in glob_patterns for c in ("*", "?", "[")):
-                allfiles = []
-                for p in glob_patterns:
-                    fpath = self.get_path(folder, p)
-                    if self.file_exists(fpath):
-                        allfiles.append(p)
-                    else:
-                        logger.warning("Pattern '%s' does not match any file (resolved to: %s).", p, fpath)
-            else:
-                allfiles = self.get_all_files(folder, recursive=True)
-                allfiles = [f for f in allfiles if any(self._fnmatch_ex(f, p) for p in glob_patterns)]
-        else:
-            # No explicit pattern: collect all files; binary ones become header-only entries.
-            allfiles = self.get_all_files(folder, recursive=True)
-
-        # --- always exclude *.api.txt unless the caller explicitly opts in ---
-        if not include_api_txt:
-            allfiles = [f for f in allfiles if not fnmatch.fnmatch(f, "*.api.txt")]
-
-        # --- always exclude files coming from .git/ or .github/ trees (at any depth) ---
-        allfiles = [
-            f
-            for f in allfiles
-            if not any(
-                fnmatch.fnmatch(f.replace("\\", "/"), p)
-                for p in (".git/*", "*/.git/*", ".github/*", "*/.github/*", "*.private.h")
-            )
-        ]
-
-        # --- exclude filter ---
-        if ignore_patterns is not None:
-            ignore_globs = [p.strip() for p in ignore_patterns.split(";") if p.strip()]
-            allfiles = [f for f in allfiles if not any(fnmatch.fnmatch(f, p) for p in ignore_globs)]
-
-        if not allfiles:
-            logger.info("No files matched the selection criteria.")
-            return
-
-        # Pre-compute file sizes. Empty files are excluded entirely.
-        file_sizes = {f: self.get_file_size(self.get_path(folder, f)) for f in allfiles}
-        allfiles = [f for f in allfiles if file_sizes[f] > 0]
-
-        # Split into text and binary — always, regardless of whether patterns were given.
-        # A glob like "*.h" may still accidentally match binary files (e.g. logo.ico
-        # caught by a broad wildcard), so we never skip the binary check.
-        binary_files = [f for f in allfiles if self.is_binary_file(self.get_path(folder, f))]
-        binary_set = set(binary_files)
-        text_files = [f for f in allfiles if f not in binary_set]
-
-        # Percentages are computed relative to text content only — binary files are
-        # listed for reference but their size does not count towards the total.
-        total_size = sum(file_sizes[f] for f in text_files)
-
-        contents = []
-
-        # Binary file headers first, sorted by size ascending.
-        for f in sorted(binary_files, key=lambda f: file_sizes[f]):
-            size = file_sizes[f]
-            logger.info("Skipping binary file %s (%d bytes)", f, size)
-            contents.append(f"// File: {f} ({size} bytes, binary)")
-
-        # Text file contents, sorted by size ascending (smallest first, largest last).
-        for f in sorted(text_files, key=lambda f: file_sizes[f]):
-            size = file_sizes[f]
-            pct = (size / total_size * 100.0) if total_size > 0 else 0.0
-            logger.info("Reading file %s (%d bytes, %.1f%%)", f, size, pct)
-            contents.append(f"// File: {f} ({size} bytes, {pct:.1f}% of total):\n")
-            contents.append(self.read_text_file(self.get_path(folder, f)))
-
-        logger.info(
-            "Collected %d text files and %d binary files, total size: %d bytes.",
-            len(text_files),
-            len(binary_files),
-            total_size,
-        )
-        dest = output_file or "content.api.txt"
-        self.write_text_file("\n".join(contents), dest, mode="a" if append else "w")
-        logger.info("%s content to %s.", "Appended" if append else "Written", dest)
+        builder = ContentPackBuilder()
+        builder.collect(folder, patterns, ignore_patterns, output_file, include_api_txt, append)
 
     def clean_log_file(self, input_file):
         """Clean a log file by removing [Debug 2] to [Debug 5] lines.
@@ -268,96 +161,70 @@ class DevUtils(NVPComponent):
         Writes the result to <basename>.cleaned.log next to the input file,
         preserving original line endings.
         """
-        content = self.read_text_file(input_file)
-        lines = content.splitlines(keepends=True)
-
-        pat = re.compile(r"\[Debug [2-5]\]")
-        cleaned_lines = [line for line in lines if not pat.search(line)]
-
-        removed = len(lines) - len(cleaned_lines)
-        logger.info("Removed %d debug lines out of %d total.", removed, len(lines))
-
         base = self.set_path_extension(input_file, "")
         output_file = base + ".cleaned.log"
-        self.write_text_file("".join(cleaned_lines), output_file)
+
+        # The file is filtered line by line, so that large logs are not loaded in memory:
+        pat = re.compile(rb"\[Debug [2-5]\]")
+        num_kept, num_lines = filter_lines(input_file, output_file, lambda line: pat.search(line) is None)
+
+        logger.info("Removed %d debug lines out of %d total.", num_lines - num_kept, num_lines)
         logger.info("Cleaned log written to %s", output_file)
 
     def compare_images(self, image1_path, image2_path, tolerance=0.05):
         """Compare 2 images with a given tolerance threshold."""
-        # Open images
-        img1 = Image.open(image1_path)
-        img2 = Image.open(image2_path)
-
-        # Ensure images are the same size
-        if img1.size != img2.size:
-            return False
-
-        # Ensure images are in the same mode (RGB, RGBA, etc.)
-        if img1.mode != img2.mode:
-            return False
-
-        # Convert images to numpy arrays (as float to avoid overflow)
-        arr1 = np.array(img1, dtype=np.float32)
-        arr2 = np.array(img2, dtype=np.float32)
+        return compare_image_files(image1_path, image2_path, tolerance)["similar"]
 
-        # Calculate the difference
-        diff = np.abs(arr1 - arr2)
+    def compare_folders(self, input_folder, ref_folder, pixel_tolerance=0, report_file=None):
+        """Compare 2 folders.
 
-        # Calculate the maximum possible difference (account for all channels)
-        max_diff = 255.0 * np.prod(arr1.shape)
-
-        # Calculate the actual difference percentage
-        diff_percentage = np.sum(diff) / max_diff
-
-        # Compare with tolerance
-        return diff_percentage <= tolerance
-
-    def compare_folders(self, input_folder, ref_folder):
-        """Compare 2 folders."""
+        The folders are compared with manifests of the files size, mtime and hash
+        (cached in build/folder_manifests), and the modified png files are compared
+        pixel by pixel, ignoring the channel differences below pixel_tolerance.
+        """
 
         if input_folder == ref_folder:
             logger.info("Folders are the same, nothing to compare.")
             return
 
-        # Get all input files:
-        cur_files = self.get_all_files(input_folder, recursive=True)
-
-        # Get all ref files:
-        ref_files = self.get_all_files(ref_folder, recursive=True)
+        cache_dir = self.get_path(self.ctx.get_root_dir(), "build", "folder_manifests")
+        comparator = FolderComparator(cache_dir, self.config.get("compare_max_workers", 8))
+        report = comparator.compare(input_folder, ref_folder, 0.0005, pixel_tolerance)
+
+        for cfile in report["added"]:
+            logger.info("File %s was added.", cfile)
+        for rfile in report["removed"]:
+            logger.info("File %s was removed.", rfile)
+        for rfile in report["changed"]:
+            res = report["images"].get(rfile, None)
+            if res is not None and "mean_diff" in res:
+                logger.info(
+                    "Image %s changed: mean diff %.5f, %d/%d pixels differ",
+                    rfile,
+                    res["mean_diff"],
+                    res["num_diff_pixels"],
+                    res["num_pixels"],
+                )
+            else:
+                logger.info("File %s changed.", rfile)
 
-        diffs = 0
+        logger.info(
+            "Compared %d files: %d added, %d removed, %d changed, %d similar images.",
+            report["num_ref_files"],
+            len(report["added"]),
+            len(report["removed"]),
+            len(report["changed"]),
+            len(report["similar_images"]),
+        )
 
-        # Check for new files (present in input but not in ref):
-        for cfile in cur_files:
-            if cfile not in ref_files:
-                logger.info("File %s was added.", cfile)
-                diffs += 1
+        if report_file is not None:
+            self.write_json(report, report_file)
+            logger.info("Comparison report written to %s", report_file)
 
-        # Iterate on all the ref files:
-        for rfile in ref_files:
-            if rfile not in cur_files:
-                logger.info("File %s was removed.", rfile)
-                diffs += 1
-            else:
-                # Compare the file sizes:
-                cur_path = self.get_path(input_folder, rfile)
-                ref_path = self.get_path(ref_folder, rfile)
-                cur_size = self.get_file_size(cur_path)
-                ref_size = self.get_file_size(ref_path)
-
-                if cur_size != ref_size:
-                    are_similar = False
-                    if self.get_path_extension(rfile).lower() == ".png":
-                        are_similar = self.compare_images(cur_path, ref_path, 0.0005)
-
-                    if not are_similar:
-                        logger.info("File %s size changed: %d => %d", rfile, ref_size, cur_size)
-                        diffs += 1
-
-        if diffs == 0:
+        if report["num_diffs"] == 0:
             logger.info("Folders are identical.")
         else:
-            logger.info("Found %d diffs between folders.", diffs)
+            logger.info("Found %d diffs between folders.", report["num_diffs"])
 
 
 if __name__ == "__main__":
@@ -370,6 +237,10 @@ if __name__ == "__main__":
     psr = context.build_parser("compare-folders")
     psr.add_str("-i", "--input", dest="input_folder")("Input folder to process")
     psr.add_str("-r", "--ref", dest="ref_folder")("Ref folder to process")
+    psr.add_int("-t", "--pixel-tolerance", dest="pixel_tolerance", default=0)(
+        "Per channel difference ignored when comparing images"
+    )
+    psr.add_str("-o", "--report", dest="report_file")("Write the comparison report to this json file")
 
     psr = context.build_parser("collect-content")
     psr.add_str("-i", "--input", dest="input_folder", nargs="?", default=None)(
@@ -397,6 +268,7 @@ if __name__ == "__main__":
     psr.add_str("pack_name", nargs="?", default=None)(
         "Name of the content pack to build. When omitted, all enabled packs are built."
     )
+    psr.add_flag("-f", "--force", dest="force")("Rebuild the packs even if they are up to date.")
 
     psr = context.build_parser("clean-log")
     psr.add_str("input_file")("Log file to clean")
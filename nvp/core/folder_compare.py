@@ -0,0 +1,198 @@
+"""Manifest based folder and image comparison used by the DevUtils component"""
+
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import xxhash
+
+from nvp.nvp_object import NVPObject
+
+try:
+    from PIL import Image
+except ModuleNotFoundError:
+    # Only needed for the image comparisons:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+
+def compare_image_files(image1_path, image2_path, tolerance=0.05, pixel_tolerance=0):
+    """Compare 2 images, returning a dict with the similarity result and the diff statistics.
+    The images are similar if the mean absolute difference (relative to 255) is below tolerance,
+    ignoring the per channel differences smaller or equal to pixel_tolerance."""
+    with Image.open(image1_path) as img1, Image.open(image2_path) as img2:
+        if img1.size != img2.size or img1.mode != img2.mode:
+            return {"similar": False, "reason": "size or mode mismatch"}
+
+        # Note: int32 is required to hold the differences of 16-bit images:
+        arr1 = np.asarray(img1, dtype=np.int32)
+        arr2 = np.asarray(img2, dtype=np.int32)
+
+    diff = np.abs(arr1 - arr2)
+    if pixel_tolerance > 0:
+        diff[diff <= pixel_tolerance] = 0
+
+    pixel_diff = diff if diff.ndim == 2 else diff.max(axis=2)
+    mean_diff = float(diff.sum(dtype=np.float64) / (255.0 * diff.size)) if diff.size > 0 else 0.0
+    return {
+        "similar": mean_diff <= tolerance,
+        "mean_diff": mean_diff,
+        "max_diff": int(diff.max()) if diff.size > 0 else 0,
+        "num_diff_pixels": int(np.count_nonzero(pixel_diff)),
+        "num_pixels": int(pixel_diff.size),
+    }
+
+
+def compare_image_pair(args):
+    """Worker function comparing a pair of images"""
+    try:
+        return compare_image_files(*args)
+    except (OSError, ValueError) as err:
+        return {"similar": False, "reason": str(err)}
+
+
+class FolderComparator(NVPObject):
+    """Compare folders using manifests of the files size, mtime and xxh3 hash.
+    The manifests are cached between runs, so only the files with a modified size or mtime are hashed again,
+    and only the modified images are loaded for a pixel comparison."""
+
+    def __init__(self, cache_dir=None, max_workers=8, image_exts=(".png",)):
+        """Constructor"""
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.image_exts = image_exts
+
+    def get_manifest_file(self, folder):
+        """Retrieve the cache file for the manifest of a given folder"""
+        if self.cache_dir is None:
+            return None
+        key = xxhash.xxh64(os.path.abspath(folder).encode("utf-8")).hexdigest()
+        return self.get_path(self.cache_dir, f"manifest_{key}.json")
+
+    def scan_dir(self, folder, prefix):
+        """Recursively list the files in a folder as (relpath, size, mtime_ns) tuples"""
+        res = []
+        stack = [(folder, prefix)]
+        while len(stack) > 0:
+            cur_dir, cur_prefix = stack.pop()
+            with os.scandir(cur_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, cur_prefix + entry.name + "/"))
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        res.append((cur_prefix + entry.name, stat.st_size, stat.st_mtime_ns))
+        return res
+
+    def scan_folder(self, folder):
+        """List all the files in a folder, scanning the top level sub folders in parallel"""
+        files = []
+        sub_dirs = []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    sub_dirs.append(entry)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for res in executor.map(lambda entry: self.scan_dir(entry.path, entry.name + "/"), sub_dirs):
+                files += res
+
+        return files
+
+    def hash_file(self, fpath):
+        """Compute the xxh3 hash of a file"""
+        hasher = xxhash.xxh3_64()
+        with open(fpath, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def build_manifest(self, folder):
+        """Build the manifest of a folder as a dict of relpath -> [size, mtime_ns, hash],
+        reusing the cached hashes of the files with an unchanged size and mtime"""
+        cache_file = self.get_manifest_file(folder)
+        prev = {}
+        if cache_file is not None and self.file_exists(cache_file):
+            with open(cache_file, "r", encoding="utf-8") as file:
+                prev = json.load(file)
+
+        manifest = {}
+        to_hash = []
+        for relpath, size, mtime in self.scan_folder(folder):
+            entry = prev.get(relpath, None)
+            if entry is not None and entry[0] == size and entry[1] == mtime:
+                manifest[relpath] = entry
+            else:
+                manifest[relpath] = [size, mtime, None]
+                to_hash.append(relpath)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            hashes = executor.map(lambda relpath: self.hash_file(self.get_path(folder, relpath)), to_hash)
+            for relpath, fhash in zip(to_hash, hashes):
+                manifest[relpath][2] = fhash
+
+        logger.debug("Hashed %d/%d files in %s", len(to_hash), len(manifest), folder)
+
+        if cache_file is not None and (len(to_hash) > 0 or len(prev) != len(manifest)):
+            self.make_folder(self.cache_dir)
+            tmp_file = cache_file + ".tmp"
+            with open(tmp_file, "w", encoding="utf-8") as file:
+                json.dump(manifest, file)
+            os.replace(tmp_file, cache_file)
+
+        return manifest
+
+    def diff_manifests(self, cur, ref):
+        """Diff 2 manifests, returning the (added, removed, modified) lists of files"""
+        added = sorted(relpath for relpath in cur if relpath not in ref)
+        removed = sorted(relpath for relpath in ref if relpath not in cur)
+        modified = sorted(
+            relpath
+            for relpath, entry in ref.items()
+            if relpath in cur and (cur[relpath][0] != entry[0] or cur[relpath][2] != entry[2])
+        )
+        return added, removed, modified
+
+    def compare_images(self, pairs, tolerance=0.0005, pixel_tolerance=0):
+        """Compare a list of (image1, image2) pairs in a worker pool"""
+        if len(pairs) == 0:
+            return []
+
+        self.check(Image is not None, "PIL is required to compare images.")
+        args = [(img1, img2, tolerance, pixel_tolerance) for img1, img2 in pairs]
+        if len(pairs) == 1:
+            return [compare_image_pair(args[0])]
+
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, len(pairs))) as executor:
+            return list(executor.map(compare_image_pair, args))
+
+    def compare(self, input_folder, ref_folder, tolerance=0.0005, pixel_tolerance=0):
+        """Compare 2 folders and return a summary report"""
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            cur, ref = executor.map(self.build_manifest, [input_folder, ref_folder])
+
+        added, removed, modified = self.diff_manifests(cur, ref)
+
+        images = [relpath for relpath in modified if self.get_path_extension(relpath).lower() in self.image_exts]
+        pairs = [(self.get_path(input_folder, relpath), self.get_path(ref_folder, relpath)) for relpath in images]
+        results = dict(zip(images, self.compare_images(pairs, tolerance, pixel_tolerance)))
+
+        similar = [relpath for relpath in images if results[relpath]["similar"]]
+        changed = [relpath for relpath in modified if relpath not in similar]
+
+        return {
+            "num_files": len(cur),
+            "num_ref_files": len(ref),
+            "added": added,
+            "removed": removed,
+            "changed": changed,
+            "similar_images": similar,
+            "images": results,
+            "num_diffs": len(added) + len(removed) + len(changed),
+        }
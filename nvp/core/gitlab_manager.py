@@ -2,11 +2,11 @@
 
 import json
 import re
-import time
 from datetime import datetime
 
-import requests
-
+from nvp.core.gitlab_sync import GitlabSyncEngine
+from nvp.core.http_client import get_http_client
+from nvp.core.package_uploader import PackageUploader
 from nvp.nvp_component import NVPComponent
 from nvp.nvp_context import NVPContext
 
@@ -43,6 +43,8 @@ class GitlabManager(NVPComponent):
         self.project_descs = self.load_config_entry("projects")
         # self.info("Gitlab project descs: %s", self.project_descs)
 
+        self.sync_engine = None
+
     def send_request(self, req_type, url, data=None, max_retries=5, auth=True):
         """Method used to send a generic request to the server."""
 
@@ -54,42 +56,33 @@ class GitlabManager(NVPComponent):
             assert self.access_token is not None, "Invalid access token."
             headers["PRIVATE-TOKEN"] = self.access_token
 
-        try_count = 0
-        while max_retries <= 0 or try_count < max_retries:
-            try:
-                if req_type == "GET":
-                    response = requests.request(
-                        req_type, self.base_url + url, params=data, headers=headers, timeout=4.0
-                    )
-                    res = json.loads(response.text)
-                elif req_type == "DELETE":
-                    response = requests.request(req_type, self.base_url + url, headers=headers, timeout=4.0)
-                    res = response.text
-                else:
-                    payload = json.dumps(data)
-                    response = requests.request(
-                        req_type, self.base_url + url, data=payload, headers=headers, timeout=4.0
-                    )
-                    res = json.loads(response.text)
-
-                if not response.ok:
-                    # This is an error:
-                    self.error("Error detected: %s", res)
-                    return None
-
-                return res
-            except requests.exceptions.RequestException as err:
-                self.error("Request exception detected: %s", str(err))
-            # except Exception as err:
-            #     self.error('No response from URL: %s', str(err))
-
-            # wait 1 seconds:
-            time.sleep(2)
-
-            # Increment the try count:
-            try_count += 1
-
-        return None
+        # Note: the retries on network errors are handled by the shared http client:
+        http = get_http_client()
+        full_url = self.base_url + url
+        if req_type == "GET":
+            response = http.request(
+                req_type, full_url, params=data, headers=headers, timeout=4.0, max_retries=max_retries
+            )
+        elif req_type == "DELETE":
+            response = http.request(req_type, full_url, headers=headers, timeout=4.0, max_retries=max_retries)
+        else:
+            payload = json.dumps(data)
+            response = http.request(
+                req_type, full_url, data=payload, headers=headers, timeout=4.0, max_retries=max_retries
+            )
+
+        if response is None:
+            self.error("No response received for %s request to %s", req_type, full_url)
+            return None
+
+        res = response.text if req_type == "DELETE" else json.loads(response.text)
+
+        if not response.ok:
+            # This is an error:
+            self.error("Error detected: %s", res)
+            return None
+
+        return res
 
     def get(self, url, data=None, max_retries=5, auth=True):
         """Send a get request"""
@@ -148,9 +141,10 @@ class GitlabManager(NVPComponent):
         if cmd == "package.upload":
             package_name = self.get_param("package_name")
             package_version = self.get_param("package_version")
-            file_name = self.get_param("file_name")
+            files = [(fname, fname) for fname in self.get_param("file_names")]
             pname = self.get_param("project_name", None)
-            self.upload_package(pname, package_name, package_version, file_name, file_name)
+            max_workers = self.get_param("max_workers")
+            self.upload_packages(pname, package_name, package_version, files, max_workers, self.get_param("force"))
             return True
 
         if cmd == "package.list":
@@ -483,7 +477,36 @@ class GitlabManager(NVPComponent):
         res = self.delete(url)
         return res
 
-    def upload_package(self, proj_name, package_name, package_version, file_name, source_file):
+    def resolve_project_name(self, proj_name):
+        """Resolve the project name from the current folder if needed"""
+        if proj_name is None:
+            proj = self.ctx.get_current_project(True)
+            if proj is None:
+                self.error("Cannot resolved git project from folder %s", self.get_cwd())
+                return None
+
+            proj_name = proj.get_name()
+            self.info("Resolved project: %s", proj_name)
+
+        return proj_name
+
+    def get_package_uploader(self, proj_name):
+        """Retrieve a package uploader and the project id for a given project"""
+        self.check(proj_name in self.project_descs, "Cannot upload package for %s", proj_name)
+
+        pdesc = self.project_descs[proj_name]
+        self.setup_token(pdesc["server"], pdesc["url"])
+        pid = self.get_project_id_from_name(pdesc["url"])
+
+        uploader = PackageUploader(
+            self.base_url,
+            self.access_token,
+            max_retries=self.config.get("upload_max_retries", 3),
+            report_interval=self.config.get("upload_report_interval", 5.0),
+        )
+        return uploader, pid
+
+    def upload_package(self, proj_name, package_name, package_version, file_name, source_file, force=False):
         """Upload a package file to GitLab's generic package registry.
 
         Args:
@@ -492,107 +515,87 @@ class GitlabManager(NVPComponent):
             package_version (str): Version of the package
             file_name (str): Name of the file as it will appear in the registry
             source_file (str): Path to the local file to upload
+            force (bool): Upload the file even if an identical file is already available
 
         Returns:
             dict: Response from GitLab API if successful, None if failed
         """
+        res = self.upload_packages(proj_name, package_name, package_version, [(file_name, source_file)], 1, force)
+        return res[0] if res is not None else None
+
+    def upload_packages(self, proj_name, package_name, package_version, files, max_workers=4, force=False):
+        """Upload multiple files to GitLab's generic package registry in parallel.
+        files is a list of (file_name, source_file) tuples.
+        Returns the list of responses (None for the failed uploads), or None if the inputs are invalid."""
+        proj_name = self.resolve_project_name(proj_name)
         if proj_name is None:
-            # Get the project name from current folder:
-            proj = self.ctx.get_current_project(True)
-            if proj is None:
-                self.error("Cannot resolved git project from folder %s", self.get_cwd())
-                return
-
-            proj_name = proj.get_name()
-            self.info("Resolved project: %s", proj_name)
-
-        self.check(proj_name in self.project_descs, "Cannot upload package for %s", proj_name)
-
-        pdesc = self.project_descs[proj_name]
-        self.setup_token(pdesc["server"], pdesc["url"])
+            return None
 
         # Validate inputs
         assert package_name is not None, "Package name is mandatory"
         assert package_version is not None, "Package version is mandatory"
-        assert file_name is not None, "File name is mandatory"
-        assert source_file is not None, "Source file path is mandatory"
-
-        # Check if source file exists
-        if not self.file_exists(source_file):
-            self.error("Source file does not exist: %s", source_file)
-            return None
 
-        # URL encode the file name to handle special characters
-        encoded_file_name = file_name.replace("\\", "/")
-        # encoded_file_name = self.url_encode_path(encoded_file_name)
-        # self.info("Encoded filename is: %s", encoded_file_name)
+        entries = []
+        for file_name, source_file in files:
+            assert file_name is not None, "File name is mandatory"
+            assert source_file is not None, "Source file path is mandatory"
 
-        # Construct the API URL
-        pid = self.get_project_id_from_name(pdesc["url"])
-        # url = f"/projects/{self.proj_id}/packages/generic/{package_name}/{package_version}/{encoded_file_name}"
-        url = f"/projects/{pid}/packages/generic/{package_name}/{package_version}/{encoded_file_name}"
-        # url = f"/projects/{pdesc['url']}/packages/generic/{package_name}/{package_version}/{encoded_file_name}"
-
-        # self.info("Using url: '%s'", url)
-        ext = self.get_path_extension(file_name)
-        is_text = ext in [".txt", ".log"]
-
-        try:
-            # Prepare headers
-            headers = {
-                "PRIVATE-TOKEN": self.access_token,
-                "cache-control": "no-cache",
-                # "content-type": "text/plain" if is_text else "application/octet-stream",
-                # "content-type": "text/plain" if is_text else "application/zip",
-                "content-type": "application/octet-stream",
-                # "content-type": "application/zip",
-            }
-
-            # Open and upload the file
-            with open(source_file, "rb") as file_data:
-                response = requests.put(
-                    self.base_url + url,
-                    headers=headers,
-                    data=file_data,
-                    timeout=600.0 * 3,  # Longer timeout for file uploads: 30mins
-                )
-
-            if response.status_code == 201:
-                self.info("Successfully uploaded package file: %s/%s/%s", package_name, package_version, file_name)
-
-                # Try to parse JSON response, but handle cases where it might not be JSON
-                try:
-                    return response.json()
-                except json.JSONDecodeError:
-                    # Return a simple success indicator if response isn't JSON
-                    return {"status": "success", "status_code": 201}
-            else:
-                # Handle error responses
-                try:
-                    error_data = response.json()
-                    self.error("Failed to upload package file. Status: %d, Error: %s", response.status_code, error_data)
-                except json.JSONDecodeError:
-                    self.error(
-                        "Failed to upload package file. Status: %d, Response: %s", response.status_code, response.text
-                    )
+            # Check if source file exists
+            if not self.file_exists(source_file):
+                self.error("Source file does not exist: %s", source_file)
                 return None
 
-        except requests.exceptions.RequestException as err:
-            self.error("Request exception during package upload: %s", str(err))
-            return None
-        except IOError as err:
-            self.error("File I/O error during package upload: %s", str(err))
-            return None
-        except Exception as err:
-            self.error("Unexpected error during package upload: %s", str(err))
+            entries.append((file_name.replace("\\", "/"), source_file))
+
+        uploader, pid = self.get_package_uploader(proj_name)
+        if pid is None:
             return None
 
+        return uploader.upload_files(pid, package_name, package_version, entries, max_workers, force)
+
+    def get_sync_engine(self):
+        """Retrieve the engine used to synchronize multiple projects concurrently"""
+        if self.sync_engine is None:
+            cache_file = self.get_path(self.ctx.get_root_dir(), "build", "gitlab_project_ids.json")
+            self.sync_engine = GitlabSyncEngine(
+                self.tokens,
+                cache_file,
+                max_workers=self.config.get("sync_max_workers", 8),
+                max_rate=self.config.get("sync_max_rate", 20.0),
+            )
+        return self.sync_engine
+
+    def get_target_labels(self, pdesc):
+        """Retrieve the labels that should be defined in a given project"""
+        tgt_labels = {}
+        for lset_name in pdesc["labels"]:
+            # Get the label set:
+            lset = self.label_sets[lset_name]
+            for lname, desc in lset.items():
+                data = {
+                    "color": desc[0],
+                    "description": desc[1],
+                    "priority": desc[2] if len(desc) >= 3 else None,
+                }
+                tgt_labels[lname] = data
+
+        return tgt_labels
+
+    def get_target_milestones(self, pdesc):
+        """Retrieve the (titles, previous title) of the default milestones of a given project"""
+        mids = self.get_milestone_ids()
+        fmt = pdesc.get("milestone_format", "v%d.%d")
+        titles = [fmt % ids for ids in mids.values()]
+        return titles, fmt % mids["prev"]
+
     def update_labels(self, pname=None):
         """Update all the project labels."""
         if pname == "all":
-            # Iterate on each project in this case:
-            for pname in self.project_descs:
-                self.update_labels(pname)
+            # Synchronize all the projects concurrently in this case:
+            targets = {pname: self.get_target_labels(pdesc) for pname, pdesc in self.project_descs.items()}
+            engine = self.get_sync_engine()
+            engine.sync(self.project_descs, label_targets=targets)
+            self.check(len(engine.failures) == 0, "%d label sync operations failed.", len(engine.failures))
             return
 
         if pname is None:
@@ -615,26 +618,16 @@ class GitlabManager(NVPComponent):
         labels = self.list_labels(pname)
 
         # Get the set of labels to use for this project:
-        tgt_labels = {}
-        for lset_name in pdesc["labels"]:
-            # Get the label set:
-            lset = self.label_sets[lset_name]
-            for lname, desc in lset.items():
-                data = {
-                    "color": desc[0],
-                    "description": desc[1],
-                    "priority": desc[2] if len(desc) >= 3 else None,
-                }
-                tgt_labels[lname] = data
+        tgt_labels = self.get_target_labels(pdesc)
 
         # Iterate on those labels:
         for lname, desc in tgt_labels.items():
             if lname not in labels:
                 self.info("Adding label %s to %s...", lname, pname)
-                self.add_label(lname, desc["color"], desc["description"])
+                self.add_label(lname, desc["color"], desc["description"], desc["priority"])
             elif labels[lname] != desc:
                 self.info("Updating label %s in %s...", lname, pname)
-                self.add_label(lname, desc["color"], desc["description"], update=True)
+                self.add_label(lname, desc["color"], desc["description"], desc["priority"], update=True)
 
     def get_milestone_ids(self):
         """Retrieve the milestone ids."""
@@ -669,9 +662,15 @@ class GitlabManager(NVPComponent):
     def update_milestones(self, pname=None):
         """Update the project default milestones."""
         if pname == "all":
-            # Iterate on each project in this case:
-            for pname in self.project_descs:
-                self.update_milestones(pname)
+            # Synchronize all the projects concurrently in this case:
+            targets = {}
+            for pname, pdesc in self.project_descs.items():
+                if pdesc.get("update_milestones", True) is True:
+                    targets[pname] = self.get_target_milestones(pdesc)
+            pdescs = {pname: self.project_descs[pname] for pname in targets}
+            engine = self.get_sync_engine()
+            engine.sync(pdescs, milestone_targets=targets)
+            self.check(len(engine.failures) == 0, "%d milestone sync operations failed.", len(engine.failures))
             return
 
         if pname is None:
@@ -867,7 +866,9 @@ if __name__ == "__main__":
     psr.add_str("-p", "--project", dest="project_name")("Project name")
     psr.add_str("package_name")("Package name")
     psr.add_str("package_version")("Package version")
-    psr.add_str("file_name")("File name")
+    psr.add_str("file_names", nargs="+")("File names")
+    psr.add_int("-j", "--jobs", dest="max_workers", default=4)("Number of parallel uploads")
+    psr.add_flag("-f", "--force", dest="force")("Upload the files even if they are already in the registry")
 
     psr = context.build_parser("package.list")
     psr.add_str("project_name")("Project name")
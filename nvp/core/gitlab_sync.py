@@ -0,0 +1,250 @@
+"""Concurrent label and milestone synchronization engine for gitlab projects"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from nvp.core.http_client import get_http_client
+from nvp.nvp_object import NVPCheckError, NVPObject
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Simple rate limiter spacing the requests sent from multiple threads"""
+
+    def __init__(self, max_rate):
+        """Constructor, max_rate is the max number of requests per second (0 to disable)"""
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until we are allowed to send a new request"""
+        if self.interval <= 0.0:
+            return
+
+        with self.lock:
+            now = time.time()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+
+        if wait_time > 0.0:
+            time.sleep(wait_time)
+
+
+class GitlabSyncEngine(NVPObject):
+    """Synchronize the labels and milestones of multiple gitlab projects.
+    The project ids are cached on disk, the current states are fetched concurrently
+    and the mutations computed from a global diff are applied with bounded parallelism.
+    A failed request doesn't stop the synchronization: the failures are collected
+    and reported at the end of sync()."""
+
+    def __init__(self, tokens, cache_file, max_workers=8, max_rate=20.0, api_url="https://{server}/api/v4"):
+        """Constructor"""
+        self.tokens = tokens
+        self.cache_file = cache_file
+        self.max_workers = max_workers
+        self.api_url = api_url
+        self.limiter = RateLimiter(max_rate)
+        self.project_ids = None
+        self.lock = threading.Lock()
+        # List of (item description, error message) for the failed operations of the last sync:
+        self.failures = []
+
+    def send(self, server, method, path, params=None, data=None, with_headers=False):
+        """Send a request to a gitlab server, returning the decoded json content"""
+        self.limiter.acquire()
+        headers = {"content-type": "application/json", "PRIVATE-TOKEN": self.tokens[server]}
+        url = self.api_url.format(server=server) + path
+        payload = json.dumps(data) if data is not None else None
+        resp = get_http_client().request(method, url, params=params, data=payload, headers=headers, timeout=10.0)
+
+        if resp is None or not resp.ok:
+            self.throw("Gitlab %s request to %s failed: %s", method, url, resp.text if resp is not None else "None")
+
+        res = resp.json() if resp.content else None
+        return (res, resp.headers) if with_headers else res
+
+    def get_all_pages(self, server, path, params=None):
+        """Retrieve all the elements from a paginated gitlab API endpoint"""
+        params = dict(params or {})
+        params["per_page"] = 100
+        page = "1"
+        result = []
+        while page:
+            params["page"] = page
+            res, headers = self.send(server, "GET", path, params, with_headers=True)
+            result += res
+            page = headers.get("X-Next-Page", "")
+        return result
+
+    def run_tasks(self, func, items, describe):
+        """Run a function on a list of items concurrently, collecting the failures instead of stopping.
+        Returns the list of results, with None for the failed items."""
+
+        def run(item):
+            try:
+                return func(item)
+            except NVPCheckError as err:
+                with self.lock:
+                    self.failures.append((describe(item), str(err)))
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(run, items))
+
+    def load_project_ids(self):
+        """Load the cached project ids"""
+        if self.project_ids is None:
+            self.project_ids = {}
+            if self.file_exists(self.cache_file):
+                self.project_ids = self.read_json(self.cache_file)
+
+    def resolve_project_ids(self, pdescs):
+        """Resolve the ids of the given projects, using the disk cache when possible"""
+        self.load_project_ids()
+        missing = [desc for desc in pdescs.values() if f"{desc['server']}|{desc['url']}" not in self.project_ids]
+
+        def resolve(desc):
+            res = self.send(desc["server"], "GET", f"/projects/{self.url_encode_path(desc['url'])}")
+            with self.lock:
+                self.project_ids[f"{desc['server']}|{desc['url']}"] = res["id"]
+
+        if len(missing) > 0:
+            logger.info("Resolving %d project ids...", len(missing))
+            self.run_tasks(resolve, missing, lambda desc: f"resolve project {desc['url']}")
+            self.make_folder(self.get_parent_folder(self.cache_file))
+            self.write_json(self.project_ids, self.cache_file)
+
+        # The projects that could not be resolved are skipped:
+        pids = {}
+        for pname, desc in pdescs.items():
+            key = f"{desc['server']}|{desc['url']}"
+            if key in self.project_ids:
+                pids[pname] = self.project_ids[key]
+        return pids
+
+    def fetch_states(self, pdescs, pids, with_labels, with_milestones):
+        """Fetch the current labels and milestones of all the projects concurrently"""
+        tasks = []
+        for pname, desc in pdescs.items():
+            if pname not in pids:
+                continue
+            if with_labels:
+                tasks.append((pname, "labels", desc["server"], f"/projects/{pids[pname]}/labels"))
+            if with_milestones:
+                tasks.append((pname, "milestones", desc["server"], f"/projects/{pids[pname]}/milestones"))
+
+        results = self.run_tasks(
+            lambda task: self.get_all_pages(task[2], task[3]), tasks, lambda task: f"fetch {task[1]} of {task[0]}"
+        )
+
+        # The states that could not be fetched are left out:
+        states = {pname: {} for pname in pdescs}
+        for task, res in zip(tasks, results):
+            if res is not None:
+                states[task[0]][task[1]] = res
+        return states
+
+    def diff_labels(self, pname, pid, server, cur_labels, tgt_labels):
+        """Compute the mutations needed to update the labels of a project"""
+        labels = {}
+        for lbl in cur_labels:
+            labels[lbl["name"]] = {
+                "color": lbl["color"],
+                "description": lbl["description"],
+                "priority": int(lbl["priority"]) if lbl["priority"] is not None else None,
+            }
+
+        mutations = []
+        for lname, desc in tgt_labels.items():
+            # Note: the priority is also sent, otherwise a label with another priority would be updated on each sync:
+            data = {key: val for key, val in desc.items() if val is not None}
+            if lname not in labels:
+                data["name"] = lname
+                path = f"/projects/{pid}/labels"
+                mutations.append({"project": pname, "server": server, "method": "POST", "path": path, "data": data})
+            elif labels[lname] != desc:
+                path = f"/projects/{pid}/labels/{self.url_encode_path(lname)}"
+                mutations.append({"project": pname, "server": server, "method": "PUT", "path": path, "data": data})
+
+        return mutations
+
+    def diff_milestones(self, pname, pid, server, cur_milestones, titles, prev_title):
+        """Compute the mutations needed to create the given milestones and close the previous one"""
+        mstones = {mst["title"]: mst for mst in cur_milestones}
+        path = f"/projects/{pid}/milestones"
+
+        mutations = []
+        for title in titles:
+            if title not in mstones:
+                mut = {"project": pname, "server": server, "method": "POST", "path": path, "data": {"title": title}}
+                # The previous milestone should be closed just after its creation:
+                mut["close_after"] = title == prev_title
+                mutations.append(mut)
+            elif title == prev_title and mstones[title]["state"] == "active":
+                mid = mstones[title]["id"]
+                data = {"state_event": "close"}
+                mutations.append(
+                    {"project": pname, "server": server, "method": "PUT", "path": f"{path}/{mid}", "data": data}
+                )
+
+        return mutations
+
+    def apply_mutation(self, mut):
+        """Apply a single mutation"""
+        logger.info("%s %s (%s): %s", mut["method"], mut["path"], mut["project"], mut["data"])
+        res = self.send(mut["server"], mut["method"], mut["path"], data=mut["data"])
+        if mut.get("close_after", False):
+            self.send(mut["server"], "PUT", f"{mut['path']}/{res['id']}", data={"state_event": "close"})
+        return res
+
+    def sync(self, pdescs, label_targets=None, milestone_targets=None):
+        """Synchronize the projects.
+        label_targets: dict of project name -> dict of target labels {name: {color, description, priority}}
+        milestone_targets: dict of project name -> (list of milestone titles, title of the milestone to close)
+        Returns the list of successfully applied mutations, the failed operations are stored in self.failures."""
+        label_targets = label_targets or {}
+        milestone_targets = milestone_targets or {}
+        self.failures = []
+
+        start_time = time.time()
+        pids = self.resolve_project_ids(pdescs)
+        states = self.fetch_states(pdescs, pids, len(label_targets) > 0, len(milestone_targets) > 0)
+        fetch_time = time.time() - start_time
+
+        mutations = []
+        for pname, desc in pdescs.items():
+            state = states[pname]
+            if pname in label_targets and "labels" in state:
+                mutations += self.diff_labels(pname, pids[pname], desc["server"], state["labels"], label_targets[pname])
+            if pname in milestone_targets and "milestones" in state:
+                titles, prev_title = milestone_targets[pname]
+                mutations += self.diff_milestones(
+                    pname, pids[pname], desc["server"], state["milestones"], titles, prev_title
+                )
+
+        def apply(mut):
+            self.apply_mutation(mut)
+            return mut
+
+        results = self.run_tasks(apply, mutations, lambda mut: f"{mut['method']} {mut['path']} ({mut['project']})")
+        applied = [mut for mut in results if mut is not None]
+
+        logger.info(
+            "Synchronized %d projects: fetched states in %.2f secs, applied %d mutations in %.2f secs",
+            len(pdescs),
+            fetch_time,
+            len(applied),
+            time.time() - start_time - fetch_time,
+        )
+
+        if len(self.failures) > 0:
+            logger.error("%d gitlab sync operations failed:", len(self.failures))
+            for desc, err in self.failures:
+                logger.error("- %s: %s", desc, err)
+
+        return applied
@@ -0,0 +1,77 @@
+"""Change detection for the hot reloadable handler files"""
+
+import logging
+import os
+
+from nvp.nvp_object import NVPObject
+
+try:
+    from inotify_simple import INotify, flags
+except ModuleNotFoundError:
+    # Optional dependency only used in the inotify mode:
+    INotify = flags = None
+
+logger = logging.getLogger(__name__)
+
+
+class HandlerCache(NVPObject):
+    """Track the handler source files to detect when they are modified.
+    In the "stat" mode the file content is only hashed when its mtime or size changed,
+    in the "inotify" mode the files are only checked again after a change notification,
+    and in the "none" mode the files are never reloaded."""
+
+    def __init__(self, mode="stat"):
+        """Constructor"""
+        if mode == "inotify" and INotify is None:
+            logger.warning("inotify_simple is not available, using the stat handler reload mode.")
+            mode = "stat"
+
+        self.check(mode in ["stat", "inotify", "none"], "Invalid handler reload mode: %s", mode)
+        self.mode = mode
+
+        # Entries of filepath -> (mtime_ns, size, hash):
+        self.entries = {}
+
+        self.inotify = None
+        self.watches = {}
+        self.dirty = set()
+        if mode == "inotify":
+            self.inotify = INotify()
+
+    def watch(self, filepath):
+        """Register the parent folder of a file for change notifications"""
+        folder = os.path.dirname(os.path.abspath(filepath))
+        if folder not in self.watches.values():
+            mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.DELETE
+            wd = self.inotify.add_watch(folder, mask)
+            self.watches[wd] = folder
+
+    def poll_events(self):
+        """Read the pending change notifications without blocking"""
+        for event in self.inotify.read(timeout=0):
+            folder = self.watches.get(event.wd, None)
+            if folder is not None:
+                self.dirty.add(os.path.join(folder, event.name))
+
+    def has_changed(self, filepath):
+        """Check if a file was modified since the previous call"""
+        if self.mode == "none":
+            self.entries.setdefault(filepath, None)
+            return False
+
+        if self.mode == "inotify":
+            self.poll_events()
+            if filepath in self.entries and os.path.abspath(filepath) not in self.dirty:
+                return False
+            self.dirty.discard(os.path.abspath(filepath))
+            if filepath not in self.entries:
+                self.watch(filepath)
+
+        stat = os.stat(filepath)
+        prev = self.entries.get(filepath, None)
+        if prev is not None and prev[0] == stat.st_mtime_ns and prev[1] == stat.st_size:
+            return False
+
+        fhash = self.compute_file_hash(filepath)
+        self.entries[filepath] = (stat.st_mtime_ns, stat.st_size, fhash)
+        return prev is not None and prev[2] != fhash
@@ -0,0 +1,244 @@
+"""Shared HTTP client used by the NVP network helpers.
+
+This module keeps one keep-alive requests session per host, applies a common
+retry/backoff policy and provides an on-disk ETag/Last-Modified cache for GET requests.
+It doesn't depend on NVPObject so that it can be used from the nvp_object module itself."""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import requests
+import urllib3
+import xxhash
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Exceptions considered as temporary network errors:
+RETRY_EXCEPTIONS = (
+    urllib3.exceptions.ReadTimeoutError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+class HttpClient:
+    """Context-wide HTTP client with per host session pools"""
+
+    def __init__(self):
+        """Constructor"""
+        self.sessions = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.max_retries = 5
+        self.backoff = 0.5
+        self.max_backoff = 30.0
+        self.retry_statuses = [429, 500, 502, 503, 504]
+        self.pool_size = 10
+        self.cache_dir = None
+
+    def configure(self, desc, root_dir=None):
+        """Configure the client from the 'http_client' config entry"""
+        self.max_retries = desc.get("max_retries", self.max_retries)
+        self.backoff = desc.get("backoff", self.backoff)
+        self.max_backoff = desc.get("max_backoff", self.max_backoff)
+        self.retry_statuses = desc.get("retry_statuses", self.retry_statuses)
+        self.pool_size = desc.get("pool_size", self.pool_size)
+
+        cache_dir = desc.get("cache_dir", None)
+        if cache_dir is None and root_dir is not None:
+            cache_dir = os.path.join(root_dir, "build", "http_cache")
+        self.cache_dir = cache_dir
+
+        if desc.get("report_stats", False):
+            atexit.register(self.log_stats)
+
+    def get_host(self, url):
+        """Retrieve the scheme://host:port key for a given url"""
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def get_session(self, url):
+        """Retrieve the keep-alive session for the host of a given url"""
+        host = self.get_host(url)
+        with self.lock:
+            if host not in self.sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount(host, adapter)
+                self.sessions[host] = session
+                self.stats[host] = {"requests": 0, "errors": 0, "retries": 0, "cache_hits": 0, "time": 0.0}
+            return self.sessions[host]
+
+    def get_backoff_delay(self, attempt):
+        """Compute the delay to wait before a given retry attempt"""
+        return min(self.max_backoff, self.backoff * (2**attempt))
+
+    def add_stat(self, host, key, value=1):
+        """Increment a statistic counter for a host"""
+        with self.lock:
+            self.stats[host][key] += value
+
+    def request(self, method, url, max_retries=None, status_codes=None, use_cache=False, retry_delay=None, **kwargs):
+        """Send a request, retrying on network errors and on retryable status codes.
+        If status_codes is provided, any other status is also retried.
+        Returns None if all the attempts failed."""
+        session = self.get_session(url)
+        host = self.get_host(url)
+        max_retries = self.max_retries if max_retries is None else max_retries
+
+        use_cache = use_cache and method == "GET" and self.cache_dir is not None and not kwargs.get("stream", False)
+        entry = None
+        if use_cache:
+            cache_file = self.get_cache_file(url, kwargs.get("params", None))
+            entry = self.read_cache_entry(cache_file)
+            if entry is not None:
+                headers = dict(kwargs.get("headers", None) or {})
+                if entry["etag"] is not None:
+                    headers["If-None-Match"] = entry["etag"]
+                if entry["last_modified"] is not None:
+                    headers["If-Modified-Since"] = entry["last_modified"]
+                kwargs["headers"] = headers
+
+        count = 0
+        while max_retries == 0 or count < max_retries:
+            if count > 0:
+                self.add_stat(host, "retries")
+                time.sleep(retry_delay if retry_delay is not None else self.get_backoff_delay(count - 1))
+            count += 1
+
+            start_time = time.time()
+            try:
+                resp = session.request(method, url, **kwargs)
+            except RETRY_EXCEPTIONS as err:
+                self.add_stat(host, "errors")
+                logger.error("Exception in %s request to %s: %s (trial %d/%d)", method, url, err, count, max_retries)
+                continue
+            finally:
+                self.add_stat(host, "time", time.time() - start_time)
+                self.add_stat(host, "requests")
+
+            if entry is not None and resp.status_code == 304:
+                self.add_stat(host, "cache_hits")
+                return self.build_cached_response(url, cache_file, entry)
+
+            if resp.status_code in self.retry_statuses or (
+                status_codes is not None and resp.status_code not in status_codes
+            ):
+                logger.error(
+                    "Received bad status %d from %s request to %s (trial %d/%d)",
+                    resp.status_code,
+                    method,
+                    url,
+                    count,
+                    max_retries,
+                )
+                continue
+
+            if use_cache and resp.status_code == 200:
+                self.write_cache_entry(cache_file, resp)
+
+            return resp
+
+        return None
+
+    def get(self, url, **kwargs):
+        """Send a GET request"""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Send a POST request"""
+        return self.request("POST", url, **kwargs)
+
+    def get_cache_file(self, url, params=None):
+        """Retrieve the base cache file path for a given url and parameters"""
+        key = url if not params else f"{url}?{urlencode(sorted(dict(params).items()))}"
+        return os.path.join(self.cache_dir, xxhash.xxh64(key.encode("utf-8")).hexdigest())
+
+    def read_cache_entry(self, cache_file):
+        """Read a cache entry if available"""
+        meta_file = cache_file + ".json"
+        if not os.path.exists(meta_file) or not os.path.exists(cache_file + ".body"):
+            return None
+
+        try:
+            with open(meta_file, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except ValueError:
+            return None
+
+    def write_cache_entry(self, cache_file, resp):
+        """Write a response in the cache if it has validators"""
+        etag = resp.headers.get("ETag", None)
+        last_modified = resp.headers.get("Last-Modified", None)
+        if etag is None and last_modified is None:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(cache_file + ".body", "wb") as file:
+            file.write(resp.content)
+
+        entry = {
+            "url": resp.url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "headers": dict(resp.headers),
+            "encoding": resp.encoding,
+        }
+        with open(cache_file + ".json", "w", encoding="utf-8") as file:
+            json.dump(entry, file)
+
+    def build_cached_response(self, url, cache_file, entry):
+        """Build a response object from a cache entry"""
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.url = url
+        resp.headers.update(entry["headers"])
+        resp.encoding = entry["encoding"]
+        with open(cache_file + ".body", "rb") as file:
+            resp._content = file.read()  # pylint: disable=protected-access
+        return resp
+
+    def get_host_stats(self):
+        """Retrieve the statistics per host, including the connection reuse counts"""
+        result = {}
+        with self.lock:
+            for host, session in self.sessions.items():
+                stats = dict(self.stats[host])
+                num_conns = 0
+                adapter = session.get_adapter(host)
+                for pool in adapter.poolmanager.pools._container.values():  # pylint: disable=protected-access
+                    num_conns += pool.num_connections
+                stats["connections"] = num_conns
+                stats["reused"] = max(0, stats["requests"] - stats["errors"] - num_conns)
+                stats["mean_latency"] = stats["time"] / stats["requests"] if stats["requests"] > 0 else 0.0
+                result[host] = stats
+        return result
+
+    def log_stats(self):
+        """Report the connection reuse and latency per host"""
+        for host, stats in self.get_host_stats().items():
+            logger.info(
+                "%s: %d requests, %d connections (%d reused), %d retries, %d cache hits, mean latency: %.1f ms",
+                host,
+                stats["requests"],
+                stats["connections"],
+                stats["reused"],
+                stats["retries"],
+                stats["cache_hits"],
+                stats["mean_latency"] * 1000.0,
+            )
+
+
+_http_client = HttpClient()
+
+
+def get_http_client():
+    """Retrieve the shared HTTP client"""
+    return _http_client
@@ -0,0 +1,267 @@
+"""Log files helpers: streaming filtering, size/age based rotation and multi-process safe appends"""
+
+import atexit
+import glob
+import gzip
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from nvp.nvp_object import NVPObject
+
+try:
+    import fcntl
+except ModuleNotFoundError:
+    # Not available on windows: appends are then not protected by an advisory lock.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Maximum size of the chunks read when streaming a log file:
+CHUNK_SIZE = 1024 * 1024
+
+# Suffix of the rotated files: .YYYYmmdd-HHMMSS-ffffff with an optional .gz extension:
+BACKUP_PATTERN = re.compile(r"\.\d{8}-\d{6}-\d{6}(\.gz)?$")
+
+
+def parse_size(value):
+    """Parse a size value given as a number of bytes or as a string like "100MB" """
+    if value is None or isinstance(value, (int, float)):
+        return value
+
+    match = re.fullmatch(r"\s*([\d.]+)\s*([kmgt]?)i?b?\s*", value.lower())
+    if match is None:
+        raise ValueError(f"Invalid size value: {value}")
+    return int(float(match.group(1)) * 1024 ** " kmgt".index(match.group(2) or " "))
+
+
+def filter_lines(input_file, output_file, predicate):
+    """Copy the lines of a file for which predicate(line) is True, with bounded memory usage.
+    The lines are processed as bytes, preserving the original line endings,
+    and a line longer than the chunk size is kept or dropped as a whole.
+    Returns the (number of lines kept, total number of lines) tuple."""
+    num_lines = 0
+    num_kept = 0
+    keep = True
+    continued = False
+    with open(input_file, "rb") as src, open(output_file, "wb") as dst:
+        for chunk in iter(lambda: src.readline(CHUNK_SIZE), b""):
+            if not continued:
+                keep = predicate(chunk)
+                num_lines += 1
+                num_kept += 1 if keep else 0
+            if keep:
+                dst.write(chunk)
+            continued = not chunk.endswith(b"\n")
+
+    return num_kept, num_lines
+
+
+class LogCompressor:
+    """Background thread compressing the rotated log files"""
+
+    def __init__(self):
+        """Constructor"""
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, filename, backup_count):
+        """Queue a rotated file for compression"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="nvp_log_compressor", daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+        self.queue.put((filename, backup_count))
+
+    def run(self):
+        """Main loop of the compression thread"""
+        while True:
+            filename, backup_count = self.queue.get()
+            try:
+                compress_file(filename)
+                prune_backups(BACKUP_PATTERN.sub("", filename), backup_count)
+            except OSError as err:
+                logger.error("Cannot compress log file %s: %s", filename, str(err))
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Wait for the pending compressions"""
+        self.queue.join()
+
+
+_compressor = LogCompressor()
+
+
+def get_log_compressor():
+    """Retrieve the shared log compressor"""
+    return _compressor
+
+
+def compress_file(filename):
+    """Compress a file with gzip and remove the source file"""
+    if not os.path.exists(filename):
+        # Already compressed by another process:
+        return
+
+    tmp_file = filename + ".gz.tmp"
+    with open(filename, "rb") as src, gzip.open(tmp_file, "wb") as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    os.replace(tmp_file, filename + ".gz")
+    os.remove(filename)
+
+
+def list_backups(filename):
+    """List the rotated files for a log file, from the oldest to the most recent"""
+    files = [fname for fname in glob.glob(glob.escape(filename) + ".*") if BACKUP_PATTERN.search(fname)]
+    return sorted(files, key=lambda fname: BACKUP_PATTERN.search(fname).group(0))
+
+
+def prune_backups(filename, backup_count):
+    """Remove the oldest rotated files to keep at most backup_count of them"""
+    if backup_count is None:
+        return
+
+    backups = list_backups(filename)
+    for fname in backups[: max(len(backups) - backup_count, 0)]:
+        try:
+            os.remove(fname)
+        except FileNotFoundError:
+            pass
+
+
+class RotatingLogFile(NVPObject):
+    """Log file that can be shared by multiple processes, with size and age based rotation.
+    Each write is done with a single O_APPEND write while holding an advisory lock on "<filename>.lock",
+    so the lines from different processes are never mixed, and the rotation is done under the same lock.
+    The mtime of the lock file is used to store the creation time of the current log file.
+    The rotated files are renamed with a timestamp suffix and compressed in a background thread."""
+
+    def __init__(self, filename, max_size=None, max_age=None, backup_count=5, compress=True, truncate=False):
+        """Constructor"""
+        self.filename = filename
+        self.max_size = parse_size(max_size)
+        self.max_age = max_age
+        self.backup_count = backup_count
+        self.compress = compress
+        self.fd = None
+
+        self.make_folder(self.get_parent_folder(os.path.abspath(filename)))
+        self.lock_file = filename + ".lock"
+        self.lock_fd = os.open(self.lock_file, os.O_WRONLY | os.O_CREAT, 0o644)
+
+        with self.locked():
+            if truncate and self.file_exists(filename) and os.path.getsize(filename) > 0:
+                # Start a new file, keeping the previous content as a backup:
+                self.rotate()
+            self.open()
+
+    def __enter__(self):
+        """Enter a with block"""
+        return self
+
+    def __exit__(self, *args):
+        """Exit a with block"""
+        self.close()
+
+    @contextmanager
+    def locked(self):
+        """Context manager holding the advisory lock"""
+        if fcntl is not None:
+            fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self.lock_fd, fcntl.LOCK_UN)
+
+    def open(self):
+        """Open the log file in append mode"""
+        if self.fd is not None:
+            os.close(self.fd)
+        created = not self.file_exists(self.filename)
+        self.fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if created:
+            # Record the creation time of the new log file:
+            os.utime(self.lock_file)
+
+    def should_rotate(self, size):
+        """Check if the file should be rotated before writing size bytes"""
+        stat = os.fstat(self.fd)
+        if stat.st_size == 0:
+            return False
+        if self.max_size is not None and stat.st_size + size > self.max_size:
+            return True
+        return self.max_age is not None and time.time() >= os.fstat(self.lock_fd).st_mtime + self.max_age
+
+    def rotate(self):
+        """Rename the current file with a timestamp suffix, must be called while holding the lock.
+        Our file descriptor is closed first since an open file cannot be renamed on windows,
+        and the rotation is skipped if the file is still opened by another process there.
+        Returns True if the file was rotated."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+        backup = f"{self.filename}.{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}"
+        try:
+            os.replace(self.filename, backup)
+        except PermissionError as err:
+            logger.warning("Cannot rotate log file %s: %s", self.filename, str(err))
+            return False
+
+        if self.compress:
+            get_log_compressor().submit(backup, self.backup_count)
+        else:
+            prune_backups(self.filename, self.backup_count)
+        return True
+
+    def check_rotation(self, size=0):
+        """Reopen the file if it was rotated by another process, and rotate it if needed"""
+        try:
+            stat = os.stat(self.filename)
+            reopen = not os.path.samestat(stat, os.fstat(self.fd))
+        except FileNotFoundError:
+            reopen = True
+
+        if reopen:
+            self.open()
+
+        if self.should_rotate(size):
+            self.rotate()
+            self.open()
+
+    def rotate_if_needed(self):
+        """Rotate the file if it is too large or too old, without writing anything"""
+        with self.locked():
+            self.check_rotation()
+
+    def write(self, text):
+        """Append some text to the file"""
+        data = text.encode("utf-8") if isinstance(text, str) else text
+        with self.locked():
+            self.check_rotation(len(data))
+            while len(data) > 0:
+                written = os.write(self.fd, data)
+                data = data[written:]
+
+    def flush(self):
+        """Nothing to flush: the data is written without buffering"""
+
+    def close(self):
+        """Close the file"""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if self.lock_fd is not None:
+            os.close(self.lock_fd)
+            self.lock_fd = None
+
@@ -0,0 +1,210 @@
+"""Streaming uploader for the gitlab generic package registry"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from nvp.core.http_client import get_http_client
+from nvp.nvp_object import NVPObject
+
+logger = logging.getLogger(__name__)
+
+
+class UploadStream:
+    """File-like upload body computing the sha256 checksum of the data while it is sent
+    and reporting the progress/throughput periodically."""
+
+    def __init__(self, source_file, label, report_interval=5.0):
+        """Constructor"""
+        self.file = open(source_file, "rb")  # pylint: disable=consider-using-with
+        self.size = os.path.getsize(source_file)
+        self.label = label
+        self.report_interval = report_interval
+        self.hasher = hashlib.sha256()
+        self.sent = 0
+        self.start_time = time.time()
+        self.last_report = self.start_time
+
+    def __len__(self):
+        """Length of the body, used to send a Content-Length header"""
+        return self.size
+
+    def read(self, size=-1):
+        """Read the next chunk of data"""
+        data = self.file.read(size)
+        self.hasher.update(data)
+        self.sent += len(data)
+
+        now = time.time()
+        if now - self.last_report >= self.report_interval:
+            self.last_report = now
+            self.report_progress()
+        return data
+
+    def get_throughput(self):
+        """Retrieve the current upload throughput in MB/s"""
+        elapsed = time.time() - self.start_time
+        return self.sent / (1024 * 1024 * elapsed) if elapsed > 0 else 0.0
+
+    def report_progress(self):
+        """Log the current progress"""
+        ratio = 100.0 * self.sent / self.size if self.size > 0 else 100.0
+        logger.info("%s: %.1f%% sent (%.2f MB/s)", self.label, ratio, self.get_throughput())
+
+    def get_checksum(self):
+        """Retrieve the sha256 checksum of the data sent so far"""
+        return self.hasher.hexdigest()
+
+    def close(self):
+        """Close the source file"""
+        self.file.close()
+
+
+class PackageUploader(NVPObject):
+    """Upload files to the generic package registry of a gitlab project.
+    The gitlab registry doesn't support partial uploads, so a failed upload is restarted,
+    but files that are already available with the same checksum are never sent again."""
+
+    def __init__(self, base_url, token, max_retries=3, report_interval=5.0, timeout=1800.0, page_size=100):
+        """Constructor"""
+        self.base_url = base_url
+        self.token = token
+        self.max_retries = max_retries
+        self.report_interval = report_interval
+        self.timeout = timeout
+        self.page_size = page_size
+
+    def get(self, path, params=None):
+        """Send a GET request to the API"""
+        headers = {"PRIVATE-TOKEN": self.token}
+        resp = get_http_client().request("GET", self.base_url + path, params=params, headers=headers, timeout=10.0)
+        if resp is None or not resp.ok:
+            logger.error("GET request to %s failed: %s", path, resp.text if resp is not None else "None")
+            return None
+        return resp.json()
+
+    def get_all(self, path, params=None):
+        """Retrieve all the pages of a list request, returning None if any request failed"""
+        result = []
+        page = 1
+        while True:
+            entries = self.get(path, dict(params or {}, per_page=self.page_size, page=page))
+            if entries is None:
+                return None
+            result += entries
+            if len(entries) < self.page_size:
+                return result
+            page += 1
+
+    def compute_checksum(self, source_file):
+        """Compute the sha256 checksum of a file"""
+        hasher = hashlib.sha256()
+        with open(source_file, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def find_package_file(self, pid, package_name, package_version, file_name):
+        """Find the registry entries for a given package file"""
+        params = {"package_name": package_name, "package_type": "generic"}
+        packages = self.get_all(f"/projects/{pid}/packages", params) or []
+
+        result = []
+        for pkg in packages:
+            if pkg["name"] != package_name or pkg["version"] != package_version:
+                continue
+            files = self.get_all(f"/projects/{pid}/packages/{pkg['id']}/package_files") or []
+            result += [pfile for pfile in files if pfile["file_name"] == os.path.basename(file_name)]
+
+        return result
+
+    def is_uploaded(self, pid, package_name, package_version, file_name, source_file):
+        """Check if an identical file is already available in the registry.
+        The local checksum is only computed if a file with the same size is found."""
+        size = os.path.getsize(source_file)
+        candidates = [
+            pfile
+            for pfile in self.find_package_file(pid, package_name, package_version, file_name)
+            if pfile.get("size") == size and pfile.get("file_sha256") is not None
+        ]
+        if len(candidates) == 0:
+            return False
+
+        checksum = self.compute_checksum(source_file)
+        return any(pfile["file_sha256"] == checksum for pfile in candidates)
+
+    def upload_file(self, pid, package_name, package_version, file_name, source_file, force=False):
+        """Upload a single package file, returning the package file description, or None on failure"""
+        label = f"{package_name}/{package_version}/{file_name}"
+        if not force and self.is_uploaded(pid, package_name, package_version, file_name, source_file):
+            logger.info("Package file %s is already uploaded.", label)
+            return {"status": "skipped", "file_name": file_name}
+
+        url = f"{self.base_url}/projects/{pid}/packages/generic/{package_name}/{package_version}/{file_name}"
+        headers = {
+            "PRIVATE-TOKEN": self.token,
+            "cache-control": "no-cache",
+            "content-type": "application/octet-stream",
+        }
+
+        for attempt in range(1, self.max_retries + 1):
+            stream = UploadStream(source_file, label, self.report_interval)
+            try:
+                resp = get_http_client().request(
+                    "PUT",
+                    url,
+                    max_retries=1,
+                    params={"select": "package_file"},
+                    data=stream,
+                    headers=headers,
+                    timeout=self.timeout,
+                )
+            except requests.exceptions.RequestException as err:
+                logger.error("Exception during upload of %s: %s", label, str(err))
+                resp = None
+            finally:
+                stream.close()
+
+            # The API returns 201, or 200 with the package file description when using select=package_file:
+            if resp is not None and resp.ok:
+                logger.info(
+                    "Uploaded %s (%.2f MB at %.2f MB/s)", label, stream.size / (1024 * 1024), stream.get_throughput()
+                )
+                try:
+                    res = resp.json()
+                except json.JSONDecodeError:
+                    res = {}
+                res["status"] = "uploaded"
+
+                checksum = stream.get_checksum()
+                remote = res.get("file_sha256", None)
+                if remote is not None and remote != checksum:
+                    logger.error("Checksum mismatch for %s: %s != %s", label, remote, checksum)
+                    continue
+                res["file_sha256"] = checksum
+                return res
+
+            logger.error(
+                "Failed to upload %s (attempt %d/%d): %s",
+                label,
+                attempt,
+                self.max_retries,
+                resp.text if resp is not None else "no response",
+            )
+
+        return None
+
+    def upload_files(self, pid, package_name, package_version, files, max_workers=4, force=False):
+        """Upload multiple package files in parallel.
+        files is a list of (file_name, source_file) tuples, the results are returned in the same order."""
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self.upload_file, pid, package_name, package_version, fname, src, force)
+                for fname, src in files
+            ]
+            return [fut.result() for fut in futures]
@@ -8,6 +8,7 @@ import time
 from datetime import datetime
 
 from nvp.components.runner import ScriptRunner
+from nvp.core.log_files import RotatingLogFile
 from nvp.nvp_component import NVPComponent
 from nvp.nvp_context import NVPContext
 
@@ -210,7 +211,10 @@ class ProcessManager(NVPComponent):
         pid_file = self._pid_file(desc)
         log_file = self.ctx.resolve_path(desc["log_file"])
 
-        self.make_folder(os.path.dirname(log_file))
+        # Rotate the process log file if needed, since the process output can't be rotated while it is running:
+        rotation = self._log_rotation(desc)
+        with RotatingLogFile(log_file, **rotation) as rlog:
+            rlog.rotate_if_needed()
 
         cmd, cwd, env = self._resolve_cmd(desc)
 
@@ -321,23 +325,28 @@ class ProcessManager(NVPComponent):
         """Return a formatted timestamp."""
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
+    def _log_rotation(self, desc=None):
+        """Return the log rotation settings for a process, or for the shared log."""
+        rotation = dict(self.ctx.get_config().get("log_rotation", {}), **self.config.get("log_rotation", {}))
+        if desc is not None:
+            rotation.update(desc.get("log_rotation", {}))
+        return rotation
+
     def _log(self, message):
         """Write a timestamped line to the shared process_manager log."""
         line = f"[{self._ts()}] {message}"
         shared_log = self.ctx.resolve_path(self.config.get("log_file"))
-        self.make_folder(os.path.dirname(shared_log))
-        with open(shared_log, "a", encoding="utf-8") as f:
+        with RotatingLogFile(shared_log, **self._log_rotation()) as f:
             f.write(line + "\n")
         self.info(message)
 
     def _notify(self, desc, message):
-        """Send a RocketChat message if notify=True for this process."""
+        """Queue a RocketChat message if notify=True for this process."""
         if not desc.get("notify", True):
             return
         channel = desc.get("notify_channel", self.config.get("notify_channel", "problem-reports"))
         try:
-            rchat = self.get_component("rchat")
-            rchat.send_message(message, channel=channel)
+            self.get_component("notifier").send_rocketchat(message, channel=channel)
         except Exception as exc:
             self.warn("RocketChat notification failed: %s", exc)
 
@@ -1,7 +1,13 @@
 """Collection of admin utility functions"""
 
+import hashlib
 import logging
 import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import xxhash
 
 from nvp.nvp_component import NVPComponent
 from nvp.nvp_context import NVPContext
@@ -23,6 +29,9 @@ class PyEnvManager(NVPComponent):
 
         self.scripts = ctx.get_config().get("scripts", {})
 
+        # Optional wheelhouse folder overriding the configured one:
+        self.wheelhouse_dir = None
+
     def process_cmd_path(self, cmd):
         """Check if this component can process the given command"""
 
@@ -42,6 +51,11 @@ class PyEnvManager(NVPComponent):
             self.remove_py_env(env_name)
             return True
 
+        if cmd == "bench":
+            env_name = self.get_param("env_name")
+            self.bench_setup_py_env(env_name)
+            return True
+
         return False
 
     def get_py_env_desc(self, env_name):
@@ -141,7 +155,7 @@ class PyEnvManager(NVPComponent):
         """Run pip with the given args."""
         cmd = [py_path, "-m", "pip"]
 
-        opts = ["--no-warn-script-location"]
+        opts = ["--no-warn-script-location"] if args[0] == "install" else []
         # Check if we have a valid cache dir:
         cache_dir = os.environ.get("PIP_CACHE_DIR", None)
 
@@ -199,11 +213,157 @@ class PyEnvManager(NVPComponent):
 
         self.run_pip(py_path, cmd, env=env)
 
-    def setup_py_env(self, env_name):
+    def get_wheelhouse_dir(self):
+        """Retrieve the root folder of the local wheelhouse"""
+        if self.wheelhouse_dir is not None:
+            return self.make_folder(self.wheelhouse_dir)
+
+        wh_dirs = self.ctx.get_config().get("pip_wheelhouse_dir", None)
+        wh_dir = None
+        if wh_dirs is not None:
+            wh_dir = self.ctx.select_first_valid_path(wh_dirs if isinstance(wh_dirs, list) else [wh_dirs])
+
+        if wh_dir is None:
+            wh_dir = self.get_path(self.ctx.get_root_dir(), ".pyenvs", ".wheelhouse")
+
+        return self.make_folder(wh_dir)
+
+    def get_site_packages_dir(self, py_path):
+        """Retrieve the site-packages folder of a given python environment"""
+        stdout, stderr, rcode = self.execute_command(
+            [py_path, "-c", "import sysconfig; print(sysconfig.get_paths()['purelib'])"]
+        )
+        self.check(rcode == 0, "Cannot retrieve site-packages folder for %s: %s", py_path, stderr)
+        return stdout.strip()
+
+    def get_python_tag(self, py_path):
+        """Retrieve the implementation, version and platform tag of a python executable"""
+        stdout, stderr, rcode = self.execute_command(
+            [py_path, "-c", "import sys, sysconfig; print(sys.version, sysconfig.get_platform())"]
+        )
+        self.check(rcode == 0, "Cannot retrieve python version for %s: %s", py_path, stderr)
+        return stdout.strip()
+
+    def hash_file_sha256(self, fpath, blocksize=1024 * 1024):
+        """Compute the sha256 digest of a file"""
+        hasher = hashlib.sha256()
+        with open(fpath, "rb") as file:
+            for buf in iter(lambda: file.read(blocksize), b""):
+                hasher.update(buf)
+        return hasher.hexdigest()
+
+    def link_or_copy(self, src_file, dst_file):
+        """Hard link a file if possible, or copy it otherwise"""
+        if self.file_exists(dst_file):
+            self.remove_file(dst_file)
+        try:
+            os.link(src_file, dst_file)
+        except OSError:
+            self.copy_file(src_file, dst_file, True, progress_threhold=-1)
+
+    def is_wheel_set_outdated(self, set_dir, packages):
+        """Check if an existing wheel set should be resolved again.
+        This is the case with the --refresh flag, or when the set contains unpinned requirements
+        and is older than the "pip_wheelhouse_max_age" config entry (in days)."""
+        if self.get_param("refresh_wheels", False):
+            return True
+
+        max_age = self.ctx.get_config().get("pip_wheelhouse_max_age", None)
+        if max_age is None:
+            return False
+
+        unpinned = [pkg for pkg in packages if not pkg.startswith("-") and "==" not in pkg and "@" not in pkg]
+        return len(unpinned) > 0 and time.time() - os.path.getmtime(set_dir) > max_age * 86400
+
+    def get_wheel_set(self, py_path, packages, env=None):
+        """Retrieve the folder containing all the wheels for a given requirement set,
+        resolving and building them once in the wheelhouse if needed.
+
+        Each set folder only contains hard links to the content-addressed wheels stored
+        in the 'blobs' folder, so identical wheels are shared between all the sets."""
+        wh_dir = self.get_wheelhouse_dir()
+
+        # The resolved set depends on the requirements and on the python version/platform:
+        key = xxhash.xxh64_hexdigest("\n".join([self.get_python_tag(py_path)] + packages).encode("utf-8"))
+        set_dir = self.get_path(wh_dir, "sets", key)
+        if self.dir_exists(set_dir):
+            if not self.is_wheel_set_outdated(set_dir, packages):
+                logger.info("Using wheel set %s", key)
+                return set_dir
+            logger.info("Refreshing wheel set %s", key)
+
+        logger.info("Building wheel set %s...", key)
+        tmp_dir = set_dir + ".tmp"
+        self.remove_folder(tmp_dir)
+        self.make_folder(tmp_dir)
+
+        req_file = self.get_path(tmp_dir, "requirements.txt")
+        self.write_text_file("\n".join(packages), req_file)
+        self.run_pip(py_path, ["wheel", "-r", req_file, "-w", tmp_dir], env=env)
+        self.remove_file(req_file)
+
+        for fname in self.get_all_files(tmp_dir, exp=r"\.whl$"):
+            fpath = self.get_path(tmp_dir, fname)
+            digest = self.hash_file_sha256(fpath)
+            blob_file = self.get_path(wh_dir, "blobs", digest[:2], digest, fname)
+            if not self.file_exists(blob_file):
+                self.rename_file(fpath, blob_file, create_parent=True)
+            self.link_or_copy(blob_file, fpath)
+
+        self.remove_folder(set_dir)
+        self.rename_folder(tmp_dir, set_dir)
+        return set_dir
+
+    def install_from_wheelhouse(self, py_path, packages, env=None):
+        """Install a list of packages with a single offline pip invocation from the wheelhouse"""
+        set_dir = self.get_wheel_set(py_path, packages, env)
+        wheels = [self.get_path(set_dir, fname) for fname in self.get_all_files(set_dir, exp=r"\.whl$")]
+        if len(wheels) == 0:
+            return
+
+        self.run_pip(py_path, ["install", "--no-index", "--no-deps", "--find-links", set_dir] + wheels, env=env)
+
+    def link_parent_env(self, desc, py_path):
+        """Reuse the parent environment packages through a .pth file in our site-packages.
+        Returns the list of packages already provided by the parent environment."""
+        parent_name = desc["inherit"]
+        pdesc = self.get_py_env_desc(parent_name)
+        parent_folder = self.get_path(self.get_py_env_dir(parent_name, pdesc), parent_name)
+
+        tools = self.get_component("tools")
+        sub_path = tools.get_tool_desc("python")["sub_path"]
+        if not self.file_exists(parent_folder, sub_path):
+            logger.info("Setting up parent environment %s...", parent_name)
+            self.setup_py_env(parent_name)
+
+        parent_site = self.get_site_packages_dir(self.get_path(parent_folder, sub_path))
+        site_dir = self.get_site_packages_dir(py_path)
+        logger.info("Layering parent site-packages %s", parent_site)
+        self.write_text_file(parent_site + "\n", site_dir, "nvp_parent_env.pth")
+
+        return self.get_all_packages(pdesc, "pre_packages") + self.get_all_packages(pdesc, "packages")
+
+    def download_module(self, mpath, dest_path):
+        """Download an additional module, keeping a copy in the wheelhouse"""
+        tools = self.get_component("tools")
+        key = xxhash.xxh64_hexdigest(mpath.encode("utf-8"))
+        cache_file = self.get_path(self.get_wheelhouse_dir(), "modules", key, self.get_filename(dest_path))
+        if not self.file_exists(cache_file):
+            self.make_folder(self.get_parent_folder(cache_file))
+            tools.download_file(mpath, cache_file)
+
+        self.link_or_copy(cache_file, dest_path)
+
+    def setup_py_env(self, env_name, use_wheelhouse=None, layered=None, env_dir=None):
         """Setup a given python environment"""
 
         desc = self.get_py_env_desc(env_name)
-        env_dir = self.get_param("env_dir")
+        env_dir = env_dir or self.get_param("env_dir")
+
+        if use_wheelhouse is None:
+            use_wheelhouse = self.get_param("use_wheelhouse") or desc.get("use_wheelhouse", False)
+        if layered is None:
+            layered = self.get_param("layered") or desc.get("layered", False)
 
         if env_dir is None:
             # try to use the install dir from the desc if any or use the default install dir:
@@ -251,6 +411,44 @@ class PyEnvManager(NVPComponent):
 
         py_path = self.get_path(dest_folder, pdesc["sub_path"])
 
+        if use_wheelhouse:
+            # Resolve the full requirement set once, and install it offline from the wheelhouse:
+            packages = ["wheel"] + self.get_all_packages(desc, "pre_packages")
+            packages += [pkg for pkg in self.get_all_packages(desc, "packages") if pkg not in packages]
+
+            if layered and "inherit" in desc:
+                parent_pkgs = self.link_parent_env(desc, py_path)
+                # Keep the pip options (like extra index urls) but skip the inherited packages:
+                packages = [pkg for pkg in packages if pkg.startswith("-") or pkg not in parent_pkgs]
+
+            git_dir = self.get_parent_folder(tools.get_tool_path("git"))
+            env = self.prepend_env_list([git_dir], os.environ.copy(), "PATH")
+
+            logger.info("Installing python packages from wheelhouse...")
+            self.install_from_wheelhouse(py_path, packages, env)
+        else:
+            self.install_packages_online(desc, dest_folder, py_path, new_env)
+
+        # Also install the additional modules if any:
+        mods = self.get_all_modules(desc)
+
+        if use_wheelhouse:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                futures = [
+                    executor.submit(self.download_module, mpath, self.get_path(dest_folder, mname))
+                    for mname, mpath in mods.items()
+                ]
+                for fut in futures:
+                    fut.result()
+            return
+
+        for mname, mpath in mods.items():
+            logger.info("Installing module %s...", mname)
+            dest_path = self.get_path(dest_folder, mname)
+            tools.download_file(mpath, dest_path)
+
+    def install_packages_online(self, desc, dest_folder, py_path, new_env):
+        """Install the packages of an environment with the regular sequential pip invocations"""
         if new_env or self.get_param("update_pip"):
             # trigger the update of pip:
             logger.info("Updating pip...")
@@ -277,15 +475,27 @@ class PyEnvManager(NVPComponent):
             logger.info("Installing python packages...")
             self.install_python_packages(py_path, packages, req_file, False)
 
-        # Also install the additional modules if any:
-        mods = self.get_all_modules(desc)
-
-        tools = self.get_component("tools")
-
-        for mname, mpath in mods.items():
-            logger.info("Installing module %s...", mname)
-            dest_path = self.get_path(dest_folder, mname)
-            tools.download_file(mpath, dest_path)
+    def bench_setup_py_env(self, env_name):
+        """Benchmark the creation of a fresh environment with and without the wheelhouse.
+        The environments and the wheelhouse are created in a temporary folder,
+        so the real environment and the shared wheelhouse are never modified."""
+        timings = []
+        prev_wheelhouse = self.wheelhouse_dir
+        with tempfile.TemporaryDirectory(prefix="nvp_pyenv_bench_") as tmp_dir:
+            # Use an empty wheelhouse, so that the first wheelhouse run is cold:
+            self.wheelhouse_dir = self.get_path(tmp_dir, "wheelhouse")
+            try:
+                runs = [("online", False), ("wheelhouse (cold)", True), ("wheelhouse (warm)", True)]
+                for idx, (label, use_wheelhouse) in enumerate(runs):
+                    env_dir = self.get_path(tmp_dir, f"run{idx}")
+                    start_time = time.time()
+                    self.setup_py_env(env_name, use_wheelhouse=use_wheelhouse, layered=False, env_dir=env_dir)
+                    timings.append((label, time.time() - start_time))
+            finally:
+                self.wheelhouse_dir = prev_wheelhouse
+
+        for label, elapsed in timings:
+            logger.info("Fresh environment creation (%s): %.2f secs", label, elapsed)
 
 
 if __name__ == "__main__":
@@ -301,6 +511,14 @@ if __name__ == "__main__":
     psr.add_str("--dir", dest="env_dir")("Environments root dir")
     psr.add_flag("--update-npm", dest="update_npm")("Request the update of npm")
     psr.add_flag("--renew", dest="renew_env")("Renew the environment completely")
+    psr.add_flag("-w", "--wheelhouse", dest="use_wheelhouse")(
+        "Resolve the requirements once into the local wheelhouse and install offline from it"
+    )
+    psr.add_flag("--layered", dest="layered")("Reuse the parent environment site-packages (wheelhouse mode only)")
+    psr.add_flag("--refresh", dest="refresh_wheels")("Resolve the requirements again even if the wheel set exists")
+
+    psr = context.build_parser("bench")
+    psr.add_str("env_name")("Name of the environment to benchmark")
 
     psr = context.build_parser("remove")
     psr.add_str("env_name")("Name of the environment to remove")
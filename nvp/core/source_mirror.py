@@ -0,0 +1,163 @@
+"""Local mirror of the library sources used by the BuildManager"""
+
+import logging
+import os
+import shutil
+import subprocess
+import time
+
+import xxhash
+
+from nvp.nvp_object import NVPObject
+
+logger = logging.getLogger(__name__)
+
+
+class SourceMirror(NVPObject):
+    """Keep bare git mirrors, downloaded archives and pristine source trees,
+    so that a library can be rebuilt without network access nor extraction.
+    The git operations are executed with the git component, and git_path is only used to query the refs."""
+
+    def __init__(self, mirror_dir, git, git_path="git", tools=None, refresh_delay=None, hard_links=False):
+        """Constructor"""
+        self.mirror_dir = mirror_dir
+        self.git = git
+        self.git_path = git_path
+        self.tools = tools
+        self.refresh_delay = refresh_delay
+        self.hard_links = hard_links
+
+    def get_url_key(self, url):
+        """Build the key used to store the data for a given url"""
+        name = os.path.basename(url.rstrip("/"))
+        if name.endswith(".git"):
+            name = name[:-4]
+        return f"{name}-{xxhash.xxh64(url.encode('utf-8')).hexdigest()}"
+
+    def resolve_git_ref(self, repo_dir, ref):
+        """Retrieve the commit hash for a given ref in a repository, or None if not found"""
+        cmd = [self.git_path, "rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}"]
+        res = subprocess.run(cmd, cwd=repo_dir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        if res.returncode != 0:
+            return None
+        return res.stdout.strip()
+
+    def get_git_mirror(self, url, ref=None):
+        """Retrieve the path to an up to date bare mirror of a git repository.
+        With a pinned ref the mirror is only fetched when that ref is missing. Without ref the mirror is
+        fetched every time to get the latest sources, unless a refresh delay (in seconds) is set,
+        in which case it is only fetched when the last fetch is older than that delay."""
+        repo_dir = self.get_path(self.mirror_dir, "git", self.get_url_key(url) + ".git")
+        stamp_file = self.get_path(repo_dir, "nvp_last_fetch")
+
+        if not self.dir_exists(repo_dir):
+            logger.info("Creating git mirror for %s...", url)
+            self.make_folder(self.get_parent_folder(repo_dir))
+            tmp_dir = repo_dir + ".tmp"
+            if self.dir_exists(tmp_dir):
+                self.remove_folder(tmp_dir, recursive=True)
+            self.git.clone_repository(url, tmp_dir, mirror=True)
+            self.rename_folder(tmp_dir, repo_dir)
+            self.write_text_file(str(time.time()), stamp_file)
+            return repo_dir
+
+        if ref is not None:
+            need_fetch = self.resolve_git_ref(repo_dir, ref) is None
+        elif self.refresh_delay is None:
+            need_fetch = True
+        else:
+            last_fetch = float(self.read_text_file(stamp_file)) if self.file_exists(stamp_file) else 0.0
+            need_fetch = time.time() - last_fetch > self.refresh_delay
+
+        if need_fetch:
+            logger.info("Updating git mirror for %s...", url)
+            self.git.execute_git(["fetch", "--prune", "origin"], cwd=repo_dir)
+            self.write_text_file(str(time.time()), stamp_file)
+
+        return repo_dir
+
+    def get_git_pristine_tree(self, url, ref=None):
+        """Retrieve a pristine source tree (without .git folder) for a git repository at a given ref"""
+        repo_dir = self.get_git_mirror(url, ref)
+        commit = self.resolve_git_ref(repo_dir, ref or "HEAD")
+        self.check(commit is not None, "Cannot find ref %s in git repository %s", ref, url)
+
+        tree_dir = self.get_path(self.mirror_dir, "pristine", f"{self.get_url_key(url)}-{commit[:12]}")
+        if self.dir_exists(tree_dir):
+            return tree_dir, False
+
+        logger.info("Checking out %s at %s...", url, commit[:12])
+        tmp_dir = tree_dir + ".tmp"
+        if self.dir_exists(tmp_dir):
+            self.remove_folder(tmp_dir, recursive=True)
+        self.make_folder(self.get_parent_folder(tree_dir))
+
+        # Local clone sharing the objects of the mirror:
+        self.git.execute_git(["clone", "--shared", "--no-checkout", repo_dir, tmp_dir])
+        self.git.execute_git(["checkout", "--quiet", commit], cwd=tmp_dir)
+
+        # Submodules refer to the origin urls, so use the url of the original repository:
+        if self.file_exists(self.get_path(tmp_dir, ".gitmodules")):
+            self.git.execute_git(["remote", "set-url", "origin", url], cwd=tmp_dir)
+            self.git.execute_git(["submodule", "update", "--init", "--recursive"], cwd=tmp_dir)
+
+        self.remove_folder(self.get_path(tmp_dir, ".git"), recursive=True)
+        self.rename_folder(tmp_dir, tree_dir)
+        return tree_dir, True
+
+    def get_archive(self, url):
+        """Retrieve a downloaded archive from the mirror, downloading it if needed"""
+        archive_dir = self.get_path(self.mirror_dir, "archives", self.get_url_key(url))
+        archive_file = self.get_path(archive_dir, os.path.basename(url))
+        if not self.file_exists(archive_file):
+            self.make_folder(archive_dir)
+            self.tools.download_file(url, archive_file)
+
+        return archive_file
+
+    def get_archive_pristine_tree(self, url, tgt_dir, extracted_dir=None):
+        """Retrieve the pristine extracted source tree of an archive"""
+        archive_file = self.get_archive(url)
+        file_hash = self.compute_file_hash(archive_file)
+        parent_dir = self.get_path(self.mirror_dir, "pristine", f"{self.get_url_key(url)}-{file_hash:016x}")
+        tree_dir = self.get_path(parent_dir, tgt_dir)
+        if self.dir_exists(tree_dir):
+            return tree_dir
+
+        if self.dir_exists(parent_dir):
+            # Incomplete previous extraction:
+            self.remove_folder(parent_dir, recursive=True)
+
+        self.make_folder(parent_dir)
+        self.tools.extract_package(archive_file, parent_dir, target_dir=tgt_dir, extracted_dir=extracted_dir)
+        return tree_dir
+
+    def copy_tree(self, src_dir, dst_dir):
+        """Copy a pristine tree into a build folder, or hard link its files if enabled.
+        Note: with hard links, the files from the build folder must be replaced and not modified in place,
+        otherwise the pristine tree would be modified too (NVPObject.break_hard_link() takes care of
+        this in the NVPObject write helpers)."""
+        if not self.hard_links:
+            shutil.copytree(src_dir, dst_dir, symlinks=True)
+            return
+
+        for root, dirs, files in os.walk(src_dir):
+            rel_dir = os.path.relpath(root, src_dir)
+            cur_dir = dst_dir if rel_dir == "." else os.path.join(dst_dir, rel_dir)
+            os.makedirs(cur_dir, exist_ok=True)
+
+            for dname in dirs:
+                src = os.path.join(root, dname)
+                if os.path.islink(src):
+                    os.symlink(os.readlink(src), os.path.join(cur_dir, dname))
+
+            for fname in files:
+                src = os.path.join(root, fname)
+                dst = os.path.join(cur_dir, fname)
+                if os.path.islink(src):
+                    os.symlink(os.readlink(src), dst)
+                    continue
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    shutil.copy2(src, dst)
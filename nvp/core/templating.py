@@ -0,0 +1,108 @@
+"""Single pass placeholder templating engine.
+
+The templates are tokenized once into literal and placeholder parts ("${VAR}" or "$[TYPE:name]"),
+and the placeholders are then substituted from a dict in a single pass. The replacement values
+are expanded recursively (with cycle detection), and a string made of a single placeholder
+is replaced with the raw value, preserving its type.
+This module doesn't depend on NVPObject so that it can be used from the nvp_object module itself."""
+
+import re
+
+# Placeholder tokens: ${VAR} or $[TYPE:name]
+TOKEN_PATTERN = re.compile(r"(\$\{[^${}]*\}|\$\[[^$\[\]]*\])")
+
+# Cache of the tokenized templates:
+_templates = {}
+MAX_CACHED_TEMPLATES = 50000
+
+
+class TemplateCycleError(ValueError):
+    """Error raised when a placeholder value refers to itself"""
+
+
+def tokenize(text):
+    """Split a template string into a tuple of literal strings and placeholder tokens.
+    The placeholders are at the odd indices."""
+    parts = _templates.get(text, None)
+    if parts is None:
+        if len(_templates) >= MAX_CACHED_TEMPLATES:
+            _templates.clear()
+        parts = tuple(TOKEN_PATTERN.split(text))
+        _templates[text] = parts
+
+    return parts
+
+
+class TemplateEngine:
+    """Substitute the placeholders from a given dict of "${VAR}" -> value entries.
+    resolver is an optional function called with the tokens not found in the values,
+    it should return the replacement value or None to keep the token unchanged."""
+
+    def __init__(self, values, resolver=None):
+        """Constructor"""
+        self.values = values
+        self.resolver = resolver
+        self.expanded = {}
+
+        # Keys that are not placeholder tokens are still supported with a plain replace:
+        self.extra_keys = [key for key in values if not TOKEN_PATTERN.fullmatch(key)]
+
+    def fill(self, content):
+        """Fill the placeholders in a string, list or dict, other types are returned unchanged"""
+        if isinstance(content, str):
+            return self.fill_string(content)
+
+        if isinstance(content, list):
+            return [self.fill(elem) for elem in content]
+
+        if isinstance(content, dict):
+            return {key: self.fill(elem) for key, elem in content.items()}
+
+        return content
+
+    def fill_string(self, text, stack=None):
+        """Fill the placeholders in a string"""
+        if "$" in text:
+            parts = tokenize(text)
+            if len(parts) == 3 and parts[0] == "" and parts[2] == "":
+                # Full string substitution, keeping the type of the value:
+                text = self.expand_token(parts[1], stack)
+            elif len(parts) > 1:
+                elems = list(parts)
+                for idx in range(1, len(parts), 2):
+                    val = self.expand_token(parts[idx], stack)
+                    elems[idx] = val if isinstance(val, str) else str(val)
+                text = "".join(elems)
+
+        if len(self.extra_keys) > 0 and isinstance(text, str):
+            for key in self.extra_keys:
+                rep = self.values[key]
+                if rep is not None:
+                    text = text.replace(key, rep)
+
+        return text
+
+    def expand_token(self, token, stack=None):
+        """Retrieve the fully expanded value for a placeholder token"""
+        if token in self.expanded:
+            return self.expanded[token]
+
+        if token in self.values:
+            val = self.values[token]
+        elif self.resolver is not None:
+            val = self.resolver(token)
+        else:
+            val = None
+
+        if val is None:
+            # Keep unknown placeholders unchanged:
+            return token
+
+        if isinstance(val, str) and "$" in val:
+            stack = stack or []
+            if token in stack:
+                raise TemplateCycleError(f"Cycle detected in placeholders: {' -> '.join(stack + [token])}")
+            val = self.fill_string(val, stack + [token])
+
+        self.expanded[token] = val
+        return val
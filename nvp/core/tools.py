@@ -11,6 +11,7 @@ from datetime import datetime
 import requests
 import urllib3
 
+from nvp.core.http_client import get_http_client
 from nvp.nvp_builder import NVPBuilder
 from nvp.nvp_component import NVPComponent
 from nvp.nvp_context import NVPContext
@@ -347,7 +348,7 @@ class ToolsManager(NVPComponent):
         while count < max_retries:
             try:
                 logger.debug("Sending request...")
-                response = requests.get(url, stream=True, timeout=timeout, headers=headers)
+                response = get_http_client().get_session(url).get(url, stream=True, timeout=timeout, headers=headers)
 
                 logger.debug("Retrieving content-length.")
                 total_length = response.headers.get("content-length")
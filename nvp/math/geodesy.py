@@ -0,0 +1,168 @@
+"""WGS84 geodesy helpers working on batches of points.
+
+The functions accept a Vec3, a Vec3Array or an array-like of shape (..., 3) and return the same kind of value.
+Geodetic coordinates are given as (latitude, longitude, altitude) with the angles in degrees and the altitude
+in meters above the ellipsoid. ECEF, ENU and NED coordinates are in meters.
+
+The ECEF to geodetic conversion uses the closed-form solution from H. Vermeille,
+"Direct transformation from geocentric coordinates to geodetic coordinates" (2002): it has no iteration
+and its error is far below the millimeter for any point further than ~43km from the earth center
+(points closer than that to the center are not supported)."""
+
+import numpy as np
+
+from nvp.math.mat4 import Mat4
+from nvp.math.mat4_array import Mat4Array
+from nvp.math.vec3 import Vec3
+from nvp.math.vec3_array import Vec3Array
+
+# WGS84 ellipsoid constants:
+WGS84_A = 6378137.0
+WGS84_F = 1.0 / 298.257223563
+WGS84_B = WGS84_A * (1.0 - WGS84_F)
+WGS84_E2 = 2.0 * WGS84_F - WGS84_F**2
+WGS84_EP2 = WGS84_E2 / (1.0 - WGS84_E2)
+
+
+def _to_array(vals):
+    """Retrieve the (..., 3) array of values from a Vec3, Vec3Array or array-like"""
+    if isinstance(vals, Vec3):
+        return np.array([vals.x, vals.y, vals.z])
+    if isinstance(vals, Vec3Array):
+        return vals.data
+    return np.asarray(vals, dtype=np.float64)
+
+
+def _like(vals, res):
+    """Wrap a (..., 3) result array with the same type as the input values"""
+    if isinstance(vals, Vec3):
+        x, y, z = res.tolist()
+        return Vec3(x, y, z)
+    if isinstance(vals, Vec3Array):
+        return Vec3Array(res)
+    return res
+
+
+def lla_to_ecef(lla):
+    """Convert geodetic coordinates to ECEF coordinates"""
+    arr = _to_array(lla)
+    lat = np.radians(arr[..., 0])
+    lon = np.radians(arr[..., 1])
+    alt = arr[..., 2]
+
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    n = WGS84_A / np.sqrt(1.0 - WGS84_E2 * sin_lat * sin_lat)
+    res = np.stack(
+        [
+            (n + alt) * cos_lat * np.cos(lon),
+            (n + alt) * cos_lat * np.sin(lon),
+            (n * (1.0 - WGS84_E2) + alt) * sin_lat,
+        ],
+        axis=-1,
+    )
+    return _like(lla, res)
+
+
+def ecef_to_lla(ecef):
+    """Convert ECEF coordinates to geodetic coordinates with the Vermeille closed-form solution"""
+    arr = _to_array(ecef)
+    x = arr[..., 0]
+    y = arr[..., 1]
+    z = arr[..., 2]
+
+    e4 = WGS84_E2 * WGS84_E2
+    dist_xy2 = x * x + y * y
+    p = dist_xy2 / (WGS84_A * WGS84_A)
+    q = (1.0 - WGS84_E2) / (WGS84_A * WGS84_A) * z * z
+    r = (p + q - e4) / 6.0
+    s = e4 * p * q / (4.0 * r * r * r)
+    t = np.cbrt(1.0 + s + np.sqrt(s * (2.0 + s)))
+    u = r * (1.0 + t + 1.0 / t)
+    v = np.sqrt(u * u + e4 * q)
+    w = WGS84_E2 * (u + v - q) / (2.0 * v)
+    k = np.sqrt(u + v + w * w) - w
+
+    dist_xy = np.sqrt(dist_xy2)
+    d = k * dist_xy / (k + WGS84_E2)
+    dist_dz = np.sqrt(d * d + z * z)
+
+    res = np.stack(
+        [
+            np.degrees(2.0 * np.arctan2(z, d + dist_dz)),
+            np.degrees(np.arctan2(y, x)),
+            (k + WGS84_E2 - 1.0) / k * dist_dz,
+        ],
+        axis=-1,
+    )
+    return _like(ecef, res)
+
+
+def enu_rotation(lla):
+    """Rotation matrices from ECEF to the local East/North/Up frames at the given geodetic locations,
+    as a (..., 3, 3) array with the east, north and up axes as rows"""
+    arr = _to_array(lla)
+    lat = np.radians(arr[..., 0])
+    lon = np.radians(arr[..., 1])
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    sin_lon, cos_lon = np.sin(lon), np.cos(lon)
+    zero = np.zeros_like(lat)
+
+    east = np.stack([-sin_lon, cos_lon, zero], axis=-1)
+    north = np.stack([-sin_lat * cos_lon, -sin_lat * sin_lon, cos_lat], axis=-1)
+    up = np.stack([cos_lat * cos_lon, cos_lat * sin_lon, sin_lat], axis=-1)
+    return np.stack([east, north, up], axis=-2)
+
+
+def ecef_to_enu(ecef, ref_lla):
+    """Convert ECEF coordinates to the ENU frame at a reference location (or per point reference locations)"""
+    ref = _to_array(lla_to_ecef(_to_array(ref_lla)))
+    delta = _to_array(ecef) - ref
+    return _like(ecef, np.einsum("...ij,...j->...i", enu_rotation(ref_lla), delta))
+
+
+def enu_to_ecef(enu, ref_lla):
+    """Convert ENU coordinates at a reference location (or per point reference locations) to ECEF coordinates"""
+    ref = _to_array(lla_to_ecef(_to_array(ref_lla)))
+    res = np.einsum("...ji,...j->...i", enu_rotation(ref_lla), _to_array(enu)) + ref
+    return _like(enu, res)
+
+
+def ecef_to_ned(ecef, ref_lla):
+    """Convert ECEF coordinates to the NED frame at a reference location (or per point reference locations)"""
+    enu = _to_array(ecef_to_enu(_to_array(ecef), ref_lla))
+    return _like(ecef, np.stack([enu[..., 1], enu[..., 0], -enu[..., 2]], axis=-1))
+
+
+def ned_to_ecef(ned, ref_lla):
+    """Convert NED coordinates at a reference location (or per point reference locations) to ECEF coordinates"""
+    arr = _to_array(ned)
+    enu = np.stack([arr[..., 1], arr[..., 0], -arr[..., 2]], axis=-1)
+    return _like(ned, _to_array(enu_to_ecef(enu, ref_lla)))
+
+
+def canonical_frame(lla):
+    """Build the canonical frame at geodetic locations, with the north, west and up axes as the
+    first 3 columns and the ECEF position as translation. Returns a Mat4 for a Vec3 location,
+    and a Mat4Array otherwise. The frame is not defined at the poles."""
+    arr = _to_array(lla).reshape(-1, 3)
+    rot = enu_rotation(arr)
+    frames = Mat4Array(count=len(arr))
+    frames.data[:, :3, 0] = rot[:, 1]
+    frames.data[:, :3, 1] = -rot[:, 0]
+    frames.data[:, :3, 2] = rot[:, 2]
+    frames.data[:, :3, 3] = lla_to_ecef(arr)
+
+    if isinstance(lla, Vec3):
+        return Mat4.from_rows(frames.data[0].tolist())
+    return frames
+
+
+def meters_per_degree(lat):
+    """Length in meters of one degree of latitude and one degree of longitude at the given latitudes"""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    sin_lat = np.sin(lat)
+    den = 1.0 - WGS84_E2 * sin_lat * sin_lat
+    meridian_radius = WGS84_A * (1.0 - WGS84_E2) / den**1.5
+    normal_radius = WGS84_A / np.sqrt(den)
+    return np.radians(meridian_radius), np.radians(normal_radius * np.cos(lat))
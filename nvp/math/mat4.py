@@ -1,6 +1,5 @@
 """Simple Mat4 module"""
 
-import copy
 import math
 
 from nvp.math.quat import Quat
@@ -11,23 +10,29 @@ from nvp.math.vec4 import Vec4
 class Mat4:
     """Mat4 class"""
 
+    __slots__ = ("_mat",)
+
     def __init__(self, *args):
-        self._mat = [[0.0] * 4 for _ in range(4)]
         if len(args) == 0:
             self.make_identity()
         elif len(args) == 1 and isinstance(args[0], Mat4):
-            self._mat = copy.deepcopy(args[0]._mat)
+            self._mat = [row[:] for row in args[0]._mat]
         elif len(args) == 1 and isinstance(args[0], Quat):
             self.make_rotate(args[0])
         elif len(args) == 16:
-            self.set(*args)
+            self._mat = [list(args[0:4]), list(args[4:8]), list(args[8:12]), list(args[12:16])]
         else:
             raise ValueError("Invalid arguments for Mat4 constructor")
 
+    @staticmethod
+    def from_rows(rows):
+        """Create a matrix from a list of 4 rows, without copying them"""
+        m = Mat4.__new__(Mat4)
+        m._mat = rows
+        return m
+
     def __copy__(self):
-        new_mat = Mat4()
-        new_mat._mat = copy.deepcopy(self._mat)
-        return new_mat
+        return Mat4.from_rows([row[:] for row in self._mat])
 
     def __eq__(self, other):
         if not isinstance(other, Mat4):
@@ -72,52 +77,49 @@ class Mat4:
 
     def __add__(self, m):
         if isinstance(m, Mat4):
-            new_mat = Mat4()
-            for r in range(4):
-                for c in range(4):
-                    new_mat[r][c] = self._mat[r][c] + m[r][c]
-            return new_mat
+            return Mat4.from_rows([[a + b for a, b in zip(r1, r2)] for r1, r2 in zip(self._mat, m._mat)])
         else:
             raise TypeError("Unsupported operand type(s) for +: 'Mat4' and " + str(type(m)))
 
     def __sub__(self, m):
         if isinstance(m, Mat4):
-            new_mat = Mat4()
-            for r in range(4):
-                for c in range(4):
-                    new_mat[r][c] = self._mat[r][c] - m[r][c]
-            return new_mat
+            return Mat4.from_rows([[a - b for a, b in zip(r1, r2)] for r1, r2 in zip(self._mat, m._mat)])
         else:
             raise TypeError("Unsupported operand type(s) for -: 'Mat4' and " + str(type(m)))
 
     def __mul__(self, m):
         if isinstance(m, Mat4):
-            new_mat = Mat4()
-            for r in range(4):
-                for c in range(4):
-                    new_mat[r][c] = sum(self._mat[r][k] * m[k][c] for k in range(4))
-            return new_mat
+            (b00, b01, b02, b03), (b10, b11, b12, b13), (b20, b21, b22, b23), (b30, b31, b32, b33) = m._mat
+            rows = []
+            for a0, a1, a2, a3 in self._mat:
+                rows.append(
+                    [
+                        a0 * b00 + a1 * b10 + a2 * b20 + a3 * b30,
+                        a0 * b01 + a1 * b11 + a2 * b21 + a3 * b31,
+                        a0 * b02 + a1 * b12 + a2 * b22 + a3 * b32,
+                        a0 * b03 + a1 * b13 + a2 * b23 + a3 * b33,
+                    ]
+                )
+            return Mat4.from_rows(rows)
         elif isinstance(m, (int, float)):
-            new_mat = Mat4()
-            for r in range(4):
-                for c in range(4):
-                    new_mat[r][c] = self._mat[r][c] * m
-            return new_mat
+            return Mat4.from_rows([[val * m for val in row] for row in self._mat])
         elif isinstance(m, Vec4):
-            new_vec = Vec4(
-                sum(self._mat[0][i] * m[i] for i in range(4)),
-                sum(self._mat[1][i] * m[i] for i in range(4)),
-                sum(self._mat[2][i] * m[i] for i in range(4)),
-                sum(self._mat[3][i] * m[i] for i in range(4)),
+            x, y, z, w = m.x, m.y, m.z, m.w
+            r0, r1, r2, r3 = self._mat
+            return Vec4(
+                r0[0] * x + r0[1] * y + r0[2] * z + r0[3] * w,
+                r1[0] * x + r1[1] * y + r1[2] * z + r1[3] * w,
+                r2[0] * x + r2[1] * y + r2[2] * z + r2[3] * w,
+                r3[0] * x + r3[1] * y + r3[2] * z + r3[3] * w,
             )
-            return new_vec
         elif isinstance(m, Vec3):
-            new_vec = Vec3(
-                sum(self._mat[0][i] * m[i] for i in range(3)) + self._mat[0][3],
-                sum(self._mat[1][i] * m[i] for i in range(3)) + self._mat[1][3],
-                sum(self._mat[2][i] * m[i] for i in range(3)) + self._mat[2][3],
+            x, y, z = m.x, m.y, m.z
+            r0, r1, r2 = self._mat[0], self._mat[1], self._mat[2]
+            return Vec3(
+                r0[0] * x + r0[1] * y + r0[2] * z + r0[3],
+                r1[0] * x + r1[1] * y + r1[2] * z + r1[3],
+                r2[0] * x + r2[1] * y + r2[2] * z + r2[3],
             )
-            return new_vec
         else:
             raise TypeError("Unsupported operand type(s) for *: 'Mat4' and " + str(type(m)))
 
@@ -133,18 +135,11 @@ class Mat4:
     def set(self, *args):
         if len(args) != 16:
             raise ValueError("Invalid number of arguments for set method")
-        idx = 0
-        for i in range(4):
-            for j in range(4):
-                self._mat[i][j] = args[idx]
-                idx += 1
+        for r, row in enumerate(self._mat):
+            row[:] = args[r * 4 : r * 4 + 4]
 
     def transposed(self):
-        new_mat = Mat4()
-        for r in range(4):
-            for c in range(4):
-                new_mat[r][c] = self._mat[c][r]
-        return new_mat
+        return Mat4.from_rows([list(col) for col in zip(*self._mat)])
 
     def set_rotate(self, q):
         """Set this matrix as a rotation"""
@@ -0,0 +1,117 @@
+"""Mat4Array class: batch of Mat4 values backed by a NumPy array"""
+
+import numpy as np
+
+from nvp.math.mat4 import Mat4
+from nvp.math.vec3 import Vec3
+from nvp.math.vec3_array import Vec3Array
+
+
+class Mat4Array:
+    """Array of Mat4 values stored as a (N, 4, 4) float64 array, with the same [row][col] layout as Mat4.
+    The operations broadcast a single matrix (or a Mat4) against all the elements of the other operand."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data=None, count=0):
+        if data is None:
+            data = np.tile(np.eye(4), (count, 1, 1))
+        elif isinstance(data, Mat4Array):
+            data = data.data
+        elif isinstance(data, Mat4):
+            data = [data._mat]
+        self.data = np.asarray(data, dtype=np.float64).reshape(-1, 4, 4)
+
+    @staticmethod
+    def from_mat4s(mats):
+        """Build an array from a list of Mat4"""
+        return Mat4Array([mat._mat for mat in mats])
+
+    @staticmethod
+    def from_translations(vecs):
+        """Build an array of translation matrices from a Vec3Array"""
+        res = Mat4Array(count=len(vecs))
+        res.data[:, :3, 3] = vecs.data
+        return res
+
+    def to_mat4s(self):
+        """Convert to a list of Mat4"""
+        return [Mat4.from_rows(rows) for rows in self.data.tolist()]
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    def __getitem__(self, i):
+        if isinstance(i, (int, np.integer)):
+            return Mat4.from_rows(self.data[i].tolist())
+        return Mat4Array(self.data[i])
+
+    def __setitem__(self, i, value) -> None:
+        if isinstance(value, Mat4):
+            value = value._mat
+        elif isinstance(value, Mat4Array):
+            value = value.data
+        self.data[i] = value
+
+    def __repr__(self):
+        return f"Mat4Array({self.data.tolist()})"
+
+    def __mul__(self, other):
+        if isinstance(other, (Mat4, Mat4Array)):
+            return self.mult(other)
+        if isinstance(other, (Vec3, Vec3Array)):
+            return self.transform(other)
+        if isinstance(other, (int, float)):
+            return Mat4Array(self.data * other)
+        raise TypeError("Unsupported operand type(s) for *: 'Mat4Array' and " + str(type(other)))
+
+    def __rmul__(self, other):
+        if isinstance(other, (int, float)):
+            return Mat4Array(self.data * other)
+        raise TypeError("Unsupported operand type(s) for *: " + str(type(other)) + " and 'Mat4Array'")
+
+    def mult(self, other):
+        """Per element matrix products self[i] * other[i]"""
+        rhs = np.array(other._mat) if isinstance(other, Mat4) else other.data
+        return Mat4Array(np.matmul(self.data, rhs))
+
+    def _split(self, vecs):
+        """Retrieve the rotation/scale and translation parts to apply to a set of vectors"""
+        if isinstance(vecs, Vec3):
+            vecs = Vec3Array(vecs)
+        if len(self) == 1:
+            # Single matrix applied to all the vectors:
+            return vecs.data, self.data[0, :3, :3].T, self.data[0, :3, 3]
+        return vecs.data[:, None, :], self.data[:, :3, :3].transpose(0, 2, 1), self.data[:, :3, 3]
+
+    def transform(self, vecs):
+        """Transform points (including the translation), like Mat4 * Vec3"""
+        pts, rot, trans = self._split(vecs)
+        return Vec3Array(np.matmul(pts, rot).reshape(-1, 3) + trans)
+
+    def transform_vectors(self, vecs):
+        """Transform direction vectors (ignoring the translation)"""
+        dirs, rot, _ = self._split(vecs)
+        return Vec3Array(np.matmul(dirs, rot).reshape(-1, 3))
+
+    def project(self, vecs):
+        """Transform points with the full matrix and divide by the w component, as for a perspective projection"""
+        if isinstance(vecs, Vec3):
+            vecs = Vec3Array(vecs)
+        pts = np.concatenate([vecs.data, np.ones((len(vecs), 1))], axis=1)
+        if len(self) == 1:
+            res = pts @ self.data[0].T
+        else:
+            res = np.matmul(self.data, pts[:, :, None])[:, :, 0]
+        return Vec3Array(res[:, :3] / res[:, 3:])
+
+    def transposed(self):
+        """Return the transposed matrices"""
+        return Mat4Array(self.data.transpose(0, 2, 1).copy())
+
+    def inverse(self):
+        """Return the inverse matrices"""
+        try:
+            return Mat4Array(np.linalg.inv(self.data))
+        except np.linalg.LinAlgError as err:
+            raise ValueError("Matrix is singular.") from err
@@ -9,6 +9,8 @@ from nvp.math.vec4 import Vec4
 class Quat:
     """Quat class"""
 
+    __slots__ = ("x", "y", "z", "w")
+
     def __init__(self, *args):
         if len(args) == 0:
             self.x, self.y, self.z, self.w = 0.0, 0.0, 0.0, 1.0
@@ -60,8 +62,11 @@ class Quat:
         self.post_mult(rhs)
         return self
 
-    def __truediv__(self, denom: float) -> "Quat":
-        return self.mult(self.inverse())
+    def __truediv__(self, denom) -> "Quat":
+        if isinstance(denom, Quat):
+            return self.mult(denom.inverse())
+        inv = 1.0 / denom
+        return Quat(self.x * inv, self.y * inv, self.z * inv, self.w * inv)
 
     def __itruediv__(self, denom: "Quat") -> "Quat":
         self *= denom.inverse()
@@ -93,6 +98,9 @@ class Quat:
     def __len__(self) -> int:
         return 4
 
+    def __iter__(self):
+        return iter((self.x, self.y, self.z, self.w))
+
     def mult(self, rhs: "Quat") -> "Quat":
         """multiply quat"""
         return Quat(
@@ -114,7 +122,8 @@ class Quat:
 
     def inverse(self) -> "Quat":
         """Invert quat"""
-        return self.conj() / self.length2()
+        inv = 1.0 / (self.x * self.x + self.y * self.y + self.z * self.z + self.w * self.w)
+        return Quat(-self.x * inv, -self.y * inv, -self.z * inv, self.w * inv)
 
     def conj(self) -> "Quat":
         """conjugate quat"""
@@ -226,9 +235,9 @@ class Quat:
         toLen2 = vec2.length2()
 
         if fromLen2 < 1.0 - 1e-7 or fromLen2 > 1.0 + 1e-7:
-            sourceVector = vec1.normalize()
+            sourceVector = vec1.normalized()
         if toLen2 < 1.0 - 1e-7 or toLen2 > 1.0 + 1e-7:
-            targetVector = vec2.normalize()
+            targetVector = vec2.normalized()
 
         dotProdPlus1 = 1.0 + sourceVector.dot(targetVector)
 
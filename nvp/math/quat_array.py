@@ -0,0 +1,172 @@
+"""QuatArray class: batch of Quat values backed by a NumPy array"""
+
+import numpy as np
+
+from nvp.math.mat4_array import Mat4Array
+from nvp.math.quat import Quat
+from nvp.math.vec3 import Vec3
+from nvp.math.vec3_array import Vec3Array
+
+
+class QuatArray:
+    """Array of Quat values stored as a (N, 4) float64 array of (x, y, z, w) components.
+    The operations broadcast a single Quat against all the elements of the other operand."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data=None, count=0):
+        if data is None:
+            data = np.tile((0.0, 0.0, 0.0, 1.0), (count, 1))
+        elif isinstance(data, QuatArray):
+            data = data.data
+        elif isinstance(data, Quat):
+            data = [[data.x, data.y, data.z, data.w]]
+        self.data = np.asarray(data, dtype=np.float64).reshape(-1, 4)
+
+    @staticmethod
+    def from_quats(quats):
+        """Build an array from a list of Quat"""
+        return QuatArray([(q.x, q.y, q.z, q.w) for q in quats])
+
+    @staticmethod
+    def from_angle_axis(angles, axes):
+        """Build rotations from an array of angles (in radians) and a Vec3 or Vec3Array of axes.
+        Null axes produce identity rotations, like Quat.make_rotate()"""
+        axes = Vec3Array(axes)
+        angles = np.asarray(angles, dtype=np.float64).reshape(-1)
+        count = max(len(angles), len(axes))
+        length = np.broadcast_to(axes.length(), (count,))
+        valid = length >= 1e-7
+        half = 0.5 * np.broadcast_to(angles, (count,))
+        scale = np.sin(half) / np.where(valid, length, 1.0)
+
+        res = QuatArray(count=count)
+        res.data[valid, :3] = (np.broadcast_to(axes.data, (count, 3)) * scale[:, None])[valid]
+        res.data[valid, 3] = np.cos(half)[valid]
+        return res
+
+    def to_quats(self):
+        """Convert to a list of Quat"""
+        return [Quat(x, y, z, w) for x, y, z, w in self.data.tolist()]
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    def __getitem__(self, i):
+        if isinstance(i, (int, np.integer)):
+            x, y, z, w = self.data[i].tolist()
+            return Quat(x, y, z, w)
+        return QuatArray(self.data[i])
+
+    def __setitem__(self, i, value) -> None:
+        if isinstance(value, Quat):
+            value = (value.x, value.y, value.z, value.w)
+        elif isinstance(value, QuatArray):
+            value = value.data
+        self.data[i] = value
+
+    def __repr__(self):
+        return f"QuatArray({self.data.tolist()})"
+
+    def __mul__(self, rhs):
+        return self.mult(rhs)
+
+    @staticmethod
+    def _values(other):
+        """Retrieve a broadcastable (N, 4) array for an operand"""
+        if isinstance(other, Quat):
+            return np.array([(other.x, other.y, other.z, other.w)])
+        return other.data
+
+    def mult(self, rhs):
+        """Per element quat products, with the same convention as Quat.mult()"""
+        x1, y1, z1, w1 = self.data.T
+        x2, y2, z2, w2 = self._values(rhs).T
+        return QuatArray(
+            np.stack(
+                [
+                    w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                    w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                    w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+                    w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                ],
+                axis=-1,
+            )
+        )
+
+    def conj(self):
+        """Return the conjugate quats"""
+        return QuatArray(self.data * (-1.0, -1.0, -1.0, 1.0))
+
+    def length2(self):
+        """Get the squared lengths of the quats"""
+        return np.einsum("ij,ij->i", self.data, self.data)
+
+    def length(self):
+        """Get the lengths of the quats"""
+        return np.sqrt(self.length2())
+
+    def inverse(self):
+        """Return the inverse quats"""
+        return QuatArray(self.data * (-1.0, -1.0, -1.0, 1.0) / self.length2()[:, None])
+
+    def normalize(self):
+        """Normalize the quats in place, null quats are left unchanged"""
+        norm = self.length()
+        np.divide(self.data, norm[:, None], out=self.data, where=norm[:, None] > 0.0)
+        return self
+
+    def normalized(self):
+        """Return a normalized copy of this array"""
+        return QuatArray(self.data.copy()).normalize()
+
+    def slerp(self, other, t):
+        """Per element spherical interpolation towards other, with the same rules as Quat.slerp().
+        t can be a scalar or an array of interpolation factors"""
+        q0 = self.data
+        q1 = np.broadcast_to(self._values(other), q0.shape)
+        t = np.asarray(t, dtype=np.float64).reshape(-1, 1)
+
+        dot = np.einsum("ij,ij->i", q0, q1)
+        q1 = np.where(dot[:, None] < 0.0, -q1, q1)
+        dot = np.abs(dot)[:, None]
+
+        # Linear interpolation when the quats are too close:
+        linear = dot > 0.9995
+        theta_0 = np.arccos(np.where(linear, 0.0, dot))
+        sin_theta_0 = np.where(linear, 1.0, np.sin(theta_0))
+        theta = theta_0 * t
+        s1 = np.where(linear, t, np.sin(theta) / sin_theta_0)
+        s0 = np.where(linear, 1.0 - t, np.cos(theta) - dot * np.sin(theta) / sin_theta_0)
+
+        return QuatArray(s0 * q0 + s1 * q1).normalize()
+
+    def rotate(self, vecs):
+        """Rotate a Vec3 or Vec3Array by the quats, like Mat4(q) * v"""
+        vecs = Vec3Array(vecs) if isinstance(vecs, Vec3) else vecs
+        xyz = self.data[:, :3]
+        w = self.data[:, 3:]
+        t = 2.0 * np.cross(xyz, vecs.data) / self.length2()[:, None]
+        return Vec3Array(vecs.data + w * t + np.cross(xyz, t))
+
+    def to_mat4s(self):
+        """Convert to rotation matrices, like Mat4(q)"""
+        res = Mat4Array(count=len(self))
+        x, y, z, w = self.data.T
+        length2 = self.length2()
+        valid = np.abs(length2) > 1e-6
+        rlength2 = np.divide(2.0, length2, out=np.zeros_like(length2), where=valid)
+        x2, y2, z2 = x * rlength2, y * rlength2, z * rlength2
+        xx, xy, xz = x * x2, x * y2, x * z2
+        yy, yz, zz = y * y2, y * z2, z * z2
+        wx, wy, wz = w * x2, w * y2, w * z2
+
+        rot = np.stack(
+            [
+                [1.0 - (yy + zz), xy - wz, xz + wy],
+                [xy + wz, 1.0 - (xx + zz), yz - wx],
+                [xz - wy, yz + wx, 1.0 - (xx + yy)],
+            ]
+        ).transpose(2, 0, 1)
+        res.data[:, :3, :3] = np.where(valid[:, None, None], rot, 0.0)
+        return res
@@ -6,6 +6,8 @@ import math
 class Vec3:
     """Vec3 class"""
 
+    __slots__ = ("x", "y", "z")
+
     def __init__(self, x=0.0, y=0.0, z=0.0):
         self.x = x
         self.y = y
@@ -19,7 +21,7 @@ class Vec3:
         elif i == 2:
             return self.z
         else:
-            raise IndexError("Quat index out of range")
+            raise IndexError("Vec3 index out of range")
 
     def __setitem__(self, i: int, value: float) -> None:
         if i == 0:
@@ -29,7 +31,7 @@ class Vec3:
         elif i == 2:
             self.z = value
         else:
-            raise IndexError("Quat index out of range")
+            raise IndexError("Vec3 index out of range")
 
     def __add__(self, other):
         return Vec3(self.x + other.x, self.y + other.y, self.z + other.z)
@@ -46,6 +48,9 @@ class Vec3:
     def __truediv__(self, scalar):
         return Vec3(self.x / scalar, self.y / scalar, self.z / scalar)
 
+    def __iter__(self):
+        return iter((self.x, self.y, self.z))
+
     def set(self, *args):
         """Set this vec3"""
         if len(args) == 1 and isinstance(args[0], Vec3):
@@ -77,7 +82,7 @@ class Vec3:
 
     def length2(self):
         """Get length2 of vector"""
-        return self.x**2 + self.y**2 + self.z**2
+        return self.x * self.x + self.y * self.y + self.z * self.z
 
     def length(self):
         """Get length of vector"""
@@ -85,15 +90,18 @@ class Vec3:
 
     def normalize(self):
         """Normalize this vector"""
-        mag = self.length()
+        mag = math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
         if mag == 0:
             return Vec3()
-        self.set(self / mag)
+        inv_mag = 1.0 / mag
+        self.x *= inv_mag
+        self.y *= inv_mag
+        self.z *= inv_mag
         return mag
 
     def normalized(self):
         """Return a normalized copy of this vector"""
-        vec = self.clone()
+        vec = Vec3(self.x, self.y, self.z)
         vec.normalize()
         return vec
 
@@ -0,0 +1,128 @@
+"""Vec3Array class: batch of Vec3 values backed by a NumPy array"""
+
+import numpy as np
+
+from nvp.math.vec3 import Vec3
+
+
+class Vec3Array:
+    """Array of Vec3 values stored as a (N, 3) float64 array.
+    The array is not copied when it is already a float64 array, so slices are views on the parent data."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data=None, count=0):
+        if data is None:
+            data = np.zeros((count, 3))
+        elif isinstance(data, Vec3Array):
+            data = data.data
+        elif isinstance(data, Vec3):
+            data = [[data.x, data.y, data.z]]
+        self.data = np.asarray(data, dtype=np.float64).reshape(-1, 3)
+
+    @staticmethod
+    def from_vec3s(vecs):
+        """Build an array from a list of Vec3"""
+        return Vec3Array([(vec.x, vec.y, vec.z) for vec in vecs])
+
+    @staticmethod
+    def from_xyz(x, y, z):
+        """Build an array from separate x, y and z arrays"""
+        return Vec3Array(np.stack(np.broadcast_arrays(x, y, z), axis=-1))
+
+    def to_vec3s(self):
+        """Convert to a list of Vec3"""
+        return [Vec3(x, y, z) for x, y, z in self.data.tolist()]
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    def __getitem__(self, i):
+        if isinstance(i, (int, np.integer)):
+            x, y, z = self.data[i].tolist()
+            return Vec3(x, y, z)
+        return Vec3Array(self.data[i])
+
+    def __setitem__(self, i, value) -> None:
+        if isinstance(value, Vec3):
+            value = (value.x, value.y, value.z)
+        elif isinstance(value, Vec3Array):
+            value = value.data
+        self.data[i] = value
+
+    def __repr__(self):
+        return f"Vec3Array({self.data.tolist()})"
+
+    @property
+    def x(self):
+        """View on the x components"""
+        return self.data[:, 0]
+
+    @property
+    def y(self):
+        """View on the y components"""
+        return self.data[:, 1]
+
+    @property
+    def z(self):
+        """View on the z components"""
+        return self.data[:, 2]
+
+    @staticmethod
+    def _values(other):
+        """Retrieve a broadcastable array for an operand"""
+        if isinstance(other, Vec3Array):
+            return other.data
+        if isinstance(other, Vec3):
+            return np.array((other.x, other.y, other.z))
+        if isinstance(other, np.ndarray) and other.ndim == 1:
+            # Per element scalars:
+            return other[:, None]
+        return other
+
+    def __add__(self, other):
+        return Vec3Array(self.data + self._values(other))
+
+    def __sub__(self, other):
+        return Vec3Array(self.data - self._values(other))
+
+    def __neg__(self):
+        return Vec3Array(-self.data)
+
+    def __mul__(self, scalar):
+        return Vec3Array(self.data * self._values(scalar))
+
+    def __truediv__(self, scalar):
+        return Vec3Array(self.data / self._values(scalar))
+
+    def clone(self):
+        """Make a copy of this array"""
+        return Vec3Array(self.data.copy())
+
+    def dot(self, other):
+        """Per element dot products"""
+        return np.einsum("ij,ij->i", self.data, np.broadcast_to(self._values(other), self.data.shape))
+
+    def cross(self, other):
+        """Per element cross products"""
+        return Vec3Array(np.cross(self.data, self._values(other)))
+
+    def length2(self):
+        """Get the squared lengths of the vectors"""
+        return np.einsum("ij,ij->i", self.data, self.data)
+
+    def length(self):
+        """Get the lengths of the vectors"""
+        return np.sqrt(self.length2())
+
+    def normalize(self):
+        """Normalize the vectors in place and return their previous lengths, null vectors are left unchanged"""
+        mag = self.length()
+        np.divide(self.data, mag[:, None], out=self.data, where=mag[:, None] != 0.0)
+        return mag
+
+    def normalized(self):
+        """Return a normalized copy of this array"""
+        vecs = self.clone()
+        vecs.normalize()
+        return vecs
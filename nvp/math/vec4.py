@@ -6,6 +6,8 @@ from nvp.math.vec3 import Vec3
 class Vec4:
     """Vec4 class"""
 
+    __slots__ = ("x", "y", "z", "w")
+
     def __init__(self, x: float, y: float, z: float, w: float):
         self.x = x
         self.y = y
@@ -36,8 +38,11 @@ class Vec4:
         else:
             raise IndexError("Vec4 index out of range")
 
+    def __iter__(self):
+        return iter((self.x, self.y, self.z, self.w))
+
     def set(self, *args):
-        """Set this quat"""
+        """Set this vec4"""
         if len(args) == 1 and isinstance(args[0], Vec4):
             self.x = args[0].x
             self.y = args[0].y
@@ -12,6 +12,7 @@ import numpy as np
 from PIL import Image, ImageDraw, ImageFilter, ImageFont
 from scipy.ndimage import distance_transform_edt, gaussian_filter
 
+from nvp.core.templating import TemplateEngine
 from nvp.nvp_component import NVPComponent
 from nvp.nvp_context import NVPContext
 import nvp.media.svg_generators as svg
@@ -825,15 +826,10 @@ class ThumbGen(NVPComponent):
         if isinstance(desc, list):
             desc = [self.inject_parameters(el) for el in desc]
 
-        if isinstance(desc, str):
-            while "$" in desc:
-                for pname, pval in params.items():
-                    src = f"${{{pname}}}"
-                    if desc == src:
-                        # Replace the source string potentially changing the type:
-                        return pval
-                    elif src in desc:
-                        desc = desc.replace(src, pval)
+        if isinstance(desc, str) and "$" in desc:
+            # Note: a string made of a single parameter is replaced potentially changing the type:
+            hlocs = {f"${{{pname}}}": pval for pname, pval in params.items()}
+            desc = TemplateEngine(hlocs).fill(desc)
 
         return desc
 
@@ -2,6 +2,8 @@
 
 import logging
 import re
+import threading
+from contextlib import contextmanager
 
 from nvp.core.build_manager import BuildManager
 from nvp.nvp_object import NVPObject
@@ -20,7 +22,11 @@ class NVPBuilder(NVPObject):
         self.env = None
         self.install_src_dir = None
         self.install_dst_dir = None
+        self.compiler_cache = None
         self.tools = self.ctx.get_component("tools")
+        self.telemetry = self.ctx.get_component("build_telemetry")
+        # Name of the library/project currently built in this thread:
+        self.target_state = threading.local()
         desc = desc or {}
         deftools = ["ninja", "make"] if self.is_windows else ["ninja"]
         self.tool_envs = desc.get("tool_envs", deftools)
@@ -40,18 +46,75 @@ class NVPBuilder(NVPObject):
             flags = self.env.get("CFLAGS", "")
             self.env["CFLAGS"] = f"{flags} -fPIC"
 
+        # Configure the compiler cache if enabled:
+        self.compiler_cache = self.man.get_compiler_cache()
+        if self.compiler_cache is not None:
+            self.compiler_cache.setup_env(self.env)
+
+    def get_launcher_env(self):
+        """Retrieve the environment to use for make/configure builds,
+        with the compilers wrapped in the compiler cache if enabled."""
+        if self.compiler_cache is None:
+            return self.env
+        return self.compiler_cache.get_launcher_env(self.env)
+
+    def set_target_name(self, name):
+        """Set the name of the library/project currently built, used in the telemetry records"""
+        self.target_state.name = name
+
+    def get_target_name(self):
+        """Retrieve the name of the library/project currently built"""
+        return getattr(self.target_state, "name", "unknown")
+
+    def get_phase_usages(self):
+        """Retrieve the usage dicts of the phases currently recorded in this thread"""
+        if not hasattr(self.target_state, "usages"):
+            self.target_state.usages = []
+        return self.target_state.usages
+
+    @contextmanager
+    def record_phase(self, phase, out_path=None):
+        """Record the telemetry data for a build phase of the current target.
+        The output size is only computed for the outermost phase, so once per build."""
+        usages = self.get_phase_usages()
+        if len(usages) > 0:
+            out_path = None
+
+        with self.telemetry.record(self.get_target_name(), phase, out_path) as usage:
+            if usage is None:
+                yield
+                return
+
+            usages.append(usage)
+            try:
+                yield
+            finally:
+                usages.pop()
+
+    def add_child_usage(self, rusage):
+        """Add the resource usage of a terminated child process to all the phases recorded in this thread"""
+        for usage in self.get_phase_usages():
+            self.telemetry.add_usage(usage, rusage)
+
+    def execute(self, cmd, **kwargs):
+        """Execute a command, collecting its resource usage for the telemetry"""
+        kwargs.setdefault("rusage_callback", self.add_child_usage)
+        return NVPObject.execute(self, cmd, **kwargs)
+
     def build(self, build_dir, prefix, desc):
         """Run the build process either on the proper target platform"""
         self.init_env()
 
         self.set_install_context(build_dir, prefix)
+        self.set_target_name(self.man.get_std_package_name(desc))
 
-        if self.is_windows:
-            self.build_on_windows(build_dir, prefix, desc)
-        elif self.is_linux:
-            self.build_on_linux(build_dir, prefix, desc)
-        else:
-            raise NotImplementedError
+        with self.record_phase("build", prefix):
+            if self.is_windows:
+                self.build_on_windows(build_dir, prefix, desc)
+            elif self.is_linux:
+                self.build_on_linux(build_dir, prefix, desc)
+            else:
+                raise NotImplementedError
 
     def append_cxxflag(self, val):
         """Append a value to the cxxflags environment var"""
@@ -106,7 +169,9 @@ class NVPBuilder(NVPObject):
             emmake_path = self.get_path(folder, f"emmake{ext}")
             cmd = [emmake_path] + cmd
 
-        self.check_execute(cmd + flags, cwd=build_dir, env=self.env, **kwargs)
+        phase = "ninja_install" if "install" in flags else "ninja"
+        with self.record_phase(phase, build_dir):
+            self.check_execute(cmd + flags, cwd=build_dir, env=self.env, **kwargs)
 
     def exec_nmake(self, build_dir, flags=None, **kwargs):
         """Run a custom ninja command line"""
@@ -138,7 +203,9 @@ class NVPBuilder(NVPObject):
             emmake_path = self.get_path(folder, f"emmake{ext}")
             cmd = [emmake_path] + cmd
 
-        self.check_execute(cmd, cwd=build_dir, env=self.env, **kwargs)
+        phase = "make_install" if flags is not None and "install" in flags else "make"
+        with self.record_phase(phase, build_dir):
+            self.check_execute(cmd, cwd=build_dir, env=self.get_launcher_env(), **kwargs)
 
     def run_make(self, build_dir, **kwargs):
         """Execute the standard make build/install commands"""
@@ -173,6 +240,9 @@ class NVPBuilder(NVPObject):
         if flags is not None:
             cmd += flags
 
+        if self.compiler_cache is not None:
+            cmd += self.compiler_cache.get_cmake_flags()
+
         # Add the source directory:
         if src_dir is not None:
             cmd.append(src_dir)
@@ -187,7 +257,8 @@ class NVPBuilder(NVPObject):
             cmd += ['-DCMAKE_C_FLAGS="-pthread"']
 
         logger.info("Cmake command: %s", cmd)
-        self.check_execute(cmd, cwd=build_dir, env=self.env, **kwargs)
+        with self.record_phase("cmake", build_dir):
+            self.check_execute(cmd, cwd=build_dir, env=self.env, **kwargs)
 
     def run_configure(self, build_dir, prefix, flags=None, src_dir=None, configure_name="configure"):
         """Execute Standard configure command"""
@@ -207,20 +278,23 @@ class NVPBuilder(NVPObject):
             cmd = [emconfigure_path] + cmd
 
         logger.info("configure command: %s", cmd)
-        self.check_execute(cmd, cwd=build_dir, env=self.env)
+        with self.record_phase("configure", build_dir):
+            self.check_execute(cmd, cwd=build_dir, env=self.get_launcher_env())
 
     def patch_file(self, filename, src, dest):
         """Patch the content of a given file"""
-        content = self.read_text_file(filename)
-        content = content.replace(src, dest)
-        self.write_text_file(content, filename)
+        with self.record_phase("patch", filename):
+            content = self.read_text_file(filename)
+            content = content.replace(src, dest)
+            self.write_text_file(content, filename)
 
     def multi_patch_file(self, filename, *changes):
         """Patch the content of a given file"""
-        content = self.read_text_file(filename)
-        for change in changes:
-            content = content.replace(change[0], change[1])
-        self.write_text_file(content, filename)
+        with self.record_phase("patch", filename):
+            content = self.read_text_file(filename)
+            for change in changes:
+                content = content.replace(change[0], change[1])
+            self.write_text_file(content, filename)
 
     def set_install_context(self, src_dir=None, dest_dir=None):
         """Set the installation context"""
@@ -249,35 +323,36 @@ class NVPBuilder(NVPObject):
 
         res = []
 
-        # copy the dawn libraries:
-        for elem in all_files:
-            ignored = False
-            for pat in excluded:
-                if re.search(pat, elem) is not None:
-                    ignored = True
-                    break
-
-            if included is not None and elem not in included:
-                logger.info("Ignoring element %s", elem)
-                continue
-
-            if ignored:
-                logger.info("Ignoring element %s", elem)
-                continue
-
-            logger.info("Installing %s %s", hint, elem)
-            src = self.get_path(src_dir, elem)
-            dst_file = self.get_filename(src) if flatten else elem
-            dst = self.get_path(dst_dir, dst_file)
-            pdir = self.get_parent_folder(dst)
-            self.make_folder(pdir)
-
-            if self.file_exists(dst):
-                self.warn("File %s already exists, removing it.", dst)
-                self.remove_file(dst)
-
-            # self.check(not self.file_exists(dst), "File %s already exists.", dst)
-            self.copy_file(src, dst)
-            res.append(elem)
+        with self.record_phase("install_files", dst_dir):
+            # copy the dawn libraries:
+            for elem in all_files:
+                ignored = False
+                for pat in excluded:
+                    if re.search(pat, elem) is not None:
+                        ignored = True
+                        break
+
+                if included is not None and elem not in included:
+                    logger.info("Ignoring element %s", elem)
+                    continue
+
+                if ignored:
+                    logger.info("Ignoring element %s", elem)
+                    continue
+
+                logger.info("Installing %s %s", hint, elem)
+                src = self.get_path(src_dir, elem)
+                dst_file = self.get_filename(src) if flatten else elem
+                dst = self.get_path(dst_dir, dst_file)
+                pdir = self.get_parent_folder(dst)
+                self.make_folder(pdir)
+
+                if self.file_exists(dst):
+                    self.warn("File %s already exists, removing it.", dst)
+                    self.remove_file(dst)
+
+                # self.check(not self.file_exists(dst), "File %s already exists.", dst)
+                self.copy_file(src, dst)
+                res.append(elem)
 
         return res
@@ -3,7 +3,10 @@
 # from __future__ import print_function
 import logging
 import os
+import platform
+import shlex
 import subprocess
+import threading
 
 from nvp.nvp_object import NVPObject
 
@@ -18,19 +21,27 @@ def get_environment_from_batch_command(env_cmd, initial=None):
     and return the environment created after running that command.
     Note that if the command must be a batch file or .cmd file, or the
     changes to the environment will not be captured.
+    On non-windows platforms the command should be a shell script
+    that will be sourced.
 
     If initial is supplied, it is used as the initial environment passed
     to the child process.
     """
     if not isinstance(env_cmd, (list, tuple)):
         env_cmd = [env_cmd]
-    # construct the command that will alter the environment
-    env_cmd = subprocess.list2cmdline(env_cmd)
     # create a tag so we can tell in the output when the proc is done
     tag = "------------- ENV VARS -------------"
-    # construct a cmd.exe command to do accomplish this
-    cmd = f'cmd.exe /s /c "{env_cmd} && echo {tag} && set"'
-    # cmd = ["cmd.exe", "/s", "/s", f'\"{env_cmd} && echo "{tag}" && set\"']
+
+    if os.name == "nt":
+        # construct the command that will alter the environment
+        env_cmd = subprocess.list2cmdline(env_cmd)
+        # construct a cmd.exe command to do accomplish this
+        cmd = f'cmd.exe /s /c "{env_cmd} && echo {tag} && set"'
+        # cmd = ["cmd.exe", "/s", "/s", f'\"{env_cmd} && echo "{tag}" && set\"']
+    else:
+        env_cmd = shlex.join(env_cmd)
+        # Use NUL separated entries to support multiline values:
+        cmd = ["/bin/sh", "-c", f". {env_cmd} && echo '{tag}' && env -0"]
 
     # launch the process
     # logger.info("Executing command: %s", cmd)
@@ -39,26 +50,79 @@ def get_environment_from_batch_command(env_cmd, initial=None):
     out = proc.communicate()[0].decode("utf-8")
     # logger.info("Retrieved whole outputs: %s", out)
 
-    # Split the outputs on the lines:
-    lines = out.splitlines()
-    while lines[0].rstrip() != tag:
-        # logger.info("Dropping line %s", lines[0])
-        lines.pop(0)
+    if proc.returncode != 0 or tag not in out:
+        NVPObject.static_throw(
+            "Cannot retrieve the environment from %s (return code %d), outputs:\n%s", env_cmd, proc.returncode, out
+        )
 
-    # Drop the tag line:
-    lines.pop(0)
+    # Drop the script outputs and the tag line:
+    out = out.split(tag, 1)[1].lstrip()
 
-    # Now parse each line into an environment KEY=VALUE pair:
+    # Now parse each entry into an environment KEY=VALUE pair:
+    entries = out.splitlines() if os.name == "nt" else out.split("\0")
     result = {}
-    for line in lines:
-        parts = line.split("=")
-        assert len(parts) == 2, f"Cannot parse environment variable line '{line}'"
+    for entry in entries:
+        if entry == "":
+            continue
+        parts = entry.split("=", 1)
+        NVPObject.static_check(len(parts) == 2, "Cannot parse environment variable entry '%s'", entry)
         result[parts[0]] = parts[1]
 
     # logger.info("Collected MSVC full environment: %s", result)
     return result
 
 
+class CompilerEnvCache(NVPObject):
+    """Persistent cache of the captured compiler environments.
+    Each entry is invalidated when the mtime of one of its stamp files changes."""
+
+    def __init__(self, filename):
+        """Constructor"""
+        self.filename = filename
+        self.entries = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Load the cache entries from disk"""
+        self.entries = {}
+        if self.file_exists(self.filename):
+            try:
+                self.entries = self.read_json(self.filename)
+            except ValueError:
+                logger.warning("Discarding invalid compiler env cache file %s", self.filename)
+
+    def get(self, key, stamp):
+        """Retrieve a copy of a cached environment, or None if missing or outdated"""
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            entry = self.entries.get(key, None)
+
+        if entry is None or entry["stamp"] != stamp:
+            return None
+
+        return dict(entry["env"])
+
+    def put(self, key, stamp, env):
+        """Store an environment in the cache and write it on disk"""
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            self.entries[key] = {"stamp": stamp, "env": dict(env)}
+            self.make_folder(self.get_parent_folder(self.filename))
+            self.write_json(self.entries, self.filename)
+
+
+_env_caches = {}
+
+
+def get_compiler_env_cache(filename):
+    """Retrieve the shared compiler environment cache for a given file"""
+    if filename not in _env_caches:
+        _env_caches[filename] = CompilerEnvCache(filename)
+    return _env_caches[filename]
+
+
 class NVPCompiler(NVPObject):
     """A class representing a compiler"""
 
@@ -234,10 +298,48 @@ class NVPCompiler(NVPObject):
         """Append a value to both the ldflags"""
         self.append_ldflag(val, env)
 
+    def get_env_cache_file(self):
+        """Retrieve the file used to persist the captured compiler environments"""
+        if "env_cache_file" in self.desc:
+            return self.desc["env_cache_file"]
+        return self.get_path(self.ctx.get_root_dir(), "build", "compiler_envs.json")
+
+    def get_env_cache_key(self):
+        """Retrieve the key used to store this compiler environment in the cache"""
+        return f"{self.type}|{self.cxx_path}|{self.version}|{platform.machine()}"
+
+    def get_env_stamp(self):
+        """Retrieve the list of (file, mtime_ns) entries used to invalidate the cached environment"""
+        files = [self.cxx_path]
+        if self.is_msvc():
+            files.append(self.desc["setup_path"])
+
+        stamp = [[fname, os.stat(fname).st_mtime_ns if self.file_exists(fname) else 0] for fname in files]
+
+        if self.is_clang() and self.is_windows:
+            # The clang environment is built on top of the MSVC environment (including its vcvars script):
+            msvc_comp = self.ctx.get_component("builder").get_compiler("msvc")
+            stamp += msvc_comp.get_env_stamp()
+
+        return stamp
+
     def init_compiler_env(self):
-        """Initialize the compiler specific environment."""
+        """Initialize the compiler specific environment, using the persisted env cache when possible."""
         assert self.comp_env is None, "Compiler environment already initialized."
 
+        cache = get_compiler_env_cache(self.get_env_cache_file())
+        key = self.get_env_cache_key()
+        stamp = self.get_env_stamp()
+        self.comp_env = cache.get(key, stamp)
+        if self.comp_env is not None:
+            logger.debug("Using cached environment for compiler %s", self.get_name())
+            return
+
+        self.capture_compiler_env()
+        cache.put(key, stamp, self.comp_env)
+
+    def capture_compiler_env(self):
+        """Build the compiler specific environment."""
         if self.is_msvc():
             # Get a copy of the original ENV:
             logger.info("Initializing MSVC compiler environment...")
@@ -0,0 +1,107 @@
+"""NVP compiler cache class"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+
+from nvp.nvp_object import NVPObject
+
+logger = logging.getLogger(__name__)
+
+
+class NVPCompilerCache(NVPObject):
+    """Compiler launcher cache (ccache or sccache) used for a given compiler"""
+
+    def __init__(self, ctx, compiler, desc):
+        """Compiler cache constructor"""
+        self.ctx = ctx
+        self.compiler = compiler
+        self.tool = desc.get("tool", "ccache")
+        self.check(self.tool in ["ccache", "sccache"], "Unsupported compiler cache tool %s", self.tool)
+
+        self.path = desc.get("path", None)
+        tools = ctx.get_component("tools")
+        if self.path is None and tools.has_tool(self.tool):
+            self.path = tools.get_tool_path(self.tool)
+        if self.path is None:
+            self.path = shutil.which(self.tool)
+
+        # Use a dedicated cache folder per compiler:
+        base_dir = desc.get("cache_dir", self.get_path(ctx.get_root_dir(), "build", "compiler_cache"))
+        self.cache_dir = self.get_path(base_dir, self.tool, compiler.get_name())
+        self.max_size = desc.get("max_size", None)
+
+    def is_available(self):
+        """Check if the cache tool was found"""
+        return self.path is not None and self.file_exists(self.path)
+
+    def get_env_vars(self):
+        """Retrieve the environment variables used to configure the cache"""
+        if self.tool == "ccache":
+            env = {"CCACHE_DIR": self.cache_dir}
+            if self.max_size is not None:
+                env["CCACHE_MAXSIZE"] = str(self.max_size)
+        else:
+            env = {"SCCACHE_DIR": self.cache_dir}
+            if self.max_size is not None:
+                env["SCCACHE_CACHE_SIZE"] = str(self.max_size)
+        return env
+
+    def setup_env(self, env):
+        """Add the cache configuration to a build environment"""
+        self.make_folder(self.cache_dir)
+        env.update(self.get_env_vars())
+        return env
+
+    def get_launcher_env(self, env):
+        """Retrieve a copy of a build environment where CC/CXX are wrapped with the cache tool.
+        This is used for make/configure builds, cmake builds should use get_cmake_flags() instead."""
+        env = env.copy()
+        for key in ["CC", "CXX"]:
+            if key in env and not env[key].startswith(self.path):
+                env[key] = f"{self.path} {env[key]}"
+        return env
+
+    def get_cmake_flags(self):
+        """Retrieve the cmake flags used to configure the compiler launchers"""
+        return [f"-DCMAKE_C_COMPILER_LAUNCHER={self.path}", f"-DCMAKE_CXX_COMPILER_LAUNCHER={self.path}"]
+
+    def get_stats(self):
+        """Retrieve the current number of hits/misses from the cache"""
+        env = self.setup_env(os.environ.copy())
+        if self.tool == "ccache":
+            cmd = [self.path, "--print-stats"]
+        else:
+            cmd = [self.path, "--show-stats", "--stats-format", "json"]
+
+        try:
+            res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env, check=True)
+        except (OSError, subprocess.CalledProcessError) as err:
+            logger.warning("Cannot retrieve %s statistics: %s", self.tool, str(err))
+            return {"hits": 0, "misses": 0}
+
+        if self.tool == "ccache":
+            # Output is made of "key<tab>value" lines:
+            values = {}
+            for line in res.stdout.splitlines():
+                parts = line.split("\t")
+                if len(parts) == 2 and parts[1].strip().isdigit():
+                    values[parts[0]] = int(parts[1])
+            hits = values.get("direct_cache_hit", 0) + values.get("preprocessed_cache_hit", 0)
+            return {"hits": hits, "misses": values.get("cache_miss", 0)}
+
+        stats = json.loads(res.stdout).get("stats", {})
+        hits = sum(stats.get("cache_hits", {}).get("counts", {}).values())
+        misses = sum(stats.get("cache_misses", {}).get("counts", {}).values())
+        return {"hits": hits, "misses": misses}
+
+    def get_stats_report(self, prev_stats):
+        """Build a report string of the hits/misses since the given previous stats"""
+        stats = self.get_stats()
+        hits = stats["hits"] - prev_stats["hits"]
+        misses = stats["misses"] - prev_stats["misses"]
+        total = hits + misses
+        ratio = 100.0 * hits / total if total > 0 else 0.0
+        return f"{self.tool} ({self.compiler.get_name()}): {hits} hits, {misses} misses ({ratio:.1f}% hit rate)"
@@ -10,6 +10,11 @@ import signal
 import sys
 from importlib import import_module
 
+import xxhash
+
+from nvp.core.handler_cache import HandlerCache
+from nvp.core.http_client import get_http_client
+from nvp.core.templating import TemplateEngine
 from nvp.nvp_object import NVPCheckError, NVPObject
 from nvp.nvp_project import NVPProject
 
@@ -132,15 +137,27 @@ class NVPContext(NVPObject):
             # We could be in a windows batch environment here:
             self.home_dir = self.get_win_home_dir()
 
+        # Caches for the path resolution:
+        self.known_vars = None
+        self.known_vars_key = None
+        self.known_vars_engine = None
+        self.resolved_paths = {}
+        self.module_files = {}
+        self.module_search_path = None
+
         # Load the manager config:
+        self.config_files = []
         self.load_config()
 
+        # Configure the shared http client:
+        get_http_client().configure(self.config.get("http_client", {}), self.root_dir)
+
         self.construct_frames = []
         self.components = {}
         self.projects = []
 
         self.handlers = {}
-        self.handler_hashes = {}
+        self.handler_cache = HandlerCache(self.config.get("handler_reload_mode", "stat"))
 
         self.platform = None
         self.commands = None
@@ -324,6 +341,7 @@ class NVPContext(NVPObject):
         cfg_file = self.get_path(self.root_dir, "config.yml")
         self.check(self.file_exists(cfg_file), "Invalid config file %s", cfg_file)
         self.config = self.read_yaml(cfg_file)
+        self.register_config_file(cfg_file)
         # else:
         #     # fallback to the config.json file:
         #     cfgfile = self.get_path(self.root_dir, "config.json")
@@ -338,6 +356,7 @@ class NVPContext(NVPObject):
             logger.debug("Loading user config from file %s", cfg_file)
 
             user_cfg = self.read_yaml(cfg_file)
+            self.register_config_file(cfg_file)
             self.extend_config(user_cfg)
 
         # First we should retrieve the list of potential paths for that file:
@@ -355,6 +374,7 @@ class NVPContext(NVPObject):
                     user_cfg = self.read_json(cpath)
                 else:
                     user_cfg = self.read_yaml(cpath)
+                self.register_config_file(cpath)
                 self.extend_config(user_cfg)
 
         # cfg_file = self.select_first_valid_path(cfg_paths)
@@ -365,8 +385,55 @@ class NVPContext(NVPObject):
 
         # self.config.update(user_cfg)
 
+    def register_config_file(self, cfg_file):
+        """Register a file used as a source for the configuration"""
+        self.config_files.append(cfg_file)
+
+    def get_config_hash(self):
+        """Compute a hash of all the configuration sources and of the environment they are resolved in.
+        This is used to invalidate the caches derived from the configuration."""
+        hasher = xxhash.xxh64()
+        for cfg_file in self.config_files:
+            hasher.update(f"{cfg_file}:{self.compute_file_hash(cfg_file)}\n".encode("utf-8"))
+
+        for proj in self.get_projects():
+            hasher.update(f"{proj.get_name(False)}:{proj.get_root_dir()}\n".encode("utf-8"))
+
+        for elem in [self.platform, self.get_hostname(), self.home_dir, sys.executable]:
+            hasher.update(f"{elem}\n".encode("utf-8"))
+
+        return hasher.hexdigest()
+
     def get_known_vars(self):
-        """Get all the known dirs variables."""
+        """Get all the known dirs variables.
+        A copy of the cached table is returned, so the callers can extend it."""
+        return dict(self.get_known_vars_table())
+
+    def get_known_vars_key(self):
+        """Retrieve the inputs of the known vars table, used to detect when it should be rebuilt"""
+        return (self.base_dir, self.home_dir, len(self.projects))
+
+    def invalidate_path_caches(self):
+        """Clear the cached known vars table and the resolved paths"""
+        self.known_vars = None
+        self.known_vars_key = None
+        self.known_vars_engine = None
+        self.resolved_paths = {}
+
+    def get_known_vars_table(self):
+        """Retrieve the cached known vars table, building it if needed.
+        This table should not be modified by the caller."""
+        key = self.get_known_vars_key()
+        if self.known_vars is not None and key == self.known_vars_key:
+            return self.known_vars
+
+        self.invalidate_path_caches()
+        self.known_vars = self.build_known_vars()
+        self.known_vars_key = key
+        return self.known_vars
+
+    def build_known_vars(self):
+        """Build the table of known dirs variables."""
         hlocs = {
             "${NVP_DIR}": self.root_dir,
             "${HOME_DIR}": self.home_dir,
@@ -389,17 +456,22 @@ class NVPContext(NVPObject):
 
     def resolve_path(self, path, check_resolved=True):
         """Fill placeholders in a path."""
-        hlocs = self.get_known_vars()
+        hlocs = self.get_known_vars_table()
 
-        path = self.fill_placeholders(path, hlocs)
+        resolved = self.resolved_paths.get(path, None)
+        if resolved is None:
+            if self.known_vars_engine is None:
+                self.known_vars_engine = TemplateEngine(hlocs)
+            resolved = self.known_vars_engine.fill(path)
+            self.resolved_paths[path] = resolved
 
         if check_resolved:
             # Check that we have no remaining vars:
             pattern = r"\$\{([^}]+)\}"
-            matches = re.findall(pattern, path)
+            matches = re.findall(pattern, resolved)
             self.check(len(matches) == 0, "Found unresolved variables in path: %s", matches)
 
-        return path
+        return resolved
 
     def enable_process_restart(self):
         """Notify that we will want to restart the current process"""
@@ -748,6 +820,7 @@ class NVPContext(NVPObject):
     def add_project(self, proj):
         """Add a project to the list"""
         self.projects.append(proj)
+        self.invalidate_path_caches()
 
     def get_projects(self):
         """Retrieve the list of available projects"""
@@ -757,14 +830,26 @@ class NVPContext(NVPObject):
         """Resolve a file path for a given python module name"""
         sep = "\\" if self.is_windows else "/"
 
-        hfile = hname.replace(".", sep) + ".py"
+        # The cached results are only valid for a given search path:
+        if self.module_search_path != sys.path:
+            self.module_search_path = list(sys.path)
+            self.module_files = {}
+
+        if hname not in self.module_files:
+            hfile = hname.replace(".", sep) + ".py"
+            self.module_files[hname] = None
 
-        for base_path in sys.path:
-            filepath = self.get_path(base_path, hfile)
-            if self.file_exists(filepath):
-                return filepath
+            for base_path in sys.path:
+                filepath = self.get_path(base_path, hfile)
+                if self.file_exists(filepath):
+                    self.module_files[hname] = filepath
+                    break
+
+        filepath = self.module_files[hname]
+        if filepath is None:
+            self.throw("Cannot resolve file for module %s", hname)
 
-        self.throw("Cannot resolve file for module %s", hname)
+        return filepath
 
     def get_handler(self, hname):
         """Get a handler by name"""
@@ -773,19 +858,13 @@ class NVPContext(NVPObject):
         # Given a module name, we should try to find the corresponding file:
         filepath = self.resolve_module_file(hname)
 
-        # Compute the hash of that file:
-        fhash = self.compute_file_hash(filepath)
-        prev_hash = self.handler_hashes.get(filepath, None)
-        if prev_hash is not None and prev_hash != fhash:
+        # Check if that file was modified (the content is only hashed if the mtime or size changed):
+        if self.handler_cache.has_changed(filepath) and hname in self.handlers:
             logger.debug("Detected change in %s, reloading handler %s", filepath, hname)
 
             # Remove the already loaded function:
-            self.check(hname in self.handlers, "Expected handler to be loader already: %s", hname)
             del self.handlers[hname]
 
-        # Store the new file hash anyway:
-        self.handler_hashes[filepath] = fhash
-
         if hname in self.handlers:
             return self.handlers[hname]
 
@@ -24,12 +24,13 @@ from queue import Queue
 from threading import Thread
 
 import jstyleson
-import requests
-import urllib3
 import xxhash
 import yaml
 from yaml.loader import SafeLoader
 
+from nvp.core.http_client import get_http_client
+from nvp.core.templating import TemplateEngine
+
 logger = logging.getLogger(__name__)
 
 printer = pprint.PrettyPrinter(indent=2)
@@ -501,13 +502,23 @@ class NVPObject(object):
         """Write content of file"""
 
         fname = self.get_path(*parts)
+        self.break_hard_link(fname)
         with open(fname, mode) as file:
             file.write(content)
 
+    def break_hard_link(self, fname):
+        """Replace a hard linked file with a private copy before modifying it in place,
+        so that the other links (for instance the pristine trees of the source mirror) are not modified"""
+        if os.path.isfile(fname) and os.stat(fname).st_nlink > 1:
+            tmp_file = fname + ".nvp_tmp"
+            shutil.copy2(fname, tmp_file)
+            os.replace(tmp_file, fname)
+
     def write_text_file(self, content, *parts, mode="w", newline=None, encoding="utf-8"):
         """Write content of file"""
 
         fname = self.get_path(*parts)
+        self.break_hard_link(fname)
         with open(fname, mode, encoding=encoding, newline=newline) as file:
             file.write(content)
 
@@ -549,6 +560,7 @@ class NVPObject(object):
             pdir = os.path.dirname(fname)
             if pdir != "":
                 os.makedirs(pdir, exist_ok=True)
+            self.break_hard_link(fname)
             with open(fname, "w+", encoding="utf-8") as file:
                 yaml.dump(data, file, sort_keys=sort_keys)
         except yaml.YAMLError as err:
@@ -565,6 +577,7 @@ class NVPObject(object):
     def write_ini(self, config, *parts, newline=None):
         """Write a config parser object as ini file"""
         fname = self.get_path(*parts)
+        self.break_hard_link(fname)
         with open(fname, "w", encoding="utf-8", newline=newline) as file:
             config.write(file)
 
@@ -580,6 +593,7 @@ class NVPObject(object):
         filedata = filedata.replace(src, repl)
 
         # Write the file out again
+        self.break_hard_link(filename)
         with open(filename, "w", encoding="utf-8") as file:
             file.write(filedata)
 
@@ -854,7 +868,7 @@ class NVPObject(object):
         # cf. https://stackoverflow.com/questions/61629856/how-to-check-whether-a-url-is-downloadable-or-not
         # headers = requests.head(url).headers
         # return 'attachment' in headers.get('Content-Disposition', '')
-        response = requests.get(url, stream=True)
+        response = get_http_client().get_session(url).get(url, stream=True)
         if not response.ok:
             return False
 
@@ -925,6 +939,8 @@ class NVPObject(object):
         num_last_outputs = kwargs.get("num_last_outputs", 20)
         encoding = kwargs.get("encoding", "utf-8")
         check_call = kwargs.get("use_check_call", False)
+        # Optional function receiving the resource usage of the terminated process (not supported on windows):
+        rusage_callback = kwargs.get("rusage_callback", None)
 
         if check_call:
             # Simple mechanism with check_call usage:
@@ -1014,7 +1030,13 @@ class NVPObject(object):
                             outfile.flush()
 
             logger.debug("Waiting for subprocess to finish...")
-            proc.wait()
+            if rusage_callback is not None and hasattr(os, "wait4"):
+                # Reap the process ourself to retrieve its own resource usage:
+                _, status, usage = os.wait4(proc.pid, 0)
+                proc.returncode = os.waitstatus_to_exitcode(status)
+                rusage_callback(usage)
+            else:
+                proc.wait()
             logger.debug("Returncode: %d", proc.returncode)
 
             if proc.returncode != 0 and check:
@@ -1151,7 +1173,7 @@ class NVPObject(object):
     def get_online_content(self, url, timeout=20):
         """Get the content from a given URL"""
         logger.info("Sending request on %s...", url)
-        response = requests.get(url, timeout=timeout)
+        response = get_http_client().get_session(url).get(url, timeout=timeout)
         content = response.text
 
         return content
@@ -1183,57 +1205,22 @@ class NVPObject(object):
         retry_delay=0.1,
         **kwargs,
     ):
-        """Make a get request"""
+        """Make a get request, using the shared HTTP client.
+        Set use_cache=True to use the ETag/Last-Modified response cache."""
 
         status_codes = kwargs.get("status_codes", [200])
-
-        count = 0
-        while max_retries == 0 or count < max_retries:
-            try:
-                logger.debug("Sending request...")
-                resp = requests.get(url, timeout=timeout, params=params, headers=headers)
-
-                if resp is None:
-                    count += 1
-                    logger.error(
-                        "No response received from get request to %s, retrying (%d/%d)...",
-                        url,
-                        count,
-                        max_retries,
-                    )
-                    continue
-
-                if resp.status_code not in status_codes:
-                    count += 1
-                    logger.error(
-                        "Received bad status %d from get request to %s (params=%s): %s, retrying (%d/%d)...",
-                        resp.status_code,
-                        url,
-                        params or "None",
-                        resp.text,
-                        count,
-                        max_retries,
-                    )
-                    time.sleep(retry_delay)
-                    continue
-
-                return resp
-
-            except (
-                urllib3.exceptions.ReadTimeoutError,
-                requests.exceptions.ConnectionError,
-                requests.exceptions.ReadTimeout,
-                requests.exceptions.Timeout,
-            ):
-                count += 1
-                logger.error(
-                    "Exception occured in get request to %s, retrying (%d/%d)...",
-                    url,
-                    count,
-                    max_retries,
-                )
-
-        return None
+        use_cache = kwargs.get("use_cache", False)
+
+        return get_http_client().get(
+            url,
+            params=params,
+            timeout=timeout,
+            headers=headers,
+            max_retries=max_retries,
+            retry_delay=retry_delay,
+            status_codes=status_codes,
+            use_cache=use_cache,
+        )
 
     def make_post_request(
         self,
@@ -1244,77 +1231,22 @@ class NVPObject(object):
         headers=None,
         retry_delay=0.1,
     ):
-        """Make a post request"""
-
-        count = 0
-        while max_retries == 0 or count < max_retries:
-            try:
-                logger.debug("Sending request...")
-                resp = requests.post(url, timeout=timeout, data=data, headers=headers)
-
-                if resp is None:
-                    count += 1
-                    logger.error(
-                        "No response received from post request to %s, retrying (%d/%d)...",
-                        url,
-                        count,
-                        max_retries,
-                    )
-                    continue
-
-                if resp.status_code != 200:
-                    count += 1
-                    logger.error(
-                        "Received bad status %d from post request to %s (data=%s), retrying (%d/%d)...",
-                        resp.status_code,
-                        url,
-                        data or "None",
-                        count,
-                        max_retries,
-                    )
-                    time.sleep(retry_delay)
-                    continue
-
-                return resp
-
-            # note: could cache generic requests exception requests.exceptions.RequestException below.
-            except (
-                urllib3.exceptions.ReadTimeoutError,
-                requests.exceptions.ConnectionError,
-                requests.exceptions.ReadTimeout,
-                requests.exceptions.Timeout,
-            ):
-                count += 1
-                logger.error(
-                    "Exception occured in post request to %s, retrying (%d/%d)...",
-                    url,
-                    count,
-                    max_retries,
-                )
-
-        return None
+        """Make a post request, using the shared HTTP client"""
+
+        return get_http_client().post(
+            url,
+            data=data,
+            timeout=timeout,
+            headers=headers,
+            max_retries=max_retries,
+            retry_delay=retry_delay,
+            status_codes=[200],
+        )
 
     def fill_placeholders(self, content, hlocs):
         """Fill the placeholders in a given content"""
         if content is None:
             return None
 
-        # If content is a list, then we process each element in the list:
-        if isinstance(content, list):
-            return [self.fill_placeholders(elem, hlocs) for elem in content]
-
-        # If content is a dict, then we process each element in the dict:
-        if isinstance(content, dict):
-            return {key: self.fill_placeholders(elem, hlocs) for key, elem in content.items()}
-
-        # Ignore non-strings:
-        if not isinstance(content, str):
-            return content
-
-        for loc, rep in hlocs.items():
-            if rep is None:
-                logger.debug("Ignoring invalid replacement for %s in %s", loc, content)
-                continue
-            content = content.replace(loc, rep)
-
-        return content
+        # Lists and dicts are processed recursively, and non-strings are ignored:
+        return TemplateEngine(hlocs).fill(content)
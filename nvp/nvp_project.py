@@ -36,6 +36,7 @@ class NVPProject(NVPObject):
             if self.file_exists(cfg_file) and not is_local_sub_proj:
                 # logger.warning("Ignoring project config file %s", cfg_file)
                 self.config.update(self.read_json(cfg_file))
+                ctx.register_config_file(cfg_file)
 
             # Prefer the yaml config if available:
             cfg_file = self.get_path(proj_path, "nvp_config.yml")
@@ -43,6 +44,7 @@ class NVPProject(NVPObject):
                 cfg = self.read_yaml(cfg_file)
                 # logger.info("Project %s config: %s", self.get_name(False), cfg)
                 self.config.update(cfg)
+                ctx.register_config_file(cfg_file)
 
             # Note: the nvp_plug system bellow is obsolete and should be removed eventually:
             if ctx.is_master_context() and self.file_exists(proj_path, "nvp_plug.py") and not is_local_sub_proj:
@@ -72,6 +74,7 @@ class NVPProject(NVPObject):
 
                 # Read that config file:
                 scfg = self.read_yaml(sproj_cfg)
+                ctx.register_config_file(sproj_cfg)
 
                 scfg["parent_root_dir"] = proj_path
 
@@ -1,9 +1,59 @@
+import json
+
 import netCDF4
 import numpy as np
+import xxhash
 
 from nvp.nvp_object import NVPObject
 
 
+def extract_schema_desc(filename):
+    """Extract the python schema description of a given netcdf file.
+
+    This is a module level function so that it can be sent to a process pool.
+    Only the metadata of the file is read here, the variable data is never accessed."""
+    return NCSchema(filename).to_dict()
+
+
+def get_group_name(prefix):
+    """Retrieve the group name used for a given prefix"""
+    return prefix if prefix != "" else "root"
+
+
+def split_schema_groups(desc):
+    """Split a schema description into one sub schema per group.
+
+    Each sub schema keeps the same structure as the full schema,
+    so that DeepDiff paths are identical in both cases."""
+    groups = {}
+
+    def get_group(gname):
+        if gname not in groups:
+            groups[gname] = {"dimensions": {}, "grp_attribs": {}, "variables": {}}
+        return groups[gname]
+
+    for dim_name, dim in desc.get("dimensions", {}).items():
+        get_group(get_group_name(dim[1]))["dimensions"][dim_name] = dim
+
+    for gname, attribs in desc.get("grp_attribs", {}).items():
+        get_group(gname)["grp_attribs"][gname] = attribs
+
+    for key, var_desc in desc.get("variables", {}).items():
+        get_group(get_group_name(var_desc["prefix"]))["variables"][key] = var_desc
+
+    return groups
+
+
+def compute_group_hashes(desc):
+    """Compute a structural hash for each group of a schema description."""
+    hashes = {}
+    for gname, sub_desc in split_schema_groups(desc).items():
+        content = json.dumps(sub_desc, sort_keys=True, default=str)
+        hashes[gname] = xxhash.xxh3_64_hexdigest(content.encode("utf-8"))
+
+    return hashes
+
+
 class NCSchema(NVPObject):
     """Helper class used to parse the complete structure of a netcdf file"""
 
@@ -98,6 +148,8 @@ class NCSchema(NVPObject):
         """Convert from numpy to simple python elements."""
         if isinstance(obj, np.generic):
             return obj.item()
+        elif isinstance(obj, np.ndarray):
+            return obj.tolist()
         elif isinstance(obj, (list, tuple)):
             return [self.convert_numpy_to_python(item) for item in obj]
         elif isinstance(obj, dict):
@@ -105,8 +157,8 @@ class NCSchema(NVPObject):
         else:
             return obj
 
-    def write_yaml_file(self, filename):
-        """Write this schema as a yaml file"""
+    def to_dict(self):
+        """Convert this schema to a simple python dict"""
 
         desc = {
             "dimensions": self.dimensions,
@@ -114,5 +166,8 @@ class NCSchema(NVPObject):
             "variables": self.variables,
         }
 
-        desc = self.convert_numpy_to_python(desc)
-        self.write_yaml(desc, filename)
+        return self.convert_numpy_to_python(desc)
+
+    def write_yaml_file(self, filename):
+        """Write this schema as a yaml file"""
+        self.write_yaml(self.to_dict(), filename)
@@ -2,12 +2,23 @@
 """
 
 import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 
+import netCDF4
+import numpy as np
 from deepdiff import DeepDiff
 
 from nvp.nvp_component import NVPComponent
 from nvp.nvp_context import NVPContext
-from nvp.tools.ncschema import NCSchema
+from nvp.tools.ncschema import (
+    NCSchema,
+    compute_group_hashes,
+    extract_schema_desc,
+    split_schema_groups,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +29,7 @@ class NetCDFManager(NVPComponent):
     def __init__(self, ctx: NVPContext):
         """class constructor"""
         NVPComponent.__init__(self, ctx)
+        self.cache_version = 1
 
     def process_cmd_path(self, cmd):
         """Check if this component can process the given command"""
@@ -63,8 +75,176 @@ class NetCDFManager(NVPComponent):
 
             return True
 
+        if cmd == "scan_schemas":
+            pat = self.get_param("pattern")
+            folder = self.get_cwd()
+            cache_file = self.get_param("cache_file") or self.get_path(folder, ".ncschema_cache.json")
+            all_files = sorted(self.get_all_files(folder, exp=pat, recursive=True))
+            self.scan_schemas(folder, all_files, cache_file, self.get_param("num_jobs"))
+            return True
+
+        if cmd == "bench_schemas":
+            self.bench_schemas(self.get_param("num_files"), self.get_param("num_jobs"))
+            return True
+
         return False
 
+    def load_schema_cache(self, cache_file):
+        """Load the schema cache file if available"""
+        if cache_file is None or not self.file_exists(cache_file):
+            return {}
+
+        cache = self.read_json(cache_file)
+        if cache.get("version", 0) != self.cache_version:
+            logger.info("Ignoring outdated schema cache %s", cache_file)
+            return {}
+
+        return cache.get("files", {})
+
+    def save_schema_cache(self, cache_file, entries):
+        """Save the schema cache file"""
+        if cache_file is not None:
+            self.write_json({"version": self.cache_version, "files": entries}, cache_file)
+
+    def get_schemas(self, folder, files, cache_file=None, num_jobs=None):
+        """Retrieve the schema entries for a list of files, using the cache when
+        the file size and mtime did not change, and extracting the others in a process pool.
+        Returns a dict of entries with the keys 'size', 'mtime_ns', 'schema' and 'hashes'."""
+
+        cache = self.load_schema_cache(cache_file)
+        entries = {}
+        missing = []
+
+        for fname in files:
+            stt = os.stat(self.get_path(folder, fname))
+            entry = cache.get(fname, None)
+            if entry is not None and entry["size"] == stt.st_size and entry["mtime_ns"] == stt.st_mtime_ns:
+                entries[fname] = entry
+            else:
+                entries[fname] = {"size": stt.st_size, "mtime_ns": stt.st_mtime_ns}
+                missing.append(fname)
+
+        logger.info("Found %d cached schemas, extracting %d schemas...", len(files) - len(missing), len(missing))
+
+        if len(missing) > 0:
+            paths = [self.get_path(folder, fname) for fname in missing]
+            if num_jobs == 1 or len(missing) == 1:
+                descs = [extract_schema_desc(fpath) for fpath in paths]
+            else:
+                with ProcessPoolExecutor(max_workers=num_jobs) as executor:
+                    descs = list(executor.map(extract_schema_desc, paths, chunksize=4))
+
+            for fname, desc in zip(missing, descs):
+                entries[fname]["schema"] = desc
+                entries[fname]["hashes"] = compute_group_hashes(desc)
+
+            self.save_schema_cache(cache_file, entries)
+
+        return entries
+
+    def scan_schemas(self, folder, files, cache_file=None, num_jobs=None):
+        """Extract the schemas of all the given files and compare them to the first one.
+        Returns True if some differences were found."""
+
+        if len(files) <= 1:
+            logger.info("Not enough files to compare.")
+            return False
+
+        start_time = time.time()
+        entries = self.get_schemas(folder, files, cache_file, num_jobs)
+        logger.info("Retrieved %d schemas in %.3f secs", len(entries), time.time() - start_time)
+
+        ref_name = files[0]
+        ref_entry = entries[ref_name]
+        ref_groups = None
+        logger.info("Comparing schemas against %s...", ref_name)
+
+        diffs_found = False
+        num_deep_diffs = 0
+        for fname in files[1:]:
+            entry = entries[fname]
+            hashes = entry["hashes"]
+            ref_hashes = ref_entry["hashes"]
+            all_groups = sorted(set(hashes) | set(ref_hashes))
+            changed = [gname for gname in all_groups if hashes.get(gname) != ref_hashes.get(gname)]
+            if len(changed) == 0:
+                continue
+
+            # Only run a full comparison on the groups that have different hashes:
+            if ref_groups is None:
+                ref_groups = split_schema_groups(ref_entry["schema"])
+            groups = split_schema_groups(entry["schema"])
+
+            for gname in changed:
+                num_deep_diffs += 1
+                ref_desc = ref_groups.get(gname, {})
+                desc = groups.get(gname, {})
+                if self.compare_schemas(ref_desc, desc):
+                    logger.info("=> in group '%s' of %s", gname, fname)
+                    diffs_found = True
+
+        logger.info(
+            "Compared %d schemas in %.3f secs (%d group deep diffs)",
+            len(files),
+            time.time() - start_time,
+            num_deep_diffs,
+        )
+        if not diffs_found:
+            logger.info("No difference found.")
+
+        return diffs_found
+
+    def write_test_file(self, filename, num_groups=4, num_vars=16, size=128):
+        """Write a synthetic netcdf file that can be used for benchmarking"""
+        with netCDF4.Dataset(filename, "w") as dset:
+            dset.product_name = self.get_filename(filename)
+            dset.createDimension("time", None)
+            for gidx in range(num_groups):
+                grp = dset.createGroup(f"group{gidx}")
+                grp.title = f"Synthetic group {gidx}"
+                grp.createDimension(f"x{gidx}", size)
+                grp.createDimension(f"y{gidx}", size)
+                for vidx in range(num_vars):
+                    var = grp.createVariable(f"var{vidx}", "f4", (f"x{gidx}", f"y{gidx}"))
+                    var.units = "m"
+                    var.valid_range = np.array([0.0, 1.0], dtype=np.float32)
+                    var[:] = np.random.random((size, size)).astype(np.float32)
+
+    def bench_schemas(self, num_files, num_jobs=None):
+        """Benchmark the schema extraction and comparison on synthetic files."""
+
+        with tempfile.TemporaryDirectory() as folder:
+            logger.info("Generating %d synthetic netcdf files...", num_files)
+            files = []
+            for idx in range(num_files):
+                fname = f"file_{idx:04d}.nc"
+                self.write_test_file(self.get_path(folder, fname))
+                files.append(fname)
+
+            # Reference implementation, serial with full YAML round trip:
+            start_time = time.time()
+            for fname in files:
+                full_path = self.get_path(folder, fname)
+                self.write_schema(full_path, self.set_path_extension(full_path, ".schema.yaml"))
+            ref_schema = self.read_yaml(self.get_path(folder, "file_0000.schema.yaml"))
+            for fname in files[1:]:
+                schema = self.read_yaml(self.get_path(folder, self.set_path_extension(fname, ".schema.yaml")))
+                self.compare_schemas(ref_schema, schema)
+            serial_time = time.time() - start_time
+
+            cache_file = self.get_path(folder, ".ncschema_cache.json")
+            start_time = time.time()
+            self.scan_schemas(folder, files, cache_file, num_jobs)
+            cold_time = time.time() - start_time
+
+            start_time = time.time()
+            self.scan_schemas(folder, files, cache_file, num_jobs)
+            warm_time = time.time() - start_time
+
+        logger.info("Serial extract + compare: %.3f secs", serial_time)
+        logger.info("Parallel scan (cold cache): %.3f secs", cold_time)
+        logger.info("Parallel scan (warm cache): %.3f secs", warm_time)
+
     def write_schema(self, input_file, output_file):
         """Write the schema of a given netcdf file to file."""
 
@@ -139,4 +319,13 @@ if __name__ == "__main__":
     psr = context.build_parser("compare_schemas")
     psr.add_str("-p", "--pattern", dest="pattern", default=r"\.schema\.yaml$")("Schema file pattern")
 
+    psr = context.build_parser("scan_schemas")
+    psr.add_str("-p", "--pattern", dest="pattern", default=r"\.nc$")("Input file pattern")
+    psr.add_str("-c", "--cache", dest="cache_file")("Schema cache file")
+    psr.add_int("-j", "--jobs", dest="num_jobs")("Number of worker processes")
+
+    psr = context.build_parser("bench_schemas")
+    psr.add_int("-n", "--num-files", dest="num_files", default=64)("Number of synthetic files")
+    psr.add_int("-j", "--jobs", dest="num_jobs")("Number of worker processes")
+
     comp.run()
@@ -0,0 +1,87 @@
+"""Unit tests on the streaming brotli/zstd compressors"""
+
+import logging
+import os
+import random
+import tempfile
+import time
+import unittest
+
+from utils import TestBase
+
+from nvp.nvp_context import NVPContext
+
+try:
+    from nvp.admin import brotli_handler
+except ModuleNotFoundError:
+    brotli_handler = None
+
+logger = logging.getLogger(__name__)
+
+
+@unittest.skipIf(brotli_handler is None, "brotli is not available")
+class Tests(TestBase):
+    """Streaming compressors tests"""
+
+    def setUp(self):
+        """Create a synthetic wasm file"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.wasm_file = os.path.join(self.tmp_dir.name, "app.wasm")
+
+        # Semi compressible content, similar to a wasm binary:
+        rng = random.Random(42)
+        words = [rng.randbytes(rng.randint(2, 12)) for _ in range(4096)]
+        size = int(os.getenv("NVP_BENCH_WASM_SIZE", str(8 * 1024 * 1024)))
+        with open(self.wasm_file, "wb") as file:
+            written = 0
+            while written < size:
+                block = b"".join(rng.choices(words, k=16384))
+                file.write(block)
+                written += len(block)
+
+    def tearDown(self):
+        """Remove the temp folder"""
+        NVPContext.instance = None
+        self.tmp_dir.cleanup()
+
+    def read_file(self, fname):
+        """Read a binary file"""
+        with open(fname, "rb") as file:
+            return file.read()
+
+    def test_roundtrip(self):
+        """Test compressing and decompressing a file with each codec"""
+        codecs = ["br"] + (["zstd"] if brotli_handler.zstandard is not None else [])
+        for codec in codecs:
+            out_file = self.wasm_file + brotli_handler.CODEC_EXTS[codec]
+            stats = brotli_handler.compress_file(self.wasm_file, out_file, codec, 5)
+            self.assertLess(stats["output_size"], stats["input_size"])
+
+            dec_file = os.path.join(self.tmp_dir.name, f"dec_{codec}.wasm")
+            brotli_handler.decompress_file(out_file, dec_file, brotli_handler.get_codec(out_file))
+            self.assertEqual(self.read_file(dec_file), self.read_file(self.wasm_file))
+
+    def test_compress_directory(self):
+        """Test precompressing the assets of a folder, skipping the up to date outputs"""
+        comp = brotli_handler.BrotliHandler(NVPContext.get(create=True))
+        with open(os.path.join(self.tmp_dir.name, "index.html"), "w", encoding="utf-8") as file:
+            file.write("<html>" * 1000)
+
+        results = comp.compress_directory(self.tmp_dir.name, ["br"], 5, max_workers=2)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(comp.compress_directory(self.tmp_dir.name, ["br"], 5), [])
+
+        # Updating an input should only recompress that file:
+        time.sleep(0.01)
+        os.utime(self.wasm_file)
+        results = comp.compress_directory(self.tmp_dir.name, ["br"], 5)
+        self.assertEqual([res["file"] for res in results], [self.wasm_file])
+
+    def test_benchmark(self):
+        """Report the throughput and peak RSS (set NVP_BENCH_WASM_SIZE for large files)"""
+        comp = brotli_handler.BrotliHandler(NVPContext.get(create=True))
+        codecs = ["br"] + (["zstd"] if brotli_handler.zstandard is not None else [])
+        results = comp.bench_files([self.wasm_file], codecs, 9)
+        self.assertEqual(len(results), len(codecs))
+        for res in results:
+            self.assertGreater(res["compress_mbps"], 0.0)
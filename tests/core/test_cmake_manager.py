@@ -0,0 +1,168 @@
+"""Unit tests on the cmake manager helpers"""
+
+import logging
+import os
+import tempfile
+import threading
+
+from utils import TestBase
+
+from nvp.core.cmake_manager import BuildJobPool, CMakeManager
+from nvp.nvp_context import NVPContext
+
+logger = logging.getLogger(__name__)
+
+
+class FakeBuilder:
+    """Minimal stand-in for the build manager"""
+
+    def __init__(self, lib_dir):
+        self.lib_dir = lib_dir
+
+    def has_library(self, _lib_name):
+        """All the dependencies are libraries"""
+        return True
+
+    def get_library_root_dir(self, _lib_name):
+        """Retrieve the root folder of a library"""
+        return self.lib_dir
+
+
+class Tests(TestBase):
+    """Cmake manager tests"""
+
+    def setUp(self):
+        """Create a cmake manager installing the dep modules of a test project"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.lib_dir = os.path.join(self.tmp_dir.name, "lib")
+        self.install_dir = os.path.join(self.tmp_dir.name, "install")
+        self.modules = {"lib/a.so": "bin/", "lib/b.so": "bin/", "data/c.txt": "share/c.txt"}
+        for src_file in self.modules:
+            self.write_file(os.path.join(self.lib_dir, src_file), b"content")
+
+        self.manager = CMakeManager(NVPContext())
+        desc = {"install_dir": self.install_dir, "linux_dep_modules": {"mylib": self.modules}}
+        self.manager.cmake_projects = {"demo": desc}
+        self.manager.get_component = lambda cname: FakeBuilder(self.lib_dir) if cname == "builder" else None
+
+    def tearDown(self):
+        """Release the context and remove the temp folder"""
+        NVPContext.instance = None
+        self.tmp_dir.cleanup()
+
+    def write_file(self, fpath, content, mtime_ns=None):
+        """Write a file, with an optional modification time"""
+        os.makedirs(os.path.dirname(fpath), exist_ok=True)
+        with open(fpath, "wb") as file:
+            file.write(content)
+        if mtime_ns is not None:
+            os.utime(fpath, ns=(mtime_ns, mtime_ns))
+
+    def install(self):
+        """Install the dep modules, returning the number of copied files"""
+        return self.manager.install_dep_modules("demo", None, "linux")
+
+    def read_installed(self, dst_file):
+        """Read an installed file"""
+        with open(os.path.join(self.install_dir, dst_file), "rb") as file:
+            return file.read()
+
+    def test_install_manifest(self):
+        """Test the incremental install of the dep modules using the install manifest"""
+        # Initial copy:
+        self.assertEqual(self.install(), 3)
+        self.assertEqual(self.read_installed("bin/a.so"), b"content")
+        self.assertEqual(self.read_installed("share/c.txt"), b"content")
+        self.assertTrue(os.path.isfile(self.manager.get_install_manifest_file(self.install_dir)))
+
+        # Unchanged files are skipped without hashing them:
+        hashed = []
+        compute_file_hash = self.manager.compute_file_hash
+
+        def count_hash(fpath):
+            hashed.append(fpath)
+            return compute_file_hash(fpath)
+
+        self.manager.compute_file_hash = count_hash
+        self.assertEqual(self.install(), 0)
+        self.assertEqual(hashed, [])
+
+        # Copied again when the source mtime changes, even with the same size:
+        src_a = os.path.join(self.lib_dir, "lib/a.so")
+        self.write_file(src_a, b"updated", os.stat(src_a).st_mtime_ns + 1000000000)
+        self.assertEqual(self.install(), 1)
+        self.assertEqual(self.read_installed("bin/a.so"), b"updated")
+
+        # Copied again when the source size changes:
+        self.write_file(os.path.join(self.lib_dir, "data/c.txt"), b"longer content")
+        self.assertEqual(self.install(), 1)
+        self.assertEqual(self.read_installed("share/c.txt"), b"longer content")
+
+        # Copied again when the installed file was modified:
+        self.write_file(os.path.join(self.install_dir, "bin/b.so"), b"modified content")
+        self.assertEqual(self.install(), 1)
+        self.assertEqual(self.read_installed("bin/b.so"), b"content")
+        self.assertEqual(self.install(), 0)
+
+    def test_install_manifest_removed_modules(self):
+        """Test that the installed files not listed in the dep modules anymore are removed"""
+        self.assertEqual(self.install(), 3)
+
+        del self.modules["lib/b.so"]
+        self.assertEqual(self.install(), 0)
+        self.assertFalse(os.path.exists(os.path.join(self.install_dir, "bin/b.so")))
+        self.assertTrue(os.path.isfile(os.path.join(self.install_dir, "bin/a.so")))
+        self.assertNotIn("bin/b.so", self.manager.load_install_manifest(self.install_dir))
+
+        # A removed module file modified since its install is kept:
+        self.write_file(os.path.join(self.install_dir, "share/c.txt"), b"user data")
+        del self.modules["data/c.txt"]
+        self.assertEqual(self.install(), 0)
+        self.assertEqual(self.read_installed("share/c.txt"), b"user data")
+
+        self.modules.clear()
+        self.install()
+        self.assertFalse(os.path.exists(os.path.join(self.install_dir, "bin/a.so")))
+        self.assertEqual(self.manager.load_install_manifest(self.install_dir), {})
+
+    def test_job_pool_shares(self):
+        """Test that the jobs are split between the projects in flight"""
+        pool = BuildJobPool(16)
+        pool.add_project()
+        pool.add_project()
+        self.assertEqual(pool.acquire(), 8)
+        # The last pending project takes all the remaining jobs:
+        self.assertEqual(pool.acquire(), 8)
+
+        pool.release(8)
+        pool.add_project()
+        pool.add_project()
+        self.assertEqual(pool.acquire(), 5)
+        self.assertEqual(pool.acquire(), 3)
+
+    def test_job_pool_single_project(self):
+        """Test that a project building alone gets all the jobs"""
+        pool = BuildJobPool(12)
+        pool.add_project()
+        self.assertEqual(pool.acquire(), 12)
+        pool.release(12)
+        self.assertEqual(pool.available, 12)
+        self.assertEqual(pool.num_projects, 0)
+
+    def test_job_pool_wait(self):
+        """Test that a build waits for its share when the pool is fully claimed"""
+        pool = BuildJobPool(8)
+        pool.add_project()
+        self.assertEqual(pool.acquire(), 8)
+
+        pool.add_project()
+        counts = []
+        thread = threading.Thread(target=lambda: counts.append(pool.acquire()))
+        thread.start()
+        thread.join(timeout=0.2)
+        self.assertEqual(counts, [])
+
+        # The released jobs are granted to the waiting build:
+        pool.release(8)
+        thread.join(timeout=10)
+        self.assertEqual(counts, [8])
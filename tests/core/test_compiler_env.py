@@ -0,0 +1,105 @@
+"""Unit tests on the compiler environment capture and cache"""
+
+import logging
+import os
+import tempfile
+
+from utils import TestBase
+
+from nvp.nvp_compiler import NVPCompiler, get_environment_from_batch_command
+from nvp.nvp_object import NVPCheckError
+
+logger = logging.getLogger(__name__)
+
+
+class Tests(TestBase):
+    """Compiler environment tests"""
+
+    def setUp(self):
+        """Prepare a fake compiler folder"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root_dir = self.tmp_dir.name
+        os.makedirs(os.path.join(self.root_dir, "bin"))
+        self.cxx_path = os.path.join(self.root_dir, "bin", "clang++")
+        with open(self.cxx_path, "w", encoding="utf-8") as file:
+            file.write("fake compiler")
+
+    def tearDown(self):
+        """Remove the fake compiler folder"""
+        self.tmp_dir.cleanup()
+
+    def create_compiler(self):
+        """Create a compiler using a dedicated env cache file"""
+        desc = {
+            "type": "clang",
+            "root_dir": self.root_dir,
+            "version": "18.1.0",
+            "env_cache_file": os.path.join(self.root_dir, "compiler_envs.json"),
+        }
+        return NVPCompiler(None, desc)
+
+    def test_capture_env_from_script(self):
+        """Test capturing the environment from a sourced shell script"""
+        script = os.path.join(self.root_dir, "setup_env.sh")
+        with open(script, "w", encoding="utf-8") as file:
+            file.write("export NVP_TEST_VAR=hello\nexport NVP_TEST_EQ='a=b'\necho 'some outputs'\n")
+
+        env = get_environment_from_batch_command(script, initial={"PATH": os.environ["PATH"]})
+        self.assertEqual(env["NVP_TEST_VAR"], "hello")
+        self.assertEqual(env["NVP_TEST_EQ"], "a=b")
+
+    def test_capture_multiline_env(self):
+        """Test capturing an environment with multiline values"""
+        script = os.path.join(self.root_dir, "setup_env.sh")
+        with open(script, "w", encoding="utf-8") as file:
+            file.write("export NVP_TEST_MULTI='line1\nline2=x'\nexport NVP_TEST_VAR=hello\n")
+
+        env = get_environment_from_batch_command(script, initial={"PATH": os.environ["PATH"]})
+        self.assertEqual(env["NVP_TEST_MULTI"], "line1\nline2=x")
+        self.assertEqual(env["NVP_TEST_VAR"], "hello")
+        self.assertNotIn("line2", env)
+
+    def test_capture_env_failure(self):
+        """Test that a failing setup script raises a readable error"""
+        script = os.path.join(self.root_dir, "setup_env.sh")
+        with open(script, "w", encoding="utf-8") as file:
+            file.write("echo 'setup failed'\nfalse\n")
+
+        with self.assertRaises(NVPCheckError) as ctx:
+            get_environment_from_batch_command(script, initial={"PATH": os.environ["PATH"]})
+        self.assertIn("setup failed", str(ctx.exception))
+
+    def test_env_is_persisted(self):
+        """Test that a captured environment is reused by a new compiler instance"""
+        comp = self.create_compiler()
+        env = comp.get_env()
+        self.assertEqual(env["CXX"], self.cxx_path)
+        self.assertTrue(os.path.exists(comp.get_env_cache_file()))
+
+        comp2 = self.create_compiler()
+
+        def fail_capture():
+            raise AssertionError("Environment should come from the cache")
+
+        comp2.capture_compiler_env = fail_capture
+        self.assertEqual(comp2.get_env()["CXX"], self.cxx_path)
+
+    def test_env_invalidated_by_mtime(self):
+        """Test that the cached environment is invalidated when the compiler binary changes"""
+        comp = self.create_compiler()
+        comp.get_env()
+
+        stat = os.stat(self.cxx_path)
+        os.utime(self.cxx_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+        comp2 = self.create_compiler()
+        captured = []
+        orig_capture = comp2.capture_compiler_env
+
+        def count_capture():
+            captured.append(True)
+            orig_capture()
+
+        comp2.capture_compiler_env = count_capture
+        self.assertEqual(comp2.get_env()["CXX"], self.cxx_path)
+        self.assertEqual(len(captured), 1)
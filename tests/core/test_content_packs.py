@@ -0,0 +1,114 @@
+"""Unit tests on the indexed content pack builder"""
+
+import logging
+import os
+import tempfile
+import time
+
+from utils import TestBase
+
+from nvp.core.content_packs import ContentPackBuilder, PatternSet
+
+logger = logging.getLogger(__name__)
+
+
+class Tests(TestBase):
+    """Content pack builder tests"""
+
+    def setUp(self):
+        """Create a source tree"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.src_dir = os.path.join(self.tmp_dir.name, "src")
+        self.out_dir = os.path.join(self.tmp_dir.name, "out")
+        self.index_file = os.path.join(self.tmp_dir.name, "index.json")
+
+        self.write_file("main.cpp", "int main() {}\r\n")
+        self.write_file("gui/window.h", "class Window;\n")
+        self.write_file("gui/widgets/button.h", "class Button {};\n")
+        self.write_file("gui/widgets/icon.h", b"\x00\x01\x02")
+        self.write_file("gui/empty.h", "")
+        self.write_file("doc/readme.md", "# Readme\n")
+        self.write_file(".git/config.h", "ignored\n")
+        self.write_file("old.api.txt", "ignored\n")
+
+    def tearDown(self):
+        """Remove the source tree"""
+        self.tmp_dir.cleanup()
+
+    def write_file(self, relpath, content):
+        """Write a file in the source tree"""
+        fpath = os.path.join(self.src_dir, relpath)
+        os.makedirs(os.path.dirname(fpath), exist_ok=True)
+        with open(fpath, "wb") as file:
+            file.write(content if isinstance(content, bytes) else content.encode("utf-8"))
+
+    def read_output(self, name):
+        """Read an output file"""
+        with open(os.path.join(self.out_dir, name), "r", encoding="utf-8") as file:
+            return file.read()
+
+    def test_pattern_set(self):
+        """Test the glob patterns matching"""
+        pset = PatternSet.from_string("gui/**.h;*.cpp")
+        self.assertTrue(pset.matches("gui/widgets/button.h"))
+        self.assertTrue(pset.matches("src/main.cpp"))
+        self.assertFalse(pset.matches("doc/readme.md"))
+        self.assertFalse(PatternSet(["gui/*.h"]).matches("src/gui/window.h"))
+
+    def test_collect(self):
+        """Test collecting the content of a folder"""
+        output = os.path.join(self.out_dir, "content.api.txt")
+        os.makedirs(self.out_dir)
+        builder = ContentPackBuilder()
+        builder.collect(self.src_dir, "**.h;*.cpp", "*/window.h", output)
+
+        expected = "\n".join(
+            [
+                "// File: gui/widgets/icon.h (3 bytes, binary)",
+                "// File: main.cpp (15 bytes, 46.9% of total):\n",
+                "int main() {}\n",
+                "// File: gui/widgets/button.h (17 bytes, 53.1% of total):\n",
+                "class Button {};\n",
+            ]
+        )
+        self.assertEqual(self.read_output("content.api.txt"), expected)
+
+        builder.collect(self.src_dir, "doc/readme.md", None, output, append=True)
+        readme = "// File: doc/readme.md (9 bytes, 100.0% of total):\n\n# Readme\n"
+        self.assertEqual(self.read_output("content.api.txt"), expected + readme)
+
+    def test_incremental_packs(self):
+        """Test that only the packs with modified files are rewritten"""
+        packs = {
+            "code": [(self.src_dir, "**.h", None, False), (self.src_dir, "*.cpp", None, False)],
+            "docs": [(self.src_dir, None, "*.h;*.cpp", False)],
+        }
+
+        def build(force=False):
+            builder = ContentPackBuilder(self.index_file)
+            return {
+                name: builder.build_pack(name, os.path.join(self.out_dir, f"{name}.api.txt"), steps, force)
+                for name, steps in packs.items()
+            }
+
+        self.assertEqual(build(), {"code": True, "docs": True})
+        readme = "// File: doc/readme.md (9 bytes, 100.0% of total):\n\n# Readme\n"
+        self.assertEqual(self.read_output("docs.api.txt"), readme)
+        code = self.read_output("code.api.txt")
+        self.assertIn("class Button {};\n// File: main.cpp", code)
+        self.assertEqual(build(), {"code": False, "docs": False})
+
+        # Touching a file without changing it should not rewrite the pack:
+        fpath = os.path.join(self.src_dir, "main.cpp")
+        os.utime(fpath, ns=(time.time_ns(), time.time_ns() + 1000000))
+        self.assertEqual(build(), {"code": False, "docs": False})
+
+        # Modifying a file should only rewrite its pack:
+        self.write_file("gui/window.h", "class MainWindow;\n")
+        self.assertEqual(build(), {"code": True, "docs": False})
+        self.assertIn("class MainWindow;", self.read_output("code.api.txt"))
+
+        # Adding a file should rewrite its pack, and force should rewrite all of them:
+        self.write_file("doc/guide.md", "# Guide\n")
+        self.assertEqual(build(), {"code": False, "docs": True})
+        self.assertEqual(build(True), {"code": True, "docs": True})
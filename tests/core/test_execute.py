@@ -0,0 +1,33 @@
+"""Unit tests on the NVPObject command execution"""
+
+import logging
+import os
+import sys
+import unittest
+
+from utils import TestBase
+
+from nvp.nvp_object import NVPObject
+
+logger = logging.getLogger(__name__)
+
+
+class Tests(TestBase):
+    """Command execution tests"""
+
+    @unittest.skipUnless(hasattr(os, "wait4"), "os.wait4 not available")
+    def test_rusage_callback(self):
+        """Test that the resource usage of each executed process is reported"""
+        usages = []
+        obj = NVPObject()
+        cmd = [sys.executable, "-c", "data = bytearray(64 * 1024 * 1024); print(len(data))"]
+        res, rcode, _ = obj.execute(cmd, rusage_callback=usages.append, print_outputs=False)
+        self.assertTrue(res)
+        self.assertEqual(rcode, 0)
+        self.assertEqual(len(usages), 1)
+        self.assertGreater(usages[0].ru_maxrss, 64 * 1024)
+
+        res, rcode, _ = obj.execute([sys.executable, "-c", "exit(3)"], rusage_callback=usages.append)
+        self.assertFalse(res)
+        self.assertEqual(rcode, 3)
+        self.assertEqual(len(usages), 2)
@@ -0,0 +1,135 @@
+"""Unit tests on the manifest based folder comparison"""
+
+import logging
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from utils import TestBase
+
+from nvp.core.folder_compare import FolderComparator, Image, compare_image_files
+
+logger = logging.getLogger(__name__)
+
+
+class Tests(TestBase):
+    """Folder comparison tests"""
+
+    def setUp(self):
+        """Create the folders"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cur_dir = os.path.join(self.tmp_dir.name, "cur")
+        self.ref_dir = os.path.join(self.tmp_dir.name, "ref")
+        self.cache_dir = os.path.join(self.tmp_dir.name, "cache")
+
+    def tearDown(self):
+        """Remove the folders"""
+        self.tmp_dir.cleanup()
+
+    def write_file(self, folder, relpath, content):
+        """Write a file in a folder"""
+        fpath = os.path.join(folder, relpath)
+        os.makedirs(os.path.dirname(fpath), exist_ok=True)
+        with open(fpath, "wb") as file:
+            file.write(content)
+
+    def create_tree(self, folder, num_files, content=b"data"):
+        """Create a synthetic tree of files"""
+        for idx in range(num_files):
+            self.write_file(folder, f"dir{idx % 10}/sub{idx % 100}/file{idx}.txt", content + str(idx).encode())
+
+    def test_diff_manifests(self):
+        """Test the detection of added, removed and modified files"""
+        self.create_tree(self.cur_dir, 50)
+        self.create_tree(self.ref_dir, 50)
+        comp = FolderComparator(self.cache_dir)
+        self.assertEqual(comp.compare(self.cur_dir, self.ref_dir)["num_diffs"], 0)
+
+        # Same size but different content:
+        self.write_file(self.cur_dir, "dir1/sub1/file1.txt", b"datX1")
+        self.write_file(self.cur_dir, "new.txt", b"new")
+        os.remove(os.path.join(self.cur_dir, "dir2/sub2/file2.txt"))
+
+        report = comp.compare(self.cur_dir, self.ref_dir)
+        self.assertEqual(report["added"], ["new.txt"])
+        self.assertEqual(report["removed"], ["dir2/sub2/file2.txt"])
+        self.assertEqual(report["changed"], ["dir1/sub1/file1.txt"])
+
+        # The cached manifest should be reused for the unchanged files:
+        hashed = []
+        hash_file = comp.hash_file
+
+        def count_hash_file(fpath):
+            hashed.append(fpath)
+            return hash_file(fpath)
+
+        comp.hash_file = count_hash_file
+        self.write_file(self.cur_dir, "dir3/sub3/file3.txt", b"data3")
+        self.assertEqual(comp.compare(self.cur_dir, self.ref_dir)["num_diffs"], 3)
+        self.assertEqual(hashed, [os.path.join(self.cur_dir, "dir3/sub3/file3.txt")])
+
+    @unittest.skipIf(Image is None, "PIL is not available")
+    def test_image_tolerance(self):
+        """Test the pixel comparison of the modified images"""
+        img = np.zeros((64, 64, 3), dtype=np.uint8)
+        os.makedirs(self.cur_dir)
+        os.makedirs(self.ref_dir)
+        Image.fromarray(img).save(os.path.join(self.ref_dir, "a.png"))
+        Image.fromarray(img).save(os.path.join(self.ref_dir, "b.png"))
+
+        img[0:32, :, :] = 2
+        Image.fromarray(img).save(os.path.join(self.cur_dir, "a.png"))
+        img[0:32, :, :] = 200
+        Image.fromarray(img).save(os.path.join(self.cur_dir, "b.png"))
+
+        report = FolderComparator().compare(self.cur_dir, self.ref_dir, tolerance=0.0005, pixel_tolerance=2)
+        self.assertEqual(report["similar_images"], ["a.png"])
+        self.assertEqual(report["changed"], ["b.png"])
+        self.assertEqual(report["images"]["b.png"]["num_diff_pixels"], 32 * 64)
+
+    @unittest.skipIf(Image is None, "PIL is not available")
+    def test_16bit_images(self):
+        """Test the pixel comparison of 16-bit images with values above the int16 range"""
+        os.makedirs(self.ref_dir)
+        ref_file = os.path.join(self.ref_dir, "ref.png")
+        cur_file = os.path.join(self.ref_dir, "cur.png")
+        img = np.zeros((16, 16), dtype=np.uint16)
+        Image.fromarray(img).save(ref_file)
+        img[0:8, :] = 40000
+        Image.fromarray(img).save(cur_file)
+
+        res = compare_image_files(cur_file, ref_file)
+        self.assertFalse(res["similar"])
+        self.assertEqual(res["max_diff"], 40000)
+        self.assertEqual(res["num_diff_pixels"], 8 * 16)
+        self.assertAlmostEqual(res["mean_diff"], 20000 / 255.0)
+
+        # Small differences between large values:
+        Image.fromarray(img).save(ref_file)
+        img[0:8, :] = 40002
+        Image.fromarray(img).save(cur_file)
+        res = compare_image_files(cur_file, ref_file, pixel_tolerance=2)
+        self.assertTrue(res["similar"])
+        self.assertEqual(res["num_diff_pixels"], 0)
+
+    def test_benchmark(self):
+        """Benchmark the comparison of synthetic trees (set NVP_BENCH_NUM_FILES=100000 for the full benchmark)"""
+        num_files = int(os.getenv("NVP_BENCH_NUM_FILES", "2000"))
+        self.create_tree(self.cur_dir, num_files)
+        self.create_tree(self.ref_dir, num_files)
+        self.write_file(self.cur_dir, "dir0/sub0/file0.txt", b"modified")
+
+        comp = FolderComparator(self.cache_dir)
+        start_time = time.perf_counter()
+        report = comp.compare(self.cur_dir, self.ref_dir)
+        cold_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        self.assertEqual(comp.compare(self.cur_dir, self.ref_dir)["changed"], report["changed"])
+        warm_time = time.perf_counter() - start_time
+
+        self.assertEqual(report["changed"], ["dir0/sub0/file0.txt"])
+        logger.info("Compared %d files: cold=%.3fs, cached manifests=%.3fs", num_files, cold_time, warm_time)
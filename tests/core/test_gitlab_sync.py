@@ -0,0 +1,194 @@
+"""Unit tests on the gitlab synchronization engine"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from utils import TestBase
+
+from nvp.core.gitlab_sync import GitlabSyncEngine
+
+logger = logging.getLogger(__name__)
+
+
+class FakeGitlabHandler(BaseHTTPRequestHandler):
+    """Minimal fake of the gitlab projects/labels/milestones API"""
+
+    protocol_version = "HTTP/1.1"
+    page_size = 2
+    projects = {}
+    requests = []
+    lock = threading.Lock()
+
+    def send_json(self, data, status=200, headers=None):
+        """Send a json response"""
+        content = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for key, val in (headers or {}).items():
+            self.send_header(key, val)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def read_json(self):
+        """Read the json request body"""
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length)) if length > 0 else {}
+
+    def handle_request(self, method):
+        """Process a request"""
+        parts = urlsplit(self.path)
+        # Keep the url-encoded separators to parse the path:
+        elems = parts.path.split("/")[4:]
+        with FakeGitlabHandler.lock:
+            FakeGitlabHandler.requests.append((method, parts.path))
+
+        if self.headers.get("PRIVATE-TOKEN") != "secret":
+            return self.send_json({"message": "401 Unauthorized"}, 401)
+
+        if len(elems) == 1:
+            path = unquote(elems[0])
+            if path not in self.projects:
+                return self.send_json({"message": "404 Project Not Found"}, 404)
+            return self.send_json({"id": self.projects[path]["id"]})
+
+        proj = next(p for p in self.projects.values() if str(p["id"]) == elems[0])
+        items = proj[elems[1]]
+
+        if method == "GET":
+            page = int(parse_qs(parts.query).get("page", ["1"])[0])
+            start = (page - 1) * self.page_size
+            headers = {"X-Next-Page": str(page + 1) if start + self.page_size < len(items) else ""}
+            return self.send_json(items[start : start + self.page_size], headers=headers)
+
+        data = self.read_json()
+        if data.get("name") == "forbidden" or unquote(parts.path).endswith("/forbidden"):
+            return self.send_json({"message": "403 Forbidden"}, 403)
+
+        with FakeGitlabHandler.lock:
+            if method == "POST":
+                item = {"id": len(items) + 1, "state": "active", "description": None, "priority": None}
+                item.update(data)
+                items.append(item)
+                return self.send_json(item, 201)
+
+            key = "name" if elems[1] == "labels" else "id"
+            item = next(it for it in items if str(it[key]) == unquote(elems[2]))
+            if data.pop("state_event", None) == "close":
+                item["state"] = "closed"
+            item.update(data)
+            return self.send_json(item)
+
+    def do_GET(self):
+        """Handle a GET request"""
+        self.handle_request("GET")
+
+    def do_POST(self):
+        """Handle a POST request"""
+        self.handle_request("POST")
+
+    def do_PUT(self):
+        """Handle a PUT request"""
+        self.handle_request("PUT")
+
+    def log_message(self, *args):
+        """Disable the request logs"""
+
+
+class Tests(TestBase):
+    """Gitlab sync engine tests"""
+
+    def setUp(self):
+        """Start a fake gitlab server"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        labels = [
+            {"name": f"lbl{idx}", "color": "#000000", "description": None, "priority": None} for idx in range(5)
+        ]
+        FakeGitlabHandler.requests = []
+        FakeGitlabHandler.projects = {
+            "group/proj_a": {"id": 1, "labels": labels, "milestones": [{"id": 1, "title": "v1", "state": "active"}]},
+            "group/proj_b": {"id": 2, "labels": [], "milestones": []},
+        }
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGitlabHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        self.api_url = f"http://127.0.0.1:{self.server.server_address[1]}/api/v4"
+        self.cache_file = os.path.join(self.tmp_dir.name, "project_ids.json")
+        self.pdescs = {
+            "proj_a": {"server": "local", "url": "group/proj_a"},
+            "proj_b": {"server": "local", "url": "group/proj_b"},
+        }
+
+    def tearDown(self):
+        """Stop the server"""
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def create_engine(self):
+        """Create a sync engine for the fake server"""
+        return GitlabSyncEngine({"local": "secret"}, self.cache_file, max_workers=4, max_rate=0, api_url=self.api_url)
+
+    def test_label_sync(self):
+        """Test the synchronization of the labels with pagination"""
+        tgt = {
+            "lbl0": {"color": "#000000", "description": None, "priority": None},
+            "lbl4": {"color": "#FF0000", "description": "updated", "priority": 1},
+            "new": {"color": "#00FF00", "description": "added", "priority": None},
+        }
+        engine = self.create_engine()
+        muts = engine.sync(self.pdescs, label_targets={"proj_a": tgt, "proj_b": tgt})
+
+        # lbl4 is only found on the third page of proj_a:
+        methods = sorted((mut["project"], mut["method"]) for mut in muts)
+        expected = [("proj_a", "POST"), ("proj_a", "PUT"), ("proj_b", "POST"), ("proj_b", "POST"), ("proj_b", "POST")]
+        self.assertEqual(methods, expected)
+
+        lbl4 = FakeGitlabHandler.projects["group/proj_a"]["labels"][4]
+        self.assertEqual(lbl4["description"], "updated")
+        self.assertEqual(len(FakeGitlabHandler.projects["group/proj_b"]["labels"]), 3)
+
+        # Second run should not change anything:
+        self.assertEqual(len(engine.sync(self.pdescs, label_targets={"proj_a": tgt, "proj_b": tgt})), 0)
+
+    def test_project_id_cache(self):
+        """Test that the project ids are only resolved once"""
+        self.create_engine().sync(self.pdescs, label_targets={"proj_a": {}})
+        self.assertTrue(os.path.exists(self.cache_file))
+
+        FakeGitlabHandler.requests = []
+        self.create_engine().sync(self.pdescs, label_targets={"proj_a": {}})
+        self.assertNotIn(("GET", "/api/v4/projects/group%2Fproj_a"), FakeGitlabHandler.requests)
+
+    def test_failures_collected(self):
+        """Test that the failed requests are reported without stopping the synchronization"""
+        self.pdescs["proj_c"] = {"server": "local", "url": "group/missing"}
+        tgt = {
+            "forbidden": {"color": "#000000", "description": None, "priority": None},
+            "new": {"color": "#00FF00", "description": "added", "priority": None},
+        }
+        engine = self.create_engine()
+        muts = engine.sync(self.pdescs, label_targets={pname: tgt for pname in self.pdescs})
+
+        self.assertEqual(sorted(mut["project"] for mut in muts), ["proj_a", "proj_b"])
+        self.assertEqual([lbl["name"] for lbl in FakeGitlabHandler.projects["group/proj_b"]["labels"]], ["new"])
+        failed = sorted(desc for desc, _ in engine.failures)
+        self.assertEqual(len(failed), 3)
+        self.assertIn("resolve project group/missing", failed)
+        self.assertIn("POST /projects/2/labels (proj_b)", failed)
+
+    def test_milestone_sync(self):
+        """Test the creation and closing of milestones"""
+        targets = {"proj_a": (["v1", "v2"], "v1"), "proj_b": (["v1", "v2"], "v1")}
+        self.create_engine().sync(self.pdescs, milestone_targets=targets)
+
+        for path in ["group/proj_a", "group/proj_b"]:
+            mstones = {mst["title"]: mst["state"] for mst in FakeGitlabHandler.projects[path]["milestones"]}
+            self.assertEqual(mstones, {"v1": "closed", "v2": "active"})
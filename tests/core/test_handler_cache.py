@@ -0,0 +1,86 @@
+"""Unit tests on the handler hot reload"""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+from utils import TestBase
+
+from nvp.core.handler_cache import INotify, HandlerCache
+from nvp.nvp_context import NVPContext
+
+logger = logging.getLogger(__name__)
+
+
+class Tests(TestBase):
+    """Handler hot reload tests"""
+
+    def setUp(self):
+        """Create the context and a handler module"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.ctx = NVPContext.get(create=True)
+        self.handler_file = os.path.join(self.tmp_dir.name, "nvp_test_reload_handler.py")
+        self.write_handler(1)
+        sys.path.insert(0, self.tmp_dir.name)
+
+    def tearDown(self):
+        """Release the context and remove the handler module"""
+        sys.path.remove(self.tmp_dir.name)
+        NVPContext.instance = None
+        self.tmp_dir.cleanup()
+
+    def write_handler(self, value):
+        """Write the handler module returning a given value"""
+        with open(self.handler_file, "w", encoding="utf-8") as file:
+            file.write(f"def handle():\n    return {value}\n")
+
+    def check_reload(self):
+        """Check that a modified handler is reloaded"""
+        self.assertEqual(self.ctx.call_handler("nvp_test_reload_handler"), 1)
+        self.assertEqual(self.ctx.call_handler("nvp_test_reload_handler"), 1)
+        self.write_handler(22)
+        self.assertEqual(self.ctx.call_handler("nvp_test_reload_handler"), 22)
+
+    def test_stat_reload(self):
+        """Test the reload of a modified handler in the stat mode"""
+        self.check_reload()
+
+        # Touching the file without changing its content should not reload the handler:
+        handler = self.ctx.get_handler("nvp_test_reload_handler")
+        os.utime(self.handler_file, ns=(time.time_ns(), time.time_ns() + 1000000))
+        self.assertIs(self.ctx.get_handler("nvp_test_reload_handler"), handler)
+
+    @unittest.skipIf(INotify is None, "inotify_simple is not available")
+    def test_inotify_reload(self):
+        """Test the reload of a modified handler in the inotify mode"""
+        self.ctx.handler_cache = HandlerCache("inotify")
+        self.check_reload()
+
+    def test_call_benchmark(self):
+        """Measure the per call overhead of the handler change detection"""
+        hname = "nvp_test_reload_handler"
+        count = 2000
+
+        def run():
+            start_time = time.perf_counter()
+            for _ in range(count):
+                self.ctx.call_handler(hname)
+            return (time.perf_counter() - start_time) * 1e6 / count
+
+        def hash_every_call():
+            start_time = time.perf_counter()
+            for _ in range(count):
+                self.ctx.compute_file_hash(self.ctx.resolve_module_file(hname))
+                self.ctx.handlers[hname]()
+            return (time.perf_counter() - start_time) * 1e6 / count
+
+        stat_time = run()
+        hash_time = hash_every_call()
+        self.ctx.handler_cache = HandlerCache("none")
+        none_time = run()
+        logger.info(
+            "Handler call overhead: hash=%.2fus, stat=%.2fus, none=%.2fus per call", hash_time, stat_time, none_time
+        )
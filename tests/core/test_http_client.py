@@ -0,0 +1,95 @@
+"""Unit tests on the shared HTTP client"""
+
+import logging
+import os
+import tempfile
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from utils import TestBase
+
+from nvp.core.http_client import HttpClient
+
+logger = logging.getLogger(__name__)
+
+
+class FlakyHandler(SimpleHTTPRequestHandler):
+    """Keep-alive handler returning a few errors before serving the files"""
+
+    protocol_version = "HTTP/1.1"
+    num_failures = 0
+
+    def do_GET(self):
+        """Handle a GET request"""
+        if self.path.startswith("/flaky") and FlakyHandler.num_failures > 0:
+            FlakyHandler.num_failures -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        super().do_GET()
+
+    def log_message(self, *args):
+        """Disable the request logs"""
+
+
+class Tests(TestBase):
+    """HTTP client tests"""
+
+    def setUp(self):
+        """Start a local http server"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.www_dir = os.path.join(self.tmp_dir.name, "www")
+        os.makedirs(self.www_dir)
+        for fname in ["data.txt", "flaky"]:
+            with open(os.path.join(self.www_dir, fname), "w", encoding="utf-8") as file:
+                file.write("hello world")
+
+        handler = partial(FlakyHandler, directory=self.www_dir)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+        self.client = HttpClient()
+        self.client.configure({"backoff": 0.01, "cache_dir": os.path.join(self.tmp_dir.name, "cache")})
+
+    def tearDown(self):
+        """Stop the server"""
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def test_connection_reuse(self):
+        """Test that the connections are reused for a given host"""
+        for _ in range(5):
+            resp = self.client.get(self.base_url + "/data.txt")
+            self.assertEqual(resp.text, "hello world")
+
+        stats = self.client.get_host_stats()[self.base_url]
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["connections"], 1)
+        self.assertEqual(stats["reused"], 4)
+
+    def test_retry_on_bad_status(self):
+        """Test the retry policy on temporary server errors"""
+        FlakyHandler.num_failures = 2
+        resp = self.client.get(self.base_url + "/flaky")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.client.get_host_stats()[self.base_url]["retries"], 2)
+
+        FlakyHandler.num_failures = 5
+        self.assertIsNone(self.client.get(self.base_url + "/flaky", max_retries=3))
+        FlakyHandler.num_failures = 0
+
+    def test_conditional_cache(self):
+        """Test the Last-Modified response cache"""
+        url = self.base_url + "/data.txt"
+        resp = self.client.get(url, use_cache=True)
+        self.assertEqual(resp.text, "hello world")
+
+        resp = self.client.get(url, use_cache=True)
+        self.assertEqual(resp.text, "hello world")
+        self.assertEqual(self.client.get_host_stats()[self.base_url]["cache_hits"], 1)
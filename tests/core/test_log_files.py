@@ -0,0 +1,142 @@
+"""Unit tests on the log files rotation and streaming filters"""
+
+import gzip
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+import unittest
+
+from utils import TestBase
+
+from nvp.core.log_files import RotatingLogFile, filter_lines, get_log_compressor, list_backups
+
+logger = logging.getLogger(__name__)
+
+
+def write_lines(filename, pid, count):
+    """Append lines to a shared log file from a child process"""
+    with RotatingLogFile(filename, max_size=64 * 1024, backup_count=None) as log:
+        for idx in range(count):
+            log.write(f"[proc {pid}] line {idx:06d} " + "x" * 80 + "\n")
+    get_log_compressor().flush()
+
+
+class Tests(TestBase):
+    """Log files tests"""
+
+    def setUp(self):
+        """Create a temp folder"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmp_dir.name, "logs", "test.log")
+
+    def tearDown(self):
+        """Remove the temp folder"""
+        self.tmp_dir.cleanup()
+
+    def read_all_lines(self):
+        """Read the lines from the log file and all its backups"""
+        lines = []
+        for fname in list_backups(self.log_file) + [self.log_file]:
+            opener = gzip.open if fname.endswith(".gz") else open
+            with opener(fname, "rt", encoding="utf-8") as file:
+                lines += file.readlines()
+        return lines
+
+    def test_filter_constant_memory(self):
+        """Test filtering a large log with a bounded memory usage (set NVP_BENCH_LOG_SIZE to test multi-GB logs)"""
+        total_size = int(os.getenv("NVP_BENCH_LOG_SIZE", str(32 * 1024 * 1024)))
+        src_file = os.path.join(self.tmp_dir.name, "big.log")
+        dst_file = os.path.join(self.tmp_dir.name, "big.cleaned.log")
+
+        block = "".join(f"[Debug {idx % 6}] message {idx} " + "y" * 60 + "\r\n" for idx in range(12000)).encode()
+        with open(src_file, "wb") as file:
+            for _ in range(max(total_size // len(block), 1)):
+                file.write(block)
+            file.write(b"[Info] " + b"z" * (3 * 1024 * 1024) + b"\n[Debug 3] last")
+
+        pat = re.compile(rb"\[Debug [2-5]\]")
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        num_kept, num_lines = filter_lines(src_file, dst_file, lambda line: pat.search(line) is None)
+        elapsed = time.perf_counter() - start_time
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        num_blocks = max(total_size // len(block), 1)
+        self.assertEqual(num_lines, num_blocks * 12000 + 2)
+        self.assertEqual(num_kept, num_blocks * 4000 + 1)
+        self.assertLess(peak, 8 * 1024 * 1024)
+        with open(dst_file, "rb") as file:
+            file.seek(-10, os.SEEK_END)
+            self.assertEqual(file.read(), b"z" * 9 + b"\n")
+        logger.info(
+            "Filtered %.1f MB in %.2fs, peak memory: %.2f MB",
+            os.path.getsize(src_file) / (1024 * 1024),
+            elapsed,
+            peak / (1024 * 1024),
+        )
+
+    @unittest.skipIf("fork" not in multiprocessing.get_all_start_methods(), "fork is not available")
+    def test_multi_process_rotation(self):
+        """Test that the lines appended by multiple processes are never lost or mixed during the rotations"""
+        ctx = multiprocessing.get_context("fork")
+        procs = [ctx.Process(target=write_lines, args=(self.log_file, pid, 2000)) for pid in range(4)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+            self.assertEqual(proc.exitcode, 0)
+
+        backups = list_backups(self.log_file)
+        self.assertGreater(len(backups), 5)
+        self.assertTrue(all(fname.endswith(".gz") for fname in backups))
+        self.assertLessEqual(os.path.getsize(self.log_file), 64 * 1024)
+
+        lines = self.read_all_lines()
+        self.assertEqual(len(lines), 8000)
+        self.assertTrue(all(re.fullmatch(r"\[proc \d\] line \d{6} x{80}\n", line) for line in lines))
+        for pid in range(4):
+            plines = [line for line in lines if line.startswith(f"[proc {pid}]")]
+            self.assertEqual(plines, sorted(plines))
+
+    def test_age_rotation(self):
+        """Test the age based rotation and the pruning of the backups"""
+        with RotatingLogFile(self.log_file, max_age=0.2, backup_count=1, compress=False) as log:
+            log.write("first\n")
+            time.sleep(0.3)
+            log.write("second\n")
+            time.sleep(0.3)
+            log.write("third\n")
+
+        backups = list_backups(self.log_file)
+        self.assertEqual(len(backups), 1)
+        self.assertEqual(self.read_all_lines(), ["second\n", "third\n"])
+
+        # Truncating should start a new file, keeping the previous one as a backup:
+        with RotatingLogFile(self.log_file, backup_count=1, compress=False, truncate=True) as log:
+            log.write("fourth\n")
+        self.assertEqual(self.read_all_lines(), ["third\n", "fourth\n"])
+
+    def test_rotate_if_needed(self):
+        """Test rotating an existing file before starting a process writing into it"""
+        os.makedirs(os.path.dirname(self.log_file))
+        with open(self.log_file, "wb") as file:
+            file.write(b"x" * 1000)
+
+        with RotatingLogFile(self.log_file, max_size=100, compress=False) as log:
+            log.rotate_if_needed()
+        self.assertEqual(len(list_backups(self.log_file)), 1)
+        self.assertEqual(os.path.getsize(self.log_file), 0)
+
+        # Small files are not rotated:
+        with open(self.log_file, "wb") as file:
+            file.write(b"x" * 50)
+        with RotatingLogFile(self.log_file, max_size=100, compress=False) as log:
+            log.rotate_if_needed()
+            log.write("y" * 10)
+        self.assertEqual(len(list_backups(self.log_file)), 1)
+        self.assertEqual(os.path.getsize(self.log_file), 60)
@@ -0,0 +1,180 @@
+"""Unit tests on the asynchronous notification dispatcher"""
+
+import json
+import logging
+import os
+import socketserver
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from utils import TestBase
+
+from nvp.communication.email_handler import SmtpSender
+from nvp.communication.notifier import NotificationDispatcher, NotificationSpool
+from nvp.communication.rocketchat import RocketChatClient
+
+logger = logging.getLogger(__name__)
+
+
+class SmtpStubHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP server storing the received messages"""
+
+    connections = 0
+    messages = []
+
+    def reply(self, line):
+        """Send a reply line"""
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        """Handle an SMTP session"""
+        SmtpStubHandler.connections += 1
+        self.reply("220 localhost ready")
+        while True:
+            line = self.rfile.readline().decode("ascii").strip()
+            if not line:
+                return
+            cmd = line.split(" ")[0].upper()
+            if cmd == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250 8BITMIME")
+            elif cmd == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b""
+                while not data.endswith(b"\r\n.\r\n"):
+                    data += self.rfile.readline()
+                SmtpStubHandler.messages.append(data.decode("utf-8"))
+                self.reply("250 OK")
+            elif cmd == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class RocketChatStubHandler(BaseHTTPRequestHandler):
+    """Minimal rocketchat API stub"""
+
+    protocol_version = "HTTP/1.1"
+    requests = []
+
+    def send_json(self, data):
+        """Send a json response"""
+        content = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        """Retrieve the channel infos"""
+        RocketChatStubHandler.requests.append(("GET", urlsplit(self.path).path))
+        self.send_json({"success": True, "channel": {"_id": "room1"}})
+
+    def do_POST(self):
+        """Send a message"""
+        data = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        RocketChatStubHandler.requests.append(("POST", data["message"]))
+        self.send_json({"success": True})
+
+    def log_message(self, *args):
+        """Disable the request logs"""
+
+
+class Tests(TestBase):
+    """Notification dispatcher tests"""
+
+    def setUp(self):
+        """Create the spool"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.spool = NotificationSpool(os.path.join(self.tmp_dir.name, "spool.db"))
+
+    def tearDown(self):
+        """Remove the spool"""
+        self.tmp_dir.cleanup()
+
+    def test_durable_spool(self):
+        """Test that the failed notifications are kept in the spool and coalesced"""
+        received = []
+
+        def failing_sender(_key, _payloads):
+            return False
+
+        dispatcher = NotificationDispatcher(self.spool, {"test": failing_sender}, batch_delay=0.05)
+        start_time = time.time()
+        for _ in range(3):
+            dispatcher.notify("test", "chan", {"message": "hello"})
+        dispatcher.notify("test", "chan", {"message": "world"})
+        self.assertLess(time.time() - start_time, 1.0)
+
+        dispatcher.flush()
+        self.assertEqual(self.spool.get_num_pending(), 2)
+
+        # A new dispatcher should retry the notifications once they are due:
+        spool = NotificationSpool(self.spool.db_file)
+        with spool.connect() as conn:
+            conn.execute("UPDATE notifications SET next_try = 0")
+
+        def sender(key, payloads):
+            received.append((key, payloads))
+            return True
+
+        dispatcher = NotificationDispatcher(spool, {"test": sender}, batch_delay=0.05)
+        self.assertEqual(dispatcher.process_pending(), 2)
+        self.assertEqual(received, [("chan", [({"message": "hello"}, 3), ({"message": "world"}, 1)])])
+        self.assertEqual(spool.get_num_pending(), 0)
+
+    def test_smtp_connection_reuse(self):
+        """Test sending multiple emails with a persistent SMTP connection"""
+        SmtpStubHandler.connections = 0
+        SmtpStubHandler.messages = []
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SmtpStubHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        try:
+            smtp = SmtpSender(f"127.0.0.1:{server.server_address[1]}", use_tls=False)
+
+            def send_email(key, payloads):
+                return all(smtp.send(pld["title"], pld["message"], key, "nvp@localhost") for pld, _ in payloads)
+
+            dispatcher = NotificationDispatcher(self.spool, {"email": send_email}, on_idle=smtp.close, batch_delay=0.05)
+            for idx in range(3):
+                dispatcher.notify("email", "dest@localhost", {"title": f"Title {idx}", "message": "<p>Failure</p>"})
+            dispatcher.flush()
+
+            self.assertEqual(len(SmtpStubHandler.messages), 3)
+            self.assertEqual(SmtpStubHandler.connections, 1)
+            self.assertIsNone(smtp.server)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_rocketchat_batch(self):
+        """Test sending batched rocketchat messages"""
+        RocketChatStubHandler.requests = []
+        server = ThreadingHTTPServer(("127.0.0.1", 0), RocketChatStubHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        try:
+            client = RocketChatClient(f"http://127.0.0.1:{server.server_address[1]}", "user", "token")
+
+            def send_message(channel, payloads):
+                msg = "\n".join(payload["message"] for payload, _ in payloads)
+                return client.send_message(msg, channel)
+
+            dispatcher = NotificationDispatcher(self.spool, {"rchat": send_message}, batch_delay=0.2)
+            for idx in range(3):
+                dispatcher.notify("rchat", "problem-reports", {"message": f"msg{idx}"})
+            dispatcher.flush()
+
+            self.assertEqual(
+                RocketChatStubHandler.requests,
+                [("GET", "/api/v1/channels.info"), ("POST", {"rid": "room1", "msg": "msg0\nmsg1\nmsg2"})],
+            )
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,140 @@
+"""Unit tests on the gitlab package uploader"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from utils import TestBase
+
+from nvp.core.package_uploader import PackageUploader
+
+logger = logging.getLogger(__name__)
+
+
+class FakeRegistryHandler(BaseHTTPRequestHandler):
+    """Minimal fake of the gitlab generic package registry"""
+
+    protocol_version = "HTTP/1.1"
+    packages = {}
+    num_uploads = 0
+    num_failures = 0
+    lock = threading.Lock()
+
+    def send_json(self, data, status=200):
+        """Send a json response"""
+        content = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def send_page(self, entries, query):
+        """Send a page of a list response"""
+        per_page = int(query.get("per_page", ["20"])[0])
+        page = int(query.get("page", ["1"])[0])
+        return self.send_json(entries[(page - 1) * per_page : page * per_page])
+
+    def do_GET(self):
+        """List the packages or package files"""
+        url = urlsplit(self.path)
+        elems = url.path.split("/")[4:]
+        query = parse_qs(url.query)
+        if len(elems) == 2:
+            pkgs = [{"id": idx, "name": key[0], "version": key[1]} for idx, key in enumerate(self.packages)]
+            return self.send_page(pkgs, query)
+
+        key = list(self.packages.keys())[int(elems[2])]
+        return self.send_page(list(self.packages[key].values()), query)
+
+    def do_PUT(self):
+        """Upload a package file"""
+        elems = urlsplit(self.path).path.split("/")[4:]
+        data = self.rfile.read(int(self.headers["Content-Length"]))
+
+        with FakeRegistryHandler.lock:
+            FakeRegistryHandler.num_uploads += 1
+            if FakeRegistryHandler.num_failures > 0:
+                FakeRegistryHandler.num_failures -= 1
+                return self.send_json({"message": "500 Internal Server Error"}, 500)
+
+            pfile = {"file_name": elems[5], "size": len(data), "file_sha256": hashlib.sha256(data).hexdigest()}
+            self.packages.setdefault((elems[3], elems[4]), {})[elems[5]] = pfile
+        # Response of the API when using select=package_file:
+        return self.send_json(pfile, 200)
+
+    def log_message(self, *args):
+        """Disable the request logs"""
+
+
+class Tests(TestBase):
+    """Package uploader tests"""
+
+    def setUp(self):
+        """Start a fake registry server"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        FakeRegistryHandler.packages = {}
+        FakeRegistryHandler.num_uploads = 0
+        FakeRegistryHandler.num_failures = 0
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeRegistryHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        base_url = f"http://127.0.0.1:{self.server.server_address[1]}/api/v4"
+        self.uploader = PackageUploader(base_url, "secret", max_retries=3)
+
+        self.files = []
+        for idx in range(3):
+            fname = os.path.join(self.tmp_dir.name, f"file{idx}.7z")
+            with open(fname, "wb") as file:
+                file.write(os.urandom(300000 + idx))
+            self.files.append((f"file{idx}.7z", fname))
+
+    def tearDown(self):
+        """Stop the server"""
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def test_parallel_upload(self):
+        """Test uploading multiple files and skipping the identical ones"""
+        res = self.uploader.upload_files(1, "libs", "1.0", self.files)
+        self.assertEqual([entry["status"] for entry in res], ["uploaded"] * 3)
+        for entry, (_, fname) in zip(res, self.files):
+            self.assertEqual(entry["file_sha256"], self.uploader.compute_checksum(fname))
+
+        # Update one of the files and upload again:
+        with open(self.files[1][1], "ab") as file:
+            file.write(b"x")
+
+        res = self.uploader.upload_files(1, "libs", "1.0", self.files)
+        self.assertEqual([entry["status"] for entry in res], ["skipped", "uploaded", "skipped"])
+        self.assertEqual(FakeRegistryHandler.num_uploads, 4)
+
+    def test_upload_retry(self):
+        """Test that a failed upload is restarted"""
+        FakeRegistryHandler.num_failures = 2
+        res = self.uploader.upload_file(1, "libs", "1.0", *self.files[0])
+        self.assertEqual(res["status"], "uploaded")
+        self.assertEqual(FakeRegistryHandler.num_uploads, 3)
+
+        FakeRegistryHandler.num_failures = 3
+        self.assertIsNone(self.uploader.upload_file(1, "libs", "1.0", *self.files[1]))
+
+    def test_paginated_lookup(self):
+        """Test finding package files beyond the first page of results"""
+        self.uploader.page_size = 2
+        for version in ["0.1", "0.2", "0.3"]:
+            self.uploader.upload_files(1, "libs", version, self.files)
+
+        self.assertEqual(len(self.uploader.find_package_file(1, "libs", "0.3", "file2.7z")), 1)
+        num_uploads = FakeRegistryHandler.num_uploads
+        res = self.uploader.upload_files(1, "libs", "0.3", self.files)
+        self.assertEqual([entry["status"] for entry in res], ["skipped"] * 3)
+        self.assertEqual(FakeRegistryHandler.num_uploads, num_uploads)
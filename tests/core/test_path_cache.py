@@ -0,0 +1,122 @@
+"""Unit tests on the cached path resolution in NVPContext"""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from utils import TestBase
+
+from nvp.nvp_context import NVPContext
+from nvp.nvp_object import NVPCheckError
+from nvp.nvp_project import NVPProject
+
+logger = logging.getLogger(__name__)
+
+
+class Tests(TestBase):
+    """Path resolution cache tests"""
+
+    def setUp(self):
+        """Create the context"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.ctx = NVPContext()
+        self.counts = {"build_known_vars": 0, "file_exists": 0}
+
+        build_known_vars = self.ctx.build_known_vars
+        file_exists = self.ctx.file_exists
+
+        def count_build_known_vars():
+            self.counts["build_known_vars"] += 1
+            return build_known_vars()
+
+        def count_file_exists(*args):
+            self.counts["file_exists"] += 1
+            return file_exists(*args)
+
+        self.ctx.build_known_vars = count_build_known_vars
+        self.ctx.file_exists = count_file_exists
+
+    def tearDown(self):
+        """Release the context and remove the temp folder"""
+        NVPContext.instance = None
+        self.tmp_dir.cleanup()
+
+    def test_known_vars_invalidation(self):
+        """Test that the known vars are rebuilt only when a project is added"""
+        self.assertEqual(self.ctx.resolve_path("${NVP_DIR}/tools"), self.ctx.get_path(self.ctx.get_root_dir(), "tools"))
+        hlocs = self.ctx.get_known_vars()
+        hlocs["${EXTRA}"] = "extra"
+        self.assertNotIn("${EXTRA}", self.ctx.get_known_vars())
+        self.assertEqual(self.counts["build_known_vars"], 1)
+
+        with self.assertRaises(NVPCheckError):
+            self.ctx.resolve_path("${DEMO_DIR}/data")
+
+        self.ctx.add_project(NVPProject({"names": ["demo"], "project_root_dir": self.tmp_dir.name}, self.ctx))
+        self.assertEqual(self.ctx.resolve_path("${DEMO_DIR}/data"), f"{self.tmp_dir.name}/data")
+        self.assertEqual(self.counts["build_known_vars"], 2)
+
+    def test_module_file_cache(self):
+        """Test the module file resolution with positive and negative caching"""
+        self.assertTrue(self.ctx.resolve_module_file("nvp.nvp_object").endswith("nvp_object.py"))
+        with self.assertRaises(NVPCheckError):
+            self.ctx.resolve_module_file("nvp.missing_module")
+
+        num_checks = self.counts["file_exists"]
+        self.ctx.resolve_module_file("nvp.nvp_object")
+        with self.assertRaises(NVPCheckError):
+            self.ctx.resolve_module_file("nvp.missing_module")
+        self.assertEqual(self.counts["file_exists"], num_checks)
+
+        # Changing the search path should invalidate the cache:
+        with open(os.path.join(self.tmp_dir.name, "nvp_test_handler.py"), "w", encoding="utf-8") as file:
+            file.write("def handle():\n    return True\n")
+        sys.path.append(self.tmp_dir.name)
+        try:
+            self.assertEqual(
+                self.ctx.resolve_module_file("nvp_test_handler"),
+                self.ctx.get_path(self.tmp_dir.name, "nvp_test_handler.py"),
+            )
+        finally:
+            sys.path.remove(self.tmp_dir.name)
+
+    def test_startup_benchmark(self):
+        """Compare the number of calls and time spent with and without the caches"""
+        paths = [f"${{NVP_DIR}}/tools/tool_{idx % 20}" for idx in range(500)]
+        modules = ["nvp.nvp_object", "nvp.nvp_context", "nvp.components.runner"] * 100
+
+        def run():
+            start_time = time.perf_counter()
+            for path in paths:
+                self.ctx.resolve_path(path)
+            for hname in modules:
+                self.ctx.resolve_module_file(hname)
+            return time.perf_counter() - start_time
+
+        def run_uncached():
+            start_time = time.perf_counter()
+            for path in paths:
+                self.ctx.invalidate_path_caches()
+                self.ctx.resolve_path(path)
+            for hname in modules:
+                self.ctx.module_search_path = None
+                self.ctx.resolve_module_file(hname)
+            return time.perf_counter() - start_time
+
+        uncached_time = run_uncached()
+        uncached_counts = dict(self.counts)
+        self.counts = {key: 0 for key in self.counts}
+        self.ctx.invalidate_path_caches()
+
+        cached_time = run()
+        self.assertEqual(self.counts["build_known_vars"], 1)
+        self.assertLess(self.counts["file_exists"], uncached_counts["file_exists"])
+        logger.info(
+            "Path resolution: uncached=%.3fms %s, cached=%.3fms %s",
+            uncached_time * 1000,
+            uncached_counts,
+            cached_time * 1000,
+            self.counts,
+        )
@@ -0,0 +1,84 @@
+"""Unit tests on the cached netcdf schema scan"""
+
+import logging
+import os
+import tempfile
+
+from utils import TestBase
+
+import nvp.tools.netcdf_manager as ncm
+from nvp.nvp_context import NVPContext
+from nvp.tools.netcdf_manager import NetCDFManager
+
+logger = logging.getLogger(__name__)
+
+
+class Tests(TestBase):
+    """Schema scan cache tests"""
+
+    def setUp(self):
+        """Create a few netcdf files and count the schema extractions"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = self.tmp_dir.name
+        self.cache_file = os.path.join(self.folder, ".ncschema_cache.json")
+        self.manager = NetCDFManager(NVPContext())
+        self.files = [f"file_{idx}.nc" for idx in range(3)]
+        for fname in self.files:
+            self.write_file(fname)
+
+        self.extracted = []
+        self.extract_schema_desc = ncm.extract_schema_desc
+
+        def count_extract(filename):
+            self.extracted.append(os.path.basename(filename))
+            return self.extract_schema_desc(filename)
+
+        ncm.extract_schema_desc = count_extract
+
+    def tearDown(self):
+        """Release the context and remove the temp folder"""
+        ncm.extract_schema_desc = self.extract_schema_desc
+        NVPContext.instance = None
+        self.tmp_dir.cleanup()
+
+    def write_file(self, fname, num_groups=2):
+        """Write a small synthetic netcdf file"""
+        self.manager.write_test_file(os.path.join(self.folder, fname), num_groups=num_groups, num_vars=2, size=4)
+
+    def get_schemas(self):
+        """Retrieve the schemas of the test files"""
+        return self.manager.get_schemas(self.folder, self.files, self.cache_file, num_jobs=1)
+
+    def test_cache_reused(self):
+        """Test that the second scan reuses the cached schemas"""
+        entries = self.get_schemas()
+        self.assertEqual(self.extracted, self.files)
+        self.assertTrue(os.path.isfile(self.cache_file))
+        self.assertEqual(sorted(entries["file_0.nc"]["hashes"]), ["group0", "group1", "root"])
+
+        self.assertEqual(self.get_schemas(), entries)
+        self.assertEqual(self.extracted, self.files)
+        self.assertFalse(self.manager.scan_schemas(self.folder, self.files, self.cache_file, num_jobs=1))
+        self.assertEqual(self.extracted, self.files)
+
+    def test_cache_invalidated(self):
+        """Test that the modified files are scanned again"""
+        entries = self.get_schemas()
+
+        # Touching a file:
+        fpath = os.path.join(self.folder, "file_1.nc")
+        mtime_ns = os.stat(fpath).st_mtime_ns + 1000000000
+        os.utime(fpath, ns=(mtime_ns, mtime_ns))
+        new_entries = self.get_schemas()
+        self.assertEqual(self.extracted, self.files + ["file_1.nc"])
+        self.assertEqual(new_entries["file_1.nc"]["hashes"], entries["file_1.nc"]["hashes"])
+
+        # Adding a group:
+        self.write_file("file_2.nc", num_groups=3)
+        new_entries = self.get_schemas()
+        self.assertEqual(self.extracted, self.files + ["file_1.nc", "file_2.nc"])
+        hashes = new_entries["file_2.nc"]["hashes"]
+        self.assertEqual(sorted(hashes), ["group0", "group1", "group2", "root"])
+        self.assertEqual(hashes["group0"], entries["file_2.nc"]["hashes"]["group0"])
+        self.assertTrue(self.manager.scan_schemas(self.folder, self.files, self.cache_file, num_jobs=1))
+        self.assertEqual(len(self.extracted), 5)
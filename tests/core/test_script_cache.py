@@ -0,0 +1,173 @@
+"""Unit tests on the compiled scripts cache of the script runner"""
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+import yaml
+from utils import TestBase
+
+from nvp.components.runner import ScriptRunner
+from nvp.nvp_context import NVPContext
+from nvp.nvp_project import NVPProject
+
+logger = logging.getLogger(__name__)
+
+
+class FakeTools:
+    """Minimal stand-in for the tools component"""
+
+    def get_tool_desc(self, _tname):
+        """Retrieve the python tool desc"""
+        return {"sub_path": "bin/python", "base_path": os.path.dirname(sys.executable)}
+
+    def get_tool_path(self, _tname):
+        """Retrieve the python path"""
+        return sys.executable
+
+    def has_tool(self, _tname):
+        """No additional tool available"""
+        return False
+
+
+class FakePyEnvs:
+    """Minimal stand-in for the pyenvs component"""
+
+    def __init__(self, env_dir):
+        self.env_dir = env_dir
+
+    def get_py_env_dir(self, _env_name):
+        """Retrieve the parent folder of the python envs"""
+        return self.env_dir
+
+    def setup_py_env(self, env_name):
+        """Create an empty python env folder"""
+        os.makedirs(os.path.join(self.env_dir, env_name, "bin"))
+
+
+class FakeNodeJs:
+    """Minimal stand-in for the nodejs component"""
+
+    def __init__(self, env_dir):
+        self.env_dir = env_dir
+
+    def get_env_dir(self, _env_name):
+        """Retrieve the parent folder of the nodejs envs"""
+        return self.env_dir
+
+    def get_node_path(self, env_name):
+        """Retrieve the node path in an env"""
+        return os.path.join(self.env_dir, env_name, "bin", "node")
+
+
+class Tests(TestBase):
+    """Script cache tests"""
+
+    def setUp(self):
+        """Create a test project with a few scripts"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.proj_dir = os.path.join(self.tmp_dir.name, "proj")
+        self.base_dir = os.path.join(self.tmp_dir.name, "base")
+        os.makedirs(self.proj_dir)
+        os.makedirs(self.base_dir)
+        self.cache_file = os.path.join(self.tmp_dir.name, "script_cache.json")
+        self.compiled = []
+        self.scripts = {
+            "demo": {"cmd": "echo ${PROJECT_ROOT_DIR}"},
+            "list_base": {"cmd": "ls ${BASE_DIR}"},
+            "py_version": {"custom_python_env": "testenv", "cmd": "${PYTHON} -V"},
+            "node_version": {"nodejs_env": "web", "cmd": "${NODE} -v"},
+        }
+        self.write_project_config()
+        self.components = {
+            "tools": FakeTools(),
+            "pyenvs": FakePyEnvs(os.path.join(self.tmp_dir.name, "pyenvs")),
+            "nodejs": FakeNodeJs(os.path.join(self.tmp_dir.name, "node_envs")),
+        }
+
+    def tearDown(self):
+        """Release the context and remove the temp folder"""
+        NVPContext.instance = None
+        self.tmp_dir.cleanup()
+
+    def write_project_config(self):
+        """Write the project config file"""
+        with open(os.path.join(self.proj_dir, "nvp_config.yml"), "w", encoding="utf-8") as file:
+            yaml.dump({"scripts": self.scripts}, file)
+
+    def create_runner(self, base_dir=None):
+        """Create a new context and script runner, as done when starting a new nvp process"""
+        NVPContext.instance = None
+        ctx = NVPContext(base_dir=base_dir or self.base_dir)
+        ctx.add_project(NVPProject({"names": ["demo"], "project_root_dir": self.proj_dir}, ctx))
+
+        runner = ScriptRunner(ctx)
+        runner.get_script_cache_file = lambda: self.cache_file
+        runner.get_component = lambda cname: self.components[cname]
+
+        compile_script_desc = runner.compile_script_desc
+
+        def count_compile(desc, script_name, proj):
+            self.compiled.append(script_name)
+            return compile_script_desc(desc, script_name, proj)
+
+        runner.compile_script_desc = count_compile
+        return runner
+
+    def test_plan_reused(self):
+        """Test that a plan is compiled once and reused by the next processes"""
+        plan = self.create_runner().get_script_plan("demo", None)
+        self.assertEqual(plan["cmd"], ["echo", self.proj_dir])
+        self.assertIsNone(plan["base_dir"])
+
+        self.assertEqual(self.create_runner().get_script_plan("demo", None), plan)
+        self.assertEqual(self.compiled, ["demo"])
+
+    def test_invalidated_by_config_change(self):
+        """Test that the plans are recompiled when a project config file changes"""
+        self.create_runner().get_script_plan("demo", None)
+
+        self.scripts["demo"]["cmd"] = "echo updated"
+        self.write_project_config()
+        plan = self.create_runner().get_script_plan("demo", None)
+        self.assertEqual(plan["cmd"], ["echo", "updated"])
+        self.assertEqual(self.compiled, ["demo", "demo"])
+
+    def test_invalidated_by_base_dir(self):
+        """Test that only the plans using ${BASE_DIR} are recompiled when the base dir changes"""
+        self.create_runner().get_script_plan("list_base", None)
+        self.create_runner().get_script_plan("demo", None)
+
+        other_dir = os.path.join(self.tmp_dir.name, "other")
+        runner = self.create_runner(other_dir)
+        self.assertEqual(runner.get_script_plan("list_base", None)["cmd"], ["ls", other_dir])
+        runner.get_script_plan("demo", None)
+        self.assertEqual(self.compiled, ["list_base", "demo", "list_base"])
+
+    def test_invalidated_by_removed_py_env(self):
+        """Test that a plan is recompiled when its custom python env folder is removed"""
+        plan = self.create_runner().get_script_plan("py_version", None)
+        env_dir = os.path.join(self.tmp_dir.name, "pyenvs", "testenv")
+        self.assertEqual(plan["required_dirs"], [env_dir])
+
+        self.create_runner().get_script_plan("py_version", None)
+        self.assertEqual(self.compiled, ["py_version"])
+
+        shutil.rmtree(env_dir)
+        self.create_runner().get_script_plan("py_version", None)
+        self.assertEqual(self.compiled, ["py_version", "py_version"])
+        # The python env was created again:
+        self.assertTrue(os.path.isdir(env_dir))
+
+    def test_invalidated_by_removed_nodejs_env(self):
+        """Test that a plan is recompiled when its nodejs env folder is missing"""
+        env_dir = os.path.join(self.tmp_dir.name, "node_envs", "web")
+        os.makedirs(env_dir)
+        plan = self.create_runner().get_script_plan("node_version", None)
+        self.assertEqual(plan["required_dirs"], [env_dir])
+
+        shutil.rmtree(env_dir)
+        self.create_runner().get_script_plan("node_version", None)
+        self.assertEqual(self.compiled, ["node_version", "node_version"])
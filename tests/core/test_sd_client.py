@@ -0,0 +1,119 @@
+"""Unit tests on the StableDiffusion server client"""
+
+import logging
+import os
+import socket
+import stat
+import tempfile
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from utils import TestBase
+
+from nvp.ai.stable_diffusion.sd_client import SDClient, get_or_create_authkey, read_authkey, serve_requests
+from nvp.nvp_object import NVPCheckError
+
+logger = logging.getLogger(__name__)
+
+
+class Tests(TestBase):
+    """SD client tests"""
+
+    def setUp(self):
+        """Create a temp folder for the key file"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.key_file = os.path.join(self.tmp_dir.name, ".nvp", "sd_server.key")
+
+    def tearDown(self):
+        """Remove the temp folder"""
+        self.tmp_dir.cleanup()
+
+    def test_authkey_file(self):
+        """Test that a random key is generated once, in a file only readable by the user"""
+        self.assertIsNone(read_authkey(self.key_file))
+        authkey = get_or_create_authkey(self.key_file)
+        self.assertEqual(len(authkey), 64)
+        self.assertEqual(get_or_create_authkey(self.key_file), authkey)
+        if os.name == "posix":
+            self.assertEqual(stat.S_IMODE(os.stat(self.key_file).st_mode), 0o600)
+
+        other_file = os.path.join(self.tmp_dir.name, "other.key")
+        self.assertNotEqual(get_or_create_authkey(other_file), authkey)
+
+    def test_client_requires_key(self):
+        """Test that the client doesn't try to connect without key file"""
+        client = SDClient(port=1, key_file=self.key_file)
+        self.assertFalse(client.is_available())
+        with self.assertRaises(NVPCheckError):
+            client.send_request("ping")
+
+    def test_ping(self):
+        """Test a request sent with the key from the key file"""
+        authkey = get_or_create_authkey(self.key_file)
+        with Listener(("localhost", 0), authkey=authkey.encode("utf-8")) as listener:
+
+            def serve():
+                with listener.accept() as conn:
+                    conn.send({"status": "ok", "cmd": conn.recv()["cmd"]})
+
+            thread = threading.Thread(target=serve)
+            thread.start()
+            resp = SDClient(port=listener.address[1], key_file=self.key_file).send_request("ping")
+            thread.join()
+
+        self.assertEqual(resp["cmd"], "ping")
+
+    def test_prepare_params(self):
+        """Test that the request paths are resolved on the client side and the unset params dropped"""
+        client = SDClient(key_file=self.key_file)
+        params = client.prepare_params({"prompt": "a cat", "init_image": "input.png", "ckpt_file": None, "seed": 3})
+        self.assertEqual(
+            params,
+            {
+                "prompt": "a cat",
+                "init_image": os.path.join(os.getcwd(), "input.png"),
+                "output_dir": os.getcwd(),
+                "seed": 3,
+            },
+        )
+
+        params = client.prepare_params({"output_dir": "outputs"})
+        self.assertEqual(params["output_dir"], os.path.join(os.getcwd(), "outputs"))
+
+    def test_serve_requests(self):
+        """Test that the server keeps running after an invalid key or a disconnected client"""
+        authkey = get_or_create_authkey(self.key_file)
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            port = sock.getsockname()[1]
+
+        requests = []
+
+        def handle_request(req):
+            requests.append(req["cmd"])
+            return {"status": "ok"}, req["cmd"] == "stop"
+
+        thread = threading.Thread(target=serve_requests, args=(("localhost", port), authkey, handle_request))
+        thread.start()
+
+        # Wait for the listener to be ready:
+        client = SDClient(port=port, key_file=self.key_file)
+        for _ in range(100):
+            if client.is_available():
+                break
+            time.sleep(0.05)
+
+        with self.assertRaises(AuthenticationError):
+            SDClient(port=port, authkey="invalid", key_file=self.key_file).send_request("ping")
+
+        # Disconnect before sending the request:
+        Client(("localhost", port), authkey=authkey.encode("utf-8")).close()
+
+        client.send_request("ping")
+        client.stop_server()
+        thread.join(timeout=10)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(requests, ["ping", "ping", "stop"])
@@ -0,0 +1,129 @@
+"""Unit tests on the local source mirror"""
+
+import logging
+import os
+import subprocess
+import tempfile
+
+from utils import TestBase
+
+from nvp.core.source_mirror import SourceMirror
+from nvp.nvp_object import NVPObject
+
+logger = logging.getLogger(__name__)
+
+
+class LocalGit:
+    """Minimal stand-in for the git component, running the git commands directly"""
+
+    def execute_git(self, args, cwd=None):
+        """Execute a git command"""
+        subprocess.run(["git"] + args, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+
+    def clone_repository(self, url, dest_folder, mirror=False, recurse=False):
+        """Clone a repository"""
+        args = ["clone", "--mirror"] if mirror else ["clone"]
+        if recurse:
+            args.append("--recursive")
+        self.execute_git(args + [url, dest_folder])
+
+
+class Tests(TestBase):
+    """Source mirror tests"""
+
+    def setUp(self):
+        """Create a local git repository"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.repo_dir = os.path.join(self.tmp_dir.name, "origin")
+        os.makedirs(self.repo_dir)
+        self.url = "file://" + self.repo_dir
+        self.git("init", "-q", "-b", "main")
+        self.commit_file("main.cpp", "int main() { return 0; }\n", "initial")
+        self.mirror = SourceMirror(os.path.join(self.tmp_dir.name, "mirror"), LocalGit())
+
+    def tearDown(self):
+        """Remove the temp folder"""
+        self.tmp_dir.cleanup()
+
+    def git(self, *args):
+        """Run a git command in the origin repository"""
+        env = dict(os.environ, GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@test", GIT_COMMITTER_NAME="test")
+        env["GIT_COMMITTER_EMAIL"] = "test@test"
+        res = subprocess.run(["git"] + list(args), cwd=self.repo_dir, env=env, check=True, stdout=subprocess.PIPE)
+        return res.stdout.decode("utf-8").strip()
+
+    def commit_file(self, fname, content, msg):
+        """Commit a file in the origin repository"""
+        with open(os.path.join(self.repo_dir, fname), "w", encoding="utf-8") as file:
+            file.write(content)
+        self.git("add", fname)
+        self.git("commit", "-q", "-m", msg)
+        return self.git("rev-parse", "HEAD")
+
+    def test_pristine_tree_reused(self):
+        """Test that a pristine tree is created once and reused"""
+        tree_dir, created = self.mirror.get_git_pristine_tree(self.url)
+        self.assertTrue(created)
+        self.assertTrue(os.path.exists(os.path.join(tree_dir, "main.cpp")))
+        self.assertFalse(os.path.exists(os.path.join(tree_dir, ".git")))
+
+        tree_dir2, created = self.mirror.get_git_pristine_tree(self.url)
+        self.assertFalse(created)
+        self.assertEqual(tree_dir, tree_dir2)
+
+    def test_fetch_missing_ref(self):
+        """Test that the mirror is fetched when a requested ref is missing"""
+        self.mirror.get_git_pristine_tree(self.url)
+        commit = self.commit_file("lib.cpp", "void f() {}\n", "second")
+
+        tree_dir, created = self.mirror.get_git_pristine_tree(self.url, commit)
+        self.assertTrue(created)
+        self.assertTrue(os.path.exists(os.path.join(tree_dir, "lib.cpp")))
+
+    def test_latest_fetched(self):
+        """Test that the latest commit is fetched without ref unless a refresh delay is set"""
+        self.mirror.get_git_pristine_tree(self.url)
+        self.commit_file("lib.cpp", "void f() {}\n", "second")
+
+        tree_dir, created = self.mirror.get_git_pristine_tree(self.url)
+        self.assertTrue(created)
+        self.assertTrue(os.path.exists(os.path.join(tree_dir, "lib.cpp")))
+
+        self.mirror.refresh_delay = 3600
+        self.commit_file("lib2.cpp", "void g() {}\n", "third")
+        tree_dir, created = self.mirror.get_git_pristine_tree(self.url)
+        self.assertFalse(created)
+        self.assertFalse(os.path.exists(os.path.join(tree_dir, "lib2.cpp")))
+
+    def test_copy_tree(self):
+        """Test copying a pristine tree into a build folder"""
+        tree_dir, _ = self.mirror.get_git_pristine_tree(self.url)
+        build_dir = os.path.join(self.tmp_dir.name, "build")
+        self.mirror.copy_tree(tree_dir, build_dir)
+
+        src_file = os.path.join(tree_dir, "main.cpp")
+        dst_file = os.path.join(build_dir, "main.cpp")
+        self.assertFalse(os.path.samefile(src_file, dst_file))
+
+    def test_copy_tree_hard_links(self):
+        """Test hard linking a pristine tree into a build folder, and patching the linked files"""
+        self.mirror.hard_links = True
+        tree_dir, _ = self.mirror.get_git_pristine_tree(self.url)
+        build_dir = os.path.join(self.tmp_dir.name, "build")
+        self.mirror.copy_tree(tree_dir, build_dir)
+
+        src_file = os.path.join(tree_dir, "main.cpp")
+        dst_file = os.path.join(build_dir, "main.cpp")
+        self.assertTrue(os.path.samefile(src_file, dst_file))
+
+        # In place modifications must not change the pristine tree:
+        obj = NVPObject()
+        obj.replace_in_file(dst_file, "return 0", "return 1")
+        self.assertFalse(os.path.samefile(src_file, dst_file))
+        self.assertEqual(obj.read_text_file(src_file), "int main() { return 0; }\n")
+        self.assertEqual(obj.read_text_file(dst_file), "int main() { return 1; }\n")
+
+        other_file = os.path.join(build_dir, "other.cpp")
+        os.link(src_file, other_file)
+        obj.write_text_file("patched", other_file)
+        self.assertEqual(obj.read_text_file(src_file), "int main() { return 0; }\n")
@@ -0,0 +1,84 @@
+"""Unit tests on the placeholder templating engine"""
+
+import logging
+import os
+import time
+
+import yaml
+
+from utils import TestBase
+
+from nvp.core.templating import TemplateCycleError, TemplateEngine
+
+logger = logging.getLogger(__name__)
+
+
+def legacy_fill(content, hlocs):
+    """Reference implementation with sequential str.replace calls"""
+    if isinstance(content, list):
+        return [legacy_fill(elem, hlocs) for elem in content]
+    if isinstance(content, dict):
+        return {key: legacy_fill(elem, hlocs) for key, elem in content.items()}
+    if not isinstance(content, str):
+        return content
+
+    for loc, rep in hlocs.items():
+        if rep is not None:
+            content = content.replace(loc, rep)
+    return content
+
+
+class Tests(TestBase):
+    """Templating engine tests"""
+
+    def test_substitution(self):
+        """Test the basic placeholder substitutions"""
+        engine = TemplateEngine({"${A}": "a", "${B}": "${A}/b", "${N}": 3, "${NONE}": None})
+        self.assertEqual(engine.fill("${B}/c"), "a/b/c")
+        self.assertEqual(engine.fill("${N}"), 3)
+        self.assertEqual(engine.fill("n=${N}"), "n=3")
+        self.assertEqual(engine.fill("${NONE}-${UNKNOWN}"), "${NONE}-${UNKNOWN}")
+        self.assertEqual(engine.fill({"x": ["${A}", 1, None]}), {"x": ["a", 1, None]})
+        self.assertEqual(engine.fill("$HOME ${A"), "$HOME ${A")
+
+    def test_resolver(self):
+        """Test the resolution of unknown tokens with a resolver function"""
+        engine = TemplateEngine({"${A}": "a"}, resolver=lambda tok: "tool" if tok.startswith("$[") else None)
+        self.assertEqual(engine.fill("${A}:$[TOOL_PATH:git]:${B}"), "a:tool:${B}")
+
+    def test_cycles(self):
+        """Test that cyclic placeholders are detected"""
+        engine = TemplateEngine({"${A}": "x${B}", "${B}": "${A}"})
+        with self.assertRaises(TemplateCycleError):
+            engine.fill("${A}")
+
+    def test_config_benchmark(self):
+        """Compare the engine with the legacy implementation on the main config file"""
+        cfg_file = os.path.join(os.path.dirname(__file__), "..", "..", "config.yml")
+        with open(cfg_file, "r", encoding="utf-8") as file:
+            config = yaml.safe_load(file)
+
+        hlocs = {
+            "${NVP_ROOT_DIR}": "/opt/nvp",
+            "${PROJECT_ROOT_DIR}": "/opt/projects/demo",
+            "${HOME}": "/home/user",
+            "${PYTHON}": "/usr/bin/python3",
+            "${TOOLS_DIR}": "/opt/nvp/tools",
+        }
+        for idx in range(100):
+            hlocs[f"${{VAR_{idx}}}"] = f"value_{idx}"
+
+        self.assertEqual(TemplateEngine(hlocs).fill(config), legacy_fill(config, hlocs))
+
+        count = 20
+        start_time = time.perf_counter()
+        for _ in range(count):
+            legacy_fill(config, hlocs)
+        legacy_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for _ in range(count):
+            TemplateEngine(hlocs).fill(config)
+        engine_time = time.perf_counter() - start_time
+
+        logger.info("Config templating: legacy=%.3fms, engine=%.3fms", legacy_time * 1000, engine_time * 1000)
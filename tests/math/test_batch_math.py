@@ -0,0 +1,202 @@
+"""Unit tests on the Vec3Array, QuatArray and Mat4Array batch types"""
+
+import logging
+import math
+import os
+import time
+
+import numpy as np
+from utils import TestBase
+
+from nvp.math.mat4 import Mat4
+from nvp.math.mat4_array import Mat4Array
+from nvp.math.quat import Quat
+from nvp.math.quat_array import QuatArray
+from nvp.math.vec3 import Vec3
+from nvp.math.vec3_array import Vec3Array
+from nvp.math.vec4 import Vec4
+
+logger = logging.getLogger(__name__)
+
+
+class Tests(TestBase):
+    """Batch math tests"""
+
+    def gen_vec3(self):
+        """Generate a random vec3"""
+        return Vec3(self.gen_float(-10.0, 10.0), self.gen_float(-10.0, 10.0), self.gen_float(-10.0, 10.0))
+
+    def gen_quat(self):
+        """Generate a random rotation quat"""
+        return Quat(self.gen_float(-math.pi, math.pi), self.gen_vec3())
+
+    def gen_mat4(self):
+        """Generate a random invertible transform"""
+        return Mat4.translate(self.gen_vec3()) * Mat4(self.gen_quat()) * Mat4.scale(2.0, 0.5, 3.0)
+
+    def test_vec3_array(self):
+        """Test the vec3 array operations against the scalar ones"""
+        vecs = [self.gen_vec3() for _ in range(20)]
+        others = [self.gen_vec3() for _ in range(20)]
+        arr = Vec3Array.from_vec3s(vecs)
+        oarr = Vec3Array.from_vec3s(others)
+
+        self.assertEqual(len(arr), 20)
+        for i, (v1, v2) in enumerate(zip(vecs, others)):
+            self.assertVec3AlmostEqual((arr + oarr)[i], v1 + v2)
+            self.assertVec3AlmostEqual((arr - oarr)[i], v1 - v2)
+            self.assertVec3AlmostEqual((arr * 2.5)[i], v1 * 2.5)
+            self.assertVec3AlmostEqual(arr.cross(oarr)[i], v1.cross(v2))
+            self.assertVec3AlmostEqual(arr.normalized()[i], v1.normalized())
+            self.assertAlmostEqual(arr.dot(oarr)[i], v1.dot(v2), delta=1e-9)
+            self.assertAlmostEqual(arr.length()[i], v1.length(), delta=1e-9)
+
+        # Broadcasting with a single Vec3:
+        self.assertVec3AlmostEqual((arr - Vec3.X_AXIS)[3], vecs[3] - Vec3.X_AXIS)
+
+        # Null vectors are left unchanged:
+        zeros = Vec3Array(count=2)
+        self.assertEqual(zeros.normalize().tolist(), [0.0, 0.0])
+        self.assertEqual(zeros.data.tolist(), [[0.0, 0.0, 0.0], [0.0, 0.0, 0.0]])
+
+    def test_quat_array(self):
+        """Test the quat array operations against the scalar ones"""
+        quats = [self.gen_quat() for _ in range(20)]
+        others = [self.gen_quat() for _ in range(20)]
+        vecs = [self.gen_vec3() for _ in range(20)]
+        arr = QuatArray.from_quats(quats)
+        oarr = QuatArray.from_quats(others)
+        rotated = arr.rotate(Vec3Array.from_vec3s(vecs))
+        mats = arr.to_mat4s()
+
+        for i, (q1, q2) in enumerate(zip(quats, others)):
+            self.assertQuatAlmostEqual((arr * oarr)[i], q1 * q2)
+            self.assertQuatAlmostEqual(arr.inverse()[i], q1.inverse())
+            self.assertQuatAlmostEqual((arr * arr.inverse())[i], Quat())
+            self.assertQuatAlmostEqual(arr.slerp(oarr, 0.3)[i], q1.slerp(q2, 0.3))
+            self.assertVec3AlmostEqual(rotated[i], Mat4(q1) * vecs[i])
+            self.assertMat4AlmostEqual(mats[i], Mat4(q1))
+
+        # Close quats use the linear interpolation:
+        close = Quat(quats[0].x + 1e-4, quats[0].y, quats[0].z, quats[0].w)
+        self.assertQuatAlmostEqual(arr[:1].slerp(close, 0.5)[0], quats[0].slerp(close, 0.5))
+
+        # Per element interpolation factors:
+        factors = np.linspace(0.0, 1.0, 20)
+        res = arr.slerp(oarr, factors)
+        for i, (q1, q2) in enumerate(zip(quats, others)):
+            self.assertQuatAlmostEqual(res[i], q1.slerp(q2, factors[i]))
+
+        angles = np.linspace(-1.0, 1.0, 20)
+        res = QuatArray.from_angle_axis(angles, Vec3(1.0, 2.0, 3.0))
+        for i, angle in enumerate(angles):
+            self.assertQuatAlmostEqual(res[i], Quat(float(angle), Vec3(1.0, 2.0, 3.0)))
+        self.assertQuatAlmostEqual(QuatArray.from_angle_axis(1.0, Vec3())[0], Quat())
+
+    def test_mat4_array(self):
+        """Test the mat4 array operations against the scalar ones"""
+        mats = [self.gen_mat4() for _ in range(20)]
+        others = [self.gen_mat4() for _ in range(20)]
+        vecs = [self.gen_vec3() for _ in range(20)]
+        arr = Mat4Array.from_mat4s(mats)
+        oarr = Mat4Array.from_mat4s(others)
+        varr = Vec3Array.from_vec3s(vecs)
+
+        prod = arr * oarr
+        inv = arr.inverse()
+        pts = arr * varr
+        for i, (m1, m2) in enumerate(zip(mats, others)):
+            self.assertMat4AlmostEqual(prod[i], m1 * m2)
+            self.assertMat4AlmostEqual(inv[i], m1.inverse())
+            self.assertMat4AlmostEqual(arr.transposed()[i], m1.transposed())
+            self.assertVec3AlmostEqual(pts[i], m1 * vecs[i])
+
+        # A single matrix is applied to all the elements:
+        single = Mat4Array(mats[0])
+        pts = single.transform(varr)
+        dirs = single.transform_vectors(varr)
+        origin = mats[0] * Vec3()
+        for i, vec in enumerate(vecs):
+            self.assertVec3AlmostEqual(pts[i], mats[0] * vec)
+            self.assertVec3AlmostEqual(dirs[i], mats[0] * vec - origin)
+            self.assertMat4AlmostEqual((single * oarr)[i], mats[0] * others[i])
+
+        proj = Mat4.perspective(math.radians(60.0), 2.0, 1.0, 100.0)
+        res = Mat4Array(proj).project(varr)
+        for i, vec in enumerate(vecs):
+            clip = proj * Vec4(vec.x, vec.y, vec.z, 1.0)
+            self.assertVec3AlmostEqual(res[i], clip.xyz() / clip.w)
+
+        with self.assertRaises(ValueError):
+            Mat4Array(Mat4() * 0.0).inverse()
+
+    def test_scalar_fast_paths(self):
+        """Test the unrolled scalar operations"""
+        m1 = self.gen_mat4()
+        m2 = self.gen_mat4()
+        ref = Mat4()
+        for r in range(4):
+            for c in range(4):
+                ref[r][c] = sum(m1[r][k] * m2[k][c] for k in range(4))
+        self.assertMat4AlmostEqual(m1 * m2, ref, delta=1e-9)
+
+        copy = Mat4(m1)
+        copy[0][0] += 1.0
+        self.assertNotEqual(copy, m1)
+
+        q = self.gen_quat()
+        self.assertQuatAlmostEqual(q * q.inverse(), Quat())
+        self.assertQuatAlmostEqual((q / q), Quat())
+        self.assertEqual(tuple(Vec3(1.0, 2.0, 3.0)), (1.0, 2.0, 3.0))
+
+        with self.assertRaises(AttributeError):
+            Vec3().w = 1.0
+
+    def build_frustum(self, grid_width, grid_height, hfov):
+        """Build the satellite frame and the frustum half extents for the sensor grid"""
+        sat_lla = Vec3(0.0, 0.0, 500000.0)
+        sat_frame = self.get_canonical_frame(sat_lla) * Mat4(Quat(math.pi / 2.0, Vec3.Y_AXIS))
+        vfov = self.hfov_to_vfov(hfov, grid_width / grid_height)
+        return sat_frame, math.tan(math.radians(hfov) * 0.5), math.tan(math.radians(vfov) * 0.5)
+
+    def test_frustum_benchmark(self):
+        """Compare the scalar and batched transforms of the sensor grid rays (set NVP_BENCH_GRID=512x256)"""
+        grid_width, grid_height = [int(val) for val in os.getenv("NVP_BENCH_GRID", "128x64").split("x")]
+        sat_frame, half_w, half_h = self.build_frustum(grid_width, grid_height, 45.0)
+        ray_length = 500000.0
+
+        # Scalar path: one ray at a time, X forward, Y left, Z up:
+        start_time = time.perf_counter()
+        scalar_pts = []
+        for row in range(grid_height):
+            v = (1.0 - 2.0 * (row + 0.5) / grid_height) * half_h
+            for col in range(grid_width):
+                u = (1.0 - 2.0 * (col + 0.5) / grid_width) * half_w
+                scalar_pts.append(sat_frame * (Vec3(1.0, u, v).normalized() * ray_length))
+        scalar_time = time.perf_counter() - start_time
+
+        # Batched path:
+        start_time = time.perf_counter()
+        v = (1.0 - 2.0 * (np.arange(grid_height) + 0.5) / grid_height) * half_h
+        u = (1.0 - 2.0 * (np.arange(grid_width) + 0.5) / grid_width) * half_w
+        vv, uu = np.meshgrid(v, u, indexing="ij")
+        dirs = Vec3Array.from_xyz(1.0, uu.ravel(), vv.ravel()).normalized()
+        batch_pts = Mat4Array(sat_frame).transform(dirs * ray_length)
+        batch_time = time.perf_counter() - start_time
+
+        self.assertEqual(len(batch_pts), len(scalar_pts))
+        np.testing.assert_allclose(batch_pts.data, Vec3Array.from_vec3s(scalar_pts).data, rtol=0.0, atol=1e-6)
+
+        # The center rays point towards the earth center:
+        center = batch_pts[(grid_height // 2) * grid_width + grid_width // 2]
+        self.assertLess(center.length(), sat_frame.col(3).xyz().length())
+
+        logger.info(
+            "Transformed %dx%d rays: scalar=%.3fs, batched=%.4fs (x%.1f)",
+            grid_width,
+            grid_height,
+            scalar_time,
+            batch_time,
+            scalar_time / max(batch_time, 1e-9),
+        )
+
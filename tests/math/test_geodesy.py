@@ -0,0 +1,157 @@
+"""Unit tests on the geodesy module"""
+
+import logging
+import math
+import os
+import time
+
+import numpy as np
+from utils import TestBase, a, e2
+
+from nvp.math import geodesy
+from nvp.math.vec3 import Vec3
+from nvp.math.vec3_array import Vec3Array
+
+logger = logging.getLogger(__name__)
+
+
+class Tests(TestBase):
+    """Geodesy tests"""
+
+    def gen_lla(self, count, max_alt=4.0e7, seed=0):
+        """Generate random geodetic locations, including the poles and the equator"""
+        rng = np.random.default_rng(seed)
+        lla = np.stack(
+            [rng.uniform(-90.0, 90.0, count), rng.uniform(-180.0, 180.0, count), rng.uniform(-1.0e4, max_alt, count)],
+            axis=-1,
+        )
+        lla[:4, 0] = [90.0, -90.0, 0.0, 89.9999999]
+        return lla
+
+    def test_constants(self):
+        """Check the WGS84 constants match the test helpers"""
+        self.assertEqual(geodesy.WGS84_A, a)
+        self.assertAlmostEqual(geodesy.WGS84_E2, e2, delta=1e-15)
+
+    def test_against_iterative_helpers(self):
+        """Compare the batched conversions with the per point iterative helpers"""
+        lla = self.gen_lla(2000)
+        ecef = geodesy.lla_to_ecef(lla)
+        lla2 = geodesy.ecef_to_lla(ecef)
+
+        for i in range(len(lla)):
+            ref_ecef = self.lla_to_ecef(Vec3(*lla[i]))
+            self.assertVec3AlmostEqual(Vec3(*ecef[i]), ref_ecef, delta=1e-6)
+
+            ref_lla = self.ecef_to_lla(ref_ecef)
+            self.assertAlmostEqual(lla2[i, 0], ref_lla.x, delta=1e-8)
+            self.assertAlmostEqual(lla2[i, 2], ref_lla.z, delta=1e-3)
+            if abs(lla[i, 0]) < 90.0:
+                self.assertAlmostEqual(lla2[i, 1], ref_lla.y, delta=1e-8)
+
+    def test_round_trip_error(self):
+        """Check the closed-form conversion error is bounded from below the surface up to beyond GEO"""
+        lla = self.gen_lla(100000, seed=1)
+        lla2 = geodesy.ecef_to_lla(geodesy.lla_to_ecef(lla))
+
+        valid = np.abs(lla[:, 0]) < 90.0
+        lon_err = np.abs((lla2[valid, 1] - lla[valid, 1] + 180.0) % 360.0 - 180.0)
+        self.assertLess(np.abs(lla2[:, 0] - lla[:, 0]).max(), 1e-11)
+        self.assertLess(lon_err.max(), 1e-11)
+        self.assertLess(np.abs(lla2[:, 2] - lla[:, 2]).max(), 1e-6)
+
+    def test_input_types(self):
+        """Check the Vec3 and Vec3Array inputs are preserved"""
+        lla = Vec3(52.52, 13.405, 34.0)
+        ecef = geodesy.lla_to_ecef(lla)
+        self.assertIsInstance(ecef, Vec3)
+        self.assertVec3AlmostEqual(ecef, self.lla_to_ecef(lla), delta=1e-6)
+        self.assertVec3AlmostEqual(geodesy.ecef_to_lla(ecef), lla, delta=1e-6)
+
+        arr = geodesy.lla_to_ecef(Vec3Array.from_vec3s([lla, lla]))
+        self.assertIsInstance(arr, Vec3Array)
+        self.assertVec3AlmostEqual(arr[1], ecef)
+
+        grid = geodesy.lla_to_ecef(np.zeros((4, 5, 3)))
+        self.assertEqual(grid.shape, (4, 5, 3))
+        self.assertAlmostEqual(grid[3, 4, 0], a)
+
+    def test_enu_ned(self):
+        """Test the local ENU and NED frames"""
+        ref = Vec3(45.0, 10.0, 100.0)
+        origin = geodesy.lla_to_ecef(ref)
+
+        # A point above the reference is along the up / -down axis:
+        above = geodesy.lla_to_ecef(Vec3(45.0, 10.0, 1100.0))
+        self.assertVec3AlmostEqual(geodesy.ecef_to_enu(above, ref), Vec3(0.0, 0.0, 1000.0), delta=1e-6)
+        self.assertVec3AlmostEqual(geodesy.ecef_to_ned(above, ref), Vec3(0.0, 0.0, -1000.0), delta=1e-6)
+
+        # A point slightly to the north/east:
+        north_east = geodesy.ecef_to_enu(geodesy.lla_to_ecef(Vec3(45.001, 10.001, 100.0)), ref)
+        self.assertGreater(north_east.x, 0.0)
+        self.assertGreater(north_east.y, 0.0)
+        self.assertAlmostEqual(north_east.z, 0.0, delta=0.05)
+
+        lla = self.gen_lla(1000, max_alt=1.0e5)
+        ecef = geodesy.lla_to_ecef(lla)
+        enu = geodesy.ecef_to_enu(ecef, ref)
+        dists = np.linalg.norm(ecef - np.array(tuple(origin)), axis=-1)
+        np.testing.assert_allclose(np.linalg.norm(enu, axis=-1), dists)
+        np.testing.assert_allclose(geodesy.enu_to_ecef(enu, ref), ecef, rtol=0.0, atol=1e-6)
+        np.testing.assert_allclose(geodesy.ned_to_ecef(geodesy.ecef_to_ned(ecef, ref), ref), ecef, rtol=0.0, atol=1e-6)
+
+        # Per point reference locations:
+        enu = geodesy.ecef_to_enu(ecef + geodesy.enu_rotation(lla)[:, 2] * 10.0, lla)
+        np.testing.assert_allclose(enu, np.tile([0.0, 0.0, 10.0], (len(lla), 1)), rtol=0.0, atol=1e-6)
+
+    def test_canonical_frame(self):
+        """Compare the canonical frames with the test helper"""
+        for lla in [Vec3(0.0, 0.0, 500000.0), Vec3(45.0, -120.0, 1000.0), Vec3(-33.9, 151.2, 0.0)]:
+            self.assertMat4AlmostEqual(geodesy.canonical_frame(lla), self.get_canonical_frame(lla), delta=1e-6)
+
+        frames = geodesy.canonical_frame(np.array([[0.0, 0.0, 500000.0], [45.0, -120.0, 1000.0]]))
+        self.assertEqual(len(frames), 2)
+        self.assertMat4AlmostEqual(frames[1], self.get_canonical_frame(Vec3(45.0, -120.0, 1000.0)), delta=1e-6)
+
+    def test_meters_per_degree(self):
+        """Check the length of a degree against the ECEF distances"""
+        for lat in [0.0, 30.0, 60.0, 89.0]:
+            m_lat, m_lon = geodesy.meters_per_degree(lat)
+            p0 = geodesy.lla_to_ecef(Vec3(lat - 0.0005, 0.0, 0.0))
+            p1 = geodesy.lla_to_ecef(Vec3(lat + 0.0005, 0.0, 0.0))
+            self.assertAlmostEqual(m_lat, (p1 - p0).length() * 1000.0, delta=1e-3)
+            p1 = geodesy.lla_to_ecef(Vec3(lat, 0.001, 0.0))
+            p0 = geodesy.lla_to_ecef(Vec3(lat, 0.0, 0.0))
+            self.assertAlmostEqual(m_lon, (p1 - p0).length() * 1000.0, delta=1e-3)
+        self.assertAlmostEqual(float(geodesy.meters_per_degree(0.0)[1]), a * math.pi / 180.0, delta=1e-6)
+
+    def test_benchmark(self):
+        """Report the conversion throughput (set NVP_BENCH_NUM_POINTS=1000000 for the full benchmark)"""
+        num_points = int(os.getenv("NVP_BENCH_NUM_POINTS", "100000"))
+        lla = self.gen_lla(num_points, max_alt=1.0e5, seed=2)
+
+        start_time = time.perf_counter()
+        ecef = geodesy.lla_to_ecef(lla)
+        to_ecef_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        lla2 = geodesy.ecef_to_lla(ecef)
+        to_lla_time = time.perf_counter() - start_time
+
+        # Reference iterative helpers on a subset of the points:
+        num_ref = min(num_points, 2000)
+        start_time = time.perf_counter()
+        for i in range(num_ref):
+            self.ecef_to_lla(Vec3(*ecef[i]))
+        ref_time = (time.perf_counter() - start_time) * num_points / num_ref
+
+        self.assertLess(np.abs(lla2[:, 2] - lla[:, 2]).max(), 1e-6)
+        logger.info(
+            "Converted %d points: lla_to_ecef=%.3fs, ecef_to_lla=%.3fs (%.1f Mpts/s), iterative=%.1fs (estimated)",
+            num_points,
+            to_ecef_time,
+            to_lla_time,
+            num_points / max(to_lla_time, 1e-9) * 1e-6,
+            ref_time,
+        )
+